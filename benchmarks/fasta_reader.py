@@ -0,0 +1,131 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark the throughput of `FastaReader` (e.g., for a genome assembly).
+
+Usage: python fasta_reader.py genome.fa
+
+The script reads all sequences in the file, using `FastaReader` and using
+the previous line-based reader (reproduced below), and reports the time and
+throughput of each.
+"""
+
+import os
+import sys
+import time
+import argparse
+
+from genometools import misc
+from genometools.seq import FastaReader, Sequence
+
+
+class LineFastaReader(object):
+    """The previous (line-based) implementation of `FastaReader`."""
+
+    def __init__(self, fh):
+        self.fh = fh
+        self.cur_name = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        started = False
+        name = None
+        if self.cur_name is not None:
+            started = True
+            name = self.cur_name
+
+        seq = []
+
+        while True:
+
+            try:
+                l = next(self.fh)
+            except StopIteration:
+                if started:
+                    self.cur_name = None
+                    break
+                else:
+                    raise StopIteration
+
+            if l[0] == '>':
+                if started:
+                    self.cur_name = l[1:-1]
+                    break
+
+                started = True
+                name = l[1:-1]
+
+            elif started:
+                if l[0] == '\n':
+                    self.cur_name = None
+                    break
+                seq.append(l[:-1])
+
+        return Sequence(name, ''.join(seq))
+
+
+def get_argument_parser():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('fasta_file', help='The FASTA file (may be gzip\'ed).')
+    parser.add_argument('--block-size', type=int, default=4194304,
+                        help='The block size used by `FastaReader`.')
+    parser.add_argument('--skip-line-reader', action='store_true',
+                        help='Do not benchmark the line-based reader.')
+    return parser
+
+
+def _report(label, num_seqs, num_bases, file_size, seconds):
+    print('%s: %d sequences, %d bases, %.2f s (%.1f MB/s)'
+          % (label, num_seqs, num_bases, seconds,
+             file_size / 1e6 / max(seconds, 1e-9)))
+
+
+def main(args=None):
+    if args is None:
+        parser = get_argument_parser()
+        args = parser.parse_args()
+
+    fasta_file = args.fasta_file
+    file_size = os.path.getsize(fasta_file)
+
+    t0 = time.time()
+    num_seqs = 0
+    num_bases = 0
+    for s in FastaReader(fasta_file, block_size=args.block_size):
+        num_seqs += 1
+        num_bases += s.length
+    _report('FastaReader', num_seqs, num_bases, file_size, time.time() - t0)
+
+    if not args.skip_line_reader:
+        t0 = time.time()
+        num_seqs = 0
+        num_bases = 0
+        with misc.smart_open_read(fasta_file, mode='r', encoding='ascii',
+                                  try_gzip=True) as fh:
+            for s in LineFastaReader(fh):
+                num_seqs += 1
+                num_bases += s.length
+        _report('Line-based reader', num_seqs, num_bases, file_size,
+                time.time() - t0)
+
+    return 0
+
+
+if __name__ == '__main__':
+    return_code = main()
+    sys.exit(return_code)
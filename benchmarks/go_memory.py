@@ -0,0 +1,73 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Benchmark the memory used by a `GeneOntology` (e.g., for go-basic.obo).
+
+Usage: python go_memory.py go-basic.obo
+
+The script reports the memory retained after parsing (and flattening) the
+ontology, as measured by `tracemalloc`, as well as the parsing time.
+"""
+
+import sys
+import gc
+import time
+import argparse
+import tracemalloc
+
+from genometools.ontology import GeneOntology
+
+
+def get_argument_parser():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('obo_file', help='The OBO file (e.g., go-basic.obo).')
+    parser.add_argument('--no-flatten', action='store_true',
+                        help='Do not flatten the ontology.')
+    return parser
+
+
+def main(args=None):
+    if args is None:
+        parser = get_argument_parser()
+        args = parser.parse_args()
+
+    flatten = not args.no_flatten
+
+    gc.collect()
+    tracemalloc.start()
+    t0 = time.time()
+    ontology = GeneOntology.read_obo(args.obo_file, flatten=flatten)
+    t1 = time.time()
+    if flatten:
+        # make sure the ancestors/descendants of every term are accessible
+        for term in ontology:
+            assert term.ancestors is not None
+            assert term.descendants is not None
+    gc.collect()
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print('GO terms: %d' % len(ontology))
+    print('Parsing time: %.2f s' % (t1 - t0))
+    print('Retained memory: %.1f MB (%.0f bytes per term)'
+          % (current / 1e6, current / float(len(ontology))))
+    print('Peak memory: %.1f MB' % (peak / 1e6))
+    return 0
+
+
+if __name__ == '__main__':
+    return_code = main()
+    sys.exit(return_code)
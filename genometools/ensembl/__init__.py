@@ -19,7 +19,11 @@
 #from .functions import *
 from .species import *
 from .util import *
+from .cache import *
 from .annotations import *
+from .intervals import *
+from .models import *
+from .indexed_gtf import *
 from .cdna import *
 from .dna import *
 
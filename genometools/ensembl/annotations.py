@@ -20,21 +20,51 @@ _oldstr = str
 from builtins import *
 
 # import os
-import ftplib
+import io
 import time
 import re
 import logging
 from collections import Iterable, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy as np
 import pandas as pd
-    
-# from .. import misc
+
+from .. import misc
 from .. import gtf
 from . import util
+from .cache import GTFCache
 
 _LOGGER = logging.getLogger(__name__)
 
 
+def _get_species_annotation_url_and_checksum(species, release, ftp):
+    """Get the FTP URL and checksum of the GTF file for a single species."""
+    # get the GTF file URL
+    # => since the naming scheme isn't consistent across species,
+    #    we're using a flexible scheme here to find the right file
+    species_dir = '/pub/release-%d/gtf/%s' % (release, species.lower())
+    data = util._ftp_dir(ftp, species_dir)
+    gtf_file = []
+    for d in data:
+        i = d.rindex(' ')
+        fn = d[(i + 1):]
+        if fn.endswith('.%d.gtf.gz' % release):
+            gtf_file.append(fn)
+    assert len(gtf_file) == 1
+    gtf_file = gtf_file[0]
+    _LOGGER.debug('GTF file: %s', gtf_file)
+
+    ### get the checksum for the GTF file
+    checksum_url = '/'.join([species_dir, 'CHECKSUMS'])
+    file_checksums = util.get_file_checksums(checksum_url, ftp=ftp)
+    gtf_checksum = file_checksums[gtf_file]
+    _LOGGER.debug('GTF file checksum: %d', gtf_checksum)
+
+    gtf_url = util._ftp_url(ftp, '%s/%s' % (species_dir, gtf_file))
+    return gtf_url, gtf_checksum
+
+
 def get_annotation_urls_and_checksums(species, release=None, ftp=None):
     """Get FTP URLs and checksums for Ensembl genome annotations.
     
@@ -45,71 +75,118 @@ def get_annotation_urls_and_checksums(species, release=None, ftp=None):
         (e.g., "Homo_sapiens").
     release : int, optional
         The release number to look up. If `None`, use latest release. [None]
-    ftp : ftplib.FTP, optional
-        The FTP connection to use. If `None`, the function will open and close
-        its own connection using user "anonymous".
+    ftp : `ftplib.FTP` or `misc.FTPConnectionPool`, optional
+        The FTP connection or connection pool to use. If `None`, use the
+        shared connection pool (see `get_ftp_pool`). [None]
+
+    Returns
+    -------
+    `collections.OrderedDict` (str => (str, int))
+        The URL and checksum of the GTF file for each species.
+
+    Notes
+    -----
+    When using a connection pool, the species are looked up concurrently,
+    using up to `misc.FTPConnectionPool.max_connections` connections.
     """
     ### type checks
     assert isinstance(species, (str, _oldstr)) or isinstance(species, Iterable)
     if release is not None:
         assert isinstance(release, int)
-    if ftp is not None:
-        assert isinstance(ftp, ftplib.FTP)
-
-    ### open FTP connection if necessary
-    close_connection = False
-    ftp_server = 'ftp.ensembl.org'
-    ftp_user = 'anonymous'
-    if ftp is None:
-        ftp = ftplib.FTP(ftp_server)
-        ftp.login(ftp_user)
-        close_connection = True    
+    ftp = util._get_ftp(ftp)
 
     ### determine release if necessary
     if release is None:
         # use latest release
         release = util.get_latest_release(ftp=ftp)
 
-    species_data = OrderedDict()
     if isinstance(species, (str, _oldstr)):
         species_list = [species]
     else:
-        species_list = species
-    for spec in species_list:
-
-        # get the GTF file URL
-        # => since the naming scheme isn't consistent across species,
-        #    we're using a flexible scheme here to find the right file
-        species_dir = '/pub/release-%d/gtf/%s' % (release, spec.lower())
-        data = []
-        ftp.dir(species_dir, data.append)
-        gtf_file = []
-        for d in data:
-            i = d.rindex(' ')
-            fn = d[(i + 1):]
-            if fn.endswith('.%d.gtf.gz' % release):
-                gtf_file.append(fn)
-        assert len(gtf_file) == 1
-        gtf_file = gtf_file[0]
-        _LOGGER.debug('GTF file: %s', gtf_file)
-
-        ### get the checksum for the GTF file
-        checksum_url = '/'.join([species_dir, 'CHECKSUMS'])
-        file_checksums = util.get_file_checksums(checksum_url, ftp=ftp)
-        gtf_checksum = file_checksums[gtf_file]
-        _LOGGER.debug('GTF file checksum: %d', gtf_checksum)
-
-        gtf_url = 'ftp://%s%s/%s' %(ftp_server, species_dir, gtf_file)
-
-        species_data[spec] = (gtf_url, gtf_checksum)
-
-    # close FTP connection, if we opened it
-    if close_connection:
-        ftp.close()
+        species_list = list(species)
+
+    if isinstance(ftp, misc.FTPConnectionPool) and len(species_list) > 1:
+        num_threads = min(ftp.max_connections, len(species_list))
+        with ThreadPoolExecutor(max_workers=num_threads) as executor:
+            results = list(executor.map(
+                lambda spec: _get_species_annotation_url_and_checksum(
+                    spec, release, ftp), species_list))
+    else:
+        results = [_get_species_annotation_url_and_checksum(
+            spec, release, ftp) for spec in species_list]
 
+    species_data = OrderedDict(zip(species_list, results))
     return species_data
 
 
+_ANNOTATION_ATTRIBUTES = OrderedDict([
+    ('gene', ['gene_id', 'gene_name', 'gene_biotype']),
+    ('transcript', ['gene_id', 'transcript_id', 'transcript_name',
+                    'transcript_biotype', 'gene_name', 'gene_biotype']),
+    ('exon', ['gene_id', 'transcript_id', 'exon_number', 'exon_id']),
+])
+"""The attributes extracted for each feature type."""
+
+
+def get_annotation_tables(path_or_buffer, features=None, cache_dir=None,
+                          cache_max_size=None):
+    """Get tables of the gene, transcript, and/or exon annotations.
+
+    Parameters
+    ----------
+    path_or_buffer : str or buffer
+        The GTF file (either the file path or a buffer).
+    features : Iterable of str, optional
+        The feature types to include ("gene", "transcript", and/or "exon").
+        If `None`, include all three. [None]
+    cache_dir : str, optional
+        Directory for caching the parsed tables (see `GTFCache`). Each table
+        is cached separately, keyed by the MD5 checksum of the GTF file, so
+        changes to the file are detected automatically. Only used if
+        ``path_or_buffer`` is a file path. [None]
+    cache_max_size : int, optional
+        The maximum size of the cache, in bytes (see `GTFCache`). [None]
+
+    Returns
+    -------
+    dict (str => `pandas.DataFrame`)
+        The table for each feature type, as returned by
+        :func:`genometools.gtf.read_feature_table`. The columns include
+        the Ensembl-specific attributes listed in
+        ``_ANNOTATION_ATTRIBUTES``.
+    """
+    if features is None:
+        features = list(_ANNOTATION_ATTRIBUTES.keys())
+
+    cache = None
+    if cache_dir is not None and isinstance(path_or_buffer, (str, _oldstr)):
+        cache = GTFCache(cache_dir, cache_max_size)
+
+    tables = {}
+    for feature in features:
+        attributes = _ANNOTATION_ATTRIBUTES[feature]
+        key = None
+        if cache is not None:
+            key = cache.get_key(path_or_buffer, feature,
+                                attributes=attributes)
+            cached = cache.get(key)
+            if cached is not None:
+                tables[feature] = cached[feature]
+                continue
+
+        if not isinstance(path_or_buffer, (str, _oldstr)) and tables:
+            raise ValueError('Can only read a single feature type from a '
+                             'buffer.')
+        _LOGGER.info('Parsing "%s" annotations...', feature)
+        tables[feature] = gtf.read_feature_table(
+            path_or_buffer, feature, attributes)
+
+        if cache is not None:
+            cache.put(key, {feature: tables[feature]})
+
+    return tables
+
+
 def get_genes(
         path_or_buffer, valid_biotypes,
         chunksize=10000,
@@ -117,7 +194,9 @@ def get_genes(
         #chromosome_pattern=r'(?:\d\d?|MT|X|Y)$',
         only_manual=False,
         remove_duplicates=True,
-        sort_by='name'):
+        sort_by='name',
+        cache_dir=None,
+        cache_max_size=None):
     """Get all genes of a specific a biotype from an Ensembl GTF file.
     
     Parameters
@@ -126,6 +205,9 @@ def get_genes(
         The GTF file (either the file path or a buffer).
     valid_biotypes : set of str
         The set of biotypes to include (e.g., "protein_coding").
+    chunksize : int, optional
+        Not used (only the lines of type "gene" are parsed, all at once).
+        Retained for backwards compatibility. [10000]
     chromosome_pattern : str, optional
         Regular expression specifying valid chromosomes. [None]
     only_manual : bool, optional
@@ -147,6 +229,11 @@ def get_genes(
                               and mouse genomes.
           - 'none': The order from the GTF file is retained. 
         Default: 'name'  
+    cache_dir : str, optional
+        Directory for caching the parsed gene annotations (see
+        :func:`get_annotation_tables`). [None]
+    cache_max_size : int, optional
+        The maximum size of the cache, in bytes (see `GTFCache`). [None]
 
     Returns
     -------
@@ -210,99 +297,90 @@ def get_genes(
     and then we're using the original index (position) to restore the original
     order.
     """
-    chrompat = None
-    if chromosome_pattern is not None:
-        chrompat = re.compile(chromosome_pattern)
+    t0 = time.time()
+    df = get_annotation_tables(path_or_buffer, ['gene'], cache_dir=cache_dir,
+                               cache_max_size=cache_max_size)['gene']
+    t1 = time.time()
+    _LOGGER.info('Parsing time: %.1f s', t1-t0)
+
+    return _get_genes(df, valid_biotypes, chromosome_pattern, only_manual,
+                      remove_duplicates, sort_by)
+
 
+def _get_genes(df, valid_biotypes, chromosome_pattern, only_manual,
+               remove_duplicates, sort_by):
+    """Select genes from a gene table (see :func:`get_genes`)."""
     # make sure this is a set
     valid_biotypes = set(valid_biotypes)
-    
-    c = 0
-    num_lines = 0
-    num_chunks = 0
-    
-    t0 = time.time()
-    reader = pd.read_csv(path_or_buffer, encoding='ascii', sep='\t',
-                         header=None, comment='#', dtype={0: str},
-                         chunksize=chunksize)
-            
+
+    num_lines = df.shape[0]
+
     # "insdc" is required to catch the mitochondrial protein-coding genes
     valid_sources = set(['ensembl_havana', 'havana', 'insdc'])
-    
+
     if not only_manual:
         # we also accept annotations with source "ensembl", which are the
         # product of an automated annotation pipeline
         valid_sources.add('ensembl')
-        
-    excluded_chromosomes = set()
 
-    # parse GTF file and keep specific information
-    data = []
-    for j, df in enumerate(reader):
-        num_chunks += 1
-        num_lines += (df.shape[0])
-        
-        # select rows of type "gene"
-        sel = (df.iloc[:, 2] == 'gene')
-        
-        for i, row in df.loc[sel].iterrows():
-            
-            # parse attribute in 9th column
-            attr = gtf.parse_attributes(row[8].lstrip(' '))
+    # check if biotype is valid
+    sel = df['gene_biotype'].isin(valid_biotypes).values
 
-            # check if biotype is valid
-            biotype = attr['gene_biotype']
-            if biotype not in valid_biotypes:
-                continue
+    chrom = df['chromosome'].astype(str)
+    excluded_chromosomes = set()
+    if chromosome_pattern is not None:
+        # categories are matched only once
+        chrompat = re.compile(chromosome_pattern)
+        valid_chroms = set(c for c in chrom.unique()
+                           if chrompat.match(c) is not None)
+        sel_chrom = chrom.isin(valid_chroms).values
+        excluded_chromosomes = set(chrom.loc[sel & ~sel_chrom].unique())
+        sel &= sel_chrom
+
+    df = df.loc[sel]
+    chrom = chrom.loc[sel]
+    c = df.shape[0]
+
+    # extract gene ID and gene name
+    ensembl_id = df['gene_id'].values
+    gene_name = df['gene_name'].values.copy()
+    # if there is no gene name, we'll use the ID as the name
+    no_name = pd.isnull(gene_name)
+    gene_name[no_name] = ensembl_id[no_name]
+
+    # We define the position to be the index of the 5'-most base of the gene,
+    # according its orientation on the chromosome (DNA sequences are always
+    # represented 5'->3'). We encode the strand as the sign of the index
+    # ("+" strand = positive sign, "-" strand = negative sign).
+    strand = df['strand'].astype(str).values
+    start = df['start'].values.astype(np.int64)
+    end = df['end'].values.astype(np.int64)
+    invalid = ~np.in1d(strand, ['+', '-'])
+    if invalid.any():
+        raise ValueError('Invalid strand information: %s'
+                         % str(strand[invalid][0]))
+    pos = np.where(strand == '+', start - 1, -(end - 1))
+    length = np.abs(end - start) + 1
 
-            chrom = str(row[0])
-            source = row[1]
-            if chrompat is not None:
-                match = chrompat.match(chrom)
-                if match is None:
-                    excluded_chromosomes.add(chrom)
-                    continue
-
-            c += 1
-
-            # extract gene ID and gene name
-            ensembl_id = attr['gene_id']
-            try:
-                gene_name = attr['gene_name']
-            except KeyError:
-                # no gene name, so we'll use the ID as the name
-                gene_name = ensembl_id
-
-            # We define the position to be the index of the 5'-most base of the gene,
-            # according its orientation on the chromosome (DNA sequences are always represented 5'->3').
-            # We encode the strand as the sign of the index
-            # ("+" strand = positive sign, "-" strand = negative sign).
-            if row[6] == '+':
-                pos = int(row[3])-1
-            elif row[6] == '-':
-                pos = -(int(row[4])-1)
-            else:
-                raise ValueError('Invalid strand information: %s'
-                                 % str(row[6]))
-            length = abs(int(row[4]) - int(row[3])) + 1
-
-            #data.append([gene_name, ensembl_id, chrom, pos, length,
-            #             source, biotype])
-            data.append([ensembl_id, gene_name, chrom, pos, length,
-                         biotype, source])
-            
-    t1 = time.time()
-    
     header = ['ensembl_id', 'name',
               'chromosome', 'position', 'length',
               'type', 'source']
-    df = pd.DataFrame(columns=header, data=data)
+    df = pd.DataFrame(OrderedDict([
+        ('ensembl_id', ensembl_id),
+        ('name', gene_name),
+        ('chromosome', chrom.values),
+        ('position', pos),
+        ('length', length),
+        ('type', df['gene_biotype'].values),
+        ('source', df['source'].astype(str).values),
+    ]), columns=header)
     
     if 'protein_coding' in valid_biotypes:
         if only_manual:
             # exclude protein-coding genes that are the based on
             # automatic annotation (source "ensembl")
-            sel = (df['type'] == 'protein_coding' & df['source'] == 'ensembl')
+            sel = ((df['type'] == 'protein_coding') &
+                   (df['source'] == 'ensembl'))
             df = df.loc[~sel]
 
         else:
@@ -397,10 +475,9 @@ def get_genes(
     # set index to ensembl ID
     df.set_index('ensembl_id', inplace=True)
     
-    _LOGGER.info('Read %d lines (in %d chunks).', num_lines, num_chunks)
+    _LOGGER.info('Read %d gene annotations.', num_lines)
     _LOGGER.info('Found %d valid gene entries.', c)
     _LOGGER.info('Final number of unique genes: %d', df.shape[0])
-    _LOGGER.info('Parsing time: %.1f s', t1-t0)
     
     # additional statistics
     all_chromosomes = list(df['chromosome'].unique())
@@ -469,3 +546,127 @@ def get_linc_rna_genes(
     df = get_genes(path_or_buffer, valid_biotypes,
                    remove_duplicates=remove_duplicates, **kwargs)
     return df
+
+
+def _write_output(file, data):
+    """Write bytes to a file path or to a (text or binary) file object."""
+    if isinstance(file, (str, _oldstr)):
+        with misc.smart_open_write(file, mode='wb') as ofh:
+            ofh.write(data)
+    elif isinstance(file, io.TextIOBase):
+        file.write(data.decode('UTF-8'))
+    else:
+        file.write(data)
+
+
+_GENE_ID_PATTERN = re.compile(br'gene_id "([^"\n]*)"')
+
+
+def _select_gene_lines(lines, gene_ids):
+    """Select the GTF lines that belong to specific genes.
+
+    Returns a list of lines (including line breaks).
+    """
+    line_list = lines.splitlines(True)
+    ids = _GENE_ID_PATTERN.findall(lines)
+    if len(ids) != len(line_list):
+        # fall back to parsing the attributes of each line
+        ids = gtf.parse_feature_lines(lines, ['gene_id'])['gene_id'].values
+        gene_ids = set(gene_ids)
+    else:
+        gene_ids = set(id_.encode('UTF-8') for id_ in gene_ids)
+    return [l for l, id_ in zip(line_list, ids) if id_ in gene_ids]
+
+
+def extract_annotations(
+        path_or_buffer, valid_biotypes,
+        gene_file=None, gene_id_file=None, transcript_file=None,
+        exon_file=None,
+        chromosome_pattern=None,
+        only_manual=False,
+        remove_duplicates=True,
+        sort_by='name'):
+    """Extract gene, transcript, and exon annotations in a single pass.
+
+    The GTF file is read only once, and the gene, transcript, and exon
+    lines are separated while reading. Genes are selected as in
+    :func:`get_genes`, and only the transcripts and exons of the selected
+    genes are written.
+
+    Parameters
+    ----------
+    path_or_buffer : str or buffer
+        The GTF file (either the file path or a buffer).
+    valid_biotypes : set of str
+        The set of biotypes to include (e.g., "protein_coding").
+    gene_file : str or file-like, optional
+        Output file for the gene table (tab-delimited, with the columns
+        returned by :func:`get_genes`). [None]
+    gene_id_file : str or file-like, optional
+        Output file for the list of gene IDs (tab-delimited, without header,
+        with the Ensembl ID and the name of each gene, sorted by ID). Genes
+        without a name are not included. [None]
+    transcript_file : str or file-like, optional
+        Output file for the transcript table (tab-delimited, with one row
+        for each transcript). [None]
+    exon_file : str or file-like, optional
+        Output file for the exon annotations (in GTF format, with the lines
+        of the original file). [None]
+    chromosome_pattern : str, optional
+        See :func:`get_genes`. [None]
+    only_manual : bool, optional
+        See :func:`get_genes`. [False]
+    remove_duplicates : bool, optional
+        See :func:`get_genes`. [True]
+    sort_by : str, optional
+        See :func:`get_genes`. ['name']
+
+    Returns
+    -------
+    `pandas.DataFrame`
+        The selected genes (see :func:`get_genes`).
+    """
+    features = ['gene']
+    if transcript_file is not None:
+        features.append('transcript')
+    if exon_file is not None:
+        features.append('exon')
+
+    t0 = time.time()
+    lines = gtf.split_feature_lines(path_or_buffer, features)
+    t1 = time.time()
+    _LOGGER.info('Reading time: %.1f s', t1-t0)
+
+    df = gtf.parse_feature_lines(lines.pop('gene'),
+                                 _ANNOTATION_ATTRIBUTES['gene'])
+    genes = _get_genes(df, valid_biotypes, chromosome_pattern, only_manual,
+                       remove_duplicates, sort_by)
+
+    if gene_file is not None:
+        _write_output(gene_file, genes.to_csv(sep='\t').encode('UTF-8'))
+
+    if gene_id_file is not None:
+        # skip genes without a name (their ID is used as the name)
+        unnamed = df.loc[df['gene_name'].isnull(), 'gene_id']
+        gene_ids = genes['name'].loc[~genes.index.isin(unnamed)].sort_index()
+        _write_output(gene_id_file, gene_ids.to_csv(
+            sep='\t', header=False).encode('UTF-8'))
+
+    if transcript_file is not None:
+        df = gtf.parse_feature_lines(lines.pop('transcript'),
+                                     _ANNOTATION_ATTRIBUTES['transcript'])
+        df = df.loc[df['gene_id'].isin(genes.index)]
+        columns = ['transcript_id', 'gene_id', 'transcript_name',
+                   'transcript_biotype', 'chromosome', 'start', 'end',
+                   'strand']
+        _LOGGER.info('Number of transcripts: %d', df.shape[0])
+        _write_output(transcript_file, df.to_csv(
+            sep='\t', columns=columns, index=False).encode('UTF-8'))
+
+    if exon_file is not None:
+        exon_lines = _select_gene_lines(lines.pop('exon'), genes.index)
+        _LOGGER.info('Number of exons: %d', len(exon_lines))
+        _write_output(exon_file, b''.join(exon_lines))
+
+    _LOGGER.info('Total time: %.1f s', time.time()-t0)
+    return genes
@@ -0,0 +1,436 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Module containing the `GTFCache` class."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+_oldstr = str
+from builtins import *
+
+import os
+import json
+import hashlib
+import logging
+import tempfile
+import zipfile
+
+import numpy as np
+import pandas as pd
+
+from .. import misc
+
+_LOGGER = logging.getLogger(__name__)
+
+
+def _pack_categories(categories):
+    """Pack a list of strings into a `numpy.ndarray` of bytes."""
+    if any('\0' in c for c in categories):
+        raise ValueError('Cannot pack strings containing null characters.')
+    packed = '\0'.join(categories).encode('UTF-8')
+    return np.frombuffer(packed, dtype=np.uint8)
+
+
+def _unpack_categories(packed, num_categories):
+    """Unpack strings packed with `_pack_categories`."""
+    if num_categories == 0:
+        return []
+    return packed.tobytes().decode('UTF-8').split('\0')
+
+
+def _encode_column(values):
+    """Encode a column as a list of (suffix, array) pairs.
+
+    Returns the column kind ("category", "object", or "array") and the
+    arrays.
+    """
+    if pd.api.types.is_categorical_dtype(values):
+        kind = 'category'
+        cat = pd.Categorical(values)
+    elif values.dtype == object:
+        kind = 'object'
+        if pd.api.types.infer_dtype(values, skipna=True) not in \
+                ['string', 'unicode', 'empty']:
+            raise ValueError('Object columns can only contain strings.')
+        cat = pd.Categorical(values)
+    else:
+        return 'array', [('values', np.asarray(values))]
+
+    categories = [str(c) for c in cat.categories]
+    return kind, [('codes', cat.codes.astype(np.int32)),
+                  ('categories', _pack_categories(categories)),
+                  ('num_categories', np.int64(len(categories)))]
+
+
+def _decode_column(kind, arrays):
+    """Decode a column encoded with `_encode_column`."""
+    if kind == 'array':
+        return arrays['values']
+
+    categories = _unpack_categories(arrays['categories'],
+                                    int(arrays['num_categories']))
+    codes = arrays['codes']
+    if kind == 'category':
+        return pd.Categorical.from_codes(codes, categories)
+
+    categories = np.array(categories + [None], dtype=object)
+    # missing values have code -1, i.e., they are mapped to `None`
+    return categories[codes]
+
+
+def write_tables(file, tables):
+    """Store tables in a fast binary columnar format.
+
+    Each column is stored as an uncompressed array. String and categorical
+    columns are stored as integer codes and their (packed) categories.
+
+    Parameters
+    ----------
+    file: str or file-like
+        The output file.
+    tables: dict (str => `pandas.DataFrame`)
+        The tables. Object columns (and the index) can only contain strings
+        (or missing values).
+
+    Returns
+    -------
+    None
+    """
+    meta = {'version': GTFCache._version, 'tables': []}
+    data = {}
+    for i, (name, df) in enumerate(sorted(tables.items())):
+        columns = []
+        for j, col in enumerate(df.columns):
+            kind, arrays = _encode_column(df[col])
+            columns.append([col, kind])
+            for suffix, a in arrays:
+                data['t%d_c%d_%s' % (i, j, suffix)] = a
+
+        index = None
+        if not isinstance(df.index, pd.RangeIndex) or \
+                df.index.start != 0 or df.index.step != 1:
+            kind, arrays = _encode_column(pd.Series(df.index.values))
+            index = [df.index.name, kind]
+            for suffix, a in arrays:
+                data['t%d_index_%s' % (i, suffix)] = a
+
+        meta['tables'].append({'name': name, 'num_rows': len(df.index),
+                               'columns': columns, 'index': index})
+
+    data['meta'] = np.array(json.dumps(meta))
+    np.savez(file, **data)
+
+
+def read_tables(file):
+    """Read tables stored with :func:`write_tables`.
+
+    Parameters
+    ----------
+    file: str or file-like
+        The input file.
+
+    Returns
+    -------
+    dict (str => `pandas.DataFrame`)
+        The tables.
+    """
+    tables = {}
+    with np.load(file, allow_pickle=False) as data:
+        meta = json.loads(str(data['meta']))
+        if meta['version'] != GTFCache._version:
+            raise ValueError('Unsupported file format version: %d'
+                             % meta['version'])
+
+        def get_arrays(prefix):
+            return dict((k[len(prefix):], data[k]) for k in data.files
+                        if k.startswith(prefix))
+
+        for i, t in enumerate(meta['tables']):
+            columns = [(col, _decode_column(kind, get_arrays(
+                't%d_c%d_' % (i, j))))
+                for j, (col, kind) in enumerate(t['columns'])]
+
+            if t['index'] is None:
+                index = pd.RangeIndex(t['num_rows'])
+            else:
+                name, kind = t['index']
+                index = pd.Index(_decode_column(
+                    kind, get_arrays('t%d_index_' % i)), name=name)
+
+            df = pd.DataFrame(index=index)
+            for col, values in columns:
+                df[col] = values
+            tables[t['name']] = df
+
+    return tables
+
+
+class GTFCache(object):
+    """A local cache for tables parsed from GTF files.
+
+    Cache entries are keyed by the MD5 checksum of the GTF file and by the
+    options used for parsing it, so that changes to the file are detected
+    automatically. Each entry contains one or more tables, which are stored
+    in a fast binary columnar format (see :func:`write_tables`).
+
+    Whenever a new entry is stored and the total size of all entries exceeds
+    :attr:`max_size`, the least recently used entries are removed. The
+    modification time of each entry is updated whenever it is accessed, so
+    the cache can be shared between processes (writes are atomic).
+
+    Parameters
+    ----------
+    cache_dir : str
+        See :attr:`cache_dir` attribute.
+    max_size : int, optional
+        See :attr:`max_size` attribute. [None]
+
+    Attributes
+    ----------
+    cache_dir : str
+        The cache directory.
+    max_size : int or None
+        The maximum total size of all cache entries, in bytes. If `None`, the
+        size of the cache is not limited.
+    """
+
+    _version = 1
+    _checksum_file = 'checksums.json'
+
+    def __init__(self, cache_dir, max_size=None):
+
+        assert isinstance(cache_dir, (str, _oldstr))
+        assert max_size is None or isinstance(max_size, int)
+
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def __repr__(self):
+        return '<%s instance (cache_dir="%s", max_size=%s)>' \
+               % (self.__class__.__name__, self.cache_dir, str(self.max_size))
+
+    def __str__(self):
+        return '<%s instance with %d entries (%d bytes)>' \
+               % (self.__class__.__name__, len(self), self.size)
+
+    def __len__(self):
+        return len(self._get_entries())
+
+    def __contains__(self, key):
+        return os.path.isfile(self._get_entry_path(key))
+
+    @property
+    def size(self):
+        """The total size of all cache entries, in bytes.
+
+        Returns
+        -------
+        int
+        """
+        return sum(size for _, size, _ in self._get_entries())
+
+    def _get_entry_path(self, key):
+        return os.path.join(self.cache_dir,
+                            '%s_v%d.npz' % (key, self._version))
+
+    def _get_entries(self):
+        """Get the path, size, and modification time of each entry."""
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        suffix = '_v%d.npz' % self._version
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(suffix):
+                continue
+            path = os.path.join(self.cache_dir, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # the entry was removed by another process
+                continue
+            entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def get_checksum(self, path):
+        """Get the MD5 checksum of a file.
+
+        Checksums are stored in the cache directory, together with the size
+        and modification time of each file, so that files are only read
+        again if they have changed.
+
+        Parameters
+        ----------
+        path : str
+            The file path.
+
+        Returns
+        -------
+        str
+            The MD5 checksum (hex digest).
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        info = [stat.st_size, stat.st_mtime]
+
+        checksum_path = os.path.join(self.cache_dir, self._checksum_file)
+        checksums = {}
+        try:
+            with open(checksum_path) as fh:
+                checksums = json.load(fh)
+        except (IOError, OSError, ValueError):
+            pass
+
+        if path in checksums and checksums[path][:2] == info:
+            return checksums[path][2]
+
+        checksum = misc.get_file_md5sum(path)
+        checksums[path] = info + [checksum]
+        misc.make_sure_dir_exists(self.cache_dir, create_subfolders=True)
+        # write to a temporary file first, in case of concurrent access
+        tf = tempfile.NamedTemporaryFile(
+            mode='w', dir=self.cache_dir, suffix='.json', delete=False)
+        try:
+            with tf:
+                json.dump(checksums, tf)
+            os.rename(tf.name, checksum_path)
+        except:
+            self._remove(tf.name)
+            raise
+        return checksum
+
+    def get_key(self, path, name, **options):
+        """Get the cache key for a GTF file and a set of parsing options.
+
+        Parameters
+        ----------
+        path : str
+            The path of the GTF file.
+        name : str
+            The name of the parsed data (e.g., "gene").
+        options : dict
+            The parsing options (must be JSON-serializable).
+
+        Returns
+        -------
+        str
+            The cache key.
+        """
+        options = json.dumps(options, sort_keys=True)
+        options_hash = hashlib.md5(options.encode('UTF-8')).hexdigest()
+        return '%s_%s_%s' % (name, self.get_checksum(path), options_hash[:16])
+
+    def get(self, key):
+        """Get the tables stored under a key.
+
+        Parameters
+        ----------
+        key : str
+            The cache key (see :meth:`get_key`).
+
+        Returns
+        -------
+        dict (str => `pandas.DataFrame`) or None
+            The tables, or `None` if there is no (valid) entry for the key.
+        """
+        path = self._get_entry_path(key)
+        if not os.path.isfile(path):
+            return None
+
+        try:
+            tables = read_tables(path)
+        except (IOError, OSError, ValueError, KeyError,
+                zipfile.BadZipfile):
+            _LOGGER.warning('Removing invalid cache entry "%s".', path)
+            self._remove(path)
+            return None
+
+        # mark the entry as recently used
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        _LOGGER.info('Read cached tables from "%s".', path)
+        return tables
+
+    def put(self, key, tables):
+        """Store tables under a key.
+
+        Parameters
+        ----------
+        key : str
+            The cache key (see :meth:`get_key`).
+        tables : dict (str => `pandas.DataFrame`)
+            The tables.
+
+        Returns
+        -------
+        None
+        """
+        misc.make_sure_dir_exists(self.cache_dir, create_subfolders=True)
+        # write to a temporary file first, in case of concurrent access
+        tf = tempfile.NamedTemporaryFile(
+            dir=self.cache_dir, suffix='.tmp', delete=False)
+        try:
+            with tf:
+                write_tables(tf, tables)
+            os.rename(tf.name, self._get_entry_path(key))
+        except:
+            self._remove(tf.name)
+            raise
+        self.evict()
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def evict(self):
+        """Remove the least recently used entries that exceed the size limit.
+
+        Returns
+        -------
+        int
+            The number of removed entries.
+        """
+        if self.max_size is None:
+            return 0
+
+        entries = sorted(self._get_entries(), key=lambda e: e[2],
+                         reverse=True)
+        total = 0
+        num_removed = 0
+        for path, size, _ in entries:
+            total += size
+            if total > self.max_size:
+                self._remove(path)
+                num_removed += 1
+
+        if num_removed > 0:
+            _LOGGER.info('Removed %d least recently used cache entries.',
+                         num_removed)
+        return num_removed
+
+    def clear(self):
+        """Remove all cache entries.
+
+        Returns
+        -------
+        None
+        """
+        for path, _, _ in self._get_entries():
+            self._remove(path)
@@ -23,7 +23,6 @@ _oldstr = str
 from builtins import *
 
 import logging
-import ftplib
 
 from . import util
 
@@ -42,8 +41,9 @@ def get_cdna_url(species, release=None, ftp=None):
     release: int or ``None``, optional
         The Ensembl release number. If ``None``, the latest release is used.
         [None]
-    ftp: ftplib.FTP or ``None``, optional
-        The FTP connection. If ``None``, create a new connection. [None]
+    ftp: `ftplib.FTP`, `misc.FTPConnectionPool`, or ``None``, optional
+        The FTP connection or connection pool. If ``None``, use the shared
+        connection pool (see `get_ftp_pool`). [None]
     """    
     #species_list, release=None, ftp=None
 
@@ -51,17 +51,7 @@ def get_cdna_url(species, release=None, ftp=None):
     assert isinstance(species, (str, _oldstr))
     if release is not None:
         assert isinstance(release, int)
-    if ftp is not None:
-        assert isinstance(ftp, ftplib.FTP)
-
-    # open FTP connection, if necessary
-    close_connection = False
-    if ftp is None:
-        ftp_server = 'ftp.ensembl.org'
-        ftp_user = 'anonymous'
-        ftp = ftplib.FTP(ftp_server)
-        ftp.login(ftp_user)
-        close_connection = True
+    ftp = util._get_ftp(ftp)
 
     # determine latest release, if necessary
     if release is None:
@@ -69,10 +59,9 @@ def get_cdna_url(species, release=None, ftp=None):
     
     # check if species exists
     fasta_dir = '/pub/release-%d/fasta' % release 
-    ftp.cwd(fasta_dir)
-    if not species in ftp.nlst():
+    if not species in util._ftp_nlst(ftp, fasta_dir):
         logger.error('Species "%s" not found on Ensembl FTP server.', species)
-        fasta_url = 'ftp://%s%s' %(ftp_server, fasta_dir)
+        fasta_url = util._ftp_url(ftp, fasta_dir)
         raise ValueError('Species "%s" not found. '
                          'See %s for a list of species available.'
                          % (species, fasta_url))
@@ -80,13 +69,8 @@ def get_cdna_url(species, release=None, ftp=None):
     # determine URL of the cdna file
     # (file names are not consistent across species)
     cdna_dir = '/pub/release-%d/fasta/%s/cdna' %(release, species)
-    ftp.cwd(cdna_dir)
-    files = ftp.nlst()
+    files = util._ftp_nlst(ftp, cdna_dir)
     cdna_file = [f for f in files if f.endswith('.cdna.all.fa.gz')][0]
-    cdna_url = 'ftp://%s%s/%s' %(ftp_server, cdna_dir, cdna_file)
-
-    # close FTP connection, if we opened it
-    if close_connection:
-        ftp.close()
+    cdna_url = util._ftp_url(ftp, '%s/%s' % (cdna_dir, cdna_file))
 
     return cdna_url
@@ -0,0 +1,209 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Script for extracting gene, transcript, and exon annotations.
+
+This script reads an Ensembl GTF file only once, and writes any combination
+of a gene table, a list of gene IDs, a transcript table, and the exon
+annotations (in GTF format) of all genes of specific biotypes.
+
+Examples
+--------
+
+Extract the protein coding genes and their exons from the human Ensembl v82
+gene annotations, downloaded from the
+`Ensembl FTP server <ftp://ftp.ensembl.org/pub/release-82/gtf/homo_sapiens/>`_:
+
+.. code-block:: bash
+
+    $ ensembl_extract_annotations.py \\
+        -a Homo_sapiens.GRCh38.82.gtf.gz \\
+        -g protein_coding_genes_human.tsv \\
+        -e protein_coding_exons_human.gtf
+
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+_oldstr = str
+from builtins import *
+
+import sys
+import textwrap
+
+from ... import misc
+from ... import cli
+from ... import ensembl
+
+
+def get_argument_parser():
+    """Function to obtain the argument parser.
+
+    Returns
+    -------
+    A fully configured `argparse.ArgumentParser` object.
+
+    Notes
+    -----
+    This function is used by the `sphinx-argparse` extension for sphinx.
+    """
+    desc = 'Extract gene, transcript, and exon annotations from an Ensembl ' \
+           'GTF file.'
+    parser = cli.get_argument_parser(desc=desc)
+
+    parser.add_argument(
+        '-a', '--annotation-file', default='-', type=str,
+        help=textwrap.dedent("""\
+            Path of Ensembl gene annotation file (in GTF format). The file
+            may be gzip'ed. If set to ``-``, read from ``stdin``.""")
+    )
+
+    g = parser.add_argument_group('Output files (at least one is required)')
+
+    g.add_argument(
+        '-g', '--gene-file', type=str, default=None,
+        help=textwrap.dedent("""\
+            Path of the gene table (tab-delimited).""")
+    )
+
+    g.add_argument(
+        '-i', '--gene-id-file', type=str, default=None,
+        help=textwrap.dedent("""\
+            Path of the list of gene IDs and names (tab-delimited). Genes
+            without a name are not included.""")
+    )
+
+    g.add_argument(
+        '-t', '--transcript-file', type=str, default=None,
+        help=textwrap.dedent("""\
+            Path of the transcript table (tab-delimited).""")
+    )
+
+    g.add_argument(
+        '-e', '--exon-file', type=str, default=None,
+        help=textwrap.dedent("""\
+            Path of the exon annotations (in GTF format).""")
+    )
+
+    parser.add_argument(
+        '-b', '--biotypes', type=str, nargs='+',
+        default=['protein_coding', 'polymorphic_pseudogene'],
+        help=textwrap.dedent("""\
+            The gene biotypes to include.
+            [protein_coding polymorphic_pseudogene]""")
+    )
+
+    parser.add_argument(
+        '-c', '--chromosome-pattern', type=str, required=False,
+        default=None, help=textwrap.dedent("""\
+            Regular expression that chromosome names have to match. [None]
+            """)
+    )
+
+    parser.add_argument(
+        '--only-manual', action='store_true',
+        help=textwrap.dedent("""\
+            Exclude annotations with source "ensembl", which are based only
+            on an automatic annotation pipeline.""")
+    )
+
+    parser.add_argument(
+        '--keep-duplicates', action='store_true',
+        help=textwrap.dedent("""\
+            Do not remove duplicate annotations of protein-coding genes.""")
+    )
+
+    cli.add_reporting_args(parser)
+
+    return parser
+
+
+def main(args=None):
+    """Extract annotations and store them in separate files.
+
+    Parameters
+    ----------
+    args: argparse.Namespace object, optional
+        The argument values. If not specified, the values will be obtained by
+        parsing the command line arguments using the `argparse` module.
+
+    Returns
+    -------
+    int
+        Exit code (0 if no error occurred).
+    """
+    if args is None:
+        # parse command-line arguments
+        parser = get_argument_parser()
+        args = parser.parse_args()
+
+    input_file = args.annotation_file
+    output_files = [args.gene_file, args.gene_id_file, args.transcript_file,
+                    args.exon_file]
+    biotypes = args.biotypes
+    chrom_pat = args.chromosome_pattern
+    only_manual = args.only_manual
+    remove_duplicates = not args.keep_duplicates
+    log_file = args.log_file
+    quiet = args.quiet
+    verbose = args.verbose
+
+    if all(f is None for f in output_files):
+        print('Please specify at least one output file.', file=sys.stderr)
+        return 1
+
+    if sum(f == '-' for f in output_files) > 1:
+        print('Only one output can be written to ``stdout``.',
+              file=sys.stderr)
+        return 1
+
+    # configure root logger
+    log_stream = sys.stdout
+    if '-' in output_files:
+        # if we print output to stdout, redirect log messages to stderr
+        log_stream = sys.stderr
+
+    logger = misc.get_logger(log_stream=log_stream, log_file=log_file,
+                             quiet=quiet, verbose=verbose)
+
+    if chrom_pat is not None:
+        logger.info('Regular expression used for filtering chromosome names: '
+                    '"%s"', chrom_pat)
+
+    if input_file == '-':
+        # read from stdin (the data may be gzip'ed)
+        input_file = None
+
+    output_files = [sys.stdout if f == '-' else f for f in output_files]
+    gene_file, gene_id_file, transcript_file, exon_file = output_files
+
+    with misc.smart_open_read(input_file, mode='rb', try_gzip=True) as fh:
+        ensembl.extract_annotations(
+            fh, biotypes,
+            gene_file=gene_file,
+            gene_id_file=gene_id_file,
+            transcript_file=transcript_file,
+            exon_file=exon_file,
+            chromosome_pattern=chrom_pat,
+            only_manual=only_manual,
+            remove_duplicates=remove_duplicates)
+
+    return 0
+
+
+if __name__ == '__main__':
+    return_code = main()
+    sys.exit(return_code)
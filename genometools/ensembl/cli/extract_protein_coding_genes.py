@@ -106,6 +106,8 @@ def main(args=None):
     output_file = args.output_file
     # species = args.species
     chrom_pat = args.chromosome_pattern
+    cache_dir = args.cache_dir
+    cache_max_size = args.cache_max_size
     log_file = args.log_file
     quiet = args.quiet
     verbose = args.verbose
@@ -132,9 +134,15 @@ def main(args=None):
     if output_file == '-':
         output_file = sys.stdout
 
+    if cache_max_size is not None:
+        # convert from MB to bytes
+        cache_max_size = cache_max_size * 1000000
+
     genes = ensembl.get_protein_coding_genes(
         input_file,
-        chromosome_pattern=chrom_pat)
+        chromosome_pattern=chrom_pat,
+        cache_dir=cache_dir,
+        cache_max_size=cache_max_size)
     genes.to_csv(output_file, sep='\t', index=False)
 
     return 0
@@ -0,0 +1,145 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Script for generating a position-sorted, indexed copy of a GTF file.
+
+The output file is compressed in blocks (BGZF format), and can be read like
+any gzip'ed file. The index is stored in a separate file, and allows the
+annotations overlapping with a genomic region to be retrieved quickly (see
+`ensembl.IndexedGTF`).
+
+Examples
+--------
+
+Index the human Ensembl v82 gene annotations, downloaded from the
+`Ensembl FTP server <ftp://ftp.ensembl.org/pub/release-82/gtf/homo_sapiens/>`_:
+
+.. code-block:: bash
+
+    $ ensembl_index_gtf.py \\
+        -a Homo_sapiens.GRCh38.82.gtf.gz \\
+        -o Homo_sapiens.GRCh38.82.sorted.gtf.gz
+
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+_oldstr = str
+from builtins import *
+
+import sys
+import textwrap
+
+from ... import misc
+from ... import cli
+from ... import ensembl
+
+
+def get_argument_parser():
+    """Function to obtain the argument parser.
+
+    Returns
+    -------
+    A fully configured `argparse.ArgumentParser` object.
+
+    Notes
+    -----
+    This function is used by the `sphinx-argparse` extension for sphinx.
+    """
+    desc = 'Generate a position-sorted, block-compressed, and indexed copy ' \
+           'of a GTF file.'
+    parser = cli.get_argument_parser(desc=desc)
+
+    parser.add_argument(
+        '-a', '--annotation-file', default='-', type=str,
+        help=textwrap.dedent("""\
+            Path of Ensembl gene annotation file (in GTF format). The file
+            may be gzip'ed. If set to ``-``, read from ``stdin``.""")
+    )
+
+    parser.add_argument(
+        '-o', '--output-file', required=True, type=str,
+        help=textwrap.dedent("""\
+            Path of output file (in BGZF format).""")
+    )
+
+    parser.add_argument(
+        '-i', '--index-file', type=str, default=None,
+        help=textwrap.dedent("""\
+            Path of the index file. If not specified, ".gti" is appended to
+            the output file path.""")
+    )
+
+    parser.add_argument(
+        '--compress-level', type=int, default=6,
+        help=textwrap.dedent("""\
+            The zlib compression level (1-9). [6]""")
+    )
+
+    cli.add_reporting_args(parser)
+
+    return parser
+
+
+def main(args=None):
+    """Generate an indexed GTF file.
+
+    Parameters
+    ----------
+    args: argparse.Namespace object, optional
+        The argument values. If not specified, the values will be obtained by
+        parsing the command line arguments using the `argparse` module.
+
+    Returns
+    -------
+    int
+        Exit code (0 if no error occurred).
+    """
+    if args is None:
+        # parse command-line arguments
+        parser = get_argument_parser()
+        args = parser.parse_args()
+
+    input_file = args.annotation_file
+    output_file = args.output_file
+    index_file = args.index_file
+    compress_level = args.compress_level
+    log_file = args.log_file
+    quiet = args.quiet
+    verbose = args.verbose
+
+    # configure root logger
+    logger = misc.get_logger(log_file=log_file, quiet=quiet,
+                             verbose=verbose)
+
+    if input_file == '-':
+        # read from stdin (in binary mode)
+        with misc.smart_open_read(mode='rb') as fh:
+            indexed_gtf = ensembl.write_indexed_gtf(
+                fh, output_file, index_file=index_file,
+                compress_level=compress_level)
+    else:
+        indexed_gtf = ensembl.write_indexed_gtf(
+            input_file, output_file, index_file=index_file,
+            compress_level=compress_level)
+    logger.info('Indexed GTF file: %s', str(indexed_gtf))
+
+    return 0
+
+
+if __name__ == '__main__':
+    return_code = main()
+    sys.exit(return_code)
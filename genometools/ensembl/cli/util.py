@@ -73,6 +73,23 @@ def get_gtf_argument_parser(desc, default_field_name='gene'):
             """)
     )
 
+    parser.add_argument(
+        '--cache-dir', type=str, required=False,
+        default=None, help=textwrap.dedent("""\
+            Directory for caching the parsed annotations, so that repeated
+            runs on the same GTF file are fast. [None]
+            """)
+    )
+
+    parser.add_argument(
+        '--cache-max-size', type=int, required=False,
+        default=None, help=textwrap.dedent("""\
+            The maximum size of the cache directory (in MB). The least
+            recently used entries are removed if the cache grows larger.
+            [None]
+            """)
+    )
+
     #parser.add_argument(
     #    '-f', '--field-name', type=str, default=default_field_name,
     #    help=textwrap.dedent("""\
@@ -21,13 +21,11 @@ from __future__ import (absolute_import, division,
 _oldstr = str
 from builtins import *
 
-import os
-import gzip
-from collections import OrderedDict
 import logging
 
 import pandas as pd
-from Bio import SeqIO
+
+from .. import seq
 
 _LOGGER = logging.getLogger(__name__)
 
@@ -48,19 +46,36 @@ def _transform_chrom(chrom):
         return '%02d' % c
 
 
-def get_chromosome_lengths(fasta_file, fancy_sort=True):
-    """Extract chromosome lengths from genome FASTA file."""
-    chromlen = []
-    with gzip.open(fasta_file, 'rt', encoding='ascii') as fh:
-        fasta = SeqIO.parse(fh, 'fasta')
-        for i, f in enumerate(fasta):
-            chromlen.append((f.id, len(f.seq)))
-            _LOGGER.info('Processed chromosome "%s"...', f.id)
-            #print(dir(f))
-            #if i == 1: break
-            
+def get_chromosome_lengths(fasta_file, fancy_sort=True, fai_file=None):
+    """Extract chromosome lengths from genome FASTA file.
+
+    The file is scanned in large blocks, without constructing the
+    chromosome sequences.
+
+    Parameters
+    ----------
+    fasta_file : str
+        The path of the FASTA file (plain, gzip'ed or BGZF-compressed).
+    fancy_sort : bool, optional
+        Whether to sort chromosomes numerically, followed by "X", "Y",
+        "MT" and all other sequences. [True]
+    fai_file : str, optional
+        If specified, a samtools-compatible FASTA index is written to this
+        path (only for plain or BGZF-compressed files). [None]
+
+    Returns
+    -------
+    `pandas.Series`
+        The length of each chromosome.
+    """
+    if fai_file is not None:
+        index = seq.index_fasta(fasta_file, fai_file)
+    else:
+        index = seq.get_fasta_index(fasta_file, check_lines=False)
+    _LOGGER.info('Processed %d chromosomes.', len(index.index))
+
     # convert to pandas Series
-    chromlen = pd.Series(OrderedDict(chromlen))
+    chromlen = pd.Series(index['length'].values, index=index.index.values)
     chromlen.index.name = 'Chromosome'
     chromlen.name = 'Length'
 
@@ -43,7 +43,7 @@ import textwrap
 from genometools import misc
 from genometools import cli
 from genometools import ensembl
-from genometools.seq import FastaReader
+from genometools.seq import FastaReader, FastaWriter
 
 
 def get_argument_parser():
@@ -79,7 +79,24 @@ def get_argument_parser():
             Path of output file. If set to ``-``, print to ``stdout``,
             and redirect logging messages to ``stderr``."""))
 
-    parser = cli.add_reporting_args(parser)
+    parser.add_argument(
+        '-z', '--compress', action='store_true', help=textwrap.dedent("""\
+            Compress the output file in blocks (BGZF format), which can be
+            read like any gzip'ed file."""))
+
+    parser.add_argument(
+        '--compress-level', type=int, default=6,
+        help=textwrap.dedent("""\
+            The zlib compression level (1-9). [6]""")
+    )
+
+    parser.add_argument(
+        '-t', '--num-threads', type=int, default=1,
+        help=textwrap.dedent("""\
+            The number of threads used for compressing the output. [1]""")
+    )
+
+    cli.add_reporting_args(parser)
     
     return parser
 
@@ -96,6 +113,9 @@ def main(args=None):
     species = args.species
     chrom_pat = args.chromosome_pattern
     output_file = args.output_file
+    compress = args.compress
+    compress_level = args.compress_level
+    num_threads = args.num_threads
     
     log_file = args.log_file
     quiet = args.quiet
@@ -118,13 +138,21 @@ def main(args=None):
     # filter the FASTA file
     # note: each chromosome sequence is temporarily read into memory,
     # so this script has a large memory footprint
+    if fasta_file == '-':
+        fasta_file = None
+    if output_file == '-':
+        output_file = None
     with \
         misc.smart_open_read(
-            fasta_file, mode='r', encoding='ascii', try_gzip=True
+            fasta_file, mode='rb', try_gzip=True
         ) as fh, \
         misc.smart_open_write(
-            output_file, mode='w', encoding='ascii'
-        ) as ofh:
+            output_file, mode='wb'
+        ) as ofh, \
+        FastaWriter(
+            ofh, linewidth=70, compress=compress,
+            compress_level=compress_level, num_threads=num_threads
+        ) as writer:
 
         # inside = False
         reader = FastaReader(fh)
@@ -134,7 +162,7 @@ def main(args=None):
                 logger.info('Ignoring chromosome "%s"...', chrom)
                 continue
             seq.name = chrom
-            seq.append_fasta(ofh)
+            writer.write(seq)
 
     return 0
 
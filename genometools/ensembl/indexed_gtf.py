@@ -0,0 +1,326 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Random access to position-sorted, block-compressed GTF files."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+_oldstr = str
+from builtins import *
+
+import io
+import csv
+import logging
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .. import misc
+from .. import gtf
+from ..misc import bgzf
+from .cache import write_tables, read_tables
+
+_LOGGER = logging.getLogger(__name__)
+
+_OFFSET = np.int64(2**34)
+
+
+def write_indexed_gtf(path_or_buffer, output_file, index_file=None,
+                      compress_level=6):
+    """Write a position-sorted, block-compressed copy of a GTF file.
+
+    The annotations are sorted by chromosome (in order of their first
+    appearance) and start position, and then written to a BGZF file (which
+    can be read like any gzip'ed file). Each block only contains complete
+    lines from a single chromosome (header lines are written to separate
+    blocks at the beginning), and the chromosome, the start position
+    of the first line, the maximum end position, and the file offset of
+    each block are stored in a separate index file (see `IndexedGTF`).
+
+    Parameters
+    ----------
+    path_or_buffer : str or file-like
+        The GTF (or GFF) file (optionally gzip'ed), or a binary file-like
+        object.
+    output_file : str
+        The path of the output file.
+    index_file : str, optional
+        The path of the index file. If `None`, ".gti" is appended to
+        ``output_file``. [None]
+    compress_level : int, optional
+        The zlib compression level. [6]
+
+    Returns
+    -------
+    `IndexedGTF`
+        The indexed GTF file.
+
+    Notes
+    -----
+    The whole file is read into memory for sorting. Annotations with the
+    same start position retain their original order (e.g., a gene precedes
+    its transcripts).
+    """
+    assert isinstance(output_file, (str, _oldstr))
+    assert index_file is None or isinstance(index_file, (str, _oldstr))
+
+    if index_file is None:
+        index_file = output_file + '.gti'
+
+    if isinstance(path_or_buffer, (str, _oldstr)):
+        with misc.smart_open_read(path_or_buffer, mode='rb',
+                                  try_gzip=True) as fh:
+            data = fh.read()
+    else:
+        data = path_or_buffer.read()
+    if not data.endswith(b'\n'):
+        data += b'\n'
+
+    # determine the position of each line
+    ends = np.nonzero(np.frombuffer(data, dtype=np.uint8) == 10)[0] + 1
+    starts = np.r_[0, ends[:-1]].astype(np.int64)
+    first_chars = np.frombuffer(data, dtype=np.uint8)[starts]
+    is_header = (first_chars == ord('#'))
+    is_body = ~is_header & (first_chars != 10)
+    header = [data[s:e] for s, e in zip(starts[is_header], ends[is_header])]
+    starts = starts[is_body]
+    ends = ends[is_body]
+
+    df = pd.read_csv(io.BytesIO(data), sep='\t', header=None,
+                     usecols=[0, 3, 4], comment='#', quoting=csv.QUOTE_NONE,
+                     dtype={0: object, 3: np.int64, 4: np.int64})
+    if len(df.index) != starts.size:
+        raise ValueError('Could not parse all annotations.')
+    chrom_codes, chromosomes = pd.factorize(df[0].values)
+
+    # sort by chromosome and start position
+    order = np.argsort(chrom_codes * _OFFSET + df[3].values,
+                       kind='mergesort')
+    starts = starts[order]
+    ends = ends[order]
+    chrom_codes = chrom_codes[order]
+    feature_starts = df[3].values[order]
+    feature_ends = df[4].values[order]
+    del df
+
+    # group lines into blocks
+    cum_sizes = np.r_[0, np.cumsum(ends - starts)].astype(np.int64)
+    chrom_ends = np.r_[np.nonzero(np.diff(chrom_codes))[0] + 1,
+                       chrom_codes.size]
+    blocks = []
+    mv = memoryview(data)
+    with io.open(output_file, 'wb') as ofh, \
+            bgzf.BgzfWriter(ofh, compress_level) as writer:
+        # the header lines are stored separately from the annotations
+        writer.write(b''.join(header))
+        writer.flush()
+        i = 0
+        for chrom_end in chrom_ends:
+            while i < chrom_end:
+                j = np.searchsorted(cum_sizes, cum_sizes[i] +
+                                    bgzf.BGZF_MAX_BLOCK_DATA, side='right')
+                j = min(j - 1, chrom_end)
+                if j == i:
+                    raise ValueError('Line %d is too long.' % (i+1))
+                block = b''.join(
+                    [mv[s:e] for s, e in zip(starts[i:j], ends[i:j])])
+                offset, size = writer.write_block(block)
+                blocks.append((chrom_codes[i], feature_starts[i],
+                               feature_ends[i:j].max(), offset, size))
+                i = j
+
+    blocks = np.array(blocks, dtype=np.int64).reshape(-1, 5)
+    index = pd.DataFrame(OrderedDict([
+        ('chromosome', pd.Categorical.from_codes(
+            blocks[:, 0], list(chromosomes))),
+        ('start', blocks[:, 1]),
+        ('end', blocks[:, 2]),
+        ('offset', blocks[:, 3]),
+        ('size', blocks[:, 4]),
+    ]))
+    header = pd.DataFrame({'line': np.array(
+        [l.decode('UTF-8').rstrip('\n') for l in header], dtype=object)})
+    with io.open(index_file, 'wb') as ofh:
+        write_tables(ofh, {'blocks': index, 'header': header})
+
+    _LOGGER.info('Wrote %d annotations in %d blocks to "%s".',
+                 starts.size, len(index.index), output_file)
+    return IndexedGTF(output_file, index_file)
+
+
+class IndexedGTF(object):
+    """A position-sorted, block-compressed GTF file with a coordinate index.
+
+    Indexed GTF files are generated using `write_indexed_gtf`. For region
+    queries, only the blocks that can contain overlapping annotations are
+    read and decompressed. The file is opened for each query, so instances
+    can be shared between threads.
+
+    Parameters
+    ----------
+    path : str
+        See :attr:`path` attribute.
+    index_file : str, optional
+        The path of the index file. If `None`, ".gti" is appended to
+        ``path``. [None]
+
+    Attributes
+    ----------
+    path : str
+        The path of the (BGZF-compressed) GTF file.
+    header : list of str
+        The header (comment) lines of the original GTF file.
+    """
+    def __init__(self, path, index_file=None):
+
+        assert isinstance(path, (str, _oldstr))
+        assert index_file is None or isinstance(index_file, (str, _oldstr))
+
+        if index_file is None:
+            index_file = path + '.gti'
+
+        tables = read_tables(index_file)
+        blocks = tables['blocks']
+
+        self.path = path
+        self.header = tables['header']['line'].tolist()
+        self._chromosomes = list(blocks['chromosome'].cat.categories)
+        self._chrom_codes = dict(
+            (c, i) for i, c in enumerate(self._chromosomes))
+        codes = blocks['chromosome'].cat.codes.values.astype(np.int64)
+        self._block_chroms = codes
+        self._block_starts = blocks['start'].values
+        self._block_ends = blocks['end'].values
+        self._block_offsets = blocks['offset'].values
+        # the first block of each chromosome (blocks are sorted)
+        self._chrom_indptr = np.searchsorted(
+            codes, np.arange(len(self._chromosomes) + 1))
+
+    def __repr__(self):
+        return '<%s instance (path="%s")>' \
+               % (self.__class__.__name__, self.path)
+
+    def __str__(self):
+        return '<%s instance with %d chromosomes (%d blocks)>' \
+               % (self.__class__.__name__, len(self._chromosomes),
+                  self._block_offsets.size)
+
+    @property
+    def chromosomes(self):
+        """The names of all chromosomes (in the order of the file).
+
+        Returns
+        -------
+        list of str
+        """
+        return list(self._chromosomes)
+
+    def _get_block_indices(self, chromosome, start, end):
+        """Get the indices of all blocks that can contain overlapping
+        annotations."""
+        try:
+            code = self._chrom_codes[chromosome]
+        except KeyError:
+            return np.zeros(0, dtype=np.int64)
+        first, last = self._chrom_indptr[code:code+2]
+        # blocks are sorted by start position, but not by end position
+        last = first + np.searchsorted(self._block_starts[first:last], end,
+                                       side='right')
+        sel = np.nonzero(self._block_ends[first:last] >= start)[0]
+        return sel + first
+
+    def fetch(self, chromosome, start=None, end=None):
+        """Get all annotations that overlap with a region.
+
+        Parameters
+        ----------
+        chromosome : str
+            The chromosome name.
+        start : int, optional
+            The start position of the region (1-based). If `None`, the region
+            starts at the beginning of the chromosome. [None]
+        end : int, optional
+            The end position of the region (1-based, inclusive). If `None`,
+            the region extends to the end of the chromosome. [None]
+
+        Returns
+        -------
+        list of str
+            The GTF lines (without line breaks), sorted by start position.
+        """
+        assert isinstance(chromosome, (str, _oldstr))
+        assert start is None or isinstance(start, (int, np.integer))
+        assert end is None or isinstance(end, (int, np.integer))
+
+        if start is None:
+            start = 1
+        if end is None:
+            end = np.iinfo(np.int64).max
+
+        indices = self._get_block_indices(chromosome, start, end)
+        lines = []
+        if indices.size == 0:
+            return lines
+
+        with io.open(self.path, 'rb') as fh:
+            for i in indices:
+                data, _ = bgzf.read_bgzf_block(fh, self._block_offsets[i])
+                for l in data.split(b'\n')[:-1]:
+                    fields = l.split(b'\t', 5)
+                    if int(fields[3]) <= end and int(fields[4]) >= start:
+                        lines.append(l.decode('UTF-8'))
+        return lines
+
+    def query(self, chromosome, start=None, end=None, feature=None):
+        """Get all annotations that overlap with a region, as a table.
+
+        Parameters
+        ----------
+        chromosome : str
+            The chromosome name.
+        start : int, optional
+            See :meth:`fetch`. [None]
+        end : int, optional
+            See :meth:`fetch`. [None]
+        feature : str, optional
+            Only return annotations of this feature type (e.g., "gene").
+            [None]
+
+        Returns
+        -------
+        `pandas.DataFrame`
+            Table with one row for each annotation, and columns
+            "chromosome", "source", "feature", "start", "end", "score",
+            "strand", "frame", and "attributes" (dictionaries parsed using
+            `gtf.parse_attributes`).
+        """
+        assert feature is None or isinstance(feature, (str, _oldstr))
+
+        records = []
+        for l in self.fetch(chromosome, start, end):
+            fields = l.split('\t')
+            if feature is not None and fields[2] != feature:
+                continue
+            fields[3] = int(fields[3])
+            fields[4] = int(fields[4])
+            fields[8] = gtf.parse_attributes(fields[8])
+            records.append(fields)
+
+        return pd.DataFrame.from_records(
+            records, columns=['chromosome', 'source', 'feature', 'start',
+                              'end', 'score', 'strand', 'frame',
+                              'attributes'])
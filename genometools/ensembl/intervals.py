@@ -0,0 +1,488 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Module containing the `GenomicIntervalIndex` class."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+_oldstr = str
+from builtins import *
+
+import logging
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .cache import write_tables, read_tables
+
+_LOGGER = logging.getLogger(__name__)
+
+# chromosome codes and positions are combined into a single integer key
+# (code * _OFFSET + position), so that intervals on all chromosomes can be
+# stored in one sorted array
+_OFFSET = np.int64(2**34)
+
+
+class GenomicIntervalIndex(object):
+    """An index of genomic intervals, for overlap and nearest-interval queries.
+
+    The intervals are stored in sorted arrays (by chromosome and start
+    position, by chromosome and end position, and by chromosome and TSS
+    position). Together with the running maximum of the end positions (in
+    order of the start positions), all queries can be answered using binary
+    searches, and are vectorized over many query positions or regions.
+
+    All positions are 1-based and intervals are closed, as in GTF files.
+
+    Parameters
+    ----------
+    chromosomes : Iterable of str
+        The chromosome of each interval.
+    starts : Iterable of int
+        The start position of each interval.
+    ends : Iterable of int
+        The end position of each interval.
+    strands : Iterable of str, optional
+        The strand of each interval ("+" or "-"). Required for TSS
+        distances. [None]
+    names : Iterable of str, optional
+        See :attr:`names` attribute. [None]
+
+    Attributes
+    ----------
+    chromosomes : `pandas.Categorical`
+        The chromosome of each interval.
+    starts : `numpy.ndarray` of int
+        The start position of each interval.
+    ends : `numpy.ndarray` of int
+        The end position of each interval.
+    strands : `numpy.ndarray` of str, or None
+        The strand of each interval.
+    names : `numpy.ndarray` of str, or None
+        The name of each interval (e.g., the Ensembl gene ID).
+
+    Notes
+    -----
+    All query methods return the indices of the intervals in their original
+    order (i.e., the order in which they were passed to the constructor).
+    """
+
+    def __init__(self, chromosomes, starts, ends, strands=None, names=None):
+
+        chromosomes = pd.Categorical(np.array(
+            [str(c) for c in chromosomes], dtype=object))
+        starts = np.array(starts, dtype=np.int64)
+        ends = np.array(ends, dtype=np.int64)
+        n = starts.size
+        if chromosomes.size != n or ends.size != n:
+            raise ValueError('The chromosomes, starts, and ends must have '
+                             'the same length.')
+        if (starts < 0).any() or (ends >= _OFFSET).any():
+            raise ValueError('Invalid interval positions.')
+        if (ends < starts).any():
+            raise ValueError('Interval end positions must not be smaller '
+                             'than their start positions.')
+
+        if strands is not None:
+            strands = np.array(list(strands), dtype=object)
+            if strands.size != n:
+                raise ValueError('The strands must have the same length as '
+                                 'the intervals.')
+            if not np.in1d(strands, ['+', '-']).all():
+                raise ValueError('Strands must be either "+" or "-".')
+
+        if names is not None:
+            names = np.array(list(names), dtype=object)
+            if names.size != n:
+                raise ValueError('The names must have the same length as '
+                                 'the intervals.')
+
+        self.chromosomes = chromosomes
+        self.starts = starts
+        self.ends = ends
+        self.strands = strands
+        self.names = names
+
+        codes = chromosomes.codes.astype(np.int64)
+        start_keys = codes * _OFFSET + starts
+        end_keys = codes * _OFFSET + ends
+
+        # intervals sorted by start position
+        self._start_order = np.argsort(start_keys, kind='mergesort')
+        self._sorted_starts = start_keys[self._start_order]
+        # running maximum of the end positions, and the (sorted) index of
+        # the interval that attains it
+        self._ends_by_start = end_keys[self._start_order]
+        self._max_ends = np.maximum.accumulate(self._ends_by_start) \
+            if n > 0 else self._ends_by_start
+        self._max_end_indices = np.maximum.accumulate(np.where(
+            self._ends_by_start == self._max_ends, np.arange(n), 0)) \
+            if n > 0 else np.zeros(0, dtype=np.int64)
+
+        # intervals sorted by end position
+        self._end_order = np.argsort(end_keys, kind='mergesort')
+        self._sorted_ends = end_keys[self._end_order]
+
+        # intervals sorted by TSS position
+        self._tss_order = None
+        self._sorted_tss = None
+        if strands is not None:
+            tss_keys = np.where(strands == '-', end_keys, start_keys)
+            self._tss_order = np.argsort(tss_keys, kind='mergesort')
+            self._sorted_tss = tss_keys[self._tss_order]
+
+    def __repr__(self):
+        return '<%s instance (%d intervals on %d chromosomes)>' \
+               % (self.__class__.__name__, len(self),
+                  self.chromosomes.categories.size)
+
+    def __str__(self):
+        return '<%s instance with %d intervals>' \
+               % (self.__class__.__name__, len(self))
+
+    def __len__(self):
+        return self.starts.size
+
+    @classmethod
+    def from_table(cls, df, name_column=None):
+        """Create an index from a table of annotations.
+
+        Parameters
+        ----------
+        df : `pandas.DataFrame`
+            The annotations, with columns "chromosome", "start", "end", and
+            (optionally) "strand", as returned by
+            :func:`get_annotation_tables`.
+        name_column : str, optional
+            The column containing the name of each interval (e.g.,
+            "gene_id"). [None]
+
+        Returns
+        -------
+        `GenomicIntervalIndex`
+            The index.
+        """
+        strands = None
+        if 'strand' in df.columns:
+            strands = df['strand'].astype(str).values
+        names = None
+        if name_column is not None:
+            names = df[name_column].values
+        return cls(df['chromosome'].astype(str).values, df['start'].values,
+                   df['end'].values, strands, names)
+
+    @classmethod
+    def from_genes(cls, genes):
+        """Create an index from a table of genes.
+
+        Parameters
+        ----------
+        genes : `pandas.DataFrame`
+            The genes, as returned by :func:`get_genes` (with the signed
+            position and the length of each gene, indexed by Ensembl ID).
+
+        Returns
+        -------
+        `GenomicIntervalIndex`
+            The index.
+        """
+        position = genes['position'].values.astype(np.int64)
+        length = genes['length'].values.astype(np.int64)
+        minus = position < 0
+        strands = np.where(minus, '-', '+').astype(object)
+        # see `get_genes` for the definition of the position
+        starts = np.where(minus, -position + 1 - length + 1, position + 1)
+        ends = starts + length - 1
+        return cls(genes['chromosome'].values, starts, ends, strands,
+                   genes.index.values)
+
+    def _get_query_keys(self, chromosomes, positions):
+        """Combine query chromosomes and positions into integer keys.
+
+        Returns the keys and the chromosome codes (-1 for unknown
+        chromosomes).
+        """
+        chromosomes = np.array([str(c) for c in chromosomes], dtype=object)
+        positions = np.array(positions, dtype=np.int64)
+        if chromosomes.size != positions.size:
+            raise ValueError('The chromosomes and positions must have the '
+                             'same length.')
+        codes = pd.Index(self.chromosomes.categories).get_indexer(
+            chromosomes).astype(np.int64)
+        return codes * _OFFSET + positions, codes
+
+    def overlaps(self, chromosomes, starts, ends):
+        """Find all intervals that overlap with the query regions.
+
+        Parameters
+        ----------
+        chromosomes : Iterable of str
+            The chromosome of each query region.
+        starts : Iterable of int
+            The start position of each query region.
+        ends : Iterable of int
+            The end position of each query region (use the same value as the
+            start position for single-base queries).
+
+        Returns
+        -------
+        query_indices : `numpy.ndarray` of int
+            The index of the query region, for each overlap.
+        interval_indices : `numpy.ndarray` of int
+            The index of the interval, for each overlap.
+
+        Notes
+        -----
+        Overlaps are sorted by query region, and then by the start position
+        of the intervals.
+        """
+        start_keys, codes = self._get_query_keys(chromosomes, starts)
+        end_keys, _ = self._get_query_keys(chromosomes, ends)
+
+        # candidates are all intervals that start before the query region
+        # ends, excluding the leading intervals which all end before the
+        # query region starts
+        lo = np.searchsorted(self._max_ends, start_keys, side='left')
+        hi = np.searchsorted(self._sorted_starts, end_keys, side='right')
+        counts = np.maximum(hi - lo, 0)
+        counts[codes < 0] = 0
+
+        query = np.repeat(np.arange(counts.size), counts)
+        offsets = np.repeat(np.cumsum(counts) - counts, counts)
+        candidates = np.repeat(lo, counts) + \
+            (np.arange(query.size) - offsets)
+
+        # the encoding of the chromosomes guarantees that overlapping
+        # intervals are located on the same chromosome
+        sel = self._ends_by_start[candidates] >= start_keys[query]
+        return query[sel], self._start_order[candidates[sel]]
+
+    def count_overlaps(self, chromosomes, starts, ends):
+        """Count the intervals that overlap with each query region.
+
+        Parameters
+        ----------
+        chromosomes : Iterable of str
+            The chromosome of each query region.
+        starts : Iterable of int
+            The start position of each query region.
+        ends : Iterable of int
+            The end position of each query region.
+
+        Returns
+        -------
+        `numpy.ndarray` of int
+            The number of overlapping intervals for each query region.
+        """
+        query, _ = self.overlaps(chromosomes, starts, ends)
+        return np.bincount(query, minlength=len(np.atleast_1d(starts)))
+
+    def _get_left(self, keys, codes):
+        """Find the closest intervals that end before each position."""
+        k = np.searchsorted(self._sorted_ends, keys, side='left') - 1
+        valid = (k >= 0) & (codes >= 0)
+        k[~valid] = 0
+        if self._sorted_ends.size == 0:
+            return np.full(keys.size, -1, dtype=np.int64), \
+                np.full(keys.size, -1, dtype=np.int64)
+        valid &= (self._sorted_ends[k] // _OFFSET) == codes
+        indices = np.where(valid, self._end_order[k], -1)
+        distances = np.where(valid, keys - self._sorted_ends[k], -1)
+        return indices, distances
+
+    def _get_right(self, keys, codes):
+        """Find the closest intervals that start after each position."""
+        n = self._sorted_starts.size
+        k = np.searchsorted(self._sorted_starts, keys, side='right')
+        valid = (k < n) & (codes >= 0)
+        k[~valid] = 0
+        if n == 0:
+            return np.full(keys.size, -1, dtype=np.int64), \
+                np.full(keys.size, -1, dtype=np.int64)
+        valid &= (self._sorted_starts[k] // _OFFSET) == codes
+        indices = np.where(valid, self._start_order[k], -1)
+        distances = np.where(valid, self._sorted_starts[k] - keys, -1)
+        return indices, distances
+
+    def nearest(self, chromosomes, positions, direction='both',
+                strands=None):
+        """Find the nearest interval for each query position.
+
+        Parameters
+        ----------
+        chromosomes : Iterable of str
+            The chromosome of each query position.
+        positions : Iterable of int
+            The query positions.
+        direction : str, optional
+            One of:
+              - 'both': Return an overlapping interval, if there is one, and
+                        otherwise the closest interval in either direction.
+              - 'upstream': Return the closest interval that ends before the
+                            query position.
+              - 'downstream': Return the closest interval that starts after
+                              the query position.
+            ['both']
+        strands : Iterable of str, optional
+            The strand of each query position. If specified, "upstream" and
+            "downstream" are interpreted relative to the strand ("-" queries
+            look for upstream intervals at higher positions). Otherwise, all
+            queries are treated as being on the "+" strand. [None]
+
+        Returns
+        -------
+        indices : `numpy.ndarray` of int
+            The index of the nearest interval for each query (-1 if there is
+            no such interval).
+        distances : `numpy.ndarray` of int
+            The distance to the nearest interval (0 for overlaps, -1 if there
+            is no such interval).
+        """
+        assert direction in ['both', 'upstream', 'downstream']
+
+        keys, codes = self._get_query_keys(chromosomes, positions)
+        left, left_dist = self._get_left(keys, codes)
+        right, right_dist = self._get_right(keys, codes)
+
+        if direction != 'both':
+            upstream = (direction == 'upstream')
+            if strands is None:
+                use_left = np.full(keys.size, upstream, dtype=np.bool_)
+            else:
+                minus = np.array(list(strands), dtype=object) == '-'
+                use_left = (minus != upstream)
+            return np.where(use_left, left, right), \
+                np.where(use_left, left_dist, right_dist)
+
+        # the closest interval in either direction (ties are resolved in
+        # favor of the interval to the left)
+        use_left = (left >= 0) & ((right < 0) | (left_dist <= right_dist))
+        indices = np.where(use_left, left, right)
+        distances = np.where(use_left, left_dist, right_dist)
+
+        # overlapping intervals: among the intervals starting at or before
+        # the query position, the one with the largest end position
+        k = np.searchsorted(self._sorted_starts, keys, side='right') - 1
+        valid = (k >= 0) & (codes >= 0)
+        k[~valid] = 0
+        if self._max_ends.size > 0:
+            valid &= self._max_ends[k] >= keys
+            overlap = self._start_order[self._max_end_indices[k]]
+            indices = np.where(valid, overlap, indices)
+            distances = np.where(valid, 0, distances)
+        return indices, distances
+
+    def get_tss_distances(self, chromosomes, positions):
+        """Find the nearest transcription start site (TSS) for each position.
+
+        The TSS of an interval is its start position if it is located on the
+        "+" strand, and its end position otherwise.
+
+        Parameters
+        ----------
+        chromosomes : Iterable of str
+            The chromosome of each query position.
+        positions : Iterable of int
+            The query positions.
+
+        Returns
+        -------
+        indices : `numpy.ndarray` of int
+            The index of the interval with the nearest TSS (-1 if there is no
+            interval on the same chromosome).
+        distances : `numpy.ndarray` of int
+            The signed distance to the TSS, relative to the strand of the
+            interval (negative values indicate positions upstream of the
+            TSS). Zero if there is no interval on the same chromosome.
+
+        Raises
+        ------
+        ValueError
+            If the strands of the intervals are unknown.
+        """
+        if self.strands is None:
+            raise ValueError('TSS distances require strand information.')
+
+        keys, codes = self._get_query_keys(chromosomes, positions)
+        n = self._sorted_tss.size
+        result = np.full(keys.size, -1, dtype=np.int64)
+        best = np.full(keys.size, np.iinfo(np.int64).max, dtype=np.int64)
+        if n > 0:
+            k = np.searchsorted(self._sorted_tss, keys, side='left')
+            # compare the closest TSS on either side (ties are resolved in
+            # favor of the TSS to the left)
+            for cand in [k, k - 1]:
+                valid = (cand >= 0) & (cand < n) & (codes >= 0)
+                cand = np.where(valid, cand, 0)
+                valid &= (self._sorted_tss[cand] // _OFFSET) == codes
+                dist = np.abs(keys - self._sorted_tss[cand])
+                better = valid & (dist <= best)
+                result[better] = self._tss_order[cand[better]]
+                best[better] = dist[better]
+
+        found = result >= 0
+        distances = np.zeros(keys.size, dtype=np.int64)
+        idx = result[found]
+        tss = np.where(self.strands[idx] == '-', self.ends[idx],
+                       self.starts[idx])
+        sign = np.where(self.strands[idx] == '-', -1, 1)
+        distances[found] = sign * \
+            (np.array(positions, dtype=np.int64)[found] - tss)
+        return result, distances
+
+    def write_npz(self, file):
+        """Store the index in a compact binary format.
+
+        Parameters
+        ----------
+        file: str or file-like
+            The output file.
+
+        Returns
+        -------
+        None
+        """
+        data = OrderedDict([
+            ('chromosome', self.chromosomes),
+            ('start', self.starts),
+            ('end', self.ends),
+        ])
+        if self.strands is not None:
+            data['strand'] = pd.Categorical(self.strands)
+        if self.names is not None:
+            data['name'] = self.names
+        write_tables(file, {'intervals': pd.DataFrame(data)})
+
+    @classmethod
+    def read_npz(cls, file):
+        """Read an index stored in binary format (see :meth:`write_npz`).
+
+        Parameters
+        ----------
+        file: str or file-like
+            The input file.
+
+        Returns
+        -------
+        `GenomicIntervalIndex`
+            The index.
+        """
+        df = read_tables(file)['intervals']
+        name_column = None
+        if 'name' in df.columns:
+            name_column = 'name'
+        return cls.from_table(df, name_column)
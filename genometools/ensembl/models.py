@@ -0,0 +1,482 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Module containing the `TranscriptModels` class."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+_oldstr = str
+from builtins import *
+
+import logging
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from .annotations import get_annotation_tables
+
+_LOGGER = logging.getLogger(__name__)
+
+# gene codes and positions are combined into a single integer key
+_OFFSET = np.int64(2**34)
+
+
+def _get_indptr(codes, n):
+    """Get the CSR index pointer for sorted integer codes."""
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(codes, minlength=n), out=indptr[1:])
+    return indptr
+
+
+class TranscriptModels(object):
+    """The genes, transcripts, and exons of a genome annotation.
+
+    The annotations are stored in columnar form. Transcripts are grouped by
+    gene, and exons are grouped by transcript (and sorted by position), so
+    that the transcripts of a gene and the exons of a transcript are
+    described by offset arrays (see :attr:`gene_indptr` and
+    :attr:`transcript_indptr`). All computations (e.g., of merged exons and
+    effective gene lengths) are performed for all genes at once.
+
+    All positions are 1-based and intervals are closed, as in GTF files.
+
+    Parameters
+    ----------
+    genes : `pandas.DataFrame`
+        The gene annotations, as returned by :func:`get_annotation_tables`.
+    transcripts : `pandas.DataFrame`
+        The transcript annotations, as returned by
+        :func:`get_annotation_tables`.
+    exons : `pandas.DataFrame`
+        The exon annotations, as returned by :func:`get_annotation_tables`.
+
+    Attributes
+    ----------
+    genes : `pandas.DataFrame`
+        The genes (indexed by Ensembl ID), with columns "name",
+        "chromosome", "start", "end", "strand", "type", and "source".
+    transcripts : `pandas.DataFrame`
+        The transcripts (indexed by Ensembl ID, and grouped by gene), with
+        columns "gene_id", "name", "start", "end", and "type".
+    exon_starts : `numpy.ndarray` of int
+        The start position of each exon (grouped by transcript).
+    exon_ends : `numpy.ndarray` of int
+        The end position of each exon (grouped by transcript).
+    gene_indptr : `numpy.ndarray` of int
+        The transcripts of the i'th gene are stored in rows
+        ``gene_indptr[i]:gene_indptr[i+1]`` of :attr:`transcripts`.
+    transcript_indptr : `numpy.ndarray` of int
+        The exons of the i'th transcript are stored in positions
+        ``transcript_indptr[i]:transcript_indptr[i+1]`` of
+        :attr:`exon_starts` and :attr:`exon_ends`.
+
+    Notes
+    -----
+    Transcripts of unknown genes, and exons of unknown transcripts, are
+    ignored.
+    """
+
+    def __init__(self, genes, transcripts, exons):
+
+        assert isinstance(genes, pd.DataFrame)
+        assert isinstance(transcripts, pd.DataFrame)
+        assert isinstance(exons, pd.DataFrame)
+
+        gene_ids = pd.Index(genes['gene_id'].values, name='ensembl_id')
+        if not gene_ids.is_unique:
+            raise ValueError('Gene IDs must be unique.')
+        name = genes['gene_name'].values.copy()
+        no_name = pd.isnull(name)
+        name[no_name] = gene_ids.values[no_name]
+        self.genes = pd.DataFrame(OrderedDict([
+            ('name', name),
+            ('chromosome', genes['chromosome'].astype(str).values),
+            ('start', genes['start'].values.astype(np.int64)),
+            ('end', genes['end'].values.astype(np.int64)),
+            ('strand', genes['strand'].astype(str).values),
+            ('type', genes['gene_biotype'].values),
+            ('source', genes['source'].astype(str).values),
+        ]), index=gene_ids)
+
+        # group transcripts by gene (retaining their original order)
+        tx_genes = gene_ids.get_indexer(transcripts['gene_id'].values)
+        valid = tx_genes >= 0
+        if not valid.all():
+            _LOGGER.warning('Ignoring %d transcripts of unknown genes.',
+                            (~valid).sum())
+        order = np.nonzero(valid)[0]
+        order = order[np.argsort(tx_genes[order], kind='mergesort')]
+        tx_genes = tx_genes[order]
+        transcripts = transcripts.iloc[order]
+        transcript_ids = pd.Index(transcripts['transcript_id'].values,
+                                  name='transcript_id')
+        if not transcript_ids.is_unique:
+            raise ValueError('Transcript IDs must be unique.')
+        self.transcripts = pd.DataFrame(OrderedDict([
+            ('gene_id', gene_ids.values[tx_genes]),
+            ('name', transcripts['transcript_name'].values),
+            ('start', transcripts['start'].values.astype(np.int64)),
+            ('end', transcripts['end'].values.astype(np.int64)),
+            ('type', transcripts['transcript_biotype'].values),
+        ]), index=transcript_ids)
+        self.gene_indptr = _get_indptr(tx_genes, len(gene_ids))
+        self._transcript_genes = tx_genes
+
+        # group exons by transcript, and sort them by position
+        exon_tx = transcript_ids.get_indexer(exons['transcript_id'].values)
+        valid = exon_tx >= 0
+        if not valid.all():
+            _LOGGER.warning('Ignoring %d exons of unknown transcripts.',
+                            (~valid).sum())
+        starts = exons['start'].values.astype(np.int64)[valid]
+        ends = exons['end'].values.astype(np.int64)[valid]
+        exon_tx = exon_tx[valid]
+        order = np.lexsort([starts, exon_tx])
+        self.exon_starts = starts[order]
+        self.exon_ends = ends[order]
+        self._exon_transcripts = exon_tx[order]
+        self.transcript_indptr = _get_indptr(self._exon_transcripts,
+                                             len(transcript_ids))
+
+        self._merged_exons = None
+
+    def __repr__(self):
+        return '<%s instance (%d genes, %d transcripts, %d exons)>' \
+               % (self.__class__.__name__, len(self.genes.index),
+                  len(self.transcripts.index), self.exon_starts.size)
+
+    def __str__(self):
+        return '<%s instance with %d genes>' \
+               % (self.__class__.__name__, len(self.genes.index))
+
+    @classmethod
+    def from_gtf(cls, path_or_buffer, cache_dir=None, cache_max_size=None):
+        """Read transcript models from an Ensembl GTF file.
+
+        Parameters
+        ----------
+        path_or_buffer : str
+            The path of the GTF file.
+        cache_dir : str, optional
+            Directory for caching the parsed annotations (see
+            :func:`get_annotation_tables`). [None]
+        cache_max_size : int, optional
+            The maximum size of the cache, in bytes (see `GTFCache`). [None]
+
+        Returns
+        -------
+        `TranscriptModels`
+            The transcript models.
+        """
+        tables = get_annotation_tables(
+            path_or_buffer, ['gene', 'transcript', 'exon'],
+            cache_dir=cache_dir, cache_max_size=cache_max_size)
+        return cls(tables['gene'], tables['transcript'], tables['exon'])
+
+    def _get_exon_genes(self):
+        """Get the gene code of each exon."""
+        return self._transcript_genes[self._exon_transcripts]
+
+    def get_transcript_counts(self):
+        """Get the number of transcripts of each gene.
+
+        Returns
+        -------
+        `pandas.Series` of int
+            The number of transcripts, indexed by gene ID.
+        """
+        return pd.Series(np.diff(self.gene_indptr), index=self.genes.index)
+
+    def get_transcript_lengths(self):
+        """Get the length of each transcript (the sum of its exon lengths).
+
+        Returns
+        -------
+        `pandas.Series` of int
+            The transcript lengths, indexed by transcript ID.
+        """
+        lengths = np.bincount(
+            self._exon_transcripts,
+            weights=self.exon_ends - self.exon_starts + 1,
+            minlength=len(self.transcripts.index)).astype(np.int64)
+        return pd.Series(lengths, index=self.transcripts.index)
+
+    def _merge_exons(self):
+        """Merge the exons of each gene.
+
+        Returns the gene code, start, and end of each merged exon.
+        """
+        if self._merged_exons is not None:
+            return self._merged_exons
+
+        genes = self._get_exon_genes()
+        order = np.lexsort([self.exon_starts, genes])
+        genes = genes[order]
+        start_keys = genes * _OFFSET + self.exon_starts[order]
+        end_keys = genes * _OFFSET + self.exon_ends[order]
+
+        # a new merged exon begins whenever an exon starts after the end of
+        # all previous exons (of the same gene), plus one (so that adjacent
+        # exons are merged as well)
+        max_ends = np.maximum.accumulate(end_keys) if end_keys.size > 0 \
+            else end_keys
+        new = np.ones(start_keys.size, dtype=np.bool_)
+        new[1:] = start_keys[1:] > max_ends[:-1] + 1
+        first = np.nonzero(new)[0]
+        last = np.r_[first[1:] - 1, start_keys.size - 1].astype(np.int64)
+
+        merged_genes = genes[first]
+        merged_starts = start_keys[first] - merged_genes * _OFFSET
+        merged_ends = max_ends[last] - merged_genes * _OFFSET
+        self._merged_exons = (merged_genes, merged_starts, merged_ends)
+        return self._merged_exons
+
+    def get_merged_exons(self):
+        """Get the merged (union of all) exons of each gene.
+
+        Overlapping and adjacent exons of the same gene are merged.
+
+        Returns
+        -------
+        `pandas.DataFrame`
+            Table with one row for each merged exon (sorted by gene and
+            position), and columns "gene_id", "chromosome", "start", "end",
+            and "strand".
+        """
+        genes, starts, ends = self._merge_exons()
+        return pd.DataFrame(OrderedDict([
+            ('gene_id', self.genes.index.values[genes]),
+            ('chromosome', self.genes['chromosome'].values[genes]),
+            ('start', starts),
+            ('end', ends),
+            ('strand', self.genes['strand'].values[genes]),
+        ]))
+
+    def get_effective_lengths(self):
+        """Get the effective length of each gene.
+
+        The effective length of a gene is the total length of the union of
+        all its exons (as used for FPKM/TPM calculations).
+
+        Returns
+        -------
+        `pandas.Series` of int
+            The effective gene lengths, indexed by gene ID. Genes without
+            exons have length 0.
+        """
+        genes, starts, ends = self._merge_exons()
+        lengths = np.bincount(genes, weights=ends - starts + 1,
+                              minlength=len(self.genes.index))
+        return pd.Series(lengths.astype(np.int64), index=self.genes.index)
+
+    def _get_table(self, level):
+        assert level in ['gene', 'transcript']
+        if level == 'gene':
+            return self.genes['chromosome'].values, \
+                self.genes['strand'].values, self.genes
+        genes = self._transcript_genes
+        return self.genes['chromosome'].values[genes], \
+            self.genes['strand'].values[genes], self.transcripts
+
+    def get_tss(self, level='transcript'):
+        """Get the transcription start site (TSS) of each gene or transcript.
+
+        Parameters
+        ----------
+        level : str, optional
+            Either 'gene' or 'transcript'. ['transcript']
+
+        Returns
+        -------
+        `pandas.Series` of int
+            The TSS positions, indexed by gene or transcript ID.
+        """
+        _, strands, df = self._get_table(level)
+        tss = np.where(strands == '-', df['end'].values, df['start'].values)
+        return pd.Series(tss, index=df.index)
+
+    def get_tes(self, level='transcript'):
+        """Get the transcription end site (TES) of each gene or transcript.
+
+        Parameters
+        ----------
+        level : str, optional
+            Either 'gene' or 'transcript'. ['transcript']
+
+        Returns
+        -------
+        `pandas.Series` of int
+            The TES positions, indexed by gene or transcript ID.
+        """
+        _, strands, df = self._get_table(level)
+        tes = np.where(strands == '-', df['start'].values, df['end'].values)
+        return pd.Series(tes, index=df.index)
+
+    def get_promoters(self, upstream=1000, downstream=100,
+                      level='transcript'):
+        """Get the promoter region of each gene or transcript.
+
+        Parameters
+        ----------
+        upstream : int, optional
+            The number of bases upstream of the TSS to include. [1000]
+        downstream : int, optional
+            The number of bases downstream of the TSS to include (including
+            the TSS). [100]
+        level : str, optional
+            Either 'gene' or 'transcript'. ['transcript']
+
+        Returns
+        -------
+        `pandas.DataFrame`
+            Table with one row for each gene or transcript (indexed by ID),
+            and columns "chromosome", "start", "end", and "strand". Start
+            positions are truncated at 1.
+        """
+        assert isinstance(upstream, int) and upstream >= 0
+        assert isinstance(downstream, int) and downstream >= 0
+
+        chromosomes, strands, df = self._get_table(level)
+        tss = self.get_tss(level).values
+        minus = (strands == '-')
+        starts = np.where(minus, tss - downstream + 1, tss - upstream)
+        ends = np.where(minus, tss + upstream, tss + downstream - 1)
+        starts = np.maximum(starts, 1)
+        return pd.DataFrame(OrderedDict([
+            ('chromosome', chromosomes),
+            ('start', starts),
+            ('end', np.maximum(ends, starts)),
+            ('strand', strands),
+        ]), index=df.index)
+
+    def get_bed(self, level='transcript', **kwargs):
+        """Convert annotations to BED format.
+
+        Parameters
+        ----------
+        level : str, optional
+            One of:
+              - 'gene': One BED6 record for each gene.
+              - 'transcript': One BED12 record for each transcript, with one
+                              block for each exon.
+              - 'merged_exon': One BED6 record for each merged exon (named
+                               by gene ID).
+              - 'promoter': One BED6 record for each transcript promoter
+                            (see :meth:`get_promoters`).
+            ['transcript']
+        kwargs : dict
+            Additional arguments for :meth:`get_promoters`.
+
+        Returns
+        -------
+        `pandas.DataFrame`
+            The BED records (with 0-based start positions).
+        """
+        assert level in ['gene', 'transcript', 'merged_exon', 'promoter']
+
+        if level == 'merged_exon':
+            df = self.get_merged_exons()
+            names = df['gene_id'].values
+        elif level == 'promoter':
+            df = self.get_promoters(**kwargs)
+            names = df.index.values
+        else:
+            chromosomes, strands, df = self._get_table(level)
+            names = df.index.values
+            df = pd.DataFrame(OrderedDict([
+                ('chromosome', chromosomes), ('start', df['start'].values),
+                ('end', df['end'].values), ('strand', strands)]),
+                index=df.index)
+
+        bed = pd.DataFrame(OrderedDict([
+            ('chrom', df['chromosome'].values),
+            ('chromStart', df['start'].values - 1),
+            ('chromEnd', df['end'].values),
+            ('name', names),
+            ('score', np.zeros(len(df.index), dtype=np.int64)),
+            ('strand', df['strand'].values),
+        ]))
+
+        if level == 'transcript':
+            indptr = self.transcript_indptr
+            tx_starts = bed['chromStart'].values[self._exon_transcripts]
+            sizes = (self.exon_ends - self.exon_starts + 1).astype(str)
+            rel_starts = (self.exon_starts - 1 - tx_starts).astype(str)
+            bed['thickStart'] = bed['chromStart']
+            bed['thickEnd'] = bed['chromEnd']
+            bed['itemRgb'] = 0
+            bed['blockCount'] = np.diff(indptr)
+            bed['blockSizes'] = [','.join(s) for s in
+                                 np.split(sizes, indptr[1:-1])]
+            bed['blockStarts'] = [','.join(s) for s in
+                                  np.split(rel_starts, indptr[1:-1])]
+
+        return bed
+
+    def write_bed(self, file, level='transcript', **kwargs):
+        """Write annotations in BED format (see :meth:`get_bed`).
+
+        Parameters
+        ----------
+        file : str or file-like
+            The output file.
+        level : str, optional
+            See :meth:`get_bed`. ['transcript']
+        kwargs : dict
+            See :meth:`get_bed`.
+
+        Returns
+        -------
+        None
+        """
+        self.get_bed(level, **kwargs).to_csv(
+            file, sep='\t', header=False, index=False)
+
+    def get_gene_table(self, effective_length=True):
+        """Convert the genes to an `ExpGeneTable`.
+
+        Parameters
+        ----------
+        effective_length : bool, optional
+            Whether to use the effective length (see
+            :meth:`get_effective_lengths`) instead of the span of each gene.
+            [True]
+
+        Returns
+        -------
+        `ExpGeneTable`
+            The genes, with positions defined as in :func:`get_genes`.
+        """
+        from ..expression import ExpGeneTable
+
+        genes = self.genes
+        minus = (genes['strand'].values == '-')
+        position = np.where(minus, -(genes['end'].values - 1),
+                            genes['start'].values - 1)
+        if effective_length:
+            length = self.get_effective_lengths().values
+        else:
+            length = genes['end'].values - genes['start'].values + 1
+        df = pd.DataFrame(OrderedDict([
+            ('name', genes['name'].values),
+            ('chromosome', genes['chromosome'].values),
+            ('position', position),
+            ('length', length),
+            ('type', genes['type'].values),
+            ('source', genes['source'].values),
+        ]), index=genes.index)
+        return ExpGeneTable(df)
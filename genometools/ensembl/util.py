@@ -25,39 +25,93 @@ import logging
 import textwrap
 import ftplib
 import re
+import posixpath
+import threading
 from collections import OrderedDict
 
 from genometools import cli
+from genometools import misc
 
 logger = logging.getLogger(__name__)
 
 
+ENSEMBL_FTP_SERVER = 'ftp.ensembl.org'
+"""The host name of the Ensembl FTP server."""
+
+_ftp_pool = None
+_ftp_pool_lock = threading.Lock()
+
+
+def get_ftp_pool():
+    """Get the shared connection pool for the Ensembl FTP server.
+
+    The pool is created when this function is first called, and is used by
+    all functions accessing the Ensembl FTP server (unless a different
+    connection or pool is specified).
+
+    Returns
+    -------
+    `misc.FTPConnectionPool`
+        The connection pool.
+    """
+    global _ftp_pool
+    with _ftp_pool_lock:
+        if _ftp_pool is None:
+            _ftp_pool = misc.FTPConnectionPool(ENSEMBL_FTP_SERVER)
+        return _ftp_pool
+
+
+def _get_ftp(ftp):
+    """Get the FTP connection or connection pool to use."""
+    if ftp is None:
+        return get_ftp_pool()
+    assert isinstance(ftp, (ftplib.FTP, misc.FTPConnectionPool))
+    return ftp
+
+
+def _ftp_dir(ftp, path):
+    """Get a directory listing, using a connection or a connection pool."""
+    if isinstance(ftp, misc.FTPConnectionPool):
+        return ftp.dir(path)
+    data = []
+    ftp.dir(path, data.append)
+    return data
+
+
+def _ftp_nlst(ftp, path):
+    """Get the names of all files in a directory, using a connection or a
+    connection pool."""
+    if isinstance(ftp, misc.FTPConnectionPool):
+        return ftp.nlst(path)
+    return [posixpath.basename(n.rstrip('/')) for n in ftp.nlst(path)]
+
+
+def _ftp_url(ftp, path):
+    """Get the URL of a file on the FTP server."""
+    netloc = ftp.host
+    if ftp.port != ftplib.FTP_PORT:
+        netloc = '%s:%d' % (ftp.host, ftp.port)
+    return 'ftp://%s%s' % (netloc, path)
+
+
 def get_latest_release(ftp=None):
     """Use files on the Ensembl FTP server to determine the latest release.
 
     Parameters
     ----------
-    ftp : ftplib.FTP, optional
-        FTP connection (with logged in user "anonymous").
+    ftp : `ftplib.FTP` or `misc.FTPConnectionPool`, optional
+        FTP connection (with logged in user "anonymous") or connection pool.
+        If `None`, use the shared connection pool (see `get_ftp_pool`).
+        [None]
 
     Returns
     -------
     int
         The version number of the latest release.
     """
-    if ftp is not None:
-        assert isinstance(ftp, ftplib.FTP)
-
-    close_connection = False
-    if ftp is None:
-        ftp_server = 'ftp.ensembl.org'
-        user = 'anonymous'
-        ftp = ftplib.FTP(ftp_server)
-        ftp.login(user)
-        close_connection = True
+    ftp = _get_ftp(ftp)
 
-    data = []
-    ftp.dir('pub', data.append)
+    data = _ftp_dir(ftp, 'pub')
     pat = re.compile(r'.* current_README -> release-(\d+)/README$')
     latest = []
     for d in data:
@@ -68,9 +122,6 @@ def get_latest_release(ftp=None):
     assert len(latest) == 1, len(latest)
     latest = latest[0]
 
-    if close_connection:
-        ftp.close()
-
     return latest
 
 
@@ -81,8 +132,9 @@ def get_file_checksums(url, ftp=None):
     ----------
     url : str
         The URL of the CHECKSUM file.
-    ftp : `ftplib.FTP` or `None`, optional
-        An FTP connection.
+    ftp : `ftplib.FTP` or `misc.FTPConnectionPool`, optional
+        An FTP connection or connection pool. If `None`, use the shared
+        connection pool (see `get_ftp_pool`). [None]
     
     Returns
     -------
@@ -93,25 +145,20 @@ def get_file_checksums(url, ftp=None):
     Notes
     -----
     The checksums contains in Ensembl CHECKSUM files are obtained with the
-    UNIX `sum` command.
+    UNIX `sum` command. When using a connection pool, the CHECKSUMS file is
+    cached.
     """
     assert isinstance(url, (str, _oldstr))
-    if ftp is not None:
-        assert isinstance(ftp, ftplib.FTP)
+    ftp = _get_ftp(ftp)
 
-    # open FTP connection if necessary
-    close_connection = False
-    ftp_server = 'ftp.ensembl.org'
-    ftp_user = 'anonymous'
-    if ftp is None:
-        ftp = ftplib.FTP(ftp_server)
-        ftp.login(ftp_user)
-        close_connection = True    
-    
     # download and parse CHECKSUM file
-    data = []
-    ftp.retrbinary('RETR %s' % url, data.append)
-    data = ''.join(d.decode('utf-8') for d in data).split('\n')[:-1]
+    if isinstance(ftp, misc.FTPConnectionPool):
+        data = ftp.retrieve(url, cache=True)
+    else:
+        data = []
+        ftp.retrbinary('RETR %s' % url, data.append)
+        data = b''.join(data)
+    data = data.decode('utf-8').split('\n')[:-1]
     file_checksums = OrderedDict()
     for d in data:
         file_name = d[(d.rindex(' ') + 1):]
@@ -120,10 +167,4 @@ def get_file_checksums(url, ftp=None):
     
     logger.debug('Obtained checksums for %d files', len(file_checksums))
 
-    # close FTP connection if we opened it
-    if close_connection:
-        ftp.close()
-    
     return file_checksums
-
-
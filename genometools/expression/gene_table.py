@@ -139,6 +139,13 @@ class ExpGeneTable(pd.DataFrame):
 
     @classmethod
     def read_gtf(cls, file_or_buffer, **kwargs):
+        """Read protein-coding genes from an Ensembl GTF file.
+
+        Keyword arguments are passed to
+        :func:`genometools.ensembl.get_protein_coding_genes`. Specify
+        ``cache_dir`` to cache the parsed gene annotations, so that repeated
+        reads of the same file are fast.
+        """
         genes = ensembl.get_protein_coding_genes(file_or_buffer, **kwargs)
         return cls(genes)
 
@@ -30,6 +30,8 @@ from collections import OrderedDict
 import pandas as pd
 import requests
 
+from .. import misc
+
 logger = logging.getLogger(__name__)
 
 
@@ -59,12 +61,6 @@ def download_files(manifest, download_dir, auth_token=None,
     assert isinstance(chunk_size, int)
     if auth_token is not None:
         assert isinstance(auth_token, str)
-                       
-    def get_file_md5hash(path):
-        """Calculate the MD5 hash for a file."""
-        with open(path, 'rb') as fh:
-            h = hashlib.md5(fh.read()).hexdigest()
-        return h
 
     headers = {}
     if auth_token is not None:
@@ -82,7 +78,7 @@ def download_files(manifest, download_dir, auth_token=None,
             logger.info('Downloading file %d / %d...', i+1, num_files)
         
         if avoid_redownload and os.path.isfile(download_file) and \
-                get_file_md5hash(download_file) == row['md5']:
+                misc.get_file_md5sum(download_file) == row['md5']:
             logger.info('File %s already downloaded...skipping.',
                         download_file)
             success = True
@@ -98,14 +94,16 @@ def download_files(manifest, download_dir, auth_token=None,
 
                 r.raise_for_status()
 
+                # calculate the hash while downloading
+                md5 = hashlib.md5()
                 with open(download_file, 'wb') as ofh:
                     for chunk in r.iter_content(chunk_size=chunk_size): 
                         if chunk: # filter out keep-alive new chunks
                             ofh.write(chunk)
-            with open(download_file, 'rb') as fh:
-                h = hashlib.md5(fh.read()).hexdigest()
-                if h == row['md5']:
-                    success = True
+                            md5.update(chunk)
+            h = md5.hexdigest()
+            if h == row['md5']:
+                success = True
             if not success:
                 logger.warning('Hash value mismatch (should be: %s; is: %s). '
                                'Attempting to re-download file...',
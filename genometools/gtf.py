@@ -18,9 +18,22 @@
 
 from __future__ import (absolute_import, division,
                         print_function, unicode_literals)
+_oldstr = str
 from builtins import *
 
+import io
 import re
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from . import misc
+
+# use regular expression with negative lookbehind to make sure we don't
+# split on escaped semicolons ("\;")
+_ATTR_SEP = re.compile(r'(?<!\\)\s*;\s*')
+
 
 def parse_attributes(s):
     """ Parses the ``attribute`` string of a GFF/GTF annotation.
@@ -40,17 +53,268 @@ def parse_attributes(s):
     The ``attribute`` string is the 9th field of each annotation (row),
     as described in the
     `GTF format specification <http://mblab.wustl.edu/GTF22.html>`_.
+
+    To extract specific attributes from many annotations at once, use
+    `extract_attributes`.
     """
-    # use regular expression with negative lookbehind to make sure we don't
-    # split on escaped semicolons ("\;")
-    attr_sep = re.compile(r'(?<!\\)\s*;\s*')
+    if '\\' in s:
+        atts = _ATTR_SEP.split(s)
+    else:
+        # no escaped semicolons
+        atts = s.split(';')
     attr = {}
-    atts = attr_sep.split(s)
     for a in atts:
-        #print(a)
-        kv = a.split(' ', maxsplit=1)
-        if len(kv) == 2:
-            k, v = kv
-            v = v.strip('"')
-            attr[k] = v
-    return attr 
+        k, sep, v = a.strip().partition(' ')
+        if sep:
+            attr[k] = v.strip('"')
+    return attr
+
+
+def _get_attribute_pattern(key):
+    """Get a pattern matching a specific attribute in attribute strings.
+
+    The pattern is applied to the newline-joined attribute strings (with a
+    leading newline), and matches the attribute if it is preceded by the
+    beginning of a line or by an unescaped semicolon (optionally followed by
+    a space). It captures the (unprocessed) value.
+
+    The attribute name is placed at the beginning of the pattern (followed by
+    fixed-width lookbehind assertions), which allows the regular expression
+    engine to quickly skip to the candidate matches.
+    """
+    k = re.escape(key + ' ')
+    return re.compile(
+        k + r'(?:(?<=[^\\]; ' + k + r')|(?<=[^\\];' + k + r')|(?<=\n' +
+        k + r'))((?:[^;\\\n]|\\.)*)')
+
+
+def extract_attributes(attributes, keys):
+    """Extract specific attributes from many GFF/GTF attribute strings.
+
+    All attribute strings are joined into a single string, which is then
+    split once for each attribute (using a regular expression matching the
+    attribute), so that the extraction does not require parsing each
+    attribute string individually.
+
+    Parameters
+    ----------
+    attributes : `pandas.Series` or Iterable of str
+        The attribute strings (see `parse_attributes`).
+    keys : str or Iterable of str
+        The names of the attributes to extract (e.g., "gene_id").
+
+    Returns
+    -------
+    `pandas.DataFrame`
+        Table with one column for each attribute, and one row for each
+        attribute string (with the same index, if ``attributes`` is a
+        `pandas.Series`). Missing attributes are represented as `None`.
+
+    Notes
+    -----
+    Values are processed as in `parse_attributes`, i.e., surrounding quotes
+    are removed, and if an attribute occurs multiple times, the last value is
+    used. Whitespace surrounding the attribute strings is ignored.
+    """
+    if isinstance(keys, (str, _oldstr)):
+        keys = [keys]
+    keys = list(keys)
+
+    index = None
+    if isinstance(attributes, pd.Series):
+        index = attributes.index
+        attributes = attributes.values
+    # leading whitespace is removed, as in `parse_attributes`
+    attributes = [str(a).strip() for a in attributes]
+
+    text = '\n' + '\n'.join(attributes)
+
+    data = {}
+    for key in keys:
+        # splitting by the pattern yields the text between matches and the
+        # values, alternatingly
+        parts = _get_attribute_pattern(key).split(text)
+        num_matches = len(parts) // 2
+        values = np.full(len(attributes), None, dtype=object)
+        if num_matches > 0:
+            # determine the row of each match by counting line breaks
+            breaks = np.fromiter(
+                (p.count('\n') for p in parts[0:-1:2]), dtype=np.int64,
+                count=num_matches)
+            rows = np.cumsum(breaks) - 1
+            # in case of duplicate attributes, the last value is retained
+            last = np.r_[rows[1:] != rows[:-1], True]
+            values[rows[last]] = [v.rstrip().strip('"') for v, l
+                                  in zip(parts[1::2], last) if l]
+        data[key] = values
+
+    return pd.DataFrame(data, index=index, columns=keys)
+
+
+def _find_feature_lines(block, end, token, lines):
+    """Find all lines in ``block[:end]`` that contain ``token`` as the
+    feature (i.e., following the first two tab characters)."""
+    pos = block.find(token, 0, end)
+    while pos != -1:
+        start = block.rfind(b'\n', 0, pos) + 1
+        stop = block.find(b'\n', pos) + 1
+        num_tabs = block.count(b'\t', start, pos)
+        if num_tabs == 1 and block[start:start+1] != b'#':
+            lines.append(block[start:stop])
+        elif num_tabs == 0:
+            # the token might overlap with the source column
+            pos = block.find(token, pos + 1, stop)
+            if pos != -1:
+                continue
+        pos = block.find(token, stop, end)
+
+
+def split_feature_lines(path_or_buffer, features, block_size=4194304):
+    """Read the lines of a GTF file that describe specific feature types.
+
+    The file is read only once, in large blocks, and each block is searched
+    for the feature names (surrounded by tab characters), so that lines
+    describing other features are never split or decoded. For a typical
+    Ensembl GTF file, this is much faster than parsing all lines in order to
+    select the lines of a certain type (e.g., "gene").
+
+    Parameters
+    ----------
+    path_or_buffer : str or file-like
+        The GTF file (optionally gzip'ed), or a file-like object (text or
+        binary).
+    features : Iterable of str
+        The feature types (third column), e.g., "gene" and "exon".
+    block_size : int, optional
+        The number of bytes (or characters) to read at once. [4194304]
+
+    Returns
+    -------
+    `collections.OrderedDict` (str => bytes)
+        The lines (including line breaks) for each feature type, in their
+        original order. Comment lines are always excluded.
+    """
+    assert isinstance(block_size, int) and block_size > 0
+    features = list(features)
+    for f in features:
+        assert isinstance(f, (str, _oldstr))
+
+    tokens = [('\t%s\t' % f).encode('ascii') for f in features]
+    lines = [[] for _ in features]
+
+    def read_lines(fh):
+        rest = b''
+        while True:
+            block = fh.read(block_size)
+            if not block:
+                break
+            if not isinstance(block, bytes):
+                block = block.encode('ascii')
+            block = rest + block
+            # only search complete lines
+            end = block.rfind(b'\n') + 1
+            rest = block[end:]
+            for token, l in zip(tokens, lines):
+                _find_feature_lines(block, end, token, l)
+        if rest:
+            # last line without line break
+            rest += b'\n'
+            for token, l in zip(tokens, lines):
+                _find_feature_lines(rest, len(rest), token, l)
+
+    if isinstance(path_or_buffer, (str, _oldstr)):
+        with misc.smart_open_read(path_or_buffer, mode='rb',
+                                  try_gzip=True) as fh:
+            read_lines(fh)
+    else:
+        read_lines(path_or_buffer)
+
+    return OrderedDict((f, b''.join(l)) for f, l in zip(features, lines))
+
+
+def read_feature_lines(path_or_buffer, feature, block_size=4194304):
+    """Read all lines of a GTF file that describe a specific feature type.
+
+    See `split_feature_lines`.
+
+    Parameters
+    ----------
+    path_or_buffer : str or file-like
+        The GTF file (optionally gzip'ed), or a file-like object (text or
+        binary).
+    feature : str
+        The feature type (third column), e.g., "gene".
+    block_size : int, optional
+        The number of bytes (or characters) to read at once. [4194304]
+
+    Returns
+    -------
+    bytes
+        The selected lines (including line breaks), in their original order.
+        Comment lines are always excluded.
+    """
+    return split_feature_lines(path_or_buffer, [feature], block_size)[feature]
+
+
+def parse_feature_lines(lines, attributes):
+    """Parse GTF lines into a table.
+
+    Parameters
+    ----------
+    lines : bytes
+        The GTF lines, as returned by `read_feature_lines`.
+    attributes : Iterable of str
+        The names of the attributes to extract (e.g., "gene_id").
+
+    Returns
+    -------
+    `pandas.DataFrame`
+        Table with one row for each line, and columns "chromosome",
+        "source", "start", "end", and "strand", followed by one column for
+        each attribute (see `extract_attributes`). The "chromosome",
+        "source", and "strand" columns are categorical.
+    """
+    attributes = list(attributes)
+
+    # only parse the required columns
+    columns = [0, 1, 3, 4, 6, 8]
+    names = ['chromosome', 'source', 'start', 'end', 'strand']
+    if lines:
+        df = pd.read_csv(io.BytesIO(lines), encoding='ascii', sep='\t',
+                         header=None, usecols=columns,
+                         dtype={0: 'category', 1: 'category', 3: np.int64,
+                                4: np.int64, 6: 'category', 8: object})
+    else:
+        df = pd.DataFrame(OrderedDict([
+            (0, pd.Categorical([])), (1, pd.Categorical([])),
+            (3, np.zeros(0, dtype=np.int64)),
+            (4, np.zeros(0, dtype=np.int64)),
+            (6, pd.Categorical([])), (8, np.zeros(0, dtype=object))]))
+
+    attr = extract_attributes(df[8].str.lstrip(' '), attributes)
+    df = df.loc[:, columns[:-1]]
+    df.columns = names
+    return pd.concat([df, attr], axis=1)
+
+
+def read_feature_table(path_or_buffer, feature, attributes):
+    """Read all annotations of a specific feature type from a GTF file.
+
+    Parameters
+    ----------
+    path_or_buffer : str or file-like
+        The GTF file (optionally gzip'ed), or a file-like object (text or
+        binary).
+    feature : str
+        The feature type (third column), e.g., "gene".
+    attributes : Iterable of str
+        The names of the attributes to extract (e.g., "gene_id").
+
+    Returns
+    -------
+    `pandas.DataFrame`
+        The annotations, in their original order (see
+        `parse_feature_lines`).
+    """
+    return parse_feature_lines(read_feature_lines(path_or_buffer, feature),
+                               attributes)
@@ -1,3 +1,7 @@
 from .functions import *
 from .download import *
+from .bgzf import *
+from .ftp import *
+from .hashing import *
+from .download_manager import *
 from .log import *
@@ -0,0 +1,263 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Functions for reading and writing BGZF (blocked gzip) files.
+
+BGZF files consist of a series of gzip members ("blocks") of at most 64 KB,
+each of which stores its own compressed size in a gzip header field. BGZF
+files can therefore be decompressed by any gzip implementation, and any
+block can be decompressed individually, given its file offset. The format
+is described in the
+`SAM format specification <https://samtools.github.io/hts-specs/SAMv1.pdf>`_.
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+_oldstr = str
+from builtins import *
+
+import struct
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+BGZF_MAX_BLOCK_DATA = 65280
+"""The maximum number of (uncompressed) bytes stored in a BGZF block."""
+
+_BGZF_HEADER = b'\x1f\x8b\x08\x04\x00\x00\x00\x00\x00\xff\x06\x00BC\x02\x00'
+_BGZF_EOF = _BGZF_HEADER + b'\x1b\x00\x03\x00\x00\x00\x00\x00\x00\x00\x00\x00'
+
+
+def compress_bgzf_block(data, compress_level=6):
+    """Compress data into a single BGZF block.
+
+    Parameters
+    ----------
+    data : bytes
+        The data (at most `BGZF_MAX_BLOCK_DATA` bytes).
+    compress_level : int, optional
+        The zlib compression level. [6]
+
+    Returns
+    -------
+    bytes
+        The compressed block.
+    """
+    if len(data) > BGZF_MAX_BLOCK_DATA:
+        raise ValueError('BGZF blocks can contain at most %d bytes.'
+                         % BGZF_MAX_BLOCK_DATA)
+    c = zlib.compressobj(compress_level, zlib.DEFLATED, -15)
+    compressed = c.compress(data) + c.flush()
+    # total block size minus one
+    bsize = len(compressed) + len(_BGZF_HEADER) + 10 - 1
+    return b''.join([
+        _BGZF_HEADER, struct.pack('<H', bsize), compressed,
+        struct.pack('<II', zlib.crc32(data) & 0xffffffff,
+                    len(data) & 0xffffffff)])
+
+
+def read_bgzf_block(fh, offset=None):
+    """Read and decompress a single BGZF block.
+
+    Parameters
+    ----------
+    fh : file-like
+        The BGZF file, opened in binary mode.
+    offset : int, optional
+        The file offset of the block. If `None`, the block is read from the
+        current position. [None]
+
+    Returns
+    -------
+    bytes
+        The decompressed data (empty at the end of the file).
+    int
+        The size of the compressed block (0 at the end of the file).
+    """
+    if offset is not None:
+        fh.seek(offset)
+    header = fh.read(len(_BGZF_HEADER) + 2)
+    if not header:
+        return b'', 0
+    if len(header) < len(_BGZF_HEADER) + 2 or \
+            header[:4] != _BGZF_HEADER[:4] or header[12:14] != b'BC':
+        raise ValueError('Invalid BGZF block.')
+    bsize = struct.unpack('<H', header[-2:])[0] + 1
+    rest = fh.read(bsize - len(header))
+    data = zlib.decompress(rest[:-8], -15)
+    crc, size = struct.unpack('<II', rest[-8:])
+    if size != len(data) or crc != (zlib.crc32(data) & 0xffffffff):
+        raise ValueError('Corrupt BGZF block.')
+    return data, bsize
+
+
+def is_bgzf(path):
+    """Test whether a file is in BGZF format.
+
+    Parameters
+    ----------
+    path : str
+        The file path.
+
+    Returns
+    -------
+    bool
+    """
+    with open(path, 'rb') as fh:
+        header = fh.read(len(_BGZF_HEADER))
+    return len(header) == len(_BGZF_HEADER) and \
+        header[:4] == _BGZF_HEADER[:4] and header[12:14] == b'BC'
+
+
+class BgzfWriter(object):
+    """A writer for BGZF files.
+
+    Data is buffered and compressed in blocks of at most
+    `BGZF_MAX_BLOCK_DATA` bytes. Calling :meth:`flush` forces the start of
+    a new block, which is useful for aligning blocks with records (e.g.,
+    lines).
+
+    If ``num_threads`` is larger than 1, blocks are compressed in parallel
+    (zlib releases the GIL while compressing), and written in order.
+
+    Parameters
+    ----------
+    fh : file-like
+        The output file, opened in binary mode.
+    compress_level : int, optional
+        The zlib compression level. [6]
+    num_threads : int, optional
+        The number of threads used for compressing blocks. [1]
+    """
+    def __init__(self, fh, compress_level=6, num_threads=1):
+        assert isinstance(compress_level, int)
+        assert isinstance(num_threads, int) and num_threads >= 1
+        self.fh = fh
+        self.compress_level = compress_level
+        self.num_threads = num_threads
+        self._buffer = []
+        self._buffer_size = 0
+        self._offset = 0
+        self._executor = None
+        self._pending = deque()
+        if num_threads > 1:
+            self._executor = ThreadPoolExecutor(num_threads)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def tell(self):
+        """Get the file offset of the next block.
+
+        Returns
+        -------
+        int
+        """
+        self._write_pending()
+        return self._offset
+
+    def _write_pending(self, max_pending=0):
+        """Write compressed blocks until at most `max_pending` are left."""
+        while len(self._pending) > max_pending:
+            block = self._pending.popleft().result()
+            self.fh.write(block)
+            self._offset += len(block)
+
+    def write(self, data):
+        """Write data.
+
+        Parameters
+        ----------
+        data : bytes
+            The data.
+
+        Returns
+        -------
+        None
+        """
+        pos = 0
+        while pos < len(data):
+            n = BGZF_MAX_BLOCK_DATA - self._buffer_size
+            self._buffer.append(data[pos:(pos + n)])
+            self._buffer_size += len(self._buffer[-1])
+            pos += n
+            if self._buffer_size == BGZF_MAX_BLOCK_DATA:
+                self.flush()
+
+    def write_block(self, data):
+        """Write data as a separate block.
+
+        Parameters
+        ----------
+        data : bytes
+            The data (at most `BGZF_MAX_BLOCK_DATA` bytes).
+
+        Returns
+        -------
+        int
+            The file offset of the block.
+        int
+            The size of the compressed block.
+        """
+        self.flush()
+        self._write_pending()
+        block = compress_bgzf_block(data, self.compress_level)
+        offset = self._offset
+        self.fh.write(block)
+        self._offset += len(block)
+        return offset, len(block)
+
+    def flush(self):
+        """Compress and write all buffered data.
+
+        If multiple threads are used, the block is compressed in the
+        background, and written once all previous blocks have been written.
+
+        Returns
+        -------
+        None
+        """
+        if self._buffer_size > 0:
+            data = b''.join(self._buffer)
+            self._buffer = []
+            self._buffer_size = 0
+            if self._executor is None:
+                self.write_block(data)
+            else:
+                self._pending.append(self._executor.submit(
+                    compress_bgzf_block, data, self.compress_level))
+                # limit the amount of data held in memory
+                self._write_pending(4 * self.num_threads)
+
+    def close(self):
+        """Write all buffered data and the BGZF end-of-file marker.
+
+        The underlying file is not closed.
+
+        Returns
+        -------
+        None
+        """
+        self.flush()
+        self._write_pending()
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        self.fh.write(_BGZF_EOF)
+        self._offset += len(_BGZF_EOF)
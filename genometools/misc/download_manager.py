@@ -0,0 +1,526 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""A download manager with resumable transfers and a local file cache."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+_oldstr = str
+from builtins import *
+
+import io
+import os
+import json
+import time
+import shutil
+import ftplib
+import hashlib
+import socket
+import logging
+import tempfile
+import threading
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor
+
+import six
+if six.PY3:
+    from urllib import parse as urlparse
+else:
+    import urlparse
+
+import requests
+import urllib3
+
+from .functions import make_sure_dir_exists
+from .ftp import FTPConnectionPool
+from .hashing import _get_hasher, _get_result
+
+_logger = logging.getLogger(__name__)
+
+# errors raised when reading the raw data of a response
+_URLLIB3_ERRORS = (urllib3.exceptions.HTTPError,)
+
+# errors after which a transfer is retried (network errors only; HTTP
+# errors and local file errors are raised immediately)
+_TRANSFER_ERRORS = (requests.ConnectionError, requests.Timeout,
+                    requests.exceptions.ChunkedEncodingError,
+                    socket.timeout, EOFError, ftplib.error_temp,
+                    ftplib.error_proto, ftplib.error_reply)
+if six.PY3:
+    _TRANSFER_ERRORS += (ConnectionError,)
+else:
+    _TRANSFER_ERRORS += (socket.error,)
+
+# the maximum time to wait before retrying a transfer (in seconds)
+_MAX_RETRY_DELAY = 30.0
+
+
+class _RestartDownload(Exception):
+    """Raised if a download cannot be resumed."""
+    pass
+
+
+class DownloadManager(object):
+    """Downloads files over HTTP(S) and FTP, with resume and caching.
+
+    Data is written to a temporary (".part") file, and checksums are
+    calculated while the data is received. If a transfer is interrupted, it
+    is resumed from the end of the temporary file (using HTTP range requests
+    or the FTP ``REST`` command), up to :attr:`max_retries` times. FTP
+    connections are reused (see `FTPConnectionPool`). HTTP servers are asked
+    not to apply a content encoding (e.g., gzip), and files are stored
+    exactly as they were transferred.
+
+    If :attr:`cache_dir` is specified, downloaded files are stored in the
+    cache directory under their MD5 hash, and the hash is recorded for each
+    URL. Subsequent downloads of the same URL (or of any file with a known
+    MD5 hash) are then served from the cache. Cached files are read-only,
+    and are copied to the requested download path.
+
+    Parameters
+    ----------
+    cache_dir : str, optional
+        See :attr:`cache_dir` attribute. [None]
+    num_threads : int, optional
+        See :attr:`num_threads` attribute. [4]
+    max_retries : int, optional
+        See :attr:`max_retries` attribute. [3]
+    chunk_size : int, optional
+        See :attr:`chunk_size` attribute. [1048576]
+    timeout : float, optional
+        See :attr:`timeout` attribute. [60]
+    max_age : float, optional
+        See :attr:`max_age` attribute. [None]
+    retry_delay : float, optional
+        See :attr:`retry_delay` attribute. [1.0]
+
+    Attributes
+    ----------
+    cache_dir : str or None
+        The cache directory. If `None`, files are not cached.
+    num_threads : int
+        The number of simultaneous transfers (see :meth:`download_all`).
+    max_retries : int
+        The number of times an interrupted transfer is resumed.
+    chunk_size : int
+        The number of bytes received at once.
+    timeout : float
+        The socket timeout, in seconds.
+    max_age : float or None
+        The number of seconds for which a cached download of a URL is reused
+        (without a checksum). If `None`, cached downloads are always reused.
+    retry_delay : float
+        The number of seconds to wait before the first retry. The delay is
+        doubled with every further retry (up to 30 seconds).
+    """
+    def __init__(self, cache_dir=None, num_threads=4, max_retries=3,
+                 chunk_size=1048576, timeout=60, max_age=None,
+                 retry_delay=1.0):
+
+        assert cache_dir is None or isinstance(cache_dir, (str, _oldstr))
+        assert isinstance(num_threads, int) and num_threads >= 1
+        assert isinstance(max_retries, int) and max_retries >= 0
+        assert isinstance(chunk_size, int) and chunk_size > 0
+        assert isinstance(retry_delay, (int, float)) and retry_delay >= 0
+
+        self.cache_dir = cache_dir
+        self.num_threads = num_threads
+        self.max_retries = max_retries
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.max_age = max_age
+        self.retry_delay = retry_delay
+
+        self._session = requests.Session()
+        self._ftp_pools = {}
+        self._url_locks = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '<%s instance (cache_dir=%s, num_threads=%d)>' \
+               % (self.__class__.__name__, str(self.cache_dir),
+                  self.num_threads)
+
+    def __str__(self):
+        return '<%s instance (cache directory: %s)>' \
+               % (self.__class__.__name__, str(self.cache_dir))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close all open connections.
+
+        Returns
+        -------
+        None
+        """
+        with self._lock:
+            pools = list(self._ftp_pools.values())
+            self._ftp_pools.clear()
+        for pool in pools:
+            pool.close()
+        self._session.close()
+
+    def _get_ftp_pool(self, u):
+        key = (u.hostname, u.port or 21, u.username or 'anonymous')
+        with self._lock:
+            try:
+                return self._ftp_pools[key]
+            except KeyError:
+                pool = FTPConnectionPool(
+                    key[0], user=key[2], password=u.password or '',
+                    port=key[1], max_connections=self.num_threads,
+                    timeout=self.timeout, max_retries=0)
+                self._ftp_pools[key] = pool
+                return pool
+
+    def _get_url_lock(self, url):
+        with self._lock:
+            return self._url_locks.setdefault(url, threading.Lock())
+
+    @staticmethod
+    def _get_url_key(url):
+        return hashlib.sha1(url.encode('UTF-8')).hexdigest()
+
+    def _get_object_path(self, md5):
+        return os.path.join(self.cache_dir, 'objects', md5[:2], md5)
+
+    def _get_record_path(self, url):
+        return os.path.join(self.cache_dir, 'urls',
+                            self._get_url_key(url) + '.json')
+
+    def _read_record(self, url):
+        try:
+            with io.open(self._get_record_path(url), encoding='UTF-8') as fh:
+                return json.load(fh)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _write_record(self, url, record):
+        record_dir = os.path.join(self.cache_dir, 'urls')
+        make_sure_dir_exists(record_dir, create_subfolders=True)
+        # write to a temporary file first, in case of concurrent access
+        with tempfile.NamedTemporaryFile(
+                mode='w', dir=record_dir, suffix='.tmp', delete=False) as tf:
+            json.dump(record, tf)
+        os.rename(tf.name, self._get_record_path(url))
+
+    def get_cached_file(self, url, checksum=None, checksum_type='md5'):
+        """Look up a file in the cache.
+
+        Parameters
+        ----------
+        url : str
+            The URL.
+        checksum : int or str, optional
+            The expected checksum of the file. [None]
+        checksum_type : str, optional
+            The type of the checksum (see `hash_file`). ["md5"]
+
+        Returns
+        -------
+        str or None
+            The path of the cached file, or `None` if there is no (valid)
+            cached file.
+        """
+        if self.cache_dir is None:
+            return None
+
+        if checksum is not None and checksum_type == 'md5':
+            path = self._get_object_path(checksum)
+            if os.path.isfile(path):
+                return path
+
+        record = self._read_record(url)
+        if record is None:
+            return None
+        if checksum is None:
+            if self.max_age is not None and \
+                    time.time() - record['time'] > self.max_age:
+                return None
+        elif record['checksums'].get(checksum_type) != checksum:
+            return None
+
+        path = self._get_object_path(record['checksums']['md5'])
+        if not os.path.isfile(path):
+            return None
+        return path
+
+    def _get_part_path(self, url, download_file):
+        if self.cache_dir is not None:
+            part_dir = os.path.join(self.cache_dir, 'tmp')
+            make_sure_dir_exists(part_dir, create_subfolders=True)
+            return os.path.join(part_dir, self._get_url_key(url) + '.part')
+        return download_file + '.part'
+
+    def _transfer_http(self, url, ofh, update):
+        """Transfer (the remainder of) a file over HTTP(S).
+
+        The data is not decoded (and we ask for it not to be encoded), so
+        that the file offset used for resuming refers to the bytes that were
+        actually transferred. Each chunk is passed on as soon as it has been
+        received, so that no data is lost if the connection breaks.
+        """
+        offset = ofh.tell()
+        headers = {'Accept-Encoding': 'identity'}
+        if offset > 0:
+            headers['Range'] = 'bytes=%d-' % offset
+        with closing(self._session.get(url, headers=headers, stream=True,
+                                       timeout=self.timeout)) as r:
+            if r.status_code == 416:
+                raise _RestartDownload('Invalid range.')
+            r.raise_for_status()
+            if offset > 0 and r.status_code != 206:
+                raise _RestartDownload('Server does not support resuming '
+                                       'downloads.')
+            size = r.headers.get('Content-Length')
+            if size is not None:
+                size = offset + int(size)
+            while True:
+                try:
+                    chunk = r.raw.read(self.chunk_size, decode_content=False)
+                except _URLLIB3_ERRORS as err:
+                    raise requests.ConnectionError(err)
+                if not chunk:
+                    break
+                update(chunk)
+        return size
+
+    def _transfer_ftp(self, u, ofh, update, check):
+        """Transfer (the remainder of) a file over FTP."""
+        offset = ofh.tell()
+        pool = self._get_ftp_pool(u)
+        with pool.connection(check=check) as ftp:
+            ftp.voidcmd('TYPE I')
+            try:
+                size = ftp.size(u.path)
+            except ftplib.error_perm:
+                size = None
+            if size is not None and offset > size:
+                raise _RestartDownload('Partial file is too large.')
+            ftp.retrbinary('RETR %s' % u.path, update,
+                           blocksize=self.chunk_size, rest=(offset or None))
+        return size
+
+    def download(self, url, download_file=None, checksum=None,
+                 checksum_type='md5'):
+        """Download a file.
+
+        Parameters
+        ----------
+        url : str
+            The URL ("http://", "https://", or "ftp://").
+        download_file : str, optional
+            The path of the downloaded file. An existing file is replaced.
+            If `None`, the file is only stored in the cache (and
+            :attr:`cache_dir` must be specified). [None]
+        checksum : int or str, optional
+            The expected checksum. If specified and the checksum of the
+            downloaded file differs, the file is downloaded again. [None]
+        checksum_type : str, optional
+            The type of the checksum (see `hash_file`). ["md5"]
+
+        Returns
+        -------
+        str
+            The path of the downloaded file.
+
+        Raises
+        ------
+        ValueError
+            If the checksum of the downloaded file is incorrect.
+        `requests.HTTPError`
+            If an HTTP error occurred.
+        `ftplib.Error`
+            If an FTP error occurred.
+        """
+        assert isinstance(url, (str, _oldstr))
+        assert download_file is None or \
+            isinstance(download_file, (str, _oldstr))
+        assert isinstance(checksum_type, (str, _oldstr))
+
+        if download_file is None and self.cache_dir is None:
+            raise ValueError('Either a download file or a cache directory '
+                             'must be specified.')
+
+        u = urlparse.urlparse(url)
+        if u.scheme not in ['http', 'https', 'ftp']:
+            raise ValueError('Unsupported URL: "%s"' % url)
+
+        # simultaneous downloads of the same URL share the same files
+        with self._get_url_lock(url):
+            path = self.get_cached_file(url, checksum, checksum_type)
+            if path is not None:
+                _logger.info('Using cached download of "%s".', url)
+            else:
+                path = self._download(u, url, download_file, checksum,
+                                      checksum_type)
+
+        if download_file is None or path == download_file:
+            return path
+
+        # copy the file from the cache (files are not linked, so that
+        # changes to the downloaded file do not affect the cache)
+        shutil.copyfile(path, download_file)
+        return download_file
+
+    def _wait_before_retry(self, attempt):
+        """Wait before retrying a transfer (with exponential backoff)."""
+        delay = min(self.retry_delay * (2 ** attempt), _MAX_RETRY_DELAY)
+        if delay > 0:
+            time.sleep(delay)
+
+    def _download(self, u, url, download_file, checksum, checksum_type):
+        """Download a file (with retries) and store it in the cache."""
+        part_path = self._get_part_path(url, download_file)
+        algorithms = ['md5']
+        if checksum is not None and checksum_type != 'md5':
+            algorithms.append(checksum_type)
+
+        for attempt in range(self.max_retries + 1):
+            hashers = [(a, _get_hasher(a)) for a in algorithms]
+            with io.open(part_path, 'ab+') as ofh:
+                # calculate the checksums of previously received data
+                ofh.seek(0)
+                while True:
+                    chunk = ofh.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    for _, h in hashers:
+                        h.update(chunk)
+                if ofh.tell() > 0:
+                    _logger.info('Resuming download of "%s" at byte %d...',
+                                 url, ofh.tell())
+
+                def update(chunk):
+                    ofh.write(chunk)
+                    for _, h in hashers:
+                        h.update(chunk)
+
+                try:
+                    if u.scheme == 'ftp':
+                        size = self._transfer_ftp(u, ofh, update, attempt > 0)
+                    else:
+                        size = self._transfer_http(url, ofh, update)
+                except _RestartDownload as err:
+                    _logger.warning('Could not resume download of "%s" (%s), '
+                                    'starting over...', url, str(err))
+                    ofh.truncate(0)
+                    continue
+                except requests.HTTPError as err:
+                    # client errors (e.g., 404) are not retried
+                    if err.response is None or \
+                            err.response.status_code < 500 or \
+                            attempt == self.max_retries:
+                        raise
+                    _logger.warning('Download of "%s" failed (%s), '
+                                    'retrying...', url, str(err))
+                    self._wait_before_retry(attempt)
+                    continue
+                except _TRANSFER_ERRORS as err:
+                    if attempt == self.max_retries:
+                        raise
+                    _logger.warning('Download of "%s" was interrupted (%s), '
+                                    'retrying...', url, str(err))
+                    self._wait_before_retry(attempt)
+                    continue
+                received = ofh.tell()
+
+            if size is not None and received != size:
+                _logger.warning('Download of "%s" is incomplete (%d of %d '
+                                'bytes), retrying...', url, received, size)
+                if received > size:
+                    os.remove(part_path)
+                self._wait_before_retry(attempt)
+                continue
+
+            checksums = dict((a, _get_result(h)) for a, h in hashers)
+            if checksum is not None and checksums[checksum_type] != checksum:
+                os.remove(part_path)
+                if attempt == self.max_retries:
+                    raise ValueError('Checksum of file downloaded from "%s" '
+                                     'is incorrect (should be: %s; is: %s).'
+                                     % (url, str(checksum),
+                                        str(checksums[checksum_type])))
+                _logger.warning('Checksum mismatch for "%s", downloading '
+                                'again...', url)
+                self._wait_before_retry(attempt)
+                continue
+            break
+        else:
+            raise IOError('Download of "%s" failed.' % url)
+
+        _logger.info('Downloaded "%s" (%d bytes).', url, received)
+        if self.cache_dir is None:
+            if os.path.isfile(download_file):
+                os.remove(download_file)
+            os.rename(part_path, download_file)
+            return download_file
+
+        path = self._get_object_path(checksums['md5'])
+        make_sure_dir_exists(os.path.dirname(path), create_subfolders=True)
+        os.rename(part_path, path)
+        os.chmod(path, 0o444)
+        record = {'url': url, 'time': time.time(), 'size': received,
+                  'checksums': checksums}
+        self._write_record(url, record)
+        return path
+
+    def download_all(self, urls, download_dir=None, checksums=None,
+                     checksum_type='md5'):
+        """Download multiple files simultaneously.
+
+        Parameters
+        ----------
+        urls : Iterable of str
+            The URLs.
+        download_dir : str, optional
+            The download directory. Files are named after the last
+            component of the URL path. If `None`, the files are only stored
+            in the cache. [None]
+        checksums : Iterable of (int or str), optional
+            The expected checksum of each file (or `None`). [None]
+        checksum_type : str, optional
+            The type of the checksums (see `hash_file`). ["md5"]
+
+        Returns
+        -------
+        list of str
+            The paths of the downloaded files.
+        """
+        urls = list(urls)
+        if checksums is None:
+            checksums = [None] * len(urls)
+        else:
+            checksums = list(checksums)
+            assert len(checksums) == len(urls)
+
+        download_files = [None] * len(urls)
+        if download_dir is not None:
+            download_files = [
+                os.path.join(download_dir, urlparse.urlparse(url).path
+                             .rstrip('/').split('/')[-1])
+                for url in urls]
+
+        with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
+            futures = [
+                executor.submit(self.download, url, f, c, checksum_type)
+                for url, f, c in zip(urls, download_files, checksums)]
+            return [f.result() for f in futures]
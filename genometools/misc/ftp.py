@@ -0,0 +1,361 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""A pool of persistent FTP connections."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+_oldstr = str
+from builtins import *
+
+import time
+import logging
+import ftplib
+import posixpath
+import threading
+import contextlib
+from collections import deque
+
+_logger = logging.getLogger(__name__)
+
+# errors after which a connection can no longer be used
+# (permanent errors, e.g. "550 File not found", are not included)
+_CONNECTION_ERRORS = (EOFError, OSError, ftplib.error_temp,
+                      ftplib.error_proto, ftplib.error_reply)
+
+
+class FTPConnectionPool(object):
+    """A thread-safe pool of persistent connections to an FTP server.
+
+    Connections are opened as needed (up to :attr:`max_connections`), and
+    are kept open after use. Connections that have been idle for a while are
+    tested (using a ``NOOP`` command) before they are reused, and broken
+    connections are replaced automatically. Directory listings and
+    (optionally) small files are cached for :attr:`cache_ttl` seconds.
+
+    Parameters
+    ----------
+    host : str
+        See :attr:`host` attribute.
+    user : str, optional
+        See :attr:`user` attribute. ['anonymous']
+    password : str, optional
+        See :attr:`password` attribute. ['']
+    port : int, optional
+        See :attr:`port` attribute. [21]
+    max_connections : int, optional
+        See :attr:`max_connections` attribute. [4]
+    timeout : float, optional
+        See :attr:`timeout` attribute. [60]
+    cache_ttl : float, optional
+        See :attr:`cache_ttl` attribute. [600]
+    max_retries : int, optional
+        See :attr:`max_retries` attribute. [2]
+    keepalive_interval : float, optional
+        See :attr:`keepalive_interval` attribute. [30]
+
+    Attributes
+    ----------
+    host : str
+        The FTP server.
+    user : str
+        The user name for logging in.
+    password : str
+        The password for logging in.
+    port : int
+        The port of the FTP server.
+    max_connections : int
+        The maximum number of simultaneous connections.
+    timeout : float
+        The socket timeout, in seconds.
+    cache_ttl : float
+        The number of seconds for which cached listings and files are reused.
+    max_retries : int
+        The number of times an operation is retried (with a new connection)
+        after a connection error.
+    keepalive_interval : float
+        Idle connections are tested before reuse if they have not been used
+        for this many seconds.
+    """
+    def __init__(self, host, user='anonymous', password='', port=21,
+                 max_connections=4, timeout=60, cache_ttl=600,
+                 max_retries=2, keepalive_interval=30):
+
+        assert isinstance(host, (str, _oldstr))
+        assert isinstance(user, (str, _oldstr))
+        assert isinstance(password, (str, _oldstr))
+        assert isinstance(port, int)
+        assert isinstance(max_connections, int) and max_connections >= 1
+        assert isinstance(max_retries, int) and max_retries >= 0
+
+        self.host = host
+        self.user = user
+        self.password = password
+        self.port = port
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.cache_ttl = cache_ttl
+        self.max_retries = max_retries
+        self.keepalive_interval = keepalive_interval
+
+        self._idle = deque()
+        self._num_connections = 0
+        self._cond = threading.Condition()
+        self._cache = {}
+        self._cache_lock = threading.Lock()
+
+    def __repr__(self):
+        return '<%s instance (host="%s", port=%d, user="%s", ' \
+               'max_connections=%d)>' \
+               % (self.__class__.__name__, self.host, self.port, self.user,
+                  self.max_connections)
+
+    def __str__(self):
+        return '<%s instance for "%s" with %d open connections>' \
+               % (self.__class__.__name__, self.host, self.num_connections)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def num_connections(self):
+        """The number of open connections (idle or in use).
+
+        Returns
+        -------
+        int
+        """
+        with self._cond:
+            return self._num_connections
+
+    def _connect(self):
+        """Open a new connection."""
+        ftp = ftplib.FTP(timeout=self.timeout)
+        try:
+            ftp.connect(self.host, self.port)
+            ftp.login(self.user, self.password)
+        except:
+            ftp.close()
+            raise
+        _logger.debug('Opened new FTP connection to "%s".', self.host)
+        return ftp
+
+    @staticmethod
+    def _close_connection(ftp):
+        try:
+            ftp.quit()
+        except ftplib.all_errors:
+            ftp.close()
+
+    def _acquire(self, check=False):
+        ftp = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    ftp, last_used = self._idle.pop()
+                    break
+                if self._num_connections < self.max_connections:
+                    self._num_connections += 1
+                    break
+                self._cond.wait()
+
+        if ftp is not None and \
+                (check or time.time() - last_used > self.keepalive_interval):
+            # make sure the connection is still alive
+            try:
+                ftp.voidcmd('NOOP')
+            except ftplib.all_errors:
+                _logger.debug('Idle FTP connection was closed by server.')
+                ftp.close()
+                ftp = None
+
+        if ftp is None:
+            try:
+                ftp = self._connect()
+            except:
+                with self._cond:
+                    self._num_connections -= 1
+                    self._cond.notify()
+                raise
+        return ftp
+
+    def _release(self, ftp):
+        with self._cond:
+            self._idle.append((ftp, time.time()))
+            self._cond.notify()
+
+    def _discard(self, ftp):
+        ftp.close()
+        with self._cond:
+            self._num_connections -= 1
+            self._cond.notify()
+
+    @contextlib.contextmanager
+    def connection(self, check=False):
+        """Obtain a connection from the pool.
+
+        The connection is returned to the pool afterwards, unless a
+        connection error occurred.
+
+        Parameters
+        ----------
+        check : bool, optional
+            Whether to test an idle connection before using it, regardless
+            of how long it has been idle. [False]
+
+        Yields
+        ------
+        `ftplib.FTP`
+            The connection.
+        """
+        ftp = self._acquire(check)
+        try:
+            yield ftp
+        except _CONNECTION_ERRORS:
+            self._discard(ftp)
+            raise
+        except:
+            self._release(ftp)
+            raise
+        else:
+            self._release(ftp)
+
+    def run(self, func, *args, **kwargs):
+        """Call a function with a pooled connection.
+
+        If a connection error occurs, the function is called again with a
+        tested or new connection (up to :attr:`max_retries` times).
+
+        Parameters
+        ----------
+        func : callable
+            The function. Its first argument is the connection
+            (`ftplib.FTP`).
+        args, kwargs
+            Additional arguments for the function.
+
+        Returns
+        -------
+        The return value of the function.
+        """
+        for i in range(self.max_retries + 1):
+            try:
+                with self.connection(check=(i > 0)) as ftp:
+                    return func(ftp, *args, **kwargs)
+            except _CONNECTION_ERRORS as err:
+                if i == self.max_retries:
+                    raise
+                _logger.warning('FTP connection error (%s), retrying...',
+                                str(err))
+
+    def _get_cached(self, key, func, *args):
+        with self._cache_lock:
+            entry = self._cache.get(key)
+        if entry is not None and time.time() - entry[0] < self.cache_ttl:
+            _logger.debug('Using cached result for %s.', str(key))
+            return entry[1]
+        value = self.run(func, *args)
+        with self._cache_lock:
+            self._cache[key] = (time.time(), value)
+        return value
+
+    def clear_cache(self):
+        """Remove all cached listings and files.
+
+        Returns
+        -------
+        None
+        """
+        with self._cache_lock:
+            self._cache.clear()
+
+    def dir(self, path):
+        """Get a (long) directory listing.
+
+        Parameters
+        ----------
+        path : str
+            The directory path.
+
+        Returns
+        -------
+        list of str
+            The lines of the listing, as returned by the ``LIST`` command.
+        """
+        def get_listing(ftp):
+            data = []
+            ftp.dir(path, data.append)
+            return data
+        return list(self._get_cached(('dir', path), get_listing))
+
+    def nlst(self, path):
+        """Get the names of all files in a directory.
+
+        Parameters
+        ----------
+        path : str
+            The directory path.
+
+        Returns
+        -------
+        list of str
+            The file names (without the directory path).
+        """
+        def get_names(ftp):
+            return [posixpath.basename(n.rstrip('/')) for n in ftp.nlst(path)]
+        return list(self._get_cached(('nlst', path), get_names))
+
+    def retrieve(self, path, cache=False):
+        """Download a file into memory.
+
+        Parameters
+        ----------
+        path : str
+            The file path.
+        cache : bool, optional
+            Whether to cache the file contents. [False]
+
+        Returns
+        -------
+        bytes
+            The file contents.
+        """
+        def get_data(ftp):
+            data = []
+            ftp.retrbinary('RETR %s' % path, data.append)
+            return b''.join(data)
+
+        if cache:
+            return self._get_cached(('retrieve', path), get_data)
+        return self.run(get_data)
+
+    def close(self):
+        """Close all idle connections.
+
+        Returns
+        -------
+        None
+        """
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._num_connections -= len(idle)
+            self._cond.notify_all()
+        for ftp, _ in idle:
+            self._close_connection(ftp)
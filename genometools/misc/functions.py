@@ -33,21 +33,23 @@ import gzip
 import logging
 import contextlib
 import subprocess as subproc
-import locale
 import ftplib
-import hashlib
 
 import six
 
 if six.PY3:
     from urllib import parse as urlparse
+    from shutil import which as _which
 else:
     import urlparse
+    from distutils.spawn import find_executable as _which
 
 
 import unicodecsv as csv
 import requests
 
+from .hashing import hash_file
+
 logger = logging.getLogger(__name__)
 
 
@@ -63,16 +65,17 @@ def try_open_gzip(path):
 
 
 def get_file_md5sum(path):
-    """Calculate the MD5 hash for a file."""
-    with open(path, 'rb') as fh:
-        h = str(hashlib.md5(fh.read()).hexdigest())
-    return h
+    """Calculate the MD5 hash for a file (without reading it into memory)."""
+    return str(hash_file(path, ['md5'])['md5'])
 
 
 @contextlib.contextmanager
 def smart_open_read(path=None, mode='rb', encoding=None, try_gzip=False):
     """Open a file for reading or return ``stdin``.
 
+    If `try_gzip` is `True`, gzip'ed data is decompressed (this also applies
+    to ``stdin``).
+
     Adapted from StackOverflow user "Wolph"
     (http://stackoverflow.com/a/17603000).
     """
@@ -87,7 +90,17 @@ def smart_open_read(path=None, mode='rb', encoding=None, try_gzip=False):
     gzfh = None
     if path is None:
         # open stdin
-        fh = io.open(sys.stdin.fileno(), mode=mode, encoding=encoding)
+        if try_gzip:
+            # look at the first bytes to test whether the data is gzip'ed
+            stdin = io.open(sys.stdin.fileno(), mode='rb', closefd=False)
+            if stdin.peek(2)[:2] == b'\x1f\x8b':
+                gzfh = gzip.GzipFile(fileobj=stdin, mode='rb')
+            else:
+                binfh = stdin
+                if 'b' not in mode:
+                    fh = io.TextIOWrapper(binfh, encoding=encoding)
+        else:
+            fh = io.open(sys.stdin.fileno(), mode=mode, encoding=encoding)
 
     else:
         # open an actual file
@@ -96,18 +109,18 @@ def smart_open_read(path=None, mode='rb', encoding=None, try_gzip=False):
             # gzip.open defaults to mode 'rb'
             gzfh = try_open_gzip(path)
 
-        if gzfh is not None:
-            logger.debug('Opening gzip''ed file.')
-            # wrap gzip stream
-            binfh = io.BufferedReader(gzfh)
-            if 'b' not in mode:
-                # add a text wrapper on top
-                logger.debug('Adding text wrapper.')
-                fh = io.TextIOWrapper(binfh, encoding=encoding)
-
-        else:
+        if gzfh is None:
             fh = io.open(path, mode=mode, encoding=encoding)
 
+    if gzfh is not None:
+        logger.debug('Opening gzip''ed file.')
+        # wrap gzip stream
+        binfh = io.BufferedReader(gzfh)
+        if 'b' not in mode:
+            # add a text wrapper on top
+            logger.debug('Adding text wrapper.')
+            fh = io.TextIOWrapper(binfh, encoding=encoding)
+
     yield_fh = fh
     if fh is None:
         yield_fh = binfh
@@ -312,9 +325,10 @@ def get_file_size(path):
     return os.path.getsize(path)
 
 def get_file_checksum(path):
-    """Get the checksum of a file (using ``sum``, Unix-only).
+    """Get the BSD checksum of a file (as calculated by ``sum``).
 
-    This function is only available on certain platforms.
+    If the ``sum`` utility is available, it is used to calculate the
+    checksum. Otherwise, the checksum is calculated using `BSDSum`.
 
     Parameters
     ----------
@@ -331,33 +345,31 @@ def get_file_checksum(path):
     IOError
         If the file does not exist.
     """
-
-    if not (sys.platform.startswith('linux') or \
-                        sys.platform in ['darwin', 'cygwin']):
-        raise OSError('This function is not available on your platform.')
-
     assert isinstance(path, (str, _oldstr))
 
     if not os.path.isfile(path): # not a file
         raise IOError('File "%s" does not exist.' %(path))
 
-    # calculate checksum
-    sub = subproc.Popen('sum "%s"' %(path), bufsize=-1, shell=True,
-                        stdout=subproc.PIPE)
-    stdoutdata = sub.communicate()[0]
-    assert sub.returncode == 0
-
-    # in Python 3, communicate() returns bytes that need to be decoded
-    encoding = locale.getpreferredencoding()
-    stdoutstr = str(stdoutdata, encoding=encoding)
-
-    file_checksum = int(stdoutstr.split(' ')[0])
+    file_checksum = None
+    sum_path = _which('sum')
+    if sum_path is not None:
+        # the ``sum`` utility is much faster than `BSDSum`
+        try:
+            stdoutdata = subproc.check_output([sum_path, '-r', path])
+            file_checksum = int(stdoutdata.split()[0])
+        except (OSError, subproc.CalledProcessError, ValueError,
+                IndexError):
+            logger.warning('Could not run "%s", calculating checksum of '
+                           'file "%s" in Python...', sum_path, path)
+
+    if file_checksum is None:
+        file_checksum = hash_file(path, ['sum'])['sum']
     logger.debug('Checksum of file "%s": %d', path, file_checksum)
     return file_checksum
 
 
 def test_file_checksum(path, checksum):
-    """Test if a file has a given checksum (using ``sum``, Unix-only).
+    """Test if a file has a given BSD checksum (as calculated by ``sum``).
 
     Parameters
     ----------
@@ -0,0 +1,429 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Streaming checksums and hashes of files.
+
+Implements the BSD ``sum`` checksum (used in Ensembl CHECKSUMS files) and
+CRC32C (used by Google Cloud Storage) using NumPy, so that both can be
+computed together with MD5 in a single chunked pass over a file.
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+_oldstr = str
+from builtins import *
+
+import io
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# data shorter than this is processed byte by byte
+_MIN_VECTORIZED = 1024
+
+# the BSD checksum is computed modulo 2^16 - 1, where rotating a 16-bit
+# value to the right by one bit corresponds to a multiplication with 2^15
+_MOD = 65535
+_BSD_POW = np.array([1 << (i % 16) for i in range(17)], dtype=np.int64)
+_BSD_INV = np.array([1 << ((16 - i % 16) % 16) for i in range(17)],
+                    dtype=np.int64)
+# the number of rows (of 16 bytes) searched for carries at once
+_BSD_WINDOW = 48
+# the number of bytes processed at once (limits memory usage)
+_BSD_BLOCK = 262144
+# after this many consecutive carries that are closer than `_BSD_DENSE`
+# bytes, the following `_BSD_SCALAR_RUN` bytes are processed one at a time
+# (the search for each carry is much more expensive than processing a byte)
+_BSD_DENSE = 64
+_BSD_DENSE_HITS = 4
+_BSD_SCALAR_RUN = 4096
+
+
+def _bsd_sum_bytes(s, data):
+    """Update a BSD checksum, one byte at a time."""
+    for b in bytearray(data):
+        s = (((s >> 1) | ((s & 1) << 15)) + b) & 0xffff
+    return s
+
+
+def _bsd_sum(s, data):
+    """Update a BSD checksum.
+
+    Without carries, the checksum is a linear function of the data
+    (modulo 2^16 - 1), and all intermediate values can be computed at once.
+    Carries (and the ambiguity between 0 and 2^16 - 1) are rare, so the
+    positions at which they occur are searched for in a vectorized manner,
+    and only these positions are processed individually. Where they are
+    frequent (e.g., in runs of zeros), the data is processed byte by byte.
+    """
+    n = len(data)
+    if n < _MIN_VECTORIZED:
+        return _bsd_sum_bytes(s, data)
+
+    # pad to a multiple of 16, so that phases correspond to columns
+    m = -(-n // 16) * 16
+    b = np.zeros(m, dtype=np.int64)
+    b[:n] = np.frombuffer(data, dtype=np.uint8)
+    # position i (0-based) is multiplied with 2^(i+1) (modulo 2^16 - 1)
+    pow_ = np.tile(_BSD_POW[1:17], m // 16)
+    inv = np.tile(_BSD_INV[1:17], m // 16)
+
+    # "de-rotated" checksums without carries: t[i] = 2^(i+1) * s_i
+    t = np.cumsum(b * pow_)
+    t += s
+    t %= _MOD
+    # (rotated) checksums before each position, without carries
+    r = np.empty(m, dtype=np.int64)
+    r[0] = s
+    r[1:] = t[:-1]
+    r *= inv
+    r %= _MOD
+    # each position defines an interval of corrections that lead to a carry
+    # (or a checksum of zero), padding never does
+    w = np.maximum(b, 1)
+    w[n:] = 0
+    r2 = r.reshape(-1, 16)
+    w2 = w.reshape(-1, 16)
+    num_rows = r2.shape[0]
+    col_inv = _BSD_INV[1:17]
+
+    c = 0  # the correction of t due to carries
+    cvec = np.zeros(16, dtype=np.int64)
+    diff = np.empty((_BSD_WINDOW, 16), dtype=np.int64)
+    pos = 0
+    last = -1  # the last position processed individually
+    dense = 0  # the number of consecutive carries in close succession
+    while True:
+        # find the next position with a carry (or zero checksum)
+        i = -1
+        row = pos // 16
+        while row < num_rows:
+            stop = min(row + _BSD_WINDOW, num_rows)
+            d = diff[:(stop - row)]
+            np.subtract(cvec, r2[row:stop], out=d)
+            np.remainder(d, _MOD, out=d)
+            sel = np.less(d, w2[row:stop]).ravel()
+            if row*16 < pos:
+                sel[:(pos - row*16)] = False
+            j = sel.argmax()
+            if sel[j]:
+                i = row*16 + int(j)
+                break
+            row = stop
+
+        if i == -1:
+            break
+
+        # process the position exactly
+        if i == last + 1:
+            rot = (s >> 1) | ((s & 1) << 15)
+        else:
+            rot = (r.item(i) - cvec.item(i % 16)) % _MOD
+            if rot == 0:
+                # the checksum was 2^16 - 1 (a carry would have been found)
+                rot = _MOD
+        s = (rot + b.item(i)) & 0xffff
+        dense = dense + 1 if i - pos < _BSD_DENSE else 0
+        if dense >= _BSD_DENSE_HITS:
+            # carries are frequent, process the following bytes individually
+            end = min(i + _BSD_SCALAR_RUN, n)
+            s = _bsd_sum_bytes(s, data[(i + 1):end])
+            i = end - 1
+            dense = 0
+        last = i
+        c = (t.item(i) - (s << ((i + 1) % 16))) % _MOD
+        np.multiply(col_inv, c, out=cvec)
+        np.remainder(cvec, _MOD, out=cvec)
+        pos = i + 1
+
+    if last < n - 1:
+        s = ((t.item(n - 1) - c) * (1 << ((16 - n % 16) % 16))) % _MOD
+        if s == 0:
+            # without a carry, the checksum cannot be zero here
+            s = _MOD
+    return s
+
+
+class BSDSum(object):
+    """The BSD checksum, as calculated by the ``sum`` utility.
+
+    Attributes
+    ----------
+    size : int
+        The number of bytes processed.
+    """
+    name = 'sum'
+
+    def __init__(self, data=None):
+        self._value = 0
+        self.size = 0
+        if data is not None:
+            self.update(data)
+
+    def update(self, data):
+        """Update the checksum.
+
+        Parameters
+        ----------
+        data : bytes
+            The data.
+
+        Returns
+        -------
+        None
+        """
+        data = memoryview(data)
+        for i in range(0, len(data), _BSD_BLOCK):
+            self._value = _bsd_sum(self._value, data[i:(i + _BSD_BLOCK)])
+        self.size += len(data)
+
+    @property
+    def value(self):
+        """The checksum.
+
+        Returns
+        -------
+        int
+        """
+        return self._value
+
+    @property
+    def blocks(self):
+        """The number of 1 KB blocks (as reported by ``sum``).
+
+        Returns
+        -------
+        int
+        """
+        return -(-self.size // 1024)
+
+
+def _get_crc32c_table():
+    poly = 0x82f63b78
+    table = np.arange(256, dtype=np.uint32)
+    for _ in range(8):
+        table = np.where(table & 1, (table >> 1) ^ poly, table >> 1)
+    return table.astype(np.uint32)
+
+
+_CRC32C_TABLE = _get_crc32c_table()
+_CRC32C_LIST = _CRC32C_TABLE.tolist()
+# the number of bytes processed per lane
+_CRC32C_LANE = 64
+# the operators for appending zero bytes, for each number of bytes
+_crc32c_shift_ops = {}
+
+
+def _apply_crc32c_op(op, x):
+    """Apply a linear operator to (raw) CRC32C values."""
+    return op[0][x & 0xff] ^ op[1][(x >> 8) & 0xff] ^ \
+        op[2][(x >> 16) & 0xff] ^ op[3][x >> 24]
+
+
+def _get_crc32c_shift_op(num_bytes):
+    """Get the operator that appends zero bytes to CRC32C values.
+
+    The operator is represented by four tables (one for each byte).
+    Only powers of two are supported.
+    """
+    try:
+        return _crc32c_shift_ops[num_bytes]
+    except KeyError:
+        pass
+
+    if num_bytes == 1:
+        v = np.arange(256, dtype=np.uint32)
+        op = (_CRC32C_TABLE, v, v << 8, v << 16)
+    else:
+        assert num_bytes % 2 == 0
+        half = _get_crc32c_shift_op(num_bytes // 2)
+        op = tuple(_apply_crc32c_op(half, t) for t in half)
+    _crc32c_shift_ops[num_bytes] = op
+    return op
+
+
+def _crc32c_bytes(crc, data):
+    """Update a raw CRC32C value, one byte at a time."""
+    table = _CRC32C_LIST
+    for b in bytearray(data):
+        crc = table[(crc ^ b) & 0xff] ^ (crc >> 8)
+    return crc
+
+
+def _crc32c(crc, data):
+    """Update a raw CRC32C value (without the final XOR).
+
+    The data is split into many short lanes, whose CRCs are computed in
+    parallel and then combined pairwise, using the linearity of CRCs.
+    """
+    offset = 0
+    while len(data) - offset >= _MIN_VECTORIZED:
+        # the combination requires a power of two lanes
+        num_lanes = 1 << (((len(data) - offset) // _CRC32C_LANE)
+                          .bit_length() - 1)
+        m = num_lanes * _CRC32C_LANE
+        lanes = np.frombuffer(data, dtype=np.uint8, count=m,
+                              offset=offset).reshape(num_lanes, _CRC32C_LANE)
+        lanes = np.ascontiguousarray(lanes.T)
+        # the initial value is equivalent to XOR'ing it with the first bytes
+        for i in range(4):
+            lanes[i, 0] ^= (crc >> (8*i)) & 0xff
+
+        lane_crcs = np.zeros(num_lanes, dtype=np.uint32)
+        table = _CRC32C_TABLE
+        for i in range(_CRC32C_LANE):
+            x = lane_crcs ^ lanes[i]
+            x &= 0xff
+            lane_crcs >>= 8
+            lane_crcs ^= table[x]
+
+        # combine the lanes
+        size = _CRC32C_LANE
+        while lane_crcs.size > 1:
+            op = _get_crc32c_shift_op(size)
+            lane_crcs = _apply_crc32c_op(op, lane_crcs[0::2]) ^ \
+                lane_crcs[1::2]
+            size *= 2
+
+        crc = int(lane_crcs[0])
+        offset += m
+
+    return _crc32c_bytes(crc, data[offset:])
+
+
+class CRC32C(object):
+    """The CRC32C (Castagnoli) checksum."""
+    name = 'crc32c'
+
+    def __init__(self, data=None):
+        self._crc = 0xffffffff
+        if data is not None:
+            self.update(data)
+
+    def update(self, data):
+        """Update the checksum.
+
+        Parameters
+        ----------
+        data : bytes
+            The data.
+
+        Returns
+        -------
+        None
+        """
+        self._crc = _crc32c(self._crc, data)
+
+    @property
+    def value(self):
+        """The checksum.
+
+        Returns
+        -------
+        int
+        """
+        return self._crc ^ 0xffffffff
+
+
+def _get_hasher(algorithm):
+    if algorithm == 'sum':
+        return BSDSum()
+    elif algorithm == 'crc32c':
+        return CRC32C()
+    else:
+        return hashlib.new(algorithm)
+
+
+def _get_result(hasher):
+    if isinstance(hasher, (BSDSum, CRC32C)):
+        return hasher.value
+    return hasher.hexdigest()
+
+
+def hash_file(path, algorithms=('sum', 'md5', 'crc32c'),
+              chunk_size=4194304):
+    """Calculate checksums and hashes of a file in a single pass.
+
+    The file is read in chunks, so that memory usage does not depend on
+    the file size.
+
+    Parameters
+    ----------
+    path : str or file-like
+        The file path, or a binary file-like object.
+    algorithms : Iterable of str, optional
+        The algorithms. "sum" (the BSD checksum) and "crc32c" are always
+        supported, as well as all algorithms supported by `hashlib.new`
+        (e.g., "md5"). [("sum", "md5", "crc32c")]
+    chunk_size : int, optional
+        The number of bytes to read at once. [4194304]
+
+    Returns
+    -------
+    `collections.OrderedDict` (str => int or str)
+        The result for each algorithm. The "sum" and "crc32c" checksums are
+        integers, all other results are hexadecimal digests.
+    """
+    assert isinstance(chunk_size, int) and chunk_size > 0
+    hashers = [(a, _get_hasher(a)) for a in algorithms]
+
+    def read(fh):
+        while True:
+            chunk = fh.read(chunk_size)
+            if not chunk:
+                break
+            for _, h in hashers:
+                h.update(chunk)
+
+    if isinstance(path, (str, _oldstr)):
+        with io.open(path, 'rb') as fh:
+            read(fh)
+    else:
+        read(path)
+
+    return OrderedDict((a, _get_result(h)) for a, h in hashers)
+
+
+def hash_files(paths, algorithms=('sum', 'md5', 'crc32c'),
+               chunk_size=4194304, num_threads=4):
+    """Calculate checksums and hashes of multiple files in parallel.
+
+    Parameters
+    ----------
+    paths : Iterable of str
+        The file paths.
+    algorithms : Iterable of str, optional
+        See :func:`hash_file`. [("sum", "md5", "crc32c")]
+    chunk_size : int, optional
+        See :func:`hash_file`. [4194304]
+    num_threads : int, optional
+        The number of files to process simultaneously. [4]
+
+    Returns
+    -------
+    `collections.OrderedDict` (str => `collections.OrderedDict`)
+        The results for each file (see :func:`hash_file`).
+    """
+    assert isinstance(num_threads, int) and num_threads >= 1
+    paths = list(paths)
+    algorithms = list(algorithms)
+
+    with ThreadPoolExecutor(max_workers=num_threads) as executor:
+        results = list(executor.map(
+            lambda p: hash_file(p, algorithms, chunk_size), paths))
+    return OrderedDict(zip(paths, results))
@@ -7,7 +7,12 @@
 from .term import GOTerm
 from .ontology import GeneOntology
 from .annotation import GOAnnotation
-from .gaf import parse_gaf, get_goa_gene_sets
+from .annotation_table import GOAnnotationTable
+from .gaf import parse_gaf, get_goa_gene_sets, get_annotation_matrix
+from .similarity import GOSimilarity
+from .annotation_index import GOAnnotationIndex
+from .release_diff import GeneOntologyDiff, GOAnnotationDiff, \
+    update_goa_gene_sets
 from .util import get_current_ontology_date, download_release
 
 #__all__ = ['GOTerm', 'GeneOntology',
@@ -298,7 +298,7 @@ class GOAnnotation(object):
             return 'P'
         elif self.go_term.domain == 'molecular_function':
             return 'F'
-        elif self.go_term_domain == 'cellular_component':
+        elif self.go_term.domain == 'cellular_component':
             return 'C'
         else:
             return None
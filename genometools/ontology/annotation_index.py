@@ -0,0 +1,292 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Module containing the `GOAnnotationIndex` class."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+_oldstr = str
+from builtins import *
+
+import logging
+
+import numpy as np
+from scipy import sparse
+
+from . import GeneOntology
+from .ontology import _pack_strings, _unpack_strings
+from .gaf import get_annotation_matrix
+
+logger = logging.getLogger(__name__)
+
+
+class GOAnnotationIndex(object):
+    """An index of GO annotations, for fast gene and GO term lookups.
+
+    The index stores the direct and the propagated annotations as sparse
+    matrices in both directions (gene-by-term and term-by-gene, in CSR
+    format). The GO terms of a gene and the genes of a GO term can therefore
+    be looked up in time proportional to the size of the result.
+
+    Parameters
+    ----------
+    gene_ontology : `GeneOntology`
+        See :attr:`gene_ontology` attribute.
+    genes : Iterable of str
+        See :attr:`genes` attribute.
+    matrix : `scipy.sparse.spmatrix`
+        The direct annotations, as a gene-by-term matrix (with one column for
+        each GO term, in the order of :attr:`GeneOntology.term_ids`).
+    include_part_of : bool, optional
+        See :attr:`include_part_of` attribute. [True]
+
+    Attributes
+    ----------
+    gene_ontology : `GeneOntology`
+        The Gene Ontology.
+    genes : `numpy.ndarray` of str
+        The annotated genes.
+    include_part_of : bool
+        Whether annotations are propagated along ``part_of`` relations.
+    """
+
+    _npz_version = 1
+
+    def __init__(self, gene_ontology, genes, matrix, include_part_of=True,
+                 _propagated=None):
+
+        assert isinstance(gene_ontology, GeneOntology)
+        assert isinstance(include_part_of, bool)
+
+        genes = np.array(list(genes), dtype=object)
+        matrix = sparse.csr_matrix(matrix, dtype=np.bool_)
+        if matrix.shape != (genes.size, len(gene_ontology)):
+            raise ValueError('The annotation matrix must have one row for '
+                             'each gene and one column for each GO term.')
+
+        self.gene_ontology = gene_ontology
+        self.genes = genes
+        self.include_part_of = include_part_of
+        self._gene_index = dict((g, i) for i, g in enumerate(genes))
+
+        if _propagated is None:
+            _propagated = gene_ontology.propagate_annotations(
+                matrix, include_part_of)
+
+        self._gene_terms = {False: matrix, True: _propagated}
+        self._term_genes = dict(
+            (k, m.T.tocsr()) for k, m in self._gene_terms.items())
+        for m in list(self._gene_terms.values()) + \
+                list(self._term_genes.values()):
+            m.sort_indices()
+
+    def __repr__(self):
+        return '<%s instance (%d genes, %d GO terms, %d annotations)>' \
+               % (self.__class__.__name__, self.genes.size,
+                  len(self.gene_ontology), self._gene_terms[False].nnz)
+
+    def __str__(self):
+        return '<%s instance with %d annotations of %d genes>' \
+               % (self.__class__.__name__, self._gene_terms[False].nnz,
+                  self.genes.size)
+
+    def __contains__(self, gene):
+        return gene in self._gene_index
+
+    @classmethod
+    def from_annotations(cls, go_annotations, gene_ontology,
+                         include_part_of=True):
+        """Create an index from GO annotations.
+
+        Parameters
+        ----------
+        go_annotations : `GOAnnotationTable` or Iterable of `GOAnnotation`
+            The GO annotations.
+        gene_ontology : `GeneOntology`
+            The Gene Ontology.
+        include_part_of : bool, optional
+            Whether to propagate annotations along ``part_of`` relations.
+            [True]
+
+        Returns
+        -------
+        `GOAnnotationIndex`
+            The annotation index.
+        """
+        genes, matrix = get_annotation_matrix(go_annotations, gene_ontology)
+        return cls(gene_ontology, genes, matrix, include_part_of)
+
+    def get_matrix(self, propagated=True, by_term=False):
+        """Get the annotation matrix.
+
+        Parameters
+        ----------
+        propagated : bool, optional
+            Whether to return the propagated annotations. [True]
+        by_term : bool, optional
+            Whether to return the term-by-gene matrix (instead of the
+            gene-by-term matrix). [False]
+
+        Returns
+        -------
+        `scipy.sparse.csr_matrix` of bool
+            The annotation matrix.
+        """
+        if by_term:
+            return self._term_genes[bool(propagated)]
+        return self._gene_terms[bool(propagated)]
+
+    def get_terms(self, gene, propagated=True):
+        """Get the GO terms a gene is annotated with.
+
+        Parameters
+        ----------
+        gene : str
+            The gene.
+        propagated : bool, optional
+            Whether to include all ancestors of the annotated GO terms.
+            [True]
+
+        Returns
+        -------
+        list of str
+            The (sorted) IDs of the GO terms.
+
+        Raises
+        ------
+        KeyError
+            If the gene does not have any annotations.
+        """
+        i = self._gene_index[gene]
+        matrix = self._gene_terms[bool(propagated)]
+        indices = matrix.indices[matrix.indptr[i]:matrix.indptr[i+1]]
+        return self.gene_ontology._get_term_id_array()[indices].tolist()
+
+    def get_genes(self, term_id, propagated=True):
+        """Get the genes annotated with a GO term.
+
+        Parameters
+        ----------
+        term_id : str
+            The GO term ID.
+        propagated : bool, optional
+            Whether to include genes annotated with any descendant of the GO
+            term. [True]
+
+        Returns
+        -------
+        list of str
+            The (sorted) genes.
+
+        Raises
+        ------
+        KeyError
+            If the GO term ID is unknown.
+        """
+        j = self.gene_ontology.get_term_indices(term_id)
+        matrix = self._term_genes[bool(propagated)]
+        indices = matrix.indices[matrix.indptr[j]:matrix.indptr[j+1]]
+        return self.genes[indices].tolist()
+
+    def get_term_counts(self, propagated=True):
+        """Get the number of genes annotated with each GO term.
+
+        Parameters
+        ----------
+        propagated : bool, optional
+            Whether to count propagated annotations. [True]
+
+        Returns
+        -------
+        `numpy.ndarray` of int
+            The number of genes for each GO term (in the order of
+            :attr:`GeneOntology.term_ids`).
+        """
+        return np.diff(self._term_genes[bool(propagated)].indptr)
+
+    def write_npz(self, file):
+        """Store the index in a compact binary format.
+
+        Parameters
+        ----------
+        file: str or file-like
+            The output file.
+
+        Returns
+        -------
+        None
+        """
+        data = {
+            'version': np.int64(self._npz_version),
+            'include_part_of': np.bool_(self.include_part_of),
+        }
+        data['genes'], data['genes_none'] = _pack_strings(self.genes.tolist())
+        data['term_ids'], data['term_ids_none'] = _pack_strings(
+            self.gene_ontology.term_ids)
+        for propagated in [False, True]:
+            name = 'propagated' if propagated else 'direct'
+            matrix = self._gene_terms[propagated]
+            data[name + '_indptr'] = matrix.indptr
+            data[name + '_indices'] = matrix.indices
+        np.savez(file, **data)
+
+    @classmethod
+    def read_npz(cls, file, gene_ontology):
+        """Read an index stored in binary format (see :meth:`write_npz`).
+
+        Parameters
+        ----------
+        file: str or file-like
+            The input file.
+        gene_ontology : `GeneOntology`
+            The Gene Ontology that was used to create the index.
+
+        Returns
+        -------
+        `GOAnnotationIndex`
+            The annotation index.
+
+        Raises
+        ------
+        ValueError
+            If the index was created using a different Gene Ontology.
+        """
+        assert isinstance(gene_ontology, GeneOntology)
+
+        with np.load(file, allow_pickle=False) as data:
+            version = int(data['version'])
+            if version != cls._npz_version:
+                raise ValueError('Unsupported file format version: %d'
+                                 % version)
+            term_ids = _unpack_strings(data['term_ids'],
+                                       data['term_ids_none'])
+            if term_ids != gene_ontology.term_ids:
+                raise ValueError('The annotation index was created using a '
+                                 'different Gene Ontology.')
+            genes = _unpack_strings(data['genes'], data['genes_none'])
+            shape = (len(genes), len(term_ids))
+
+            matrices = {}
+            for propagated in [False, True]:
+                name = 'propagated' if propagated else 'direct'
+                indices = data[name + '_indices']
+                matrices[propagated] = sparse.csr_matrix(
+                    (np.ones(indices.size, dtype=np.bool_), indices,
+                     data[name + '_indptr']), shape=shape)
+            include_part_of = bool(data['include_part_of'])
+
+        return cls(gene_ontology, genes, matrices[False], include_part_of,
+                   _propagated=matrices[True])
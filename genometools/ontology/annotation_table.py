@@ -0,0 +1,288 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Module containing the `GOAnnotationTable` class."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+_oldstr = str
+from builtins import *
+
+import logging
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+import numpy as np
+
+from . import GeneOntology, GOAnnotation
+
+logger = logging.getLogger(__name__)
+
+
+def _get_categorical(values):
+    """Convert a `pandas.Series` to categorical, with NaNs replaced by ''.
+    """
+    if not pd.api.types.is_categorical_dtype(values):
+        values = values.astype('category')
+    if values.isnull().any():
+        if '' not in values.cat.categories:
+            values = values.cat.add_categories([''])
+        values = values.fillna('')
+    return values
+
+
+class GOAnnotationTable(object):
+    """A table of GO annotations, stored in columnar form.
+
+    Each annotation corresponds to one row of the table. The GO term of each
+    annotation is stored as an integer index (see
+    :attr:`GeneOntology.term_ids`), and all other columns are stored as
+    categorical columns. `GOAnnotation` objects are only created when
+    individual annotations are accessed.
+
+    Parameters
+    ----------
+    gene_ontology : `GeneOntology`
+        See :attr:`gene_ontology` attribute.
+    data : `pandas.DataFrame`
+        See :attr:`data` attribute.
+
+    Attributes
+    ----------
+    gene_ontology : `GeneOntology`
+        The Gene Ontology.
+    data : `pandas.DataFrame`
+        The annotation data, with the columns listed in :attr:`columns`
+        (in GAF 2.1 order).
+    """
+
+    columns = [
+        'db', 'db_id', 'db_symbol', 'qualifier', 'go_term', 'db_ref',
+        'ev_code', 'with_from', 'aspect', 'db_name', 'db_syn', 'db_type',
+        'taxon', 'date', 'assigned_by', 'ext', 'product_id'
+    ]
+    """The table columns (in GAF 2.1 order)."""
+
+    def __init__(self, gene_ontology, data):
+
+        assert isinstance(gene_ontology, GeneOntology)
+        assert isinstance(data, pd.DataFrame)
+        assert list(data.columns) == self.columns
+
+        self.gene_ontology = gene_ontology
+        self.data = data
+
+    def __repr__(self):
+        return '<%s instance (%d annotations)>' \
+               % (self.__class__.__name__, len(self))
+
+    def __str__(self):
+        return '<%s instance with %d GO annotations>' \
+               % (self.__class__.__name__, len(self))
+
+    def __len__(self):
+        return len(self.data.index)
+
+    def __getitem__(self, i):
+        return self.get_annotation(i)
+
+    def __iter__(self):
+        columns = self._get_columns()
+        for i in range(len(self)):
+            yield GOAnnotation.from_list(
+                self.gene_ontology,
+                [categories[codes[i]] for categories, codes in columns])
+
+    @property
+    def genes(self):
+        """The gene symbols, corresponding to :attr:`gene_codes`.
+
+        Returns
+        -------
+        `numpy.ndarray` of str
+        """
+        return np.asarray(self.data['db_symbol'].cat.categories,
+                          dtype=object)
+
+    @property
+    def gene_codes(self):
+        """The integer code of the annotated gene, for each annotation.
+
+        Returns
+        -------
+        `numpy.ndarray` of int
+        """
+        return self.data['db_symbol'].cat.codes.values
+
+    @property
+    def term_indices(self):
+        """The index of the annotated GO term, for each annotation.
+
+        Returns
+        -------
+        `numpy.ndarray` of int
+        """
+        return self.data['go_term'].values
+
+    @classmethod
+    def from_gaf_frame(cls, df, gene_ontology):
+        """Create a table from a `pandas.DataFrame` with GAF data.
+
+        Parameters
+        ----------
+        df : `pandas.DataFrame`
+            The GAF data, with (str or categorical) columns labeled by their
+            GAF column position (0-16), as returned by ``pandas.read_csv``
+            with ``header=None``. Missing columns are filled with empty
+            strings.
+        gene_ontology : `GeneOntology`
+            The Gene Ontology. All GO terms must be part of the ontology.
+
+        Returns
+        -------
+        `GOAnnotationTable`
+            The annotation table.
+        """
+        n = len(df.index)
+        data = pd.DataFrame(index=pd.RangeIndex(n))
+        for j, col in enumerate(cls.columns):
+            if j in df.columns:
+                values = df[j]
+            else:
+                values = pd.Series(np.full(n, '', dtype=object))
+
+            if col == 'go_term':
+                data[col] = gene_ontology.get_term_indices(
+                    values.astype(object).values).astype(np.int32)
+            else:
+                data[col] = _get_categorical(values).values
+
+        return cls(gene_ontology, data)
+
+    @classmethod
+    def from_annotations(cls, go_annotations, gene_ontology):
+        """Create a table from a list of `GOAnnotation` objects.
+
+        Parameters
+        ----------
+        go_annotations : Iterable of `GOAnnotation`
+            The GO annotations.
+        gene_ontology : `GeneOntology`
+            The Gene Ontology.
+
+        Returns
+        -------
+        `GOAnnotationTable`
+            The annotation table.
+        """
+        rows = [ann.as_list for ann in go_annotations]
+        df = pd.DataFrame(rows, columns=range(len(cls.columns)),
+                          dtype=object)
+        return cls.from_gaf_frame(df, gene_ontology)
+
+    @classmethod
+    def concat(cls, tables, gene_ontology):
+        """Concatenate annotation tables.
+
+        The categories of each column are merged, so the result is as
+        compact as its inputs.
+
+        Parameters
+        ----------
+        tables : list of `GOAnnotationTable`
+            The tables to concatenate. All tables must be based on
+            ``gene_ontology``.
+        gene_ontology : `GeneOntology`
+            The Gene Ontology.
+
+        Returns
+        -------
+        `GOAnnotationTable`
+            The concatenated table.
+        """
+        tables = list(tables)
+        for t in tables:
+            if t.gene_ontology is not gene_ontology:
+                raise ValueError('The annotation tables must be based on '
+                                 'the same Gene Ontology.')
+
+        if len(tables) == 1:
+            return tables[0]
+        if not tables:
+            return cls.from_gaf_frame(pd.DataFrame(), gene_ontology)
+
+        data = pd.DataFrame(index=pd.RangeIndex(sum(len(t) for t in tables)))
+        for col in cls.columns:
+            if col == 'go_term':
+                data[col] = np.concatenate([t.term_indices for t in tables])
+            else:
+                data[col] = union_categoricals(
+                    [t.data[col].values for t in tables])
+        return cls(gene_ontology, data)
+
+    def _get_columns(self):
+        """Get the categories and codes of each column (in GAF order)."""
+        columns = []
+        for col in self.columns:
+            if col == 'go_term':
+                columns.append((self.gene_ontology._get_term_id_array(),
+                                self.term_indices))
+            else:
+                values = self.data[col].values
+                columns.append((np.asarray(values.categories, dtype=object),
+                                values.codes))
+        return columns
+
+    def get_annotation(self, i):
+        """Get an annotation as a `GOAnnotation` object.
+
+        Parameters
+        ----------
+        i : int
+            The index of the annotation.
+
+        Returns
+        -------
+        `GOAnnotation`
+            The annotation.
+        """
+        return GOAnnotation.from_list(self.gene_ontology, self.get_row(i))
+
+    def get_row(self, i):
+        """Get an annotation as a list of strings (in GAF 2.1 order).
+
+        Parameters
+        ----------
+        i : int
+            The index of the annotation.
+
+        Returns
+        -------
+        list of str
+            The annotation data.
+        """
+        return [categories[codes[i]]
+                for categories, codes in self._get_columns()]
+
+    def to_list(self):
+        """Convert the table to a list of `GOAnnotation` objects.
+
+        Returns
+        -------
+        list of `GOAnnotation`
+            The annotations.
+        """
+        return list(iter(self))
@@ -29,16 +29,22 @@ from collections import OrderedDict, Iterable
 
 import pandas as pd
 import numpy as np
+from scipy import sparse
 
-from . import GOTerm, GeneOntology, GOAnnotation
+from . import GOTerm, GeneOntology, GOAnnotation, GOAnnotationTable
 from .. import misc
 from ..basic import GeneSet, GeneSetCollection
 
 logger = logging.getLogger(__name__)
 
+# columns with few distinct values, which are parsed as categorical columns
+_CATEGORICAL_COLUMNS = ['db', 'qualifier', 'ev_code', 'aspect', 'db_type',
+                        'taxon', 'assigned_by']
+
 
 def parse_gaf(path_or_buffer, gene_ontology, valid_genes=None,
-              db=None, ev_codes=None):
+              db=None, ev_codes=None, as_table=False, chunksize=None,
+              usecols=None):
     """Parse a GAF 2.1 file containing GO annotations.
     
     Parameters
@@ -53,11 +59,26 @@ def parse_gaf(path_or_buffer, gene_ontology, valid_genes=None,
         Select only annotations with this "DB"" value. [None]
     ev_codes : str or set of str, optional
         Select only annotations with this/these evidence codes. [None]
+    as_table : bool, optional
+        Whether to return the annotations as a `GOAnnotationTable`, instead
+        of a list of `GOAnnotation` objects. This is much faster and requires
+        much less memory for large files. [False]
+    chunksize : int, optional
+        If given, read the file in chunks of this many lines. Each chunk is
+        filtered and converted to categorical columns before the next chunk
+        is read, so that memory usage is bounded by the size of the
+        selected annotations, not by the size of the file. The chunks are
+        concatenated with `GOAnnotationTable.concat`. [None]
+    usecols : list of str, optional
+        Only read these columns (see :attr:`GOAnnotationTable.columns`).
+        The columns required for filtering are always read, and all other
+        columns are set to empty strings. For example, only "db_symbol" and
+        "go_term" are needed for generating gene sets. [None]
     
     Returns
     -------
-    list of `GOAnnotation`
-        The list of GO annotations.
+    list of `GOAnnotation`, or `GOAnnotationTable`
+        The GO annotations.
     """
     #if path == '-':
     #    path = sys.stdin
@@ -68,6 +89,8 @@ def parse_gaf(path_or_buffer, gene_ontology, valid_genes=None,
     if (ev_codes is not None) and ev_codes:
         assert isinstance(ev_codes, (str, _oldstr)) or \
                 isinstance(ev_codes, Iterable)
+    if chunksize is not None:
+        assert isinstance(chunksize, (int, np.integer)) and chunksize > 0
 
     if isinstance(ev_codes, str):
         ev_codes = set([ev_codes])
@@ -76,85 +99,260 @@ def parse_gaf(path_or_buffer, gene_ontology, valid_genes=None,
     else:
         ev_codes = None
 
+    if valid_genes is not None:
+        valid_genes = set(valid_genes)
+
+    # determine which columns to read
+    positions = None
+    if usecols is not None:
+        positions = set([0, 2, 4, 6])
+        for col in usecols:
+            if col not in GOAnnotationTable.columns:
+                raise ValueError('Invalid column: "%s"' % col)
+            positions.add(GOAnnotationTable.columns.index(col))
+        positions = sorted(positions)
+
     # open file, if necessary
     if isinstance(path_or_buffer, (str, _oldstr)):
         buffer = misc.gzip_open_text(path_or_buffer, encoding='ascii')
     else:
         buffer = path_or_buffer
 
-    if valid_genes is not None:
-        valid_genes = set(valid_genes)
-
     # use pandas to parse the file quickly
-    df = pd.read_csv(buffer, sep='\t', comment='!', header=None, dtype=_oldstr)
+    # (without NaN detection, so that missing values are empty strings);
+    # columns with few distinct values are parsed directly as categorical
+    # columns, to avoid creating a string object for each of their values
+    categorical = set(GOAnnotationTable.columns.index(col)
+                      for col in _CATEGORICAL_COLUMNS)
+    dtype = dict((j, 'category' if j in categorical else _oldstr)
+                 for j in range(len(GOAnnotationTable.columns)))
+    try:
+        reader = pd.read_csv(
+            buffer, sep='\t', comment='!', header=None, dtype=dtype,
+            na_filter=False, usecols=positions, chunksize=chunksize)
+        if chunksize is None:
+            reader = [reader]
+
+        all_go_term_ids = set(gene_ontology._term_dict.keys())
+        stats = OrderedDict()
+        tables = []
+        for df in reader:
+            df = _filter_gaf_chunk(df, stats, all_go_term_ids, valid_genes,
+                                   db, ev_codes)
+            for j in categorical.intersection(df.columns):
+                df[j] = df[j].cat.remove_unused_categories()
+            tables.append(GOAnnotationTable.from_gaf_frame(
+                df, gene_ontology))
+    finally:
+        if buffer is not path_or_buffer:
+            buffer.close()
+
+    for msg, (excluded, total) in stats.items():
+        logger.info(msg, excluded, total, 100*(excluded/float(max(total, 1))))
+
+    table = GOAnnotationTable.concat(tables, gene_ontology)
+    logger.info('Read %d GO annotations.', len(table))
+
+    if as_table:
+        return table
+
+    # convert each row into a GOAnnotation object
+    return table.to_list()
+
 
-    # replace pandas' NaNs with empty strings
-    df.fillna('', inplace=True)
+def _filter_gaf_chunk(df, stats, all_go_term_ids, valid_genes=None,
+                      db=None, ev_codes=None):
+    """Filter the annotations in a chunk of a GAF file.
+
+    The number of excluded annotations are added to ``stats``.
+    """
+    filters = []
 
     # exclude annotations with unknown Gene Ontology terms
-    all_go_term_ids = set(gene_ontology._term_dict.keys())
-    sel = df.iloc[:, 4].isin(all_go_term_ids)
-    logger.info(
-        'Ignoring %d / %d annotations (%.1f %%) with unknown GO terms.',
-        (~sel).sum(), sel.size, 100*((~sel).sum()/float(sel.size)))
-    df = df.loc[sel]
+    filters.append(
+        ('Ignoring %d / %d annotations (%.1f %%) with unknown GO terms.',
+         4, lambda x: x.isin(all_go_term_ids)))
 
     # filter rows for valid genes
     if valid_genes is not None:
-        sel = df.iloc[:, 2].isin(valid_genes)
-        logger.info(
-            'Ignoring %d / %d annotations (%.1f %%) with unknown genes.',
-            (~sel).sum(), sel.size, 100*((~sel).sum()/float(sel.size)))
-        df = df.loc[sel]
+        filters.append(
+            ('Ignoring %d / %d annotations (%.1f %%) with unknown genes.',
+             2, lambda x: x.isin(valid_genes)))
 
     # filter rows for DB value
     if db is not None:
-        sel = (df.iloc[:, 0] == db)
-        logger.info(
-            'Excluding %d / %d annotations (%.1f %%) with wrong DB values.',
-            (~sel).sum(), sel.size, 100*((~sel).sum()/float(sel.size)))
-        df = df.loc[sel]
+        filters.append(
+            ('Excluding %d / %d annotations (%.1f %%) with wrong DB '
+             'values.', 0, lambda x: x == db))
 
     # filter rows for evidence value
     if ev_codes is not None:
-        sel = (df.iloc[:, 6].isin(ev_codes))
-        logger.info(
-            'Excluding %d / %d annotations (%.1f %%) based on evidence code.',
-            (~sel).sum(), sel.size, 100*((~sel).sum()/float(sel.size)))
+        filters.append(
+            ('Excluding %d / %d annotations (%.1f %%) based on evidence '
+             'code.', 6, lambda x: x.isin(ev_codes)))
+
+    for msg, col, test in filters:
+        sel = test(df[col])
+        excluded, total = stats.get(msg, (0, 0))
+        stats[msg] = (excluded + int((~sel).sum()), total + sel.size)
         df = df.loc[sel]
 
-    # convert each row into a GOAnnotation object
-    go_annotations = []
-    for i, l in df.iterrows():
-        ann = GOAnnotation.from_list(gene_ontology, l.tolist())
-        go_annotations.append(ann)
-    logger.info('Read %d GO annotations.', len(go_annotations))
+    return df
+
+
+def _get_annotation_matrix(go_annotations, gene_ontology=None):
+    """Convert GO annotations to a sparse gene-by-term matrix.
+
+    If ``gene_ontology`` is given (or the annotations are provided as a
+    `GOAnnotationTable`), the columns correspond to all terms of the ontology
+    (in the order of :attr:`GeneOntology.term_ids`), otherwise only to the
+    annotated terms (in sorted order).
+
+    Returns
+    -------
+    genes : `numpy.ndarray` of str
+        The (sorted) gene symbols, corresponding to the matrix rows.
+    terms : list of `GOTerm`
+        The GO terms corresponding to the matrix columns.
+    matrix : `scipy.sparse.csr_matrix` of bool
+        The annotation matrix.
+    """
+    if isinstance(go_annotations, GOAnnotationTable):
+        if gene_ontology is None:
+            gene_ontology = go_annotations.gene_ontology
+        elif gene_ontology is not go_annotations.gene_ontology:
+            raise ValueError('The annotation table is based on a different '
+                             'Gene Ontology.')
+        genes = go_annotations.genes
+        terms = [gene_ontology[id_] for id_ in gene_ontology.term_ids]
+        matrix = sparse.coo_matrix(
+            (np.ones(len(go_annotations), dtype=np.bool_),
+             (go_annotations.gene_codes, go_annotations.term_indices)),
+            shape=(genes.size, len(terms))).tocsr()
+        return genes, terms, matrix
+
+    symbols = []
+    term_ids = []
+    term_dict = {}
+    for ann in go_annotations:
+        symbols.append(ann.db_symbol)
+        term_ids.append(ann.go_term.id)
+        term_dict[ann.go_term.id] = ann.go_term
 
-    return go_annotations
+    genes, rows = np.unique(np.array(symbols, dtype=object),
+                            return_inverse=True)
+    if gene_ontology is not None:
+        terms = [gene_ontology[id_] for id_ in gene_ontology.term_ids]
+        cols = gene_ontology.get_term_indices(term_ids)
+    else:
+        all_ids, cols = np.unique(np.array(term_ids, dtype=object),
+                                  return_inverse=True)
+        terms = [term_dict[id_] for id_ in all_ids]
+
+    matrix = sparse.coo_matrix(
+        (np.ones(rows.size, dtype=np.bool_), (rows, cols)),
+        shape=(genes.size, len(terms))).tocsr()
+    return genes, terms, matrix
+
+
+def get_annotation_matrix(go_annotations, gene_ontology):
+    """Convert GO annotations to a sparse gene-by-term matrix.
 
+    Parameters
+    ----------
+    go_annotations : `GOAnnotationTable` or Iterable of `GOAnnotation`
+        The GO annotations.
+    gene_ontology : `GeneOntology`
+        The Gene Ontology.
 
-def get_goa_gene_sets(go_annotations):
+    Returns
+    -------
+    genes : `numpy.ndarray` of str
+        The gene symbols, corresponding to the matrix rows.
+    matrix : `scipy.sparse.csr_matrix` of bool
+        The annotation matrix, with one column for each GO term (in the order
+        of :attr:`GeneOntology.term_ids`).
+    """
+    genes, _, matrix = _get_annotation_matrix(go_annotations, gene_ontology)
+    return genes, matrix
+
+
+def get_goa_gene_sets(go_annotations, gene_ontology=None, propagate=False,
+                      include_part_of=True, min_genes=None, max_genes=None):
     """Generate a list of gene sets from a collection of GO annotations.
 
     Each gene set corresponds to all genes annotated with a certain GO term.
+
+    Parameters
+    ----------
+    go_annotations : `GOAnnotationTable` or Iterable of `GOAnnotation`
+        The GO annotations.
+    gene_ontology : `GeneOntology`, optional
+        The Gene Ontology. Required if ``propagate`` is True, unless the
+        annotations are provided as a `GOAnnotationTable`. [None]
+    propagate : bool, optional
+        Whether to propagate annotations to all ancestors of the annotated
+        GO terms (the "true path rule"). [False]
+    include_part_of : bool, optional
+        Whether to propagate annotations along ``part_of`` relations (in
+        addition to ``is_a`` relations). [True]
+    min_genes : int, optional
+        Exclude gene sets with fewer genes. [None]
+    max_genes : int, optional
+        Exclude gene sets with more genes. [None]
+
+    Returns
+    -------
+    `GeneSetCollection`
+        The gene sets (in the order of their GO term IDs).
+
+    Notes
+    -----
+    Annotations are propagated by multiplying the (sparse) gene-by-term
+    annotation matrix with the ancestor closure matrix of the ontology (see
+    :meth:`GeneOntology.propagate_annotations`).
     """
-    go_term_genes = OrderedDict()
-    term_ids = {}
-    for ann in go_annotations:
-        term_ids[ann.go_term.id] = ann.go_term
-        try:
-            go_term_genes[ann.go_term.id].append(ann.db_symbol)
-        except KeyError:
-            go_term_genes[ann.go_term.id] = [ann.db_symbol]
-    
-    go_term_genes = OrderedDict(sorted(go_term_genes.items()))
+    if isinstance(go_annotations, GOAnnotationTable) and \
+            gene_ontology is None:
+        gene_ontology = go_annotations.gene_ontology
+
+    if propagate and gene_ontology is None:
+        raise ValueError('Propagating annotations requires the Gene '
+                         'Ontology.')
+
+    genes, terms, matrix = _get_annotation_matrix(
+        go_annotations, gene_ontology)
+
+    if propagate:
+        matrix = gene_ontology.propagate_annotations(matrix, include_part_of)
+
+    return _get_gene_sets(genes, terms, matrix, min_genes, max_genes)
+
+
+def _get_gene_sets(genes, terms, matrix, min_genes=None, max_genes=None):
+    """Generate gene sets from the columns of a gene-by-term matrix."""
+    matrix = sparse.csc_matrix(matrix)
+    matrix.eliminate_zeros()
+    matrix.sort_indices()
+
+    sizes = np.diff(matrix.indptr)
+    sel = sizes > 0
+    if min_genes is not None:
+        sel &= (sizes >= min_genes)
+    if max_genes is not None:
+        sel &= (sizes <= max_genes)
+    logger.info('Generating %d gene sets (excluding %d based on their '
+                'size).', sel.sum(), (sizes > 0).sum() - sel.sum())
+
     gene_sets = []
-    for tid, genes in go_term_genes.items():
-        go_term = term_ids[tid]
-        gs = GeneSet(id=tid, name=go_term.name, genes=genes,
+    for j in np.nonzero(sel)[0]:
+        go_term = terms[j]
+        gs = GeneSet(id=go_term.id, name=go_term.name,
+                     genes=genes[matrix.indices[
+                         matrix.indptr[j]:matrix.indptr[j+1]]],
                      source='GO',
                      collection=go_term.domain_short,
                      description=go_term.definition)
         gene_sets.append(gs)
     gene_sets = GeneSetCollection(gene_sets)
-    return gene_sets
\ No newline at end of file
+    return gene_sets
@@ -19,11 +19,16 @@
 
 from __future__ import (absolute_import, division,
                         print_function, unicode_literals)
+_oldstr = str
 from builtins import *
 
+import os
+import re
+import gc
 import gzip
 import hashlib
-# import re
+import tempfile
+import contextlib
 import six
 # import sys
 import logging
@@ -31,6 +36,8 @@ import logging
 
 from collections import OrderedDict, Iterable
 
+import numpy as np
+from scipy import sparse
 import unicodecsv as csv
 
 from genometools import misc
@@ -43,6 +50,60 @@ else:
 
 logger = logging.getLogger(__name__)
 
+# a quoted string in an OBO value (with escaped quotes)
+_quoted_pattern = re.compile(r'"((?:[^"\\]|\\.)*)"')
+
+
+@contextlib.contextmanager
+def _gc_paused():
+    """Temporarily disable the garbage collector.
+
+    Creating tens of thousands of `GOTerm` objects otherwise triggers many
+    (useless) garbage collection passes.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _pack_strings(strings):
+    """Pack a list of strings (or `None`) into a `numpy.ndarray` of bytes.
+
+    Returns the packed strings and a boolean mask indicating `None` values.
+    """
+    is_none = np.array([s is None for s in strings], dtype=np.bool_)
+    strings = ['' if s is None else s for s in strings]
+    if any('\0' in s for s in strings):
+        raise ValueError('Cannot pack strings containing null characters.')
+    packed = '\0'.join(strings).encode('UTF-8')
+    return np.frombuffer(packed, dtype=np.uint8), is_none
+
+
+def _unpack_strings(packed, is_none):
+    """Unpack strings packed with `_pack_strings`."""
+    if not is_none.size:
+        return []
+    strings = packed.tobytes().decode('UTF-8').split('\0')
+    return [None if n else s for s, n in zip(strings, is_none)]
+
+
+def _get_indptr(arrays):
+    """Get the CSR index pointer for a list of index arrays."""
+    indptr = np.zeros(len(arrays) + 1, dtype=np.int32)
+    np.cumsum([a.size for a in arrays], out=indptr[1:])
+    return indptr
+
+
+def _concatenate(arrays):
+    """Concatenate a list of index arrays (which may be empty)."""
+    if not arrays:
+        return np.zeros(0, dtype=np.int32)
+    return np.concatenate(arrays).astype(np.int32)
+
 
 class GeneOntology(object):
     """A Gene Ontology.
@@ -76,7 +137,12 @@ class GeneOntology(object):
     >>> ontology = GeneOntology.read_obo('go-basic.obo')
     """
     # TODO: finish docstring
-    def __init__(self, terms=None, syn2id=None, alt_id=None, name2id=None):
+
+    _npz_version = 2
+    """Version of the binary format used by `write_npz`."""
+
+    def __init__(self, terms=None, syn2id=None, alt_id=None, name2id=None,
+                 obsolete_ids=None):
 
         if terms is None:
             terms = []
@@ -90,21 +156,34 @@ class GeneOntology(object):
         if name2id is None:
             name2id = {}
 
+        if obsolete_ids is None:
+            obsolete_ids = set()
+
         assert isinstance(terms, Iterable)
         assert isinstance(syn2id, dict)
         assert isinstance(alt_id, dict)
         assert isinstance(name2id, dict)
+        assert isinstance(obsolete_ids, Iterable)
 
         term_dict = {}
         for t in terms:
             term_dict[t.id] = t
+            t._ontology = self
         self._term_dict = term_dict
 
         self.syn2id = syn2id
         self.alt_id = alt_id
         self.name2id = name2id
+        self.obsolete_ids = set(obsolete_ids)
         self._flattened = False
 
+        # the sorted term IDs, and the cached ancestor/descendant closures
+        # (see `get_ancestor_matrix`)
+        self._term_id_array = None
+        self._term_index = None
+        self._closures = {}
+        self._flatten_params = {}
+
     def __repr__(self):
         return '<%s instance (%d GO terms, hash="%s")>' \
                % (self.__class__.__name__, len(self), self.hash)
@@ -130,9 +209,14 @@ class GeneOntology(object):
     def __setitem__(self, key, value):
         assert isinstance(value, GOTerm)
         self._term_dict[key] = value
+        value._ontology = self
+        self._clear_cache()
 
     def __delitem__(self, key):
-        del self._term_dict[key]
+        term = self._term_dict.pop(key)
+        if term._ontology is self:
+            term._ontology = None
+        self._clear_cache()
 
     def __len__(self):
         return len(self._term_dict)
@@ -200,10 +284,134 @@ class GeneOntology(object):
         `GOParser`
             The GOParser object stored in the pickle file.
         """
-        with misc.open_plain_or_gzip(fn, 'rb') as fh:
+        with misc.smart_open_read(fn, 'rb', try_gzip=True) as fh:
             parser = pickle.load(fh)
         return parser
 
+    def write_npz(self, file):
+        """Store the ontology in a compact binary format.
+
+        All GO term data, relations and the ancestor closure are stored as
+        numpy arrays (see `numpy.savez`), which is much faster to read than
+        a pickle of the object graph.
+
+        Parameters
+        ----------
+        file: str or file-like
+            The output file.
+
+        Returns
+        -------
+        None
+        """
+        terms = [self[id_] for id_ in self._get_term_id_array()]
+        data = {'version': np.int64(self._npz_version)}
+
+        for attr in ['id', 'name', 'domain', 'definition']:
+            data[attr], data[attr + '_none'] = _pack_strings(
+                [getattr(t, attr) for t in terms])
+
+        for rel in ['is_a', 'part_of']:
+            matrix = self.get_relation_matrix(rel)
+            data[rel + '_indptr'] = matrix.indptr
+            data[rel + '_indices'] = matrix.indices
+
+        for attr in ['syn2id', 'alt_id', 'name2id']:
+            d = getattr(self, attr)
+            keys = list(d.keys())
+            data[attr + '_keys'], data[attr + '_keys_none'] = \
+                _pack_strings(keys)
+            data[attr + '_values'] = self.get_term_indices(
+                [d[k] for k in keys])
+        data['obsolete'] = self.get_term_indices(sorted(self.obsolete_ids))
+
+        for include_part_of in [True, False]:
+            key = ('ancestors', include_part_of)
+            if include_part_of or key in self._closures:
+                closure = self.get_ancestor_matrix(include_part_of)
+                name = 'ancestors_%d' % int(include_part_of)
+                data[name + '_indptr'] = closure.indptr
+                data[name + '_indices'] = closure.indices
+
+        np.savez(file, **data)
+
+    @classmethod
+    def read_npz(cls, file, flatten=True):
+        """Read an ontology stored in binary format (see :meth:`write_npz`).
+
+        Parameters
+        ----------
+        file: str or file-like
+            The input file.
+        flatten: bool, optional
+            If set to False, do not flatten the ontology.
+
+        Returns
+        -------
+        `GeneOntology`
+            The Gene Ontology.
+        """
+        with _gc_paused():
+            with np.load(file, allow_pickle=False) as data:
+                version = int(data['version'])
+                if version != cls._npz_version:
+                    raise ValueError('Unsupported file format version: %d'
+                                     % version)
+                fields = {}
+                for attr in ['id', 'name', 'domain', 'definition']:
+                    fields[attr] = _unpack_strings(
+                        data[attr], data[attr + '_none'])
+                term_ids = fields['id']
+                n = len(term_ids)
+
+                def get_matrix(name):
+                    indices = data[name + '_indices']
+                    return sparse.csr_matrix(
+                        (np.ones(indices.size, dtype=np.bool_), indices,
+                         data[name + '_indptr']), shape=(n, n))
+
+                def get_relations(matrix):
+                    indptr = matrix.indptr.tolist()
+                    indices = matrix.indices.tolist()
+                    return [[term_ids[j]
+                             for j in indices[indptr[i]:indptr[i+1]]]
+                            for i in range(n)]
+
+                closures = {}
+                for rel in ['is_a', 'part_of']:
+                    closures[(rel,)] = get_matrix(rel)
+                for include_part_of in [True, False]:
+                    name = 'ancestors_%d' % int(include_part_of)
+                    if name + '_indptr' in data:
+                        closures[('ancestors', include_part_of)] = \
+                            get_matrix(name)
+
+                mappings = []
+                for attr in ['syn2id', 'alt_id', 'name2id']:
+                    keys = _unpack_strings(data[attr + '_keys'],
+                                           data[attr + '_keys_none'])
+                    values = [term_ids[i] for i in data[attr + '_values']]
+                    mappings.append(dict(zip(keys, values)))
+                obsolete_ids = [term_ids[i] for i in data['obsolete']]
+
+            terms = [GOTerm(*args) for args in zip(
+                fields['id'], fields['name'], fields['domain'],
+                fields['definition'],
+                get_relations(closures[('is_a',)]),
+                get_relations(closures[('part_of',)]))]
+            ontology = cls(terms, *mappings, obsolete_ids=obsolete_ids)
+
+            # the term IDs were stored in sorted order
+            ontology._get_term_id_array()
+            ontology._closures.update(closures)
+
+            if flatten:
+                ontology._flatten_ancestors()
+                ontology._flatten_descendants()
+                ontology._flattened = True
+
+            return ontology
+
     def get_term_by_id(self, id_):
         """Get the GO term corresponding to the given GO term ID.
 
@@ -258,10 +466,10 @@ class GeneOntology(object):
         """
         term = None
         try:
-            term = self.terms[self.name2id[name]]
+            term = self[self.name2id[name]]
         except KeyError:
             try:
-                term = self.terms[self.syn2id[name]]
+                term = self[self.syn2id[name]]
             except KeyError:
                 pass
             else:
@@ -274,13 +482,14 @@ class GeneOntology(object):
         return term
 
     @classmethod
-    def read_obo(cls, path, flatten=True, part_of_cc_only=False):
+    def read_obo(cls, path, flatten=True, part_of_cc_only=False,
+                 cache_dir=None):
         """ Parse an OBO file and store GO term information.
 
         Parameters
         ----------
         path: str
-            Path of the OBO file.
+            Path of the OBO file. The file can be gzip'ed.
         flatten: bool, optional
             If set to False, do not generate a list of all ancestors and
             descendants for each GO term.
@@ -288,79 +497,781 @@ class GeneOntology(object):
             Legacy parameter for backwards compatibility. If set to True,
             ignore ``part_of`` relations outside the ``cellular_component``
             domain.
+        cache_dir: str, optional
+            Directory for caching the parsed ontology in binary format (see
+            :meth:`write_npz`). The cache file is keyed by the MD5 checksum
+            of the OBO file, so changes to the file are detected
+            automatically. [None]
 
-        Notes
-        -----
-        The OBO file must end with a line break.
+        Returns
+        -------
+        `GeneOntology`
+            The Gene Ontology.
+        """
+        cache_file = None
+        if cache_dir is not None:
+            cache_file = os.path.join(cache_dir, 'go_%s_%d_v%d.npz' % (
+                misc.get_file_md5sum(path), int(part_of_cc_only),
+                cls._npz_version))
+            if os.path.isfile(cache_file):
+                logger.info('Reading cached ontology from "%s"...',
+                            cache_file)
+                return cls.read_npz(cache_file, flatten=flatten)
+
+        ontology = cls._parse_obo(path, part_of_cc_only)
+
+        if flatten:
+            logger.info('Flattening ancestors...')
+            ontology._flatten_ancestors()
+            logger.info('Flattening descendants...')
+            ontology._flatten_descendants()
+            ontology._flattened = True
+
+        if cache_file is not None:
+            # (the ancestor closure is stored regardless of `flatten`)
+            misc.make_sure_dir_exists(cache_dir, create_subfolders=True)
+            # write to a temporary file first, in case of concurrent access
+            tf = tempfile.NamedTemporaryFile(
+                dir=cache_dir, suffix='.npz', delete=False)
+            try:
+                with tf:
+                    ontology.write_npz(tf)
+                os.rename(tf.name, cache_file)
+            except:
+                os.remove(tf.name)
+                raise
+
+        return ontology
+
+    @staticmethod
+    def _parse_obo_stanzas(fh):
+        """Generate the tag-value pairs of each [Term] stanza of an OBO file.
+
+        Tags can appear in any order, trailing modifiers and comments
+        (`` ! ...``) are kept as part of the values, and the last stanza does
+        not need to be followed by a blank line.
         """
+        stanza = None
+        for l in fh:
+            l = l.rstrip('\r\n')
+            if not l:
+                continue
+            if l.startswith('['):
+                if stanza is not None:
+                    yield stanza
+                stanza = [] if l == '[Term]' else None
+            elif stanza is not None and not l.startswith('!'):
+                tag, _, value = l.partition(':')
+                stanza.append((tag, value.strip()))
+        if stanza is not None:
+            yield stanza
 
+    @staticmethod
+    def _split_quoted(value):
+        """Split an OBO value into its (unescaped) quoted text and the rest.
+        """
+        m = _quoted_pattern.match(value)
+        if m is None:
+            return value, ''
+        return m.group(1).replace('\\"', '"'), value[m.end():]
+
+    @classmethod
+    def _parse_obo(cls, path, part_of_cc_only=False):
+        """Parse an OBO file (without flattening)."""
         name2id = {}
         alt_id = {}
         syn2id = {}
+        obsolete_ids = []
         terms = []
 
-        with open(path) as fh:
-            n = 0
-            while True:
-                try:
-                    nextline = next(fh)
-                except StopIteration:
-                    break
-                if nextline == '[Term]\n':
-                    n += 1
-                    id_ = next(fh)[4:-1]
-                    # acc = get_acc(id_)
-                    name = next(fh)[6:-1]
-                    name2id[name] = id_
-                    domain = next(fh)[11:-1]
-                    def_ = None
-                    is_a = set()
+        with misc.gzip_open_text(path, encoding='UTF-8') as fh, \
+                _gc_paused():
+            for stanza in cls._parse_obo_stanzas(fh):
+                id_ = None
+                name = None
+                domain = None
+                def_ = None
+                is_a = set()
+                part_of = set()
+                alt_ids = []
+                synonyms = []
+                is_obsolete = False
+                for tag, value in stanza:
+                    if tag == 'id':
+                        id_ = value
+                    elif tag == 'name':
+                        name = value
+                    elif tag == 'namespace':
+                        domain = value
+                    elif tag == 'alt_id':
+                        alt_ids.append(value)
+                    elif tag == 'is_obsolete':
+                        is_obsolete = (value == 'true')
+                    elif tag == 'def':
+                        def_ = cls._split_quoted(value)[0]
+                    elif tag == 'is_a':
+                        is_a.add(value.split(None, 1)[0])
+                    elif tag == 'synonym':
+                        syn, rest = cls._split_quoted(value)
+                        if rest.split()[:1] == ['EXACT']:
+                            synonyms.append(syn)
+                    elif tag == 'relationship':
+                        rel = value.split()
+                        if rel[0] == 'part_of':
+                            part_of.add(rel[1])
+
+                if id_ is None or name is None:
+                    logger.warning('Skipping [Term] stanza without ID or '
+                                   'name.')
+                    continue
+                if part_of_cc_only and domain != 'cellular_component':
                     part_of = set()
-                    l = next(fh)
-                    while l != '\n':
-                        if l.startswith('alt_id:'):
-                            alt_id[l[8:-1]] = id_
-                        elif l.startswith('def: '):
-                            idx = l[6:].index('"')
-                            def_ = l[6:(idx+6)]
-                        elif l.startswith('is_a:'):
-                            is_a.add(l[6:16])
-                        elif l.startswith('synonym:'):
-                            idx = l[10:].index('"')
-                            if l[(10+idx+2):].startswith("EXACT"):
-                                s = l[10:(10+idx)]
-                                syn2id[s] = id_
-                        elif l.startswith('relationship: part_of'):
-                            if part_of_cc_only:
-                                if domain == 'cellular_component':
-                                    part_of.add(l[22:32])
-                            else:
-                                part_of.add(l[22:32])
-                        l = next(fh)
-                    assert def_ is not None
-                    terms.append(GOTerm(id_, name, domain, def_, is_a, part_of))
-
-        logger.info('Parsed %d GO term definitions.', n)
-
-        ontology = cls(terms, syn2id, alt_id, name2id)
-
-        # store children and parts
-        logger.info('Adding child and part relationships...')
-        for term in ontology:
-            for parent in term.is_a:
-                ontology[parent].children.add(term.id)
-            for whole in term.part_of:
-                ontology[whole].parts.add(term.id)
 
-        if flatten:
-            logger.info('Flattening ancestors...')
-            ontology._flatten_ancestors()
-            logger.info('Flattening descendants...')
-            ontology._flatten_descendants()
-            ontology._flattened = True
+                name2id[name] = id_
+                for a in alt_ids:
+                    alt_id[a] = id_
+                for syn in synonyms:
+                    syn2id[syn] = id_
+                if is_obsolete:
+                    obsolete_ids.append(id_)
+                terms.append(GOTerm(id_, name, domain, def_, is_a, part_of))
+
+        logger.info('Parsed %d GO term definitions.', len(terms))
+
+        return cls(terms, syn2id, alt_id, name2id, obsolete_ids)
+
+    def _get_topological_order(self, include_part_of=True):
+        """Sort all GO terms so that each term comes after its parents.
+
+        Uses Kahn's algorithm, so it does not rely on recursion.
+
+        Parameters
+        ----------
+        include_part_of: bool, optional
+            Whether to treat ``part_of`` relations as parent relations.
+
+        Returns
+        -------
+        list of int
+            The indices of all GO terms (see :attr:`term_ids`), in
+            topological order.
+
+        Raises
+        ------
+        ValueError
+            If the relations between GO terms contain a cycle.
+        """
+        parents = self._get_parent_matrix(include_part_of)
+        children = parents.T.tocsr()
+        indptr = children.indptr.tolist()
+        indices = children.indices.tolist()
+        num_parents = np.diff(parents.indptr).tolist()
+
+        order = [i for i, n in enumerate(num_parents) if n == 0]
+        k = 0
+        while k < len(order):
+            i = order[k]
+            for j in indices[indptr[i]:indptr[i+1]]:
+                num_parents[j] -= 1
+                if num_parents[j] == 0:
+                    order.append(j)
+            k += 1
+
+        if len(order) < len(num_parents):
+            raise ValueError('The GO term relations contain a cycle!')
+
+        return order
+
+    def get_relation_matrix(self, relation='is_a'):
+        """Get the direct relations between all GO terms as a sparse matrix.
+
+        Parameters
+        ----------
+        relation: str, optional
+            The type of relation. One of "is_a", "part_of" (row *i*
+            indicates the parents/wholes of the *i*-th GO term), "children",
+            or "parts" (row *i* indicates the children/parts of the *i*-th GO
+            term). ["is_a"]
+
+        Returns
+        -------
+        `scipy.sparse.csr_matrix` of bool
+            Square matrix, with terms in the order of :attr:`term_ids`.
+
+        Raises
+        ------
+        KeyError
+            If a relation refers to an unknown GO term.
+        """
+        if relation not in ['is_a', 'part_of', 'children', 'parts']:
+            raise ValueError('Invalid relation: "%s"' % relation)
+
+        key = (relation,)
+        try:
+            return self._closures[key]
+        except KeyError:
+            pass
+
+        if relation in ['children', 'parts']:
+            inverse = 'is_a' if relation == 'children' else 'part_of'
+            matrix = self.get_relation_matrix(inverse).T.tocsr()
+            matrix.sort_indices()
+        else:
+            term_ids = self._get_term_id_array()
+            n = term_ids.size
+            rows = [np.sort(self.get_term_indices(
+                getattr(self[id_], '_' + relation))) for id_ in term_ids]
+            indices = _concatenate(rows)
+            matrix = sparse.csr_matrix(
+                (np.ones(indices.size, dtype=np.bool_), indices,
+                 _get_indptr(rows)), shape=(n, n))
+
+        self._closures[key] = matrix
+        return matrix
+
+    def _get_parent_matrix(self, include_part_of=True):
+        """Get the direct parents of all GO terms as a sparse matrix."""
+        parents = self.get_relation_matrix('is_a')
+        if include_part_of:
+            parents = (parents + self.get_relation_matrix('part_of')).tocsr()
+            parents.sort_indices()
+        return parents
+
+    @property
+    def term_ids(self):
+        """The IDs of all GO terms, in the order of the closure matrices.
+
+        Returns
+        -------
+        list of str
+            The sorted list of GO term IDs.
+        """
+        return list(self._get_term_id_array())
+
+    def _get_term_id_array(self):
+        """Get the sorted GO term IDs as a `numpy.ndarray` of objects."""
+        if self._term_id_array is None:
+            self._term_id_array = np.array(sorted(self._term_dict.keys()),
+                                           dtype=object)
+            self._term_index = dict(
+                (id_, i) for i, id_ in enumerate(self._term_id_array))
+        return self._term_id_array
+
+    def get_term_indices(self, term_ids):
+        """Get the indices of GO terms in the closure matrices.
+
+        Parameters
+        ----------
+        term_ids: str or Iterable of str
+            A GO term ID, or a list of GO term IDs.
+
+        Returns
+        -------
+        int or `numpy.ndarray` of int
+            The index, or the array of indices.
+
+        Raises
+        ------
+        KeyError
+            If a GO term ID is unknown.
+        """
+        self._get_term_id_array()
+        if isinstance(term_ids, (str, _oldstr)):
+            return self._term_index[term_ids]
+        return np.array([self._term_index[id_] for id_ in term_ids],
+                        dtype=np.int64)
+
+    def _clear_cache(self):
+        """Discard the term index and all cached closures."""
+        self._term_id_array = None
+        self._term_index = None
+        self._closures = {}
+
+    def get_ancestor_matrix(self, include_part_of=True):
+        """Get the ancestor closure of all GO terms as a sparse matrix.
+
+        The closure is computed once in topological order, i.e., the
+        ancestors of each term are assembled from the (already computed)
+        ancestors of its parents. The result is cached separately for each
+        value of ``include_part_of``.
+
+        Parameters
+        ----------
+        include_part_of: bool, optional
+            Whether to include ``part_of`` relations in determining
+            ancestors.
+
+        Returns
+        -------
+        `scipy.sparse.csr_matrix` of bool
+            Square matrix, in which row *i* indicates the ancestors of the
+            *i*-th GO term (see :attr:`term_ids`). Terms are not considered
+            their own ancestors.
+        """
+        key = ('ancestors', include_part_of)
+        try:
+            return self._closures[key]
+        except KeyError:
+            pass
+
+        n = self._get_term_id_array().size
+        parents = self._get_parent_matrix(include_part_of)
+        rows = [None] * n
+        for i in self._get_topological_order(include_part_of):
+            p = parents.indices[parents.indptr[i]:parents.indptr[i+1]]
+            if p.size > 0:
+                rows[i] = np.unique(np.concatenate(
+                    [p] + [rows[j] for j in p]))
+            else:
+                rows[i] = p
+
+        indices = _concatenate(rows)
+        data = np.ones(indices.size, dtype=np.bool_)
+        closure = sparse.csr_matrix((data, indices, _get_indptr(rows)),
+                                    shape=(n, n))
+
+        self._closures[key] = closure
+        return closure
+
+    def get_descendant_matrix(self, include_parts=True):
+        """Get the descendant closure of all GO terms as a sparse matrix.
+
+        This is the transpose of the ancestor closure (see
+        :meth:`get_ancestor_matrix`), and it is cached separately for each
+        value of ``include_parts``.
+
+        Parameters
+        ----------
+        include_parts: bool, optional
+            Whether to include ``part_of`` relations in determining
+            descendants.
+
+        Returns
+        -------
+        `scipy.sparse.csr_matrix` of bool
+            Square matrix, in which row *i* indicates the descendants of the
+            *i*-th GO term (see :attr:`term_ids`).
+        """
+        key = ('descendants', include_parts)
+        try:
+            return self._closures[key]
+        except KeyError:
+            pass
+
+        closure = self.get_ancestor_matrix(include_parts).T.tocsr()
+        closure.sort_indices()
+        self._closures[key] = closure
+        return closure
+
+    def _get_row_ids(self, matrix, i):
+        """Get the GO term IDs in one row of a closure matrix."""
+        return self._get_term_id_array()[
+            matrix.indices[matrix.indptr[i]:matrix.indptr[i+1]]]
+
+    def _get_closure_dict(self, matrix):
+        term_ids = self._get_term_id_array()
+        return dict((id_, frozenset(self._get_row_ids(matrix, i)))
+                    for i, id_ in enumerate(term_ids))
+
+    def get_ancestor_closure(self, include_part_of=True):
+        """Get the ancestors of all GO terms.
+
+        Parameters
+        ----------
+        include_part_of: bool, optional
+            Whether to include ``part_of`` relations in determining
+            ancestors.
+
+        Returns
+        -------
+        dict (str => frozenset of str)
+            Mapping of GO term IDs to the IDs of their ancestors.
+
+        Notes
+        -----
+        The mapping is generated from the sparse ancestor matrix (see
+        :meth:`get_ancestor_matrix`) on every call, and requires much more
+        memory than the matrix itself.
+        """
+        return self._get_closure_dict(
+            self.get_ancestor_matrix(include_part_of))
+
+    def get_descendant_closure(self, include_parts=True):
+        """Get the descendants of all GO terms.
+
+        Parameters
+        ----------
+        include_parts: bool, optional
+            Whether to include ``part_of`` relations in determining
+            descendants.
+
+        Returns
+        -------
+        dict (str => frozenset of str)
+            Mapping of GO term IDs to the IDs of their descendants.
+        """
+        return self._get_closure_dict(
+            self.get_descendant_matrix(include_parts))
+
+    def _lookup(self, matrix, term_ids):
+        """Look up the rows of a closure matrix for one or more GO terms."""
+        if isinstance(term_ids, (str, _oldstr)):
+            return list(self._get_row_ids(
+                matrix, self.get_term_indices(term_ids)))
+        return [list(self._get_row_ids(matrix, i))
+                for i in self.get_term_indices(term_ids)]
+
+    def ancestors_of(self, term_ids, include_part_of=True):
+        """Get the ancestors of one or more GO terms.
+
+        Parameters
+        ----------
+        term_ids: str or Iterable of str
+            A GO term ID, or a list of GO term IDs.
+        include_part_of: bool, optional
+            Whether to include ``part_of`` relations in determining
+            ancestors.
+
+        Returns
+        -------
+        list of str, or list of (list of str)
+            The ancestors of the GO term, or of each of the GO terms.
+        """
+        return self._lookup(self.get_ancestor_matrix(include_part_of),
+                            term_ids)
 
+    def descendants_of(self, term_ids, include_parts=True):
+        """Get the descendants of one or more GO terms.
+
+        Parameters
+        ----------
+        term_ids: str or Iterable of str
+            A GO term ID, or a list of GO term IDs.
+        include_parts: bool, optional
+            Whether to include ``part_of`` relations in determining
+            descendants.
+
+        Returns
+        -------
+        list of str, or list of (list of str)
+            The descendants of the GO term, or of each of the GO terms.
+        """
+        return self._lookup(self.get_descendant_matrix(include_parts),
+                            term_ids)
+
+    def is_ancestor(self, ancestor_ids, term_ids, include_part_of=True):
+        """Test whether GO terms are ancestors of other GO terms.
+
+        Parameters
+        ----------
+        ancestor_ids: str or Iterable of str
+            The ID(s) of the putative ancestor(s).
+        term_ids: str or Iterable of str
+            The ID(s) of the GO term(s) to test (pairwise with
+            ``ancestor_ids``).
+        include_part_of: bool, optional
+            Whether to include ``part_of`` relations in determining
+            ancestors.
+
+        Returns
+        -------
+        bool or `numpy.ndarray` of bool
+            Whether each of the ``ancestor_ids`` is an ancestor of the
+            corresponding term in ``term_ids``.
+        """
+        closure = self.get_ancestor_matrix(include_part_of)
+        rows = self.get_term_indices(term_ids)
+        cols = self.get_term_indices(ancestor_ids)
+        if np.isscalar(rows) and np.isscalar(cols):
+            return bool(closure[rows, cols])
+        rows, cols = np.broadcast_arrays(rows, cols)
+        if rows.size == 0:
+            return np.zeros(0, dtype=np.bool_)
+        return np.asarray(closure[rows, cols]).ravel().astype(np.bool_)
+
+    def common_ancestors(self, term_ids1, term_ids2, include_part_of=True):
+        """Get the common ancestors of (pairs of) GO terms.
+
+        Parameters
+        ----------
+        term_ids1: str or Iterable of str
+            The ID(s) of the first GO term(s).
+        term_ids2: str or Iterable of str
+            The ID(s) of the second GO term(s).
+        include_part_of: bool, optional
+            Whether to include ``part_of`` relations in determining
+            ancestors.
+
+        Returns
+        -------
+        list of str, or list of (list of str)
+            The common ancestors of the GO terms, or of each pair of GO
+            terms.
+        """
+        closure = self.get_ancestor_matrix(include_part_of)
+        single = isinstance(term_ids1, (str, _oldstr)) and \
+            isinstance(term_ids2, (str, _oldstr))
+        rows1 = np.atleast_1d(self.get_term_indices(term_ids1))
+        rows2 = np.atleast_1d(self.get_term_indices(term_ids2))
+        rows1, rows2 = np.broadcast_arrays(rows1, rows2)
+        common = closure[rows1].multiply(closure[rows2]).tocsr()
+        common.sort_indices()
+        result = [list(self._get_row_ids(common, i))
+                  for i in range(common.shape[0])]
+        if single:
+            return result[0]
+        return result
+
+    def propagate_annotations(self, matrix, include_part_of=True):
+        """Propagate annotations to all ancestors of the annotated GO terms.
+
+        This implements the "true path rule", using a single sparse matrix
+        product with the ancestor closure (see :meth:`get_ancestor_matrix`).
+
+        Parameters
+        ----------
+        matrix: `scipy.sparse.spmatrix`
+            Annotation matrix, with one column for each GO term (in the order
+            of :attr:`term_ids`), e.g., a gene-by-term matrix.
+        include_part_of: bool, optional
+            Whether to propagate annotations along ``part_of`` relations.
+
+        Returns
+        -------
+        `scipy.sparse.csr_matrix` of bool
+            The propagated annotation matrix.
+        """
+        closure = self.get_ancestor_matrix(include_part_of)
+        closure = closure + sparse.identity(closure.shape[0], dtype=np.bool_,
+                                            format='csr')
+        propagated = sparse.csr_matrix(matrix).astype(np.int32).dot(
+            closure.astype(np.int32))
+        return (propagated > 0).tocsr()
+
+    def get_information_content(self, matrix, include_part_of=True):
+        """Calculate the information content of all GO terms.
+
+        The information content of a term *t* is defined as *-log(p(t))*,
+        where *p(t)* is the fraction of annotated genes (or other entities)
+        in the term's domain that are annotated with *t* or any of its
+        descendants.
+
+        Parameters
+        ----------
+        matrix: `scipy.sparse.spmatrix`
+            The annotation corpus, as a gene-by-term annotation matrix (see
+            :func:`get_annotation_matrix`).
+        include_part_of: bool, optional
+            Whether to propagate annotations along ``part_of`` relations.
+
+        Returns
+        -------
+        `numpy.ndarray` of float
+            The information content of each GO term (in the order of
+            :attr:`term_ids`). The value is NaN for GO terms without any
+            (propagated) annotations.
+        """
+        propagated = self.propagate_annotations(matrix, include_part_of)
+        counts = np.asarray(
+            propagated.sum(axis=0, dtype=np.int64)).ravel()
+
+        # count the annotated genes in each domain
+        domains, domain_codes = np.unique(
+            [str(self[id_].domain) for id_ in self._get_term_id_array()],
+            return_inverse=True)
+        domain_matrix = sparse.csr_matrix(
+            (np.ones(domain_codes.size, dtype=np.int32),
+             (np.arange(domain_codes.size), domain_codes)),
+            shape=(domain_codes.size, domains.size))
+        genes_per_domain = np.asarray(
+            (propagated.astype(np.int32).dot(domain_matrix) > 0).sum(
+                axis=0)).ravel()
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ic = -np.log(counts / genes_per_domain[domain_codes].astype(
+                np.float64))
+        ic[counts == 0] = np.nan
+        return ic
+
+    def _get_slim_mapping(self, slim_term_ids, include_part_of,
+                          most_specific):
+        """Get a term-by-slim-term matrix indicating the slim ancestors of
+        each GO term (including the term itself)."""
+        slim_idx = np.unique(self.get_term_indices(list(slim_term_ids)))
+        closure = self.get_ancestor_matrix(include_part_of)
+        closure = closure + sparse.identity(closure.shape[0], dtype=np.bool_,
+                                            format='csr')
+        mapping = closure.tocsc()[:, slim_idx].tocsr()
+
+        if most_specific:
+            # remove slim terms that are ancestors of another mapped slim term
+            slim_ancestors = self.get_ancestor_matrix(include_part_of)[
+                slim_idx].tocsc()[:, slim_idx]
+            redundant = mapping.astype(np.int32).dot(
+                slim_ancestors.astype(np.int32)) > 0
+            mapping = mapping.astype(np.int8) - \
+                mapping.multiply(redundant).astype(np.int8)
+            mapping.eliminate_zeros()
+            mapping = (mapping > 0).tocsr()
+
+        return slim_idx, mapping
+
+    def map_to_slim(self, slim_term_ids, annotations, include_part_of=True,
+                    most_specific=False):
+        """Map GO annotations to a GO slim.
+
+        Each annotation is replaced by one annotation for each slim term that
+        is identical to, or an ancestor of, the annotated GO term. The mapping
+        is performed using a single sparse matrix product with the ancestor
+        closure for all annotations.
+
+        Parameters
+        ----------
+        slim_term_ids: Iterable of str
+            The IDs of the GO slim terms (e.g., the term IDs of a GO slim
+            ontology).
+        annotations: `GOAnnotationTable` or Iterable of `GOAnnotation`
+            The GO annotations.
+        include_part_of: bool, optional
+            Whether to include ``part_of`` relations in determining
+            ancestors. [True]
+        most_specific: bool, optional
+            If True, only map annotations to the most specific slim terms,
+            i.e., exclude slim terms that are ancestors of other slim terms
+            the annotation is mapped to. [False]
+
+        Returns
+        -------
+        `GOAnnotationTable` or list of `GOAnnotation`
+            The mapped annotations (of the same type as ``annotations``).
+            Duplicate annotations resulting from the mapping are removed,
+            and annotations that cannot be mapped to any slim term are
+            dropped.
+
+        Raises
+        ------
+        KeyError
+            If a slim term ID is unknown.
+        """
+        from .annotation_table import GOAnnotationTable
+
+        as_table = isinstance(annotations, GOAnnotationTable)
+        if as_table:
+            if annotations.gene_ontology is not self:
+                raise ValueError('The annotation table is based on a '
+                                 'different Gene Ontology.')
+            table = annotations
+        else:
+            table = GOAnnotationTable.from_annotations(annotations, self)
+
+        slim_idx, mapping = self._get_slim_mapping(
+            slim_term_ids, include_part_of, most_specific)
+
+        # only look up each annotated term once
+        terms, inverse = np.unique(table.term_indices, return_inverse=True)
+        mapped = mapping[terms][inverse].tocoo()
+        order = np.lexsort((mapped.col, mapped.row))
+        rows = mapped.row[order]
+        cols = mapped.col[order]
+
+        data = table.data.iloc[rows].reset_index(drop=True)
+        data['go_term'] = slim_idx[cols].astype(np.int32)
+        data = data.drop_duplicates().reset_index(drop=True)
+        logger.info('Mapped %d annotations to %d annotations with %d GO '
+                    'slim terms.', len(table), len(data.index),
+                    slim_idx.size)
+
+        result = GOAnnotationTable(self, data)
+        if not as_table:
+            result = result.to_list()
+        return result
+
+    def subgraph(self, term_ids, include_ancestors=False,
+                 include_part_of=True):
+        """Extract the subgraph induced by a set of GO terms.
+
+        Parameters
+        ----------
+        term_ids: Iterable of str
+            The IDs of the GO terms.
+        include_ancestors: bool, optional
+            Whether to also include all ancestors of the GO terms. [False]
+        include_part_of: bool, optional
+            Whether to include ancestors along ``part_of`` relations (only
+            used if ``include_ancestors`` is True). [True]
+
+        Returns
+        -------
+        `GeneOntology`
+            A new ontology containing (copies of) the selected GO terms, with
+            all ``is_a`` and ``part_of`` relations between them.
+
+        Raises
+        ------
+        KeyError
+            If a GO term ID is unknown.
+        """
+        idx = np.unique(self.get_term_indices(list(term_ids)))
+        if include_ancestors:
+            closure = self.get_ancestor_matrix(include_part_of)
+            idx = np.union1d(idx, closure[idx].indices)
+
+        id_array = self._get_term_id_array()
+        sub_ids = id_array[idx].tolist()
+
+        relations = []
+        for rel in ['is_a', 'part_of']:
+            matrix = self.get_relation_matrix(rel)[idx].tocsc()[:, idx].tocsr()
+            matrix.sort_indices()
+            indptr = matrix.indptr.tolist()
+            indices = matrix.indices.tolist()
+            relations.append(
+                [[sub_ids[j] for j in indices[indptr[i]:indptr[i+1]]]
+                 for i in range(len(sub_ids))])
+
+        terms = []
+        for id_, is_a, part_of in zip(sub_ids, *relations):
+            t = self[id_]
+            terms.append(GOTerm(t.id, t.name, t.domain, t.definition,
+                                is_a=is_a, part_of=part_of))
+
+        keep = set(sub_ids)
+        mappings = [dict((k, v) for k, v in getattr(self, attr).items()
+                         if v in keep)
+                    for attr in ['syn2id', 'alt_id', 'name2id']]
+        ontology = GeneOntology(terms, *mappings,
+                                obsolete_ids=self.obsolete_ids & keep)
+
+        if include_ancestors:
+            # the subgraph is closed under the ancestor relation, so its
+            # closure is the restriction of the full closure
+            sub_closure = closure[idx].tocsc()[:, idx].tocsr()
+            sub_closure.sort_indices()
+            ontology._get_term_id_array()
+            ontology._closures[('ancestors', include_part_of)] = sub_closure
         return ontology
 
+    def _get_related(self, kind, id_):
+        """Get the IDs of GO terms related to a GO term.
+
+        Used by the `GOTerm` attributes ``children``, ``parts``,
+        ``ancestors`` and ``descendants``. For the latter two, returns
+        ``None`` if the ontology has not been flattened.
+        """
+        if kind in ['children', 'parts']:
+            matrix = self.get_relation_matrix(kind)
+        else:
+            try:
+                include_part_of = self._flatten_params[kind]
+            except KeyError:
+                return None
+            if kind == 'ancestors':
+                matrix = self.get_ancestor_matrix(include_part_of)
+            else:
+                matrix = self.get_descendant_matrix(include_part_of)
+        return frozenset(
+            self._get_row_ids(matrix, self.get_term_indices(id_)))
+
     def _flatten_ancestors(self, include_part_of=True):
         """Determines and stores all ancestors of each GO term.
 
@@ -374,19 +1285,10 @@ class GeneOntology(object):
         -------
         None
         """
-        def get_all_ancestors(term):
-            ancestors = set()
-            for id_ in term.is_a:
-                ancestors.add(id_)
-                ancestors.update(get_all_ancestors(self[id_]))
-            if include_part_of:
-                for id_ in term.part_of:
-                    ancestors.add(id_)
-                    ancestors.update(get_all_ancestors(self[id_]))
-            return ancestors
-
+        self.get_ancestor_matrix(include_part_of)
+        self._flatten_params['ancestors'] = include_part_of
         for term in self:
-            term.ancestors = get_all_ancestors(term)
+            term.ancestors = None
 
     def _flatten_descendants(self, include_parts=True):
         """Determines and stores all descendants of each GO term.
@@ -401,16 +1303,7 @@ class GeneOntology(object):
         -------
         None
         """
-        def get_all_descendants(term):
-            descendants = set()
-            for id_ in term.children:
-                descendants.add(id_)
-                descendants.update(get_all_descendants(self[id_]))
-            if include_parts:
-                for id_ in term.parts:
-                    descendants.add(id_)
-                    descendants.update(get_all_descendants(self[id_]))
-            return descendants
-
+        self.get_descendant_matrix(include_parts)
+        self._flatten_params['descendants'] = include_parts
         for term in self:
-            term.descendants = get_all_descendants(term)
\ No newline at end of file
+            term.descendants = None
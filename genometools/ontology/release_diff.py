@@ -0,0 +1,356 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Functions for comparing GO releases and updating GO gene sets."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+_oldstr = str
+from builtins import *
+
+import logging
+
+import numpy as np
+from scipy import sparse
+
+from . import GeneOntology, GOAnnotationTable
+from .gaf import get_annotation_matrix, _get_gene_sets
+from ..basic import GeneSetCollection
+
+logger = logging.getLogger(__name__)
+
+
+class GeneOntologyDiff(object):
+    """The differences between two releases of the Gene Ontology.
+
+    Parameters
+    ----------
+    added : Iterable of str
+        See :attr:`added` attribute.
+    removed : Iterable of str
+        See :attr:`removed` attribute.
+    merged : dict
+        See :attr:`merged` attribute.
+    obsoleted : Iterable of str
+        See :attr:`obsoleted` attribute.
+    reparented : Iterable of str
+        See :attr:`reparented` attribute.
+    changed : Iterable of str
+        See :attr:`changed` attribute.
+
+    Attributes
+    ----------
+    added : list of str
+        The IDs of GO terms only present in the new release.
+    removed : list of str
+        The IDs of GO terms only present in the old release (excluding
+        merged terms).
+    merged : dict (str => str)
+        The IDs of GO terms only present in the old release that have become
+        alternative IDs of other terms, mapped to the new term IDs.
+    obsoleted : list of str
+        The IDs of GO terms that have been marked as obsolete.
+    reparented : list of str
+        The IDs of GO terms with changed ``is_a`` or ``part_of`` relations.
+    changed : list of str
+        The IDs of GO terms with a changed name, domain, or definition.
+    """
+    def __init__(self, added, removed, merged, obsoleted, reparented,
+                 changed):
+
+        assert isinstance(merged, dict)
+
+        self.added = sorted(added)
+        self.removed = sorted(removed)
+        self.merged = merged
+        self.obsoleted = sorted(obsoleted)
+        self.reparented = sorted(reparented)
+        self.changed = sorted(changed)
+
+    def __repr__(self):
+        return ('<%s instance (%d added, %d removed, %d merged, '
+                '%d obsoleted, %d reparented, %d changed)>'
+                % (self.__class__.__name__, len(self.added),
+                   len(self.removed), len(self.merged), len(self.obsoleted),
+                   len(self.reparented), len(self.changed)))
+
+    def __str__(self):
+        return repr(self)
+
+    def __len__(self):
+        return len(self.added) + len(self.removed) + len(self.merged) + \
+            len(self.obsoleted) + len(self.reparented) + len(self.changed)
+
+    @classmethod
+    def from_ontologies(cls, old, new):
+        """Compare two releases of the Gene Ontology.
+
+        Parameters
+        ----------
+        old : `GeneOntology`
+            The old release.
+        new : `GeneOntology`
+            The new release.
+
+        Returns
+        -------
+        `GeneOntologyDiff`
+            The differences.
+        """
+        assert isinstance(old, GeneOntology)
+        assert isinstance(new, GeneOntology)
+
+        old_ids = set(old.term_ids)
+        new_ids = set(new.term_ids)
+
+        added = new_ids - old_ids
+        merged = {}
+        removed = []
+        for id_ in old_ids - new_ids:
+            if id_ in new.alt_id:
+                merged[id_] = new.alt_id[id_]
+            else:
+                removed.append(id_)
+
+        obsoleted = (new.obsolete_ids - old.obsolete_ids) & old_ids
+
+        reparented = []
+        changed = []
+        for id_ in old_ids & new_ids:
+            t1 = old[id_]
+            t2 = new[id_]
+            if t1.is_a != t2.is_a or t1.part_of != t2.part_of:
+                reparented.append(id_)
+            if (t1.name, t1.domain, t1.definition) != \
+                    (t2.name, t2.domain, t2.definition):
+                changed.append(id_)
+
+        diff = cls(added, removed, merged, obsoleted, reparented, changed)
+        logger.info('GO release differences: %s', repr(diff))
+        return diff
+
+
+def _get_annotation_pairs(go_annotations):
+    """Get the gene and GO term ID of each annotation.
+
+    Returns the (unique) genes and GO term IDs, and the gene and term codes
+    of each annotation.
+    """
+    if isinstance(go_annotations, GOAnnotationTable):
+        return (go_annotations.genes, go_annotations.gene_codes,
+                go_annotations.gene_ontology._get_term_id_array(),
+                go_annotations.term_indices)
+
+    go_annotations = list(go_annotations)
+    genes, gene_codes = np.unique(
+        np.array([ann.db_symbol for ann in go_annotations], dtype=object),
+        return_inverse=True)
+    term_ids, term_codes = np.unique(
+        np.array([ann.go_term.id for ann in go_annotations], dtype=object),
+        return_inverse=True)
+    return genes, gene_codes, term_ids, term_codes
+
+
+class GOAnnotationDiff(object):
+    """The differences between two sets of GO annotations.
+
+    Annotations are compared based on their gene and GO term, i.e., changes
+    in other fields (e.g., evidence codes) are ignored.
+
+    Parameters
+    ----------
+    added : Iterable of (str, str) tuples
+        See :attr:`added` attribute.
+    removed : Iterable of (str, str) tuples
+        See :attr:`removed` attribute.
+
+    Attributes
+    ----------
+    added : list of (str, str) tuples
+        The (gene, GO term ID) pairs only present in the new annotations.
+    removed : list of (str, str) tuples
+        The (gene, GO term ID) pairs only present in the old annotations.
+    """
+    def __init__(self, added, removed):
+        self.added = sorted(added)
+        self.removed = sorted(removed)
+
+    def __repr__(self):
+        return '<%s instance (%d added, %d removed)>' \
+               % (self.__class__.__name__, len(self.added),
+                  len(self.removed))
+
+    def __str__(self):
+        return repr(self)
+
+    def __len__(self):
+        return len(self.added) + len(self.removed)
+
+    @property
+    def term_ids(self):
+        """The IDs of all GO terms with added or removed annotations.
+
+        Returns
+        -------
+        list of str
+        """
+        return sorted(set(id_ for _, id_ in self.added + self.removed))
+
+    @classmethod
+    def from_annotations(cls, old, new):
+        """Compare two sets of GO annotations.
+
+        Parameters
+        ----------
+        old : `GOAnnotationTable` or Iterable of `GOAnnotation`
+            The old annotations.
+        new : `GOAnnotationTable` or Iterable of `GOAnnotation`
+            The new annotations.
+
+        Returns
+        -------
+        `GOAnnotationDiff`
+            The differences.
+        """
+        old_genes, old_gene_codes, old_terms, old_term_codes = \
+            _get_annotation_pairs(old)
+        new_genes, new_gene_codes, new_terms, new_term_codes = \
+            _get_annotation_pairs(new)
+
+        # encode each (gene, term) pair as a single integer, using the codes
+        # of the combined genes and terms
+        genes, gene_map = np.unique(np.concatenate([old_genes, new_genes]),
+                                    return_inverse=True)
+        terms, term_map = np.unique(np.concatenate([old_terms, new_terms]),
+                                    return_inverse=True)
+
+        def encode(gene_codes, term_codes, gene_offset, term_offset):
+            gene_codes = gene_codes.astype(np.int64) + gene_offset
+            term_codes = term_codes.astype(np.int64) + term_offset
+            keys = gene_map[gene_codes].astype(np.int64) * terms.size + \
+                term_map[term_codes]
+            return np.unique(keys)
+
+        old_keys = encode(old_gene_codes, old_term_codes, 0, 0)
+        new_keys = encode(new_gene_codes, new_term_codes,
+                          old_genes.size, old_terms.size)
+
+        def decode(keys):
+            return list(zip(genes[keys // terms.size].tolist(),
+                            terms[keys % terms.size].tolist()))
+
+        diff = cls(
+            decode(np.setdiff1d(new_keys, old_keys, assume_unique=True)),
+            decode(np.setdiff1d(old_keys, new_keys, assume_unique=True)))
+        logger.info('GO annotation differences: %s', repr(diff))
+        return diff
+
+
+def _get_ancestor_ids(gene_ontology, term_ids, include_part_of):
+    """Get the IDs of the GO terms and all their ancestors."""
+    term_ids = [id_ for id_ in term_ids if id_ in gene_ontology]
+    if not term_ids:
+        return set()
+    idx = gene_ontology.get_term_indices(term_ids)
+    closure = gene_ontology.get_ancestor_matrix(include_part_of)
+    idx = np.union1d(idx, closure[idx].indices)
+    return set(gene_ontology._get_term_id_array()[idx])
+
+
+def update_goa_gene_sets(gene_sets, old_ontology, new_ontology,
+                         old_annotations, new_annotations,
+                         include_part_of=True, min_genes=None,
+                         max_genes=None):
+    """Update propagated GO gene sets for a new GO release.
+
+    Only the gene sets of GO terms that are affected by changes in the
+    ontology or in the annotations are recomputed. A GO term is affected if
+    it was added, obsoleted, or its name, domain, or definition has changed,
+    or if it is an ancestor (in either release) of a GO term that was added,
+    removed, merged, obsoleted, reparented, or has changed annotations.
+
+    Parameters
+    ----------
+    gene_sets : `GeneSetCollection`
+        The gene sets for the old release, as generated by
+        :func:`get_goa_gene_sets` (with ``propagate=True``, and with
+        identical values of ``include_part_of``, ``min_genes``, and
+        ``max_genes``).
+    old_ontology : `GeneOntology`
+        The old release of the Gene Ontology.
+    new_ontology : `GeneOntology`
+        The new release of the Gene Ontology.
+    old_annotations : `GOAnnotationTable` or Iterable of `GOAnnotation`
+        The old GO annotations.
+    new_annotations : `GOAnnotationTable` or Iterable of `GOAnnotation`
+        The new GO annotations (based on ``new_ontology``).
+    include_part_of : bool, optional
+        Whether annotations are propagated along ``part_of`` relations.
+        [True]
+    min_genes : int, optional
+        Exclude gene sets with fewer genes. [None]
+    max_genes : int, optional
+        Exclude gene sets with more genes. [None]
+
+    Returns
+    -------
+    `GeneSetCollection`
+        The updated gene sets (in the order of their GO term IDs), identical
+        to the result of :func:`get_goa_gene_sets` for the new release.
+    """
+    assert isinstance(gene_sets, GeneSetCollection)
+
+    ontology_diff = GeneOntologyDiff.from_ontologies(
+        old_ontology, new_ontology)
+    annotation_diff = GOAnnotationDiff.from_annotations(
+        old_annotations, new_annotations)
+
+    # determine the affected GO terms
+    annotated = annotation_diff.term_ids
+    affected = set(ontology_diff.added) | set(ontology_diff.obsoleted) | \
+        set(ontology_diff.changed)
+    affected |= _get_ancestor_ids(
+        new_ontology,
+        ontology_diff.added + ontology_diff.obsoleted +
+        ontology_diff.reparented + annotated, include_part_of)
+    affected |= _get_ancestor_ids(
+        old_ontology,
+        ontology_diff.removed + list(ontology_diff.merged.keys()) +
+        ontology_diff.obsoleted + ontology_diff.reparented + annotated,
+        include_part_of)
+    affected &= set(new_ontology.term_ids)
+    logger.info('Recomputing gene sets for %d / %d GO terms.',
+                len(affected), len(new_ontology))
+
+    # only propagate annotations to the affected GO terms
+    genes, matrix = get_annotation_matrix(new_annotations, new_ontology)
+    cols = np.sort(new_ontology.get_term_indices(list(affected)))
+    closure = new_ontology.get_ancestor_matrix(include_part_of)
+    identity = sparse.csr_matrix(
+        (np.ones(cols.size, dtype=np.bool_), (cols, np.arange(cols.size))),
+        shape=(closure.shape[0], cols.size))
+    closure = closure.tocsc()[:, cols] + identity
+    matrix = matrix.astype(np.int32).dot(closure.astype(np.int32))
+    terms = [new_ontology[id_]
+             for id_ in new_ontology._get_term_id_array()[cols]]
+    updated = _get_gene_sets(genes, terms, matrix, min_genes, max_genes)
+
+    new_ids = set(new_ontology.term_ids)
+    result = [gs for gs in gene_sets
+              if gs.id in new_ids and gs.id not in affected]
+    result.extend(updated)
+    result.sort(key=lambda gs: gs.id)
+    return GeneSetCollection(result)
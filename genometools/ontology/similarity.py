@@ -0,0 +1,353 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Module containing the `GOSimilarity` class."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+_oldstr = str
+from builtins import *
+
+import logging
+import multiprocessing
+
+import numpy as np
+from scipy import sparse
+
+from . import GeneOntology
+from .gaf import get_annotation_matrix
+
+logger = logging.getLogger(__name__)
+
+# the similarity object used by worker processes
+_worker_similarity = None
+
+
+def _init_worker(similarity):
+    global _worker_similarity
+    _worker_similarity = similarity
+
+
+def _worker_gene_similarity(args):
+    return _worker_similarity._get_gene_similarity(*args)
+
+
+class GOSimilarity(object):
+    """Semantic similarity of GO terms and genes.
+
+    The information content (IC) of each GO term is calculated from an
+    annotation corpus (see :meth:`GeneOntology.get_information_content`). The
+    similarity of two GO terms is based on their most informative common
+    ancestor (MICA). MICAs are determined for many term pairs at once, by
+    intersecting the corresponding rows of the (reflexive) ancestor closure
+    matrix.
+
+    Parameters
+    ----------
+    gene_ontology : `GeneOntology`
+        See :attr:`gene_ontology` attribute.
+    go_annotations : `GOAnnotationTable` or Iterable of `GOAnnotation`
+        The annotation corpus.
+    include_part_of : bool, optional
+        Whether to include ``part_of`` relations. [True]
+
+    Attributes
+    ----------
+    gene_ontology : `GeneOntology`
+        The Gene Ontology.
+    genes : `numpy.ndarray` of str
+        The annotated genes.
+    ic : `numpy.ndarray` of float
+        The information content of each GO term (in the order of
+        :attr:`GeneOntology.term_ids`).
+    """
+
+    measures = ['resnik', 'lin', 'jiang']
+    """The supported similarity measures."""
+
+    def __init__(self, gene_ontology, go_annotations, include_part_of=True):
+
+        assert isinstance(gene_ontology, GeneOntology)
+        assert isinstance(include_part_of, bool)
+
+        self.gene_ontology = gene_ontology
+
+        genes, matrix = get_annotation_matrix(go_annotations, gene_ontology)
+        self.genes = genes
+        self._gene_index = dict((g, i) for i, g in enumerate(genes))
+        # the last row is left empty (for genes without annotations)
+        self._annotations = sparse.vstack(
+            [matrix, sparse.csr_matrix((1, matrix.shape[1]), dtype=np.bool_)],
+            format='csr')
+        self.ic = gene_ontology.get_information_content(
+            matrix, include_part_of=include_part_of)
+
+        closure = gene_ontology.get_ancestor_matrix(include_part_of)
+        self._closure = (closure + sparse.identity(
+            closure.shape[0], dtype=np.bool_, format='csr')).tocsr()
+
+    def __repr__(self):
+        return '<%s instance (%d GO terms, %d genes)>' \
+               % (self.__class__.__name__, self.ic.size, self.genes.size)
+
+    def __str__(self):
+        return '<%s instance with %d GO terms and %d annotated genes>' \
+               % (self.__class__.__name__, self.ic.size, self.genes.size)
+
+    def _get_mica(self, idx1, idx2):
+        """Determine the MICA for pairs of GO terms (given by their indices).
+
+        Returns the MICA indices (-1 if there is no common ancestor with
+        a defined IC) and their IC (0 in that case).
+        """
+        idx1 = np.asarray(idx1, dtype=np.int64)
+        idx2 = np.asarray(idx2, dtype=np.int64)
+        mica = np.full(idx1.size, -1, dtype=np.int64)
+        mica_ic = np.zeros(idx1.size, dtype=np.float64)
+        if idx1.size == 0:
+            return mica, mica_ic
+
+        common = self._closure[idx1].multiply(self._closure[idx2]).tocsr()
+        common.eliminate_zeros()
+        common.sort_indices()
+        ic = self.ic[common.indices]
+        valid = ~np.isnan(ic)
+
+        rows = np.repeat(np.arange(idx1.size), np.diff(common.indptr))
+        rows = rows[valid]
+        cols = common.indices[valid]
+        ic = ic[valid]
+        if rows.size == 0:
+            return mica, mica_ic
+
+        # for each row, select the common ancestor with the highest IC
+        order = np.lexsort((-ic, rows))
+        first = np.r_[True, rows[order][1:] != rows[order][:-1]]
+        sel = order[first]
+        mica[rows[sel]] = cols[sel]
+        mica_ic[rows[sel]] = ic[sel]
+        return mica, mica_ic
+
+    def _get_term_similarity(self, idx1, idx2, measure):
+        """Calculate the similarity for pairs of GO terms (given by indices).
+        """
+        mica, mica_ic = self._get_mica(idx1, idx2)
+        if measure == 'resnik':
+            return mica_ic
+
+        ic1 = self.ic[idx1]
+        ic2 = self.ic[idx2]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            if measure == 'lin':
+                sim = 2 * mica_ic / (ic1 + ic2)
+                # two terms that are both roots are identical
+                sim[(ic1 + ic2) == 0] = 1.0
+            else:
+                sim = 1.0 / (1.0 + ic1 + ic2 - 2 * mica_ic)
+        sim[np.isnan(sim) | (mica == -1)] = 0.0
+        return sim
+
+    def get_mica(self, term_ids1, term_ids2):
+        """Get the most informative common ancestor of pairs of GO terms.
+
+        Parameters
+        ----------
+        term_ids1 : str or Iterable of str
+            The first GO term ID of each pair.
+        term_ids2 : str or Iterable of str
+            The second GO term ID of each pair.
+
+        Returns
+        -------
+        str or None, or list of (str or None)
+            The ID of the MICA of each pair (None if the terms do not have a
+            common ancestor).
+        """
+        scalar = isinstance(term_ids1, (str, _oldstr))
+        idx1, idx2 = self._get_pair_indices(term_ids1, term_ids2)
+        mica, _ = self._get_mica(idx1, idx2)
+        term_ids = self.gene_ontology._get_term_id_array()
+        result = [term_ids[i] if i >= 0 else None for i in mica]
+        if scalar:
+            return result[0]
+        return result
+
+    def _get_pair_indices(self, term_ids1, term_ids2):
+        if isinstance(term_ids1, (str, _oldstr)):
+            term_ids1 = [term_ids1]
+        if isinstance(term_ids2, (str, _oldstr)):
+            term_ids2 = [term_ids2]
+        idx1 = self.gene_ontology.get_term_indices(term_ids1)
+        idx2 = self.gene_ontology.get_term_indices(term_ids2)
+        if idx1.size != idx2.size:
+            raise ValueError('The number of GO terms must be identical.')
+        return idx1, idx2
+
+    def get_term_similarity(self, term_ids1, term_ids2, measure='resnik'):
+        """Calculate the semantic similarity for pairs of GO terms.
+
+        Parameters
+        ----------
+        term_ids1 : str or Iterable of str
+            The first GO term ID of each pair.
+        term_ids2 : str or Iterable of str
+            The second GO term ID of each pair.
+        measure : str, optional
+            The similarity measure, one of "resnik" (IC of the MICA), "lin"
+            (Lin's normalized similarity), or "jiang" (Jiang-Conrath
+            distance *d*, converted to a similarity as *1 / (1 + d)*).
+            ["resnik"]
+
+        Returns
+        -------
+        float or `numpy.ndarray` of float
+            The similarity of each pair. Pairs without a common ancestor
+            have a similarity of 0.
+        """
+        if measure not in self.measures:
+            raise ValueError('Unknown similarity measure: "%s"' % measure)
+        scalar = isinstance(term_ids1, (str, _oldstr))
+        idx1, idx2 = self._get_pair_indices(term_ids1, term_ids2)
+        sim = self._get_term_similarity(idx1, idx2, measure)
+        if scalar:
+            return float(sim[0])
+        return sim
+
+    def resnik(self, term_ids1, term_ids2):
+        """Resnik similarity (see :meth:`get_term_similarity`)."""
+        return self.get_term_similarity(term_ids1, term_ids2, 'resnik')
+
+    def lin(self, term_ids1, term_ids2):
+        """Lin similarity (see :meth:`get_term_similarity`)."""
+        return self.get_term_similarity(term_ids1, term_ids2, 'lin')
+
+    def jiang(self, term_ids1, term_ids2):
+        """Jiang-Conrath similarity (see :meth:`get_term_similarity`)."""
+        return self.get_term_similarity(term_ids1, term_ids2, 'jiang')
+
+    def _get_gene_similarity(self, gene_idx1, gene_idx2, measure):
+        """Calculate the BMA similarity for pairs of genes (given by indices).
+        """
+        annotations = self._annotations
+        indptr = annotations.indptr
+        indices = annotations.indices
+
+        n1 = indptr[gene_idx1 + 1] - indptr[gene_idx1]
+        n2 = indptr[gene_idx2 + 1] - indptr[gene_idx2]
+
+        # enumerate all term pairs of all gene pairs
+        num_pairs = n1 * n2
+        pair = np.repeat(np.arange(gene_idx1.size), num_pairs)
+        offset = np.arange(pair.size) - np.repeat(
+            np.cumsum(num_pairs) - num_pairs, num_pairs)
+        i = offset // n2[pair]
+        j = offset % n2[pair]
+        term1 = indices[indptr[gene_idx1][pair] + i]
+        term2 = indices[indptr[gene_idx2][pair] + j]
+
+        sim = self._get_term_similarity(term1, term2, measure)
+
+        # best match for each term of either gene
+        m = sim.size
+        best1 = np.zeros(n1.sum(), dtype=np.float64)
+        best2 = np.zeros(n2.sum(), dtype=np.float64)
+        pos1 = np.repeat(np.cumsum(n1) - n1, num_pairs) + i
+        pos2 = np.repeat(np.cumsum(n2) - n2, num_pairs) + j
+        if m > 0:
+            np.maximum.at(best1, pos1, sim)
+            np.maximum.at(best2, pos2, sim)
+
+        total = np.zeros(gene_idx1.size, dtype=np.float64)
+        np.add.at(total, np.repeat(np.arange(gene_idx1.size), n1), best1)
+        np.add.at(total, np.repeat(np.arange(gene_idx1.size), n2), best2)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            result = total / (n1 + n2)
+        result[(n1 == 0) | (n2 == 0)] = np.nan
+        return result
+
+    def get_gene_similarity(self, genes1, genes2, measure='resnik',
+                            num_jobs=1, chunksize=1000):
+        """Calculate the semantic similarity for pairs of genes.
+
+        The similarity of two genes is calculated as the best-match average
+        (BMA) of the similarities of their (direct) GO annotations.
+
+        Parameters
+        ----------
+        genes1 : str or Iterable of str
+            The first gene of each pair.
+        genes2 : str or Iterable of str
+            The second gene of each pair.
+        measure : str, optional
+            The term similarity measure (see :meth:`get_term_similarity`).
+            ["resnik"]
+        num_jobs : int, optional
+            The number of worker processes. [1]
+        chunksize : int, optional
+            The number of gene pairs processed at once. [1000]
+
+        Returns
+        -------
+        float or `numpy.ndarray` of float
+            The similarity of each pair of genes. The similarity is NaN if
+            one of the genes does not have any annotations.
+        """
+        assert isinstance(num_jobs, int) and num_jobs >= 1
+        assert isinstance(chunksize, int) and chunksize >= 1
+        if measure not in self.measures:
+            raise ValueError('Unknown similarity measure: "%s"' % measure)
+
+        scalar = isinstance(genes1, (str, _oldstr))
+        if scalar:
+            genes1 = [genes1]
+        if isinstance(genes2, (str, _oldstr)):
+            genes2 = [genes2]
+        genes1 = list(genes1)
+        genes2 = list(genes2)
+        if len(genes1) != len(genes2):
+            raise ValueError('The number of genes must be identical.')
+
+        # genes without annotations are assigned to the empty last row
+        n = self.genes.size
+        gene_idx1 = np.array([self._gene_index.get(g, n) for g in genes1],
+                             dtype=np.int64)
+        gene_idx2 = np.array([self._gene_index.get(g, n) for g in genes2],
+                             dtype=np.int64)
+
+        tasks = [(gene_idx1[i:(i + chunksize)],
+                  gene_idx2[i:(i + chunksize)], measure)
+                 for i in range(0, gene_idx1.size, chunksize)]
+        if num_jobs == 1 or len(tasks) <= 1:
+            results = [self._get_gene_similarity(*t) for t in tasks]
+        else:
+            logger.debug('Calculating gene similarities using %d '
+                         'processes...', num_jobs)
+            pool = multiprocessing.Pool(
+                num_jobs, initializer=_init_worker, initargs=(self,))
+            try:
+                results = pool.map(_worker_gene_similarity, tasks)
+            finally:
+                pool.close()
+                pool.join()
+
+        if results:
+            sim = np.concatenate(results)
+        else:
+            sim = np.zeros(0, dtype=np.float64)
+
+        if scalar:
+            return float(sim[0])
+        return sim
@@ -21,6 +21,7 @@ from __future__ import (absolute_import, division,
 from builtins import *
 
 import re
+import sys
 from collections import OrderedDict, Iterable
 
 
@@ -54,9 +55,9 @@ class GOTerm(object):
         The domain of the GO term (e.g., "biological_process").
     definition: str
         The definition (description) of the GO term.
-    is_a: set of str
+    is_a: frozenset of str
         Set of GO term IDs that this GO term is a "subtype" of.
-    part_of: set of str
+    part_of: frozenset of str
         Set of GO term IDs that this GO term is a "part" of.
     ancestors: set of str
         Set of GO term IDs that are "ancestors" of this GO term.
@@ -67,6 +68,16 @@ class GOTerm(object):
     descendants: set of str
         Set of GO terms IDs that are "descendants" of this GO term.
 
+    Notes
+    -----
+    To reduce memory usage, the class uses ``__slots__``, GO term IDs are
+    interned, and the ``is_a`` and ``part_of`` relations are stored as
+    tuples. The corresponding attributes return immutable sets, and can
+    only be changed by assigning a new value.
+    ``children``, ``parts``, ``ancestors`` and ``descendants`` are not
+    stored at all, but are looked up in the `GeneOntology` that the term
+    belongs to.
+
     Methods
     -------
     get_pretty_format(omit_acc=False, max_name_length=0, abbreviate=True)
@@ -91,6 +102,10 @@ class GOTerm(object):
     """List of tuples defining abbreviations to use in GO term names.
     """
 
+    __slots__ = ['id', 'name', 'domain', 'definition',
+                 '_is_a', '_part_of', '_ancestors', '_descendants',
+                 '_ontology']
+
     def __init__(self, id_, name,
                  domain=None, definition=None,
                  is_a=None, part_of=None):
@@ -113,22 +128,24 @@ class GOTerm(object):
         assert isinstance(is_a, Iterable)
         assert isinstance(part_of, Iterable)
 
-        self.id = id_  # unique identifier
+        # the `GeneOntology` that this term belongs to
+        self._ontology = None
+
+        self.id = sys.intern(id_)  # unique identifier
         self.name = name
+        if domain is not None:
+            domain = sys.intern(domain)
         self.domain = domain
         self.definition = definition
 
         # to store immediate parents/wholes
-        self.is_a = set(is_a)
-        self.part_of = set(part_of)
+        self.is_a = is_a
+        self.part_of = part_of
 
-        # to store immediate children/parts
-        self.children = set()
-        self.parts = set()
-
-        # to store all descendants/ancestors
-        self.descendants = None
-        self.ancestors = None
+        # to store all descendants/ancestors (if not provided by the
+        # ontology that this term belongs to; see `ancestors`)
+        self._descendants = None
+        self._ancestors = None
 
     def __repr__(self):
         # The ID uniquely identifies the term
@@ -184,6 +201,83 @@ class GOTerm(object):
         """
         return 'GO:%07d' % acc
 
+    @staticmethod
+    def _get_id_tuple(ids):
+        """Convert GO term IDs to a sorted tuple of interned strings."""
+        return tuple(sorted(set(sys.intern(id_) for id_ in ids)))
+
+    @property
+    def is_a(self):
+        """The IDs of the GO terms that this GO term is a subtype of."""
+        return frozenset(self._is_a)
+
+    @is_a.setter
+    def is_a(self, value):
+        self._is_a = self._get_id_tuple(value)
+        if self._ontology is not None:
+            self._ontology._clear_cache()
+
+    @property
+    def part_of(self):
+        """The IDs of the GO terms that this GO term is a part of."""
+        return frozenset(self._part_of)
+
+    @part_of.setter
+    def part_of(self, value):
+        self._part_of = self._get_id_tuple(value)
+        if self._ontology is not None:
+            self._ontology._clear_cache()
+
+    @property
+    def children(self):
+        """The IDs of the GO terms that are subtypes of this GO term.
+
+        Children are determined by the ontology that the term belongs to.
+        """
+        if self._ontology is None:
+            return frozenset()
+        return frozenset(self._ontology._get_related('children', self.id))
+
+    @property
+    def parts(self):
+        """The IDs of the GO terms that are parts of this GO term.
+
+        Parts are determined by the ontology that the term belongs to.
+        """
+        if self._ontology is None:
+            return frozenset()
+        return frozenset(self._ontology._get_related('parts', self.id))
+
+    @property
+    def ancestors(self):
+        """The IDs of all ancestors of this GO term.
+
+        For terms belonging to a flattened `GeneOntology`, this is a view
+        generated on demand from the ontology's ancestor closure matrix.
+        """
+        if self._ancestors is None and self._ontology is not None:
+            return self._ontology._get_related('ancestors', self.id)
+        return self._ancestors
+
+    @ancestors.setter
+    def ancestors(self, value):
+        self._ancestors = value
+
+    @property
+    def descendants(self):
+        """The IDs of all descendants of this GO term.
+
+        For terms belonging to a flattened `GeneOntology`, this is a view
+        generated on demand from the ontology's descendant closure matrix.
+        """
+        if self._descendants is None and self._ontology is not None:
+            return self._ontology._get_related('descendants', self.id)
+        return self._descendants
+
+    @descendants.setter
+    def descendants(self, value):
+        self._descendants = value
+
     @property
     def acc(self):
         """Returns the GO term accession number (part of the ID)."""
@@ -1,2 +1,5 @@
 from .sequence import Sequence
-from .fasta import FastaReader
\ No newline at end of file
+from .fasta import FastaReader, FastaWriter
+from .fasta_index import get_fasta_index, index_fasta, read_fai, write_fai, \
+    write_gzi
+from .indexed_fasta import IndexedFasta, reverse_complement
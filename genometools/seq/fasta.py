@@ -14,63 +14,211 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-"""Module containing the `FastaReader` class."""
+"""Module containing the `FastaReader` and `FastaWriter` classes."""
 
 from __future__ import (absolute_import, division,
                         print_function, unicode_literals)
+_oldstr = str
 from builtins import *
 
+import io
+
 from . import Sequence
+from .sequence import _wrap_lines
+from .fasta_index import _iter_blocks
+from ..misc import BgzfWriter
 
 
 class FastaReader(object):
-    """A FASTA file reader."""
+    """A FASTA file reader.
+
+    The file is read in large blocks of bytes, and sequences are returned
+    as `Sequence` objects that store their sequence as bytes (which are only
+    decoded when needed).
+
+    Parameters
+    ----------
+    fh : str or file-like
+        The path of the FASTA file (plain, gzip'ed, or BGZF-compressed), or
+        a file-like object (preferably opened in binary mode).
+    block_size : int, optional
+        The number of bytes to read at once. [4194304]
+
+    Notes
+    -----
+    The name of each sequence is the complete header line (without the
+    leading ">").
+    """
 
-    def __init__(self, fh):
+    def __init__(self, fh, block_size=4194304):
+        assert isinstance(block_size, int) and block_size > 0
         self.fh = fh
-        self.cur_name = None
+        self.block_size = block_size
+        self._records = self._read()
 
     def __iter__(self):
         return self
 
     def __next__(self):
-        started = False
-        name = None
-        if self.cur_name is not None:
-            started = True
-            name = self.cur_name
+        return next(self._records)
 
-        seq = []
+    def _iter_blocks(self):
+        if isinstance(self.fh, (str, _oldstr)):
+            for block in _iter_blocks(self.fh, self.block_size):
+                yield block
+            return
 
+        fh = self.fh
+        is_text = isinstance(fh, io.TextIOBase)
+        if is_text and hasattr(fh, 'buffer'):
+            fh = fh.buffer
+            is_text = False
         while True:
+            block = fh.read(self.block_size)
+            if not block:
+                break
+            if is_text or not isinstance(block, bytes):
+                block = block.encode('ascii')
+            yield block
 
-            try:
-                l = self.fh.next()
-            except StopIteration:
-                if started:
-                    # we've read a sequence and now hit the end of the file
-                    self.cur_name = None
-                    break
+    def _read(self):
+        """Generate the sequences."""
+        name = None
+        header = []  # the parts of an incomplete header line
+        parts = []  # the sequence parts, without line breaks
+        line_start = True
+        for block in self._iter_blocks():
+            has_cr = b'\r' in block
+            i = 0
+            n = len(block)
+            while i < n:
+                if header:
+                    # complete the header line
+                    j = block.find(b'\n', i)
+                    if j == -1:
+                        header.append(block[i:])
+                        break
+                    header.append(block[i:j])
+                    name = b''.join(header)[1:].rstrip(b'\r').decode('UTF-8')
+                    header = []
+                    i = j + 1
+                    continue
+
+                # find the next header line
+                if block[i:(i + 1)] == b'>' and \
+                        (block[(i - 1):i] == b'\n' if i > 0 else line_start):
+                    j = i
                 else:
-                    # we haven't read a sequence, so the iterator is done
-                    raise StopIteration
-
-            if l[0] == '>':
-                if started:
-                    # this is already the beginning of the next sequence,
-                    # => store the name of the next sequence, so that the
-                    #    information from this line isn't lost
-                    self.cur_name = l[1:-1]
+                    j = block.find(b'\n>', i)
+                    if j != -1:
+                        j += 1
+
+                part = block[i:(n if j == -1 else j)]
+                if part:
+                    if name is None and part.strip():
+                        raise ValueError('FASTA file does not start with a '
+                                         'header.')
+                    part = part.replace(b'\n', b'')
+                    if has_cr:
+                        part = part.replace(b'\r', b'')
+                    parts.append(part)
+                if j == -1:
                     break
 
-                # this is the beginning of the sequence
-                started = True
-                name = l[1:-1]
+                if name is not None:
+                    yield Sequence(name, b''.join(parts))
+                parts = []
+                header.append(b'>')
+                i = j + 1
 
-            elif started:
-                if l[0] == '\n':  # we've hit an empty line (= sequence end)
-                    self.cur_name = None
-                    break
-                seq.append(l[:-1])
-            
-        return Sequence(name, ''.join(seq))
+            line_start = block.endswith(b'\n')
+
+        if header:
+            name = b''.join(header)[1:].rstrip(b'\r').decode('UTF-8')
+        if name is not None:
+            yield Sequence(name, b''.join(parts))
+
+
+class FastaWriter(object):
+    """A FASTA file writer.
+
+    Each sequence is wrapped into lines in bulk and written with a single
+    call. The output can be compressed in BGZF format, which can be read by
+    any gzip implementation, and which allows the blocks to be compressed
+    in parallel.
+
+    Parameters
+    ----------
+    fh : str or file-like
+        The path of the output file, or a file-like object opened in binary
+        mode.
+    linewidth : int, optional
+        The number of characters per line. [60]
+    compress : bool, optional
+        Whether to compress the output (in BGZF format). [False]
+    compress_level : int, optional
+        The zlib compression level. [6]
+    num_threads : int, optional
+        The number of threads used for compression. [1]
+    """
+
+    def __init__(self, fh, linewidth=60, compress=False, compress_level=6,
+                 num_threads=1):
+        assert isinstance(linewidth, int) and linewidth > 0
+        assert isinstance(compress, bool)
+        assert isinstance(compress_level, int)
+        assert isinstance(num_threads, int) and num_threads >= 1
+
+        self._own_fh = False
+        if isinstance(fh, (str, _oldstr)):
+            fh = io.open(fh, 'wb')
+            self._own_fh = True
+        self.fh = fh
+        self.linewidth = linewidth
+
+        self._writer = None
+        if compress:
+            self._writer = BgzfWriter(fh, compress_level, num_threads)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def write(self, seq):
+        """Write a sequence.
+
+        Parameters
+        ----------
+        seq : `Sequence`
+            The sequence.
+
+        Returns
+        -------
+        None
+        """
+        assert isinstance(seq, Sequence)
+        data = b''.join([b'>', seq.name.encode('UTF-8'), b'\n',
+                         _wrap_lines(seq.data, self.linewidth)])
+        if self._writer is not None:
+            self._writer.write(data)
+        else:
+            self.fh.write(data)
+
+    def close(self):
+        """Write all buffered data.
+
+        The underlying file is only closed if it was opened by the writer.
+
+        Returns
+        -------
+        None
+        """
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._own_fh:
+            self.fh.close()
+        else:
+            self.fh.flush()
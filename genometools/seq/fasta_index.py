@@ -0,0 +1,380 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Functions for indexing FASTA files (in samtools ".fai" format)."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+_oldstr = str
+from builtins import *
+
+import io
+import gzip
+import struct
+import logging
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from ..misc import bgzf
+
+_LOGGER = logging.getLogger(__name__)
+
+FAI_COLUMNS = ['length', 'offset', 'linebases', 'linewidth']
+"""The columns of a FASTA index (apart from the sequence name)."""
+
+
+def _iter_blocks(path, block_size, gzi_entries=None):
+    """Read a (plain, gzip'ed, or BGZF-compressed) file in large blocks.
+
+    For BGZF files, the compressed and uncompressed offsets of each
+    compression block (except the first) are appended to ``gzi_entries``.
+    """
+    with io.open(path, 'rb') as fh:
+        magic = fh.read(2)
+
+    if magic == b'\x1f\x8b' and bgzf.is_bgzf(path):
+        with io.open(path, 'rb') as fh:
+            buf = []
+            buf_size = 0
+            coffset = 0
+            uoffset = 0
+            while True:
+                data, bsize = bgzf.read_bgzf_block(fh)
+                if bsize == 0:
+                    break
+                if data and uoffset > 0 and gzi_entries is not None:
+                    gzi_entries.append((coffset, uoffset))
+                coffset += bsize
+                uoffset += len(data)
+                buf.append(data)
+                buf_size += len(data)
+                if buf_size >= block_size:
+                    yield b''.join(buf)
+                    buf = []
+                    buf_size = 0
+            if buf:
+                yield b''.join(buf)
+        return
+
+    if magic == b'\x1f\x8b':
+        fh = gzip.open(path, 'rb')
+    else:
+        fh = io.open(path, 'rb')
+    with fh:
+        while True:
+            data = fh.read(block_size)
+            if not data:
+                break
+            yield data
+
+
+class _FastaScanner(object):
+    """Determines the length and layout of each sequence in a FASTA file.
+
+    Data is processed in blocks of complete lines, and all per-line
+    operations are vectorized.
+    """
+    def __init__(self):
+        self.names = []
+        self.lengths = []
+        self.offsets = []
+        self.linebases = []
+        self.linewidths = []
+        self.valid = []
+        # whether the last sequence contained a line that was not full
+        self.ended = False
+        # whether the line layout of the last sequence is still unknown
+        self.pending = False
+
+    def feed(self, data, base):
+        """Process a block of complete lines, starting at offset ``base``."""
+        arr = np.frombuffer(data, dtype=np.uint8)
+        ends = np.flatnonzero(arr == 10)
+        num_lines = ends.size
+        if num_lines == 0:
+            return
+        starts = np.empty(num_lines, dtype=np.int64)
+        starts[0] = 0
+        starts[1:] = ends[:-1] + 1
+        widths = ends - starts + 1
+        # for empty lines, this is the line break
+        is_header = arr[starts] == 62  # ">"
+        bases = widths - 1
+        bases -= (arr[np.maximum(ends - 1, 0)] == 13) & (bases > 0)
+        bases[is_header] = 0
+
+        headers = np.flatnonzero(is_header)
+        # the segments of lines belonging to each sequence
+        if headers.size > 0 and headers[0] == 0:
+            seg_starts = headers
+            continued = False
+        else:
+            seg_starts = np.r_[0, headers]
+            continued = True
+        if continued and not self.names:
+            if np.any(bases > 0):
+                raise ValueError('FASTA file does not start with a header.')
+            continued = False
+            seg_starts = headers
+            if headers.size == 0:
+                return
+            first = headers[0]
+            bases = bases[first:]
+            widths = widths[first:]
+            is_header = is_header[first:]
+            starts = starts[first:]
+            ends = ends[first:]
+            seg_starts = seg_starts - first
+            headers = headers - first
+            num_lines -= first
+        seg_sizes = np.diff(np.r_[seg_starts, num_lines])
+
+        # the layout of each sequence is determined by its first line
+        first_lines = np.minimum(headers + 1, num_lines - 1)
+        has_line = (headers + 1 < num_lines) & ~is_header[first_lines]
+        lb = np.where(has_line, bases[first_lines], 0)
+        lw = np.where(has_line, widths[first_lines], 0)
+        if continued:
+            if self.pending:
+                if is_header[0]:
+                    self.linebases[-1], self.linewidths[-1] = 0, 0
+                else:
+                    self.linebases[-1] = int(bases[0])
+                    self.linewidths[-1] = int(widths[0])
+            lb = np.r_[self.linebases[-1], lb]
+            lw = np.r_[self.linewidths[-1], lw]
+        self.pending = headers.size > 0 and headers[-1] == num_lines - 1
+
+        # check that all lines except the last one(s) are full
+        line_lb = np.repeat(lb, seg_sizes)
+        line_lw = np.repeat(lw, seg_sizes)
+        indices = np.arange(num_lines)
+        not_full = ~is_header & \
+            ((bases != line_lb) | (widths != line_lw))
+        first_not_full = np.minimum.reduceat(
+            np.where(not_full, indices, num_lines), seg_starts)
+        last_nonempty = np.maximum.reduceat(
+            np.where(bases > 0, indices, -1), seg_starts)
+        too_long = np.maximum.reduceat(bases > line_lb, seg_starts)
+        valid = (last_nonempty <= first_not_full) & ~too_long
+        ended = first_not_full < num_lines
+        lengths = np.add.reduceat(bases, seg_starts)
+
+        if continued:
+            self.lengths[-1] += int(lengths[0])
+            if self.ended and last_nonempty[0] >= 0:
+                valid[0] = False
+            self.valid[-1] = self.valid[-1] and bool(valid[0])
+            ended[0] |= self.ended
+            lengths = lengths[1:]
+            valid = valid[1:]
+            lb = lb[1:]
+            lw = lw[1:]
+
+        for h in headers:
+            name = bytes(data[(starts[h] + 1):ends[h]]).split(None, 1)
+            self.names.append(name[0].decode('UTF-8') if name else '')
+        self.offsets.extend((base + ends[headers] + 1).tolist())
+        self.lengths.extend(lengths.tolist())
+        self.linebases.extend(lb.tolist())
+        self.linewidths.extend(lw.tolist())
+        self.valid.extend(valid.tolist())
+        self.ended = bool(ended[-1])
+
+    def get_index(self):
+        index = pd.DataFrame(OrderedDict([
+            ('length', np.array(self.lengths, dtype=np.int64)),
+            ('offset', np.array(self.offsets, dtype=np.int64)),
+            ('linebases', np.array(self.linebases, dtype=np.int64)),
+            ('linewidth', np.array(self.linewidths, dtype=np.int64)),
+        ]), index=pd.Index(self.names, name='name'))
+        return index, np.array(self.valid, dtype=np.bool_)
+
+
+def get_fasta_index(path, check_lines=True, block_size=4194304,
+                    gzi_entries=None):
+    """Determine the length and file offset of each sequence in a FASTA file.
+
+    The file is read in large blocks, without constructing the sequences.
+
+    Parameters
+    ----------
+    path : str
+        The path of the FASTA file (plain, gzip'ed or BGZF-compressed).
+    check_lines : bool, optional
+        Whether to raise an error if the lines of a sequence do not have
+        the same length (which is required for random access). [True]
+    block_size : int, optional
+        The number of bytes processed at once. [4194304]
+    gzi_entries : list, optional
+        If specified and the file is BGZF-compressed, the compressed and
+        uncompressed offset of each compression block (except the first) is
+        appended to this list (see :func:`write_gzi`). [None]
+
+    Returns
+    -------
+    `pandas.DataFrame`
+        Table with one row for each sequence (indexed by the sequence name,
+        i.e., the first word of the header), and columns "length", "offset",
+        "linebases", and "linewidth" (see `samtools faidx`). For compressed
+        files, offsets refer to the uncompressed data.
+
+    Raises
+    ------
+    ValueError
+        If the file is not a valid FASTA file, or if ``check_lines`` is
+        `True` and a sequence has lines of different lengths.
+    """
+    assert isinstance(path, (str, _oldstr))
+    assert isinstance(check_lines, bool)
+    assert isinstance(block_size, int) and block_size > 0
+
+    scanner = _FastaScanner()
+    pending = b''
+    base = 0
+    for block in _iter_blocks(path, block_size, gzi_entries):
+        data = pending + block
+        end = data.rfind(b'\n') + 1
+        if end > 0:
+            scanner.feed(memoryview(data)[:end], base)
+        base += end
+        pending = data[end:]
+    if pending:
+        scanner.feed(pending + b'\n', base)
+
+    index, valid = scanner.get_index()
+    if check_lines and not np.all(valid):
+        name = index.index[np.flatnonzero(~valid)[0]]
+        raise ValueError('Sequence "%s" has lines of different lengths.'
+                         % name)
+    _LOGGER.debug('Indexed %d sequences in "%s".', len(index.index), path)
+    return index
+
+
+def write_fai(index, output_file):
+    """Write a FASTA index in samtools ".fai" format.
+
+    Parameters
+    ----------
+    index : `pandas.DataFrame`
+        The index (see :func:`get_fasta_index`).
+    output_file : str
+        The output file.
+
+    Returns
+    -------
+    None
+    """
+    assert isinstance(index, pd.DataFrame)
+    assert isinstance(output_file, (str, _oldstr))
+    with io.open(output_file, 'w', encoding='UTF-8') as ofh:
+        for name, row in zip(index.index, index[FAI_COLUMNS].values):
+            ofh.write('%s\t%d\t%d\t%d\t%d\n' % ((name,) + tuple(row)))
+
+
+def read_fai(path):
+    """Read a FASTA index in samtools ".fai" format.
+
+    Parameters
+    ----------
+    path : str
+        The path of the index file.
+
+    Returns
+    -------
+    `pandas.DataFrame`
+        The index (see :func:`get_fasta_index`).
+    """
+    assert isinstance(path, (str, _oldstr))
+    index = pd.read_csv(path, sep='\t', header=None, usecols=range(5),
+                        index_col=0, dtype={0: object},
+                        names=['name'] + FAI_COLUMNS)
+    return index.astype(np.int64)
+
+
+def write_gzi(gzi_entries, output_file):
+    """Write a BGZF block index in ".gzi" format (see `bgzip`).
+
+    Parameters
+    ----------
+    gzi_entries : list of (int, int)
+        The compressed and uncompressed offset of each compression block,
+        except the first (see :func:`get_fasta_index`).
+    output_file : str
+        The output file.
+
+    Returns
+    -------
+    None
+    """
+    assert isinstance(output_file, (str, _oldstr))
+    entries = np.array(gzi_entries, dtype='<u8').reshape(-1, 2)
+    with io.open(output_file, 'wb') as ofh:
+        ofh.write(struct.pack('<Q', entries.shape[0]))
+        ofh.write(entries.tobytes())
+
+
+def index_fasta(path, fai_file=None, gzi_file=None):
+    """Generate a samtools-compatible index for a FASTA file.
+
+    Parameters
+    ----------
+    path : str
+        The path of the FASTA file (plain or BGZF-compressed).
+    fai_file : str, optional
+        The path of the index file. If `None`, ".fai" is appended to
+        ``path``. [None]
+    gzi_file : str, optional
+        The path of the BGZF block index (only for BGZF-compressed files).
+        If `None`, ".gzi" is appended to ``path``. [None]
+
+    Returns
+    -------
+    `pandas.DataFrame`
+        The index (see :func:`get_fasta_index`).
+
+    Raises
+    ------
+    ValueError
+        If the file is gzip'ed, but not BGZF-compressed (i.e., does not
+        support random access), or if it is not a valid FASTA file.
+    """
+    assert isinstance(path, (str, _oldstr))
+    assert fai_file is None or isinstance(fai_file, (str, _oldstr))
+    assert gzi_file is None or isinstance(gzi_file, (str, _oldstr))
+
+    is_bgzf = bgzf.is_bgzf(path)
+    if not is_bgzf:
+        with io.open(path, 'rb') as fh:
+            if fh.read(2) == b'\x1f\x8b':
+                raise ValueError('Cannot index gzip\'ed FASTA files (use '
+                                 'BGZF compression instead).')
+
+    if fai_file is None:
+        fai_file = path + '.fai'
+    if gzi_file is None:
+        gzi_file = path + '.gzi'
+
+    gzi_entries = []
+    index = get_fasta_index(path, gzi_entries=gzi_entries)
+    write_fai(index, fai_file)
+    if is_bgzf:
+        write_gzi(gzi_entries, gzi_file)
+    _LOGGER.info('Wrote index for %d sequences to "%s".',
+                 len(index.index), fai_file)
+    return index
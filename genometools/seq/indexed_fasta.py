@@ -0,0 +1,287 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Random access to indexed FASTA files."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+_oldstr = str
+from builtins import *
+
+import io
+import os
+import mmap
+import logging
+
+import numpy as np
+import pandas as pd
+
+from .fasta_index import read_fai, index_fasta
+
+_LOGGER = logging.getLogger(__name__)
+
+_COMPLEMENT = bytes.maketrans(b'ACGTURYKMBVDHNacgturykmbvdhn',
+                              b'TGCAAYRMKVBHDNtgcaayrmkvbhdn')
+
+
+def reverse_complement(seq):
+    """Get the reverse complement of a nucleotide sequence.
+
+    IUPAC ambiguity codes are supported, and case is preserved.
+
+    Parameters
+    ----------
+    seq : bytes
+        The sequence.
+
+    Returns
+    -------
+    bytes
+        The reverse complement.
+    """
+    return seq.translate(_COMPLEMENT)[::-1]
+
+
+class IndexedFasta(object):
+    """Random access to the sequences in a FASTA file, using a ".fai" index.
+
+    The file is memory-mapped, so that only the parts of the file that
+    contain the requested regions are read. If the index file does not
+    exist, it is generated (see `index_fasta`). The file must not be
+    compressed. Instances can be shared between threads.
+
+    Parameters
+    ----------
+    path : str
+        See :attr:`path` attribute.
+    fai_file : str, optional
+        The path of the index file. If `None`, ".fai" is appended to
+        ``path``. [None]
+
+    Attributes
+    ----------
+    path : str
+        The path of the FASTA file.
+    """
+    def __init__(self, path, fai_file=None):
+
+        assert isinstance(path, (str, _oldstr))
+        assert fai_file is None or isinstance(fai_file, (str, _oldstr))
+
+        if fai_file is None:
+            fai_file = path + '.fai'
+
+        with io.open(path, 'rb') as fh:
+            if fh.read(2) == b'\x1f\x8b':
+                raise ValueError('Compressed FASTA files are not supported.')
+
+        if os.path.isfile(fai_file):
+            index = read_fai(fai_file)
+        else:
+            index = index_fasta(path, fai_file)
+
+        self.path = path
+        self._names = index.index.tolist()
+        self._name_indices = dict((n, i) for i, n in enumerate(self._names))
+        self._lengths = index['length'].values
+        self._offsets = index['offset'].values
+        self._linebases = index['linebases'].values
+        self._linewidths = index['linewidth'].values
+
+        self._mm = None
+        if os.path.getsize(path) > 0:
+            with io.open(path, 'rb') as fh:
+                self._mm = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __repr__(self):
+        return '<%s instance (path="%s")>' \
+               % (self.__class__.__name__, self.path)
+
+    def __str__(self):
+        return '<%s instance with %d sequences>' \
+               % (self.__class__.__name__, len(self))
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, name):
+        return name in self._name_indices
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        """Close the memory-mapped file.
+
+        Returns
+        -------
+        None
+        """
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    @property
+    def names(self):
+        """The names of all sequences (in the order of the file).
+
+        Returns
+        -------
+        list of str
+        """
+        return list(self._names)
+
+    @property
+    def lengths(self):
+        """The length of each sequence.
+
+        Returns
+        -------
+        `pandas.Series`
+        """
+        return pd.Series(self._lengths, index=self._names)
+
+    def _get_offset(self, i, pos):
+        """Get the file offset of a (0-based) position."""
+        lb = self._linebases[i]
+        return int(self._offsets[i] + (pos // lb) * self._linewidths[i] +
+                   pos % lb)
+
+    def _fetch(self, i, start, end):
+        """Get the sequence between two (0-based, half-open) positions."""
+        if end <= start:
+            return b''
+        lb = int(self._linebases[i])
+        lw = int(self._linewidths[i])
+        first_line = start // lb
+        last_line = (end - 1) // lb
+        if first_line == last_line:
+            return self._mm[self._get_offset(i, start):
+                            (self._get_offset(i, end - 1) + 1)]
+
+        # read all lines except the last one, and remove line breaks
+        line_offset = int(self._offsets[i]) + first_line * lw
+        lines = np.frombuffer(self._mm, dtype=np.uint8,
+                              count=(last_line - first_line) * lw,
+                              offset=line_offset).reshape(-1, lw)
+        head = lines[:, :lb].ravel()[(start % lb):]
+        tail = self._mm[(line_offset + (last_line - first_line) * lw):
+                        (self._get_offset(i, end - 1) + 1)]
+        return head.tobytes() + tail
+
+    def _get_index(self, name):
+        try:
+            return self._name_indices[name]
+        except KeyError:
+            raise KeyError('Sequence "%s" not found in "%s".'
+                           % (name, self.path))
+
+    def fetch(self, name, start=None, end=None, reverse=False):
+        """Get (a region of) a sequence.
+
+        Parameters
+        ----------
+        name : str
+            The sequence name (e.g., a chromosome).
+        start : int, optional
+            The start position of the region (1-based). If `None`, the
+            region starts at the beginning of the sequence. [None]
+        end : int, optional
+            The end position of the region (1-based, inclusive). If `None`,
+            the region extends to the end of the sequence. [None]
+        reverse : bool, optional
+            Whether to return the reverse complement. [False]
+
+        Returns
+        -------
+        bytes
+            The sequence of the region (truncated at the sequence ends).
+
+        Raises
+        ------
+        KeyError
+            If there is no sequence with the given name.
+        """
+        assert isinstance(name, (str, _oldstr))
+        assert start is None or isinstance(start, (int, np.integer))
+        assert end is None or isinstance(end, (int, np.integer))
+        assert isinstance(reverse, bool)
+
+        i = self._get_index(name)
+        length = int(self._lengths[i])
+        start = 0 if start is None else min(max(int(start) - 1, 0), length)
+        end = length if end is None else min(max(int(end), 0), length)
+        seq = self._fetch(i, start, end)
+        if reverse:
+            seq = reverse_complement(seq)
+        return seq
+
+    def fetch_regions(self, regions):
+        """Get the sequences of many regions.
+
+        Regions are read in the order in which they appear in the file, to
+        minimize random I/O. Regions on the minus strand are
+        reverse-complemented.
+
+        Parameters
+        ----------
+        regions : `pandas.DataFrame`
+            The regions, either in BED format (with columns "chrom",
+            "chromStart" (0-based), "chromEnd", and optionally "strand"), or
+            with columns "chromosome", "start" (1-based), "end", and
+            optionally "strand" (see `ensembl.TranscriptModels`).
+
+        Returns
+        -------
+        list of bytes
+            The sequence of each region (in the order of ``regions``).
+
+        Raises
+        ------
+        KeyError
+            If a sequence name is not found.
+        """
+        assert isinstance(regions, pd.DataFrame)
+
+        if 'chromStart' in regions.columns:
+            names = regions['chrom'].values
+            starts = regions['chromStart'].values.astype(np.int64)
+        else:
+            names = regions['chromosome'].values
+            starts = regions['start'].values.astype(np.int64) - 1
+        ends = regions['end' if 'end' in regions.columns
+                       else 'chromEnd'].values.astype(np.int64)
+        reverse = np.zeros(len(regions.index), dtype=np.bool_)
+        if 'strand' in regions.columns:
+            reverse = (regions['strand'].values == '-')
+
+        indices = np.array([self._get_index(n) for n in names],
+                           dtype=np.int64).reshape(-1)
+        lengths = self._lengths[indices]
+        starts = np.minimum(np.maximum(starts, 0), lengths)
+        ends = np.minimum(np.maximum(ends, 0), lengths)
+
+        seqs = [None] * indices.size
+        order = np.lexsort([starts, self._offsets[indices]])
+        for j in order.tolist():
+            seq = self._fetch(indices[j], int(starts[j]), int(ends[j]))
+            if reverse[j]:
+                seq = reverse_complement(seq)
+            seqs[j] = seq
+        return seqs
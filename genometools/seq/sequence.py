@@ -16,12 +16,50 @@
 
 """Module containing the `Sequence` class."""
 
+import numpy as np
+
+
+def _wrap_lines(data, linewidth):
+    """Split a sequence into lines of a fixed width.
+
+    Parameters
+    ----------
+    data : bytes
+        The sequence.
+    linewidth : int
+        The number of characters per line.
+
+    Returns
+    -------
+    bytes
+        The lines, each terminated by a line break.
+    """
+    n = len(data)
+    if n == 0:
+        return b''
+    num_full = n // linewidth
+    remainder = n - num_full * linewidth
+    out = np.empty(num_full * (linewidth + 1) +
+                   (remainder + 1 if remainder > 0 else 0), dtype=np.uint8)
+    src = np.frombuffer(data, dtype=np.uint8)
+    lines = out[:(num_full * (linewidth + 1))].reshape(-1, linewidth + 1)
+    lines[:, :linewidth] = src[:(num_full * linewidth)].reshape(-1, linewidth)
+    lines[:, linewidth] = ord('\n')
+    if remainder > 0:
+        out[(num_full * (linewidth + 1)):-1] = src[(num_full * linewidth):]
+        out[-1] = ord('\n')
+    return out.tobytes()
+
+
 class Sequence(object):
-    """A nucleotide sequence."""
+    """A nucleotide sequence.
+
+    The sequence can be stored as bytes (e.g., by `FastaReader`), in which
+    case it is only decoded when the :attr:`seq` attribute is accessed.
+    """
 
     def __init__(self, name, seq):
         assert isinstance(name, str)
-        assert isinstance(seq, str)
         self.name = name
         self.seq = seq
 
@@ -47,18 +85,53 @@ class Sequence(object):
         data.append(self.seq)
         return hash(tuple(data))
 
+    @property
+    def seq(self):
+        """The sequence (str)."""
+        if self._seq is None:
+            self._seq = self._data.decode('ascii')
+        return self._seq
+
+    @seq.setter
+    def seq(self, seq):
+        assert isinstance(seq, (str, bytes))
+        if isinstance(seq, bytes):
+            self._seq = None
+            self._data = seq
+        else:
+            self._seq = seq
+            self._data = None
+
+    @property
+    def data(self):
+        """The sequence (bytes)."""
+        if self._data is None:
+            self._data = self._seq.encode('ascii')
+        return self._data
+
     @property
     def length(self):
-        return len(self.seq)
+        if self._data is not None:
+            return len(self._data)
+        return len(self._seq)
 
     @property
     def seq_hash(self):
         return hash(self.seq)
 
     def append_fasta(self, ofh, linewidth = 70):
-        ofh.write('>%s\n' %(self.name))
-        start = 0
-        while start < self.length - linewidth:
-            ofh.write('%s\n' %(self.seq[start:(start+linewidth)]))
-            start += linewidth
-        ofh.write('%s\n' %(self.seq[start:]))
+        """Write the sequence in FASTA format (see also `FastaWriter`).
+
+        Parameters
+        ----------
+        ofh : file-like
+            The output file, opened in text mode.
+        linewidth : int, optional
+            The number of characters per line. [70]
+
+        Returns
+        -------
+        None
+        """
+        lines = _wrap_lines(self.data, linewidth).decode('ascii')
+        ofh.write('>%s\n%s' % (self.name, lines))
@@ -42,7 +42,6 @@ install_requires = [
     'google-cloud-storage>=0.23.1',
     'oauth2client>=4, <5',
     'jinja2>=2.9.5, <3',
-    'biopython>=1.69',
     'sortedcontainers>=1.5.7,<2'
 ]
 
@@ -170,6 +169,12 @@ setup(
                 'genometools.ensembl.extract_protein_coding_exon_annotations:'
                 'main',
 
+            'ensembl_extract_annotations.py = '
+                'genometools.ensembl.cli.extract_annotations:main',
+
+            'ensembl_index_gtf.py = '
+                'genometools.ensembl.cli.index_gtf:main',
+
             # NCBI scripts
             'ncbi_extract_entrez2gene.py = '
                 'genometools.ncbi.extract_entrez2gene:main',
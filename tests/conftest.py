@@ -0,0 +1,283 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Fixtures shared by all tests.
+
+Provides minimal FTP and HTTP servers that serve a local directory, as
+stand-ins for remote servers (e.g., the Ensembl FTP server).
+"""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import str as text
+
+import os
+import socket
+import threading
+import posixpath
+import socketserver
+from http import server as http_server
+
+import pytest
+
+
+class _FTPHandler(socketserver.StreamRequestHandler):
+    """Handles a single FTP control connection (passive mode only)."""
+
+    def reply(self, msg):
+        self.wfile.write((msg + '\r\n').encode('UTF-8'))
+
+    def get_path(self, arg):
+        path = posixpath.normpath(posixpath.join(self.cwd, arg or '.'))
+        return os.path.join(self.server.root, path.lstrip('/'))
+
+    def get_listing(self, path):
+        lines = []
+        for name in sorted(os.listdir(path)):
+            p = os.path.join(path, name)
+            if os.path.islink(p):
+                lines.append('lrwxrwxrwx 1 ftp ftp 0 Jan 01 00:00 %s -> %s'
+                             % (name, os.readlink(p)))
+            elif os.path.isdir(p):
+                lines.append('drwxr-xr-x 2 ftp ftp 0 Jan 01 00:00 %s' % name)
+            else:
+                lines.append('-rw-r--r-- 1 ftp ftp %d Jan 01 00:00 %s'
+                             % (os.path.getsize(p), name))
+        return lines
+
+    def transfer(self, data, interrupt_after=None):
+        if self.data_sock is None:
+            self.reply('425 Use PASV first.')
+            return
+        self.reply('150 Opening data connection.')
+        conn, _ = self.data_sock.accept()
+        self.data_sock.close()
+        self.data_sock = None
+        try:
+            conn.sendall(data[:interrupt_after])
+        finally:
+            conn.close()
+        if interrupt_after is not None:
+            self.reply('426 Transfer aborted.')
+        else:
+            self.reply('226 Transfer complete.')
+
+    def handle(self):
+        self.cwd = '/'
+        self.data_sock = None
+        rest = 0
+        with self.server.lock:
+            self.server.connections.add(self.request)
+        try:
+            self.reply('220 Test FTP server ready.')
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    break
+                cmd, _, arg = line.decode('UTF-8').strip().partition(' ')
+                cmd = cmd.upper()
+                if cmd == 'USER':
+                    self.reply('331 Password required.')
+                elif cmd == 'PASS':
+                    with self.server.lock:
+                        self.server.num_logins += 1
+                    self.reply('230 Logged in.')
+                elif cmd in ['TYPE', 'NOOP']:
+                    self.reply('200 OK.')
+                elif cmd == 'PWD':
+                    self.reply('257 "%s"' % self.cwd)
+                elif cmd == 'CWD':
+                    if os.path.isdir(self.get_path(arg)):
+                        self.cwd = posixpath.normpath(
+                            posixpath.join(self.cwd, arg))
+                        self.reply('250 OK.')
+                    else:
+                        self.reply('550 No such directory.')
+                elif cmd == 'PASV':
+                    self.data_sock = socket.socket()
+                    self.data_sock.bind(('127.0.0.1', 0))
+                    self.data_sock.listen(1)
+                    port = self.data_sock.getsockname()[1]
+                    self.reply('227 Entering Passive Mode (127,0,0,1,%d,%d).'
+                               % (port // 256, port % 256))
+                elif cmd in ['LIST', 'NLST']:
+                    path = self.get_path(arg)
+                    if not os.path.isdir(path):
+                        self.reply('550 No such directory.')
+                        continue
+                    if cmd == 'LIST':
+                        lines = self.get_listing(path)
+                    else:
+                        lines = [posixpath.join(arg, n) if arg else n
+                                 for n in sorted(os.listdir(path))]
+                    self.transfer(''.join(l + '\r\n' for l in lines)
+                                  .encode('UTF-8'))
+                elif cmd == 'SIZE':
+                    path = self.get_path(arg)
+                    if os.path.isfile(path):
+                        self.reply('213 %d' % os.path.getsize(path))
+                    else:
+                        self.reply('550 No such file.')
+                elif cmd == 'REST':
+                    rest = int(arg)
+                    self.reply('350 Restarting at %d.' % rest)
+                elif cmd == 'RETR':
+                    path = self.get_path(arg)
+                    if not os.path.isfile(path):
+                        self.reply('550 No such file.')
+                        continue
+                    with open(path, 'rb') as fh:
+                        fh.seek(rest)
+                        data = fh.read()
+                    rest = 0
+                    with self.server.lock:
+                        self.server.num_retrievals += 1
+                        interrupt_after = self.server.interrupt_after
+                        self.server.interrupt_after = None
+                    self.transfer(data, interrupt_after)
+                elif cmd == 'QUIT':
+                    self.reply('221 Goodbye.')
+                    break
+                else:
+                    self.reply('502 Command not implemented.')
+        except (OSError, EOFError):
+            pass
+        finally:
+            if self.data_sock is not None:
+                self.data_sock.close()
+            with self.server.lock:
+                self.server.connections.discard(self.request)
+
+
+class _FTPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, root):
+        socketserver.TCPServer.__init__(self, ('127.0.0.1', 0), _FTPHandler)
+        self.root = root
+        self.lock = threading.Lock()
+        self.connections = set()
+        self.num_logins = 0
+        self.num_retrievals = 0
+        # the next transfer is aborted after this many bytes
+        self.interrupt_after = None
+
+    @property
+    def host(self):
+        return self.server_address[0]
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def drop_connections(self):
+        """Close all control connections (simulates server timeouts)."""
+        with self.lock:
+            connections = list(self.connections)
+        for conn in connections:
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class _HTTPHandler(http_server.BaseHTTPRequestHandler):
+    """Serves files, with support for range requests ("bytes=start-")."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        path = os.path.join(self.server.root,
+                            posixpath.normpath(self.path).lstrip('/'))
+        range_ = self.headers.get('Range')
+        with self.server.lock:
+            self.server.requests.append((self.path, range_))
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, 'rb') as fh:
+            data = fh.read()
+
+        start = 0
+        with self.server.lock:
+            interrupt_after = self.server.interrupt_after
+            self.server.interrupt_after = None
+        if range_ is not None and self.server.support_ranges:
+            start = int(range_.split('=')[1].rstrip('-'))
+            if start >= len(data):
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d'
+                             % (start, len(data) - 1, len(data)))
+        else:
+            self.send_response(200)
+        if self.server.content_encoding is not None:
+            self.send_header('Content-Encoding', self.server.content_encoding)
+        self.send_header('Content-Length', str(len(data) - start))
+        self.end_headers()
+        self.wfile.write(data[start:][:interrupt_after])
+        if interrupt_after is not None:
+            self.close_connection = True
+
+
+class _HTTPServer(socketserver.ThreadingMixIn, http_server.HTTPServer):
+    daemon_threads = True
+
+    def __init__(self, root):
+        http_server.HTTPServer.__init__(self, ('127.0.0.1', 0), _HTTPHandler)
+        self.root = root
+        self.lock = threading.Lock()
+        # the path and "Range" header of each request
+        self.requests = []
+        self.support_ranges = True
+        # the "Content-Encoding" header sent with each file (the files are
+        # served as they are)
+        self.content_encoding = None
+        # the next transfer is aborted after this many bytes
+        self.interrupt_after = None
+
+    @property
+    def url(self):
+        return 'http://%s:%d' % self.server_address[:2]
+
+
+@pytest.fixture(scope='session')
+def my_http_server(tmpdir_factory):
+    """A local HTTP server serving a temporary directory."""
+    root = text(tmpdir_factory.mktemp('http_root'))
+    server = _HTTPServer(root)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture(scope='session')
+def my_ftp_server(tmpdir_factory):
+    """A local FTP server serving a temporary directory."""
+    root = text(tmpdir_factory.mktemp('ftp_root'))
+    server = _FTPServer(root)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
@@ -16,11 +16,16 @@
 
 """Tests for the `ensembl.annotation` module."""
 
+import io
+import re
+import gzip
 import hashlib
 
+import pandas as pd
 from pandas.util import hash_pandas_object
 
 from genometools import ensembl
+from genometools import gtf
 
 
 def test_get_genes(my_gene_annotation_file):
@@ -31,3 +36,78 @@ def test_get_genes(my_gene_annotation_file):
     assert len(genes) == 4
     h = hashlib.md5(hash_pandas_object(genes).values.tobytes()).hexdigest()
     assert h == 'a72941001a18af44ffdd555c4fe30bd8'
+
+
+def test_extract_annotations(tmpdir, my_gene_annotation_file):
+    """Test the single-pass extraction of annotations."""
+    gene_file = str(tmpdir.join('genes.tsv'))
+    gene_id_file = str(tmpdir.join('gene_ids.tsv'))
+    transcript_file = str(tmpdir.join('transcripts.tsv'))
+    exon_file = str(tmpdir.join('exons.gtf'))
+
+    valid_biotypes = ['protein_coding', 'polymorphic_pseudogene']
+    genes = ensembl.extract_annotations(
+        my_gene_annotation_file, valid_biotypes, gene_file=gene_file,
+        gene_id_file=gene_id_file, transcript_file=transcript_file,
+        exon_file=exon_file)
+    assert genes.equals(
+        ensembl.get_protein_coding_genes(my_gene_annotation_file))
+
+    df = pd.read_csv(gene_file, sep='\t', index_col=0)
+    assert df.index.tolist() == genes.index.tolist()
+    assert df['name'].tolist() == genes['name'].tolist()
+
+    df = pd.read_csv(gene_id_file, sep='\t', header=None)
+    assert df[0].tolist() == sorted(genes.index)
+    assert df[1].tolist() == genes['name'].loc[sorted(genes.index)].tolist()
+
+    # compare to the original GTF lines
+    with gzip.open(my_gene_annotation_file, 'rt') as fh:
+        lines = [l for l in fh if not l.startswith('#')]
+    gene_ids = set(genes.index)
+
+    def get_lines(feature):
+        return [l for l in lines if l.split('\t')[2] == feature and
+                gtf.parse_attributes(l.split('\t')[8])['gene_id']
+                in gene_ids]
+
+    with open(exon_file) as fh:
+        assert fh.readlines() == get_lines('exon')
+
+    df = pd.read_csv(transcript_file, sep='\t')
+    transcript_ids = [gtf.parse_attributes(l.split('\t')[8])['transcript_id']
+                      for l in get_lines('transcript')]
+    assert df['transcript_id'].tolist() == transcript_ids
+    assert df['gene_id'].isin(gene_ids).all()
+
+
+def test_extract_annotations_buffer(my_gene_annotation_file):
+    with gzip.open(my_gene_annotation_file, 'rb') as fh:
+        data = fh.read()
+    ofh = io.BytesIO()
+    genes = ensembl.extract_annotations(
+        io.BytesIO(data), ['protein_coding'], gene_id_file=ofh)
+    assert ofh.getvalue().decode('ascii').splitlines() == \
+        ['%s\t%s' % (id_, genes.loc[id_, 'name'])
+         for id_ in sorted(genes.index)]
+
+
+def test_extract_annotations_unnamed(my_gene_annotation_file):
+    """Genes without a name are not included in the list of gene IDs."""
+    with gzip.open(my_gene_annotation_file, 'rb') as fh:
+        lines = fh.read().splitlines(True)
+    genes = ensembl.extract_annotations(io.BytesIO(b''.join(lines)),
+                                        ['protein_coding'])
+    unnamed_id = sorted(genes.index)[0]
+    for i, l in enumerate(lines):
+        if l.split(b'\t')[2:3] == [b'gene'] and \
+                ('gene_id "%s"' % unnamed_id).encode('ascii') in l:
+            lines[i] = re.sub(br'gene_name "[^"]*"; ', b'', l)
+
+    ofh = io.BytesIO()
+    genes = ensembl.extract_annotations(
+        io.BytesIO(b''.join(lines)), ['protein_coding'], gene_id_file=ofh)
+    assert genes.loc[unnamed_id, 'name'] == unnamed_id
+    assert ofh.getvalue().decode('ascii').splitlines() == \
+        ['%s\t%s' % (id_, genes.loc[id_, 'name'])
+         for id_ in sorted(genes.index) if id_ != unnamed_id]
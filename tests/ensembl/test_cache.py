@@ -0,0 +1,159 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the `ensembl.cache` module."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+import os
+import shutil
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from genometools import ensembl
+from genometools.ensembl import GTFCache
+from genometools.ensembl.cache import write_tables, read_tables
+
+
+def _get_tables():
+    a = pd.DataFrame(OrderedDict([
+        ('chromosome', pd.Categorical(['1', '1', 'X'])),
+        ('start', np.array([1, 5, 10], dtype=np.int64)),
+        ('name', np.array(['a', None, 'c'], dtype=object)),
+        ('score', np.array([0.5, np.nan, 1.0])),
+    ]))
+    b = pd.DataFrame({'length': [3, 4]},
+                     index=pd.Index(['ENSG01', 'ENSG02'], name='ensembl_id'))
+    c = pd.DataFrame({'name': np.zeros(0, dtype=object)})
+    return {'a': a, 'b': b, 'c': c}
+
+
+def test_tables(tmpdir):
+    path = str(tmpdir.join('tables.npz'))
+    tables = _get_tables()
+    write_tables(path, tables)
+    tables2 = read_tables(path)
+    assert sorted(tables2.keys()) == ['a', 'b', 'c']
+    for name, df in tables.items():
+        df2 = tables2[name]
+        assert df2.equals(df)
+        assert df2.index.equals(df.index)
+        assert df2.index.name == df.index.name
+        assert (df2.dtypes == df.dtypes).all()
+    assert tables2['a']['name'].tolist() == ['a', None, 'c']
+
+
+def test_cache(tmpdir, my_gene_annotation_file):
+    cache_dir = str(tmpdir.join('cache'))
+    cache = GTFCache(cache_dir)
+    assert len(cache) == 0
+
+    key = cache.get_key(my_gene_annotation_file, 'test', option=1)
+    assert key == cache.get_key(my_gene_annotation_file, 'test', option=1)
+    assert key != cache.get_key(my_gene_annotation_file, 'test', option=2)
+    assert key not in cache
+    assert cache.get(key) is None
+
+    tables = _get_tables()
+    cache.put(key, tables)
+    assert key in cache
+    assert len(cache) == 1
+    assert cache.size > 0
+    assert cache.get(key)['a'].equals(tables['a'])
+
+    # changes to the file are detected
+    path = str(tmpdir.join('annotations.gtf.gz'))
+    shutil.copyfile(my_gene_annotation_file, path)
+    key1 = cache.get_key(path, 'test')
+    with open(path, 'ab') as ofh:
+        ofh.write(b'\0')
+    assert cache.get_key(path, 'test') != key1
+
+    # invalid entries are removed
+    with open(cache._get_entry_path(key), 'wb') as ofh:
+        ofh.write(b'invalid')
+    assert cache.get(key) is None
+    assert len(cache) == 0
+
+
+def test_cache_failed_write(tmpdir, monkeypatch):
+    cache_dir = str(tmpdir.join('cache'))
+    cache = GTFCache(cache_dir)
+
+    def write_tables(file, tables):
+        raise IOError('No space left on device')
+    monkeypatch.setattr(ensembl.cache, 'write_tables', write_tables)
+    with pytest.raises(IOError):
+        cache.put('key', _get_tables())
+    # no temporary files are left behind
+    assert os.listdir(cache_dir) == []
+
+
+def test_cache_eviction(tmpdir):
+    cache_dir = str(tmpdir.join('cache'))
+    cache = GTFCache(cache_dir)
+    tables = _get_tables()
+    for i, key in enumerate(['k1', 'k2', 'k3']):
+        cache.put(key, tables)
+        # make sure the modification times differ
+        os.utime(cache._get_entry_path(key), (1000 + i, 1000 + i))
+    entry_size = cache.size // 3
+
+    # accessing an entry marks it as recently used
+    assert cache.get('k1') is not None
+
+    cache.max_size = 2 * entry_size
+    assert cache.evict() == 1
+    assert 'k1' in cache and 'k2' not in cache and 'k3' in cache
+
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_get_genes_cached(tmpdir, my_gene_annotation_file):
+    cache_dir = str(tmpdir.join('cache'))
+    genes = ensembl.get_protein_coding_genes(my_gene_annotation_file)
+    for _ in range(2):
+        genes_cached = ensembl.get_protein_coding_genes(
+            my_gene_annotation_file, cache_dir=cache_dir)
+        assert genes_cached.equals(genes)
+        assert genes_cached.index.equals(genes.index)
+    assert len(GTFCache(cache_dir)) == 1
+
+
+def test_get_annotation_tables(tmpdir, my_gene_annotation_file):
+    cache_dir = str(tmpdir.join('cache'))
+    tables = ensembl.get_annotation_tables(my_gene_annotation_file)
+    assert sorted(tables.keys()) == ['exon', 'gene', 'transcript']
+    genes = tables['gene']
+    assert genes.columns.tolist() == [
+        'chromosome', 'source', 'start', 'end', 'strand',
+        'gene_id', 'gene_name', 'gene_biotype']
+    transcripts = tables['transcript']
+    exons = tables['exon']
+    assert transcripts['gene_id'].isin(genes['gene_id']).all()
+    assert exons['transcript_id'].isin(transcripts['transcript_id']).all()
+
+    for _ in range(2):
+        tables2 = ensembl.get_annotation_tables(
+            my_gene_annotation_file, cache_dir=cache_dir)
+        for feature, df in tables.items():
+            assert tables2[feature].equals(df)
+    assert len(GTFCache(cache_dir)) == 3
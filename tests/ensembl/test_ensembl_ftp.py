@@ -0,0 +1,112 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests for functions that access the Ensembl FTP server, using a local
+FTP server."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+import os
+import ftplib
+
+import pytest
+
+from genometools import ensembl
+from genometools import misc
+
+_SPECIES = {
+    'homo_sapiens': 'Homo_sapiens.GRCh38',
+    'mus_musculus': 'Mus_musculus.GRCm38',
+}
+
+
+@pytest.fixture(scope='session')
+def my_ensembl_ftp(my_ftp_server):
+    """Create a (tiny) copy of the Ensembl FTP server directory tree."""
+    pub = os.path.join(my_ftp_server.root, 'pub')
+    release = os.path.join(pub, 'release-90')
+    for species, prefix in _SPECIES.items():
+        gtf_dir = os.path.join(release, 'gtf', species)
+        os.makedirs(gtf_dir)
+        gtf_file = '%s.90.gtf.gz' % prefix
+        with open(os.path.join(gtf_dir, gtf_file), 'wb') as ofh:
+            ofh.write(b'gtf')
+        with open(os.path.join(gtf_dir, 'CHECKSUMS'), 'w') as ofh:
+            ofh.write('12345 1 README\n%d 1 %s\n' % (len(species), gtf_file))
+        cdna_dir = os.path.join(release, 'fasta', species, 'cdna')
+        os.makedirs(cdna_dir)
+        with open(os.path.join(cdna_dir, '%s.cdna.all.fa.gz' % prefix),
+                  'wb') as ofh:
+            ofh.write(b'cdna')
+    with open(os.path.join(release, 'README'), 'w') as ofh:
+        ofh.write('Release 90')
+    os.symlink('release-90/README', os.path.join(pub, 'current_README'))
+    return my_ftp_server
+
+
+@pytest.fixture
+def my_pool(my_ensembl_ftp):
+    pool = misc.FTPConnectionPool(my_ensembl_ftp.host,
+                                  port=my_ensembl_ftp.port, timeout=10)
+    yield pool
+    pool.close()
+
+
+def test_latest_release(my_pool):
+    assert ensembl.get_latest_release(ftp=my_pool) == 90
+
+
+def test_annotation_urls(my_pool, my_ensembl_ftp):
+    species = ['Homo_sapiens', 'Mus_musculus']
+    num_retrievals = my_ensembl_ftp.num_retrievals
+    for _ in range(2):
+        data = ensembl.get_annotation_urls_and_checksums(
+            species, ftp=my_pool)
+        assert list(data.keys()) == species
+        url, checksum = data['Mus_musculus']
+        assert url == 'ftp://%s:%d/pub/release-90/gtf/mus_musculus/' \
+                      'Mus_musculus.GRCm38.90.gtf.gz' \
+                      % (my_ensembl_ftp.host, my_ensembl_ftp.port)
+        assert checksum == len('mus_musculus')
+    # CHECKSUMS files are cached
+    assert my_ensembl_ftp.num_retrievals == num_retrievals + 2
+    assert my_pool.num_connections <= my_pool.max_connections
+
+
+def test_cdna_url(my_pool):
+    url = ensembl.get_cdna_url('homo_sapiens', ftp=my_pool)
+    assert url.endswith('/pub/release-90/fasta/homo_sapiens/cdna/'
+                        'Homo_sapiens.GRCh38.cdna.all.fa.gz')
+    with pytest.raises(ValueError):
+        ensembl.get_cdna_url('danio_rerio', release=90, ftp=my_pool)
+
+
+def test_single_connection(my_ensembl_ftp):
+    # plain FTP connections are still supported
+    ftp = ftplib.FTP()
+    ftp.connect(my_ensembl_ftp.host, my_ensembl_ftp.port)
+    ftp.login('anonymous')
+    try:
+        assert ensembl.get_latest_release(ftp=ftp) == 90
+        data = ensembl.get_annotation_urls_and_checksums(
+            'Homo_sapiens', release=90, ftp=ftp)
+        assert data['Homo_sapiens'][1] == len('homo_sapiens')
+        url = ensembl.get_cdna_url('mus_musculus', release=90, ftp=ftp)
+        assert url.endswith('Mus_musculus.GRCm38.cdna.all.fa.gz')
+    finally:
+        ftp.close()
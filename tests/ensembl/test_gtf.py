@@ -0,0 +1,132 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the `gtf` module."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+import io
+import gzip
+
+import pandas as pd
+
+from genometools import gtf
+
+
+def test_parse_attributes():
+    attr = gtf.parse_attributes(
+        r'gene_id "ENSG01"; gene_name "A\;B"; tag "basic"; '
+        r'tag "CCDS";   level 2;')
+    assert attr == {'gene_id': 'ENSG01', 'gene_name': r'A\;B',
+                    'tag': 'CCDS', 'level': '2'}
+    assert gtf.parse_attributes('gene_id "ENSG01"') == {'gene_id': 'ENSG01'}
+    assert gtf.parse_attributes('') == {}
+
+
+def test_extract_attributes():
+    attributes = pd.Series([
+        'gene_id "ENSG01"; gene_name "A"; tag "basic"; tag "CCDS";',
+        'gene_id "ENSG02"; note "a gene_name b"; level 2',
+        r'gene_id "ENSG03";gene_name "C\;D"; my_gene_name "E";',
+        '',
+        r'note "x\; gene_name y"; gene_id "ENSG05"',
+    ], index=list('abcde'))
+    df = gtf.extract_attributes(attributes, ['gene_id', 'gene_name', 'tag',
+                                             'level', 'unknown'])
+    assert df.index.tolist() == list('abcde')
+    assert df.columns.tolist() == ['gene_id', 'gene_name', 'tag', 'level',
+                                   'unknown']
+    assert df['gene_id'].tolist() == \
+        ['ENSG01', 'ENSG02', 'ENSG03', None, 'ENSG05']
+    assert df['gene_name'].tolist() == ['A', None, r'C\;D', None, None]
+    assert df['tag'].tolist() == ['CCDS', None, None, None, None]
+    assert df['level'].tolist() == [None, '2', None, None, None]
+    assert df['unknown'].isnull().all()
+
+    # the results are consistent with the scalar parser
+    for i, s in enumerate(attributes):
+        attr = gtf.parse_attributes(s)
+        for key in ['gene_id', 'gene_name', 'tag', 'level']:
+            assert df[key].iloc[i] == attr.get(key)
+
+    df = gtf.extract_attributes([], 'gene_id')
+    assert df.shape == (0, 1)
+
+
+def test_extract_attributes_whitespace():
+    attributes = [
+        '  gene_id "ENSG01"; gene_name "A";',
+        '\tgene_id "ENSG02"; gene_name "B"; level 2 ',
+        ' gene_id "ENSG03";gene_name "C"',
+    ]
+    keys = ['gene_id', 'gene_name', 'level']
+    df = gtf.extract_attributes(attributes, keys)
+    assert df['gene_id'].tolist() == ['ENSG01', 'ENSG02', 'ENSG03']
+    for i, s in enumerate(attributes):
+        attr = gtf.parse_attributes(s)
+        assert df.iloc[i].tolist() == [attr.get(k) for k in keys]
+
+
+def test_extract_attributes_file(my_gene_annotation_file):
+    with gzip.open(my_gene_annotation_file, 'rt') as fh:
+        attributes = [l.rstrip('\n').split('\t')[8] for l in fh
+                      if not l.startswith('#')]
+    keys = ['gene_id', 'gene_name', 'gene_biotype', 'transcript_id',
+            'exon_number', 'tag', 'ccds_id']
+    df = gtf.extract_attributes(attributes, keys)
+    assert len(df.index) == len(attributes)
+    for i, s in enumerate(attributes):
+        attr = gtf.parse_attributes(s)
+        assert df.iloc[i].tolist() == [attr.get(k) for k in keys]
+
+
+def test_read_feature_lines(my_gene_annotation_file):
+    with gzip.open(my_gene_annotation_file, 'rb') as fh:
+        expected = b''.join(l for l in fh if not l.startswith(b'#') and
+                            l.split(b'\t')[2] == b'gene')
+    assert expected
+    lines = gtf.read_feature_lines(my_gene_annotation_file, 'gene')
+    assert lines == expected
+
+    # small blocks (lines are split across blocks)
+    lines = gtf.read_feature_lines(my_gene_annotation_file, 'gene',
+                                   block_size=100)
+    assert lines == expected
+
+
+def test_read_feature_lines_buffer():
+    text = ('#!genome-build test\n'
+            '1\tgene\tgene\t1\t10\t.\t+\t.\tgene_id "A";\n'
+            '1\thavana\texon\t1\t10\t.\t+\t.\tnote "\tgene\t";\n'
+            '#1\thavana\tgene\t1\t10\t.\t+\t.\tgene_id "B";\n'
+            '2\thavana\tgene\t5\t20\t.\t-\t.\tgene_id "C";')
+    lines = gtf.read_feature_lines(io.StringIO(text), 'gene')
+    assert lines == (b'1\tgene\tgene\t1\t10\t.\t+\t.\tgene_id "A";\n'
+                     b'2\thavana\tgene\t5\t20\t.\t-\t.\tgene_id "C";\n')
+    assert gtf.read_feature_lines(
+        io.BytesIO(text.encode('ascii')), 'gene', block_size=7) == lines
+    assert gtf.read_feature_lines(io.BytesIO(b''), 'gene') == b''
+
+
+def test_split_feature_lines(my_gene_annotation_file):
+    features = ['gene', 'transcript', 'exon']
+    lines = gtf.split_feature_lines(my_gene_annotation_file, features,
+                                    block_size=1000)
+    assert list(lines.keys()) == features
+    for feature in features:
+        assert lines[feature] == \
+            gtf.read_feature_lines(my_gene_annotation_file, feature)
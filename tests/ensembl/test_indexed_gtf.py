@@ -0,0 +1,80 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests for the `IndexedGTF` class."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import str as text
+
+import gzip
+
+import pytest
+
+from genometools import ensembl
+from genometools import misc
+
+
+@pytest.fixture(scope='session')
+def my_indexed_gtf(my_gene_annotation_file, tmpdir_factory):
+    path = text(tmpdir_factory.mktemp('indexed_gtf').join('test.gtf.gz'))
+    return ensembl.write_indexed_gtf(my_gene_annotation_file, path)
+
+
+def _get_lines(path):
+    with gzip.open(path, 'rt') as fh:
+        return [l.rstrip('\n') for l in fh]
+
+
+def test_write(my_indexed_gtf, my_gene_annotation_file):
+    assert misc.is_bgzf(my_indexed_gtf.path)
+    lines = _get_lines(my_gene_annotation_file)
+    sorted_lines = _get_lines(my_indexed_gtf.path)
+    header = [l for l in lines if l.startswith('#')]
+    assert my_indexed_gtf.header == header
+    assert sorted(lines) == sorted(sorted_lines)
+    assert sorted_lines[:len(header)] == header
+    assert my_indexed_gtf.chromosomes == ['1']
+
+
+def test_fetch(my_indexed_gtf, my_gene_annotation_file):
+    lines = [l for l in _get_lines(my_gene_annotation_file)
+             if not l.startswith('#')]
+    fields = [l.split('\t') for l in lines]
+
+    for start, end in [(1, 20000), (100000, 100000), (500000, 2000000),
+                       (29554, 29570)]:
+        expected = [l for l, f in zip(lines, fields)
+                    if int(f[3]) <= end and int(f[4]) >= start]
+        result = my_indexed_gtf.fetch('1', start, end)
+        assert sorted(result) == sorted(expected)
+        starts = [int(l.split('\t')[3]) for l in result]
+        assert starts == sorted(starts)
+
+    assert len(my_indexed_gtf.fetch('1')) == len(lines)
+    assert my_indexed_gtf.fetch('X', 1, 100000) == []
+
+
+def test_query(my_indexed_gtf):
+    df = my_indexed_gtf.query('1', 11869, 11869, feature='gene')
+    assert df['attributes'].iloc[0]['gene_id'] == 'ENSG00000223972'
+    assert (df['feature'] == 'gene').all()
+    assert df['start'].dtype == int
+
+    reopened = ensembl.IndexedGTF(my_indexed_gtf.path)
+    assert len(reopened.query('1', 1, 20000).index) == \
+        len(my_indexed_gtf.fetch('1', 1, 20000))
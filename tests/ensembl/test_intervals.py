@@ -0,0 +1,138 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the `GenomicIntervalIndex` class."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+import numpy as np
+import pytest
+
+from genometools import ensembl
+from genometools.ensembl import GenomicIntervalIndex
+
+
+@pytest.fixture
+def my_index():
+    #   0: 1:100-200 (+), 1: 1:150-300 (-), 2: 1:1000-1100 (+),
+    #   3: 2:50-60 (-)
+    return GenomicIntervalIndex(
+        ['1', '1', '1', '2'], [100, 150, 1000, 50], [200, 300, 1100, 60],
+        ['+', '-', '+', '-'], ['a', 'b', 'c', 'd'])
+
+
+def test_overlaps(my_index):
+    query, intervals = my_index.overlaps(
+        ['1', '1', '1', '2', '3'], [160, 301, 50, 60, 1], [160, 999, 100, 70,
+                                                           1000])
+    assert query.tolist() == [0, 0, 2, 3]
+    assert intervals.tolist() == [0, 1, 0, 3]
+    assert my_index.count_overlaps(
+        ['1', '1', '1', '2', '3'], [160, 301, 50, 60, 1],
+        [160, 999, 100, 70, 1000]).tolist() == [2, 0, 1, 1, 0]
+
+
+def test_nearest(my_index):
+    chroms = ['1', '1', '1', '2', '3']
+    positions = [250, 600, 50, 100, 1]
+    indices, distances = my_index.nearest(chroms, positions)
+    assert indices.tolist() == [1, 1, 0, 3, -1]
+    assert distances.tolist() == [0, 300, 50, 40, -1]
+
+    indices, distances = my_index.nearest(chroms, positions, 'upstream')
+    assert indices.tolist() == [0, 1, -1, 3, -1]
+    assert distances.tolist() == [50, 300, -1, 40, -1]
+
+    indices, distances = my_index.nearest(chroms, positions, 'downstream')
+    assert indices.tolist() == [2, 2, 0, -1, -1]
+    assert distances.tolist() == [750, 400, 50, -1, -1]
+
+    # upstream on the "-" strand
+    indices, _ = my_index.nearest(chroms, positions, 'upstream',
+                                  strands=['-', '-', '+', '-', '+'])
+    assert indices.tolist() == [2, 2, -1, -1, -1]
+
+
+def test_tss_distances(my_index):
+    indices, distances = my_index.get_tss_distances(
+        ['1', '1', '2', '3'], [90, 310, 70, 1])
+    assert indices.tolist() == [0, 1, 3, -1]
+    # upstream of "+" strand TSS, upstream of "-" strand TSS, and
+    # upstream of "-" strand TSS
+    assert distances.tolist() == [-10, -10, -10, 0]
+
+    index = GenomicIntervalIndex(['1'], [1], [10])
+    with pytest.raises(ValueError):
+        index.get_tss_distances(['1'], [5])
+
+
+def test_random():
+    """Compare vectorized queries to a brute-force implementation."""
+    rng = np.random.RandomState(0)
+    n = 500
+    chroms = rng.choice(['1', '2', 'X'], n)
+    starts = rng.randint(1, 20000, n)
+    ends = starts + rng.randint(0, 2000, n)
+    strands = rng.choice(['+', '-'], n)
+    index = GenomicIntervalIndex(chroms, starts, ends, strands)
+
+    m = 200
+    q_chroms = rng.choice(['1', '2', 'X', 'Y'], m)
+    q_starts = rng.randint(1, 22000, m)
+    q_ends = q_starts + rng.randint(0, 500, m)
+
+    query, intervals = index.overlaps(q_chroms, q_starts, q_ends)
+    expected = set(
+        (i, j) for i in range(m) for j in np.nonzero(
+            (chroms == q_chroms[i]) & (starts <= q_ends[i]) &
+            (ends >= q_starts[i]))[0])
+    assert set(zip(query.tolist(), intervals.tolist())) == expected
+
+    indices, distances = index.nearest(q_chroms, q_starts)
+    for i in range(m):
+        same = (chroms == q_chroms[i])
+        if not same.any():
+            assert indices[i] == -1
+            continue
+        dist = np.maximum(0, np.maximum(starts - q_starts[i],
+                                        q_starts[i] - ends))
+        assert distances[i] == dist[same].min()
+        assert same[indices[i]] and dist[indices[i]] == distances[i]
+
+
+def test_from_genes(my_gene_annotation_file):
+    genes = ensembl.get_protein_coding_genes(my_gene_annotation_file)
+    table = ensembl.get_annotation_tables(
+        my_gene_annotation_file, ['gene'])['gene'].set_index('gene_id')
+    index = GenomicIntervalIndex.from_genes(genes)
+    assert index.names.tolist() == genes.index.tolist()
+    table = table.loc[genes.index]
+    assert index.starts.tolist() == table['start'].tolist()
+    assert index.ends.tolist() == table['end'].tolist()
+    assert index.strands.tolist() == table['strand'].astype(str).tolist()
+
+
+def test_npz(tmpdir, my_index):
+    path = str(tmpdir.join('index.npz'))
+    my_index.write_npz(path)
+    index = GenomicIntervalIndex.read_npz(path)
+    assert index.chromosomes.tolist() == my_index.chromosomes.tolist()
+    assert index.starts.tolist() == my_index.starts.tolist()
+    assert index.ends.tolist() == my_index.ends.tolist()
+    assert index.strands.tolist() == my_index.strands.tolist()
+    assert index.names.tolist() == my_index.names.tolist()
+    assert index.nearest(['1'], [600])[0].tolist() == [1]
@@ -0,0 +1,134 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the `TranscriptModels` class."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from genometools import ensembl
+from genometools.expression import ExpGeneTable
+from genometools.ensembl import TranscriptModels
+
+
+def _get_table(rows, columns):
+    df = pd.DataFrame(rows, columns=['chromosome', 'start', 'end',
+                                     'strand'] + columns)
+    df['source'] = 'havana'
+    return df
+
+
+@pytest.fixture
+def my_models():
+    genes = _get_table([
+        ['1', 100, 500, '+', 'G1', 'A', 'protein_coding'],
+        ['2', 1000, 2000, '-', 'G2', None, 'lincRNA'],
+    ], ['gene_id', 'gene_name', 'gene_biotype'])
+    transcripts = _get_table([
+        ['2', 1000, 2000, '-', 'G2', 'T3', None, 'lincRNA'],
+        ['1', 100, 400, '+', 'G1', 'T1', 'A-1', 'protein_coding'],
+        ['1', 150, 500, '+', 'G1', 'T2', 'A-2', 'protein_coding'],
+    ], ['gene_id', 'transcript_id', 'transcript_name',
+        'transcript_biotype'])
+    exons = _get_table([
+        ['1', 300, 400, '+', 'G1', 'T1'],
+        ['1', 100, 200, '+', 'G1', 'T1'],
+        ['1', 150, 250, '+', 'G1', 'T2'],
+        ['1', 401, 500, '+', 'G1', 'T2'],
+        ['2', 1000, 2000, '-', 'G2', 'T3'],
+    ], ['gene_id', 'transcript_id'])
+    return TranscriptModels(genes, transcripts, exons)
+
+
+def test_init(my_models):
+    assert my_models.genes.index.tolist() == ['G1', 'G2']
+    assert my_models.genes['name'].tolist() == ['A', 'G2']
+    assert my_models.transcripts.index.tolist() == ['T1', 'T2', 'T3']
+    assert my_models.gene_indptr.tolist() == [0, 2, 3]
+    assert my_models.transcript_indptr.tolist() == [0, 2, 4, 5]
+    assert my_models.exon_starts.tolist() == [100, 300, 150, 401, 1000]
+
+
+def test_lengths(my_models):
+    assert my_models.get_transcript_counts().tolist() == [2, 1]
+    assert my_models.get_transcript_lengths().tolist() == [202, 201, 1001]
+    merged = my_models.get_merged_exons()
+    assert merged['start'].tolist() == [100, 300, 1000]
+    assert merged['end'].tolist() == [250, 500, 2000]
+    assert merged['gene_id'].tolist() == ['G1', 'G1', 'G2']
+    assert my_models.get_effective_lengths().tolist() == [352, 1001]
+
+
+def test_tss(my_models):
+    assert my_models.get_tss().tolist() == [100, 150, 2000]
+    assert my_models.get_tes().tolist() == [400, 500, 1000]
+    assert my_models.get_tss('gene').tolist() == [100, 2000]
+
+    promoters = my_models.get_promoters(upstream=200, downstream=10)
+    assert promoters['start'].tolist() == [1, 1, 1991]
+    assert promoters['end'].tolist() == [109, 159, 2200]
+
+
+def test_bed(my_models):
+    buf = io.StringIO()
+    my_models.write_bed(buf)
+    lines = buf.getvalue().splitlines()
+    assert lines[0].split('\t') == [
+        '1', '99', '400', 'T1', '0', '+', '99', '400', '0', '2', '101,101',
+        '0,200']
+    assert len(lines) == 3
+
+    bed = my_models.get_bed('merged_exon')
+    assert bed['chromStart'].tolist() == [99, 299, 999]
+
+
+def test_gene_table(my_models):
+    table = my_models.get_gene_table()
+    assert isinstance(table, ExpGeneTable)
+    assert table['position'].tolist() == [99, -1999]
+    assert table['length'].tolist() == [352, 1001]
+    table = my_models.get_gene_table(effective_length=False)
+    assert table['length'].tolist() == [401, 1001]
+
+
+def test_from_gtf(my_gene_annotation_file):
+    models = TranscriptModels.from_gtf(my_gene_annotation_file)
+    genes = ensembl.get_genes(my_gene_annotation_file, ['protein_coding'],
+                              remove_duplicates=False)
+    assert set(genes.index) <= set(models.genes.index)
+    lengths = models.get_effective_lengths()
+    spans = models.genes['end'] - models.genes['start'] + 1
+    assert np.all(lengths <= spans)
+
+    # compare to a straightforward computation of the effective lengths
+    merged = models.get_merged_exons()
+    for gene_id in models.genes.index[:20]:
+        covered = set()
+        for i in np.nonzero(
+                models.transcripts['gene_id'].values == gene_id)[0]:
+            for j in range(models.transcript_indptr[i],
+                           models.transcript_indptr[i + 1]):
+                covered.update(range(models.exon_starts[j],
+                                     models.exon_ends[j] + 1))
+        assert lengths[gene_id] == len(covered)
+        assert len(merged[merged['gene_id'] == gene_id].index) > 0 or \
+            len(covered) == 0
@@ -0,0 +1,80 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests for the `bgzf` module."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import str as text
+
+import io
+import gzip
+
+import pytest
+
+from genometools import misc
+
+
+def test_bgzf(my_temp_dir):
+    path = text(my_temp_dir.join('test.bgz'))
+    data = b''.join(b'line %d\n' % i for i in range(20000))
+    with open(path, 'wb') as ofh, misc.BgzfWriter(ofh) as writer:
+        writer.write(data[:100])
+        writer.flush()
+        offset, size = writer.write_block(b'block\n')
+        writer.write(data[100:])
+
+    assert misc.is_bgzf(path)
+    # BGZF files are valid gzip files
+    with gzip.open(path, 'rb') as fh:
+        assert fh.read() == data[:100] + b'block\n' + data[100:]
+
+    with open(path, 'rb') as fh:
+        assert misc.read_bgzf_block(fh, offset) == (b'block\n', size)
+        fh.seek(0)
+        blocks = []
+        while True:
+            block, size = misc.read_bgzf_block(fh)
+            if size == 0:
+                break
+            blocks.append(block)
+    assert blocks[0] == data[:100]
+    assert blocks[-1] == b''  # end-of-file marker
+    assert max(len(b) for b in blocks) == misc.BGZF_MAX_BLOCK_DATA
+    assert b''.join(blocks) == data[:100] + b'block\n' + data[100:]
+
+
+def test_bgzf_block_size():
+    with pytest.raises(ValueError):
+        misc.compress_bgzf_block(b'x' * (misc.BGZF_MAX_BLOCK_DATA + 1))
+    block = misc.compress_bgzf_block(b'')
+    assert misc.read_bgzf_block(io.BytesIO(block)) == (b'', len(block))
+
+
+def test_bgzf_threads():
+    data = b''.join(b'line %d\n' % i for i in range(200000))
+    compressed = []
+    for num_threads in [1, 3]:
+        ofh = io.BytesIO()
+        with misc.BgzfWriter(ofh, num_threads=num_threads) as writer:
+            writer.write(data[:100])
+            writer.flush()
+            writer.write(data[100:])
+            assert writer.tell() <= len(ofh.getvalue())
+        compressed.append(ofh.getvalue())
+    assert compressed[0] == compressed[1]
+    assert gzip.GzipFile(fileobj=io.BytesIO(compressed[1])).read() == data
@@ -0,0 +1,187 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the `download_manager` module."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import str as text
+
+import os
+import gzip
+import hashlib
+
+import numpy as np
+import pytest
+import requests
+
+from genometools import misc
+
+
+@pytest.fixture(scope='module')
+def my_remote_files(my_http_server, my_ftp_server):
+    np.random.seed(0)
+    files = {}
+    for i in range(4):
+        name = 'file_%d.bin' % i
+        data = np.random.randint(0, 256, 100000 + i).astype(np.uint8)
+        data = data.tobytes()
+        for root in [my_http_server.root, my_ftp_server.root]:
+            with open(os.path.join(root, name), 'wb') as ofh:
+                ofh.write(data)
+        files[name] = data
+    return files
+
+
+def get_md5(data):
+    return hashlib.md5(data).hexdigest()
+
+
+def test_http_download(my_temp_dir, my_http_server, my_remote_files):
+    cache_dir = text(my_temp_dir.join('download_cache_http'))
+    download_dir = text(my_temp_dir.join('downloads_http'))
+    os.mkdir(download_dir)
+    url = my_http_server.url + '/file_0.bin'
+    data = my_remote_files['file_0.bin']
+    manager = misc.DownloadManager(cache_dir=cache_dir, chunk_size=8192,
+                                   retry_delay=0)
+
+    # the transfer is interrupted and then resumed
+    del my_http_server.requests[:]
+    my_http_server.interrupt_after = 30000
+    download_file = os.path.join(download_dir, 'file_0.bin')
+    path = manager.download(url, download_file, checksum=get_md5(data))
+    assert path == download_file
+    with open(path, 'rb') as fh:
+        assert fh.read() == data
+    # the transfer is resumed after the last byte received (regardless of
+    # the chunk size)
+    assert my_http_server.requests == [('/file_0.bin', None),
+                                       ('/file_0.bin', 'bytes=30000-')]
+
+    # the file is now cached
+    os.remove(download_file)
+    cached_file = manager.get_cached_file(url)
+    assert cached_file is not None
+    assert manager.download(url, download_file) == download_file
+    with open(download_file, 'rb') as fh:
+        assert fh.read() == data
+    assert len(my_http_server.requests) == 2
+
+    # the downloaded file is a copy of the cached file
+    with open(download_file, 'ab') as ofh:
+        ofh.write(b'modified')
+    with open(cached_file, 'rb') as fh:
+        assert fh.read() == data
+    assert manager.download(url, checksum=get_md5(data)) == cached_file
+    assert len(my_http_server.requests) == 2
+
+    # a new manager reuses the cache
+    path = misc.DownloadManager(cache_dir=cache_dir).download(url)
+    assert os.path.dirname(path).startswith(cache_dir)
+    assert len(my_http_server.requests) == 2
+
+    # a server that does not support range requests
+    my_http_server.support_ranges = False
+    my_http_server.interrupt_after = 20000
+    try:
+        url = my_http_server.url + '/file_1.bin'
+        path = manager.download(url)
+    finally:
+        my_http_server.support_ranges = True
+    with open(path, 'rb') as fh:
+        assert fh.read() == my_remote_files['file_1.bin']
+
+    # a server that declares a content encoding (e.g., for a gzip'ed file);
+    # the file is stored as transferred, and resumed at the correct offset
+    my_http_server.content_encoding = 'gzip'
+    my_http_server.interrupt_after = 12345
+    del my_http_server.requests[:]
+    gzip_data = gzip.compress(my_remote_files['file_2.bin'])
+    with open(os.path.join(my_http_server.root, 'file_2.bin.gz'),
+              'wb') as ofh:
+        ofh.write(gzip_data)
+    try:
+        url = my_http_server.url + '/file_2.bin.gz'
+        path = manager.download(url)
+    finally:
+        my_http_server.content_encoding = None
+    with open(path, 'rb') as fh:
+        assert fh.read() == gzip_data
+    assert my_http_server.requests == [('/file_2.bin.gz', None),
+                                       ('/file_2.bin.gz', 'bytes=12345-')]
+    manager.close()
+
+
+def test_http_not_found(my_temp_dir, my_http_server):
+    download_dir = text(my_temp_dir.join('downloads_not_found'))
+    os.mkdir(download_dir)
+    url = my_http_server.url + '/missing.bin'
+    del my_http_server.requests[:]
+    with misc.DownloadManager() as manager:
+        with pytest.raises(requests.HTTPError):
+            manager.download(url, os.path.join(download_dir, 'missing.bin'))
+    # client errors are not retried
+    assert my_http_server.requests == [('/missing.bin', None)]
+
+
+def test_ftp_download(my_temp_dir, my_ftp_server, my_remote_files):
+    cache_dir = text(my_temp_dir.join('download_cache_ftp'))
+    url = 'ftp://%s:%d/file_2.bin' % (my_ftp_server.host, my_ftp_server.port)
+    data = my_remote_files['file_2.bin']
+
+    with misc.DownloadManager(cache_dir=cache_dir, chunk_size=8192,
+                              retry_delay=0) as manager:
+        num_retrievals = my_ftp_server.num_retrievals
+        my_ftp_server.interrupt_after = 50000
+        checksum = misc.BSDSum(data).value
+        path = manager.download(url, checksum=checksum, checksum_type='sum')
+        with open(path, 'rb') as fh:
+            assert fh.read() == data
+        assert my_ftp_server.num_retrievals == num_retrievals + 2
+
+        # cached files are found by their checksum
+        assert manager.download(url, checksum=checksum,
+                                checksum_type='sum') == path
+        assert manager.download('ftp://example.org/file_2.bin',
+                                checksum=get_md5(data)) == path
+        assert my_ftp_server.num_retrievals == num_retrievals + 2
+
+        # incorrect checksums
+        with pytest.raises(ValueError):
+            manager.download(url, checksum=checksum + 1, checksum_type='sum')
+        assert my_ftp_server.num_retrievals == num_retrievals + 6
+
+
+def test_download_all(my_temp_dir, my_http_server, my_ftp_server,
+                      my_remote_files):
+    download_dir = text(my_temp_dir.join('downloads_all'))
+    os.mkdir(download_dir)
+    names = sorted(my_remote_files.keys())
+    urls = [my_http_server.url + '/' + n for n in names[:2]] + \
+        ['ftp://%s:%d/%s' % (my_ftp_server.host, my_ftp_server.port, n)
+         for n in names[2:]]
+    checksums = [get_md5(my_remote_files[n]) for n in names]
+
+    # without a cache
+    manager = misc.DownloadManager(num_threads=3)
+    paths = manager.download_all(urls, download_dir, checksums)
+    assert paths == [os.path.join(download_dir, n) for n in names]
+    for n, path in zip(names, paths):
+        with open(path, 'rb') as fh:
+            assert fh.read() == my_remote_files[n]
+    assert not any(n.endswith('.part') for n in os.listdir(download_dir))
+    manager.close()
@@ -0,0 +1,117 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+
+"""Tests for the `FTPConnectionPool` class."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+import os
+import ftplib
+import threading
+
+import pytest
+
+from genometools import misc
+
+
+@pytest.fixture
+def my_ftp_dir(my_ftp_server):
+    path = os.path.join(my_ftp_server.root, 'pool')
+    if not os.path.isdir(path):
+        os.mkdir(path)
+        for i in range(3):
+            with open(os.path.join(path, 'file%d.txt' % i), 'wb') as ofh:
+                ofh.write(b'data %d\n' % i)
+    return path
+
+
+@pytest.fixture
+def my_pool(my_ftp_server):
+    pool = misc.FTPConnectionPool(my_ftp_server.host,
+                                  port=my_ftp_server.port,
+                                  max_connections=2, timeout=10)
+    yield pool
+    pool.close()
+
+
+def test_listing(my_pool, my_ftp_dir):
+    names = my_pool.nlst('/pool')
+    assert names == ['file0.txt', 'file1.txt', 'file2.txt']
+    listing = my_pool.dir('/pool')
+    assert len(listing) == 3 and listing[0].endswith(' file0.txt')
+    assert my_pool.num_connections == 1
+
+    # listings are cached
+    with open(os.path.join(my_ftp_dir, 'new.txt'), 'w') as ofh:
+        ofh.write('new')
+    assert my_pool.nlst('/pool') == names
+    my_pool.clear_cache()
+    assert 'new.txt' in my_pool.nlst('/pool')
+    os.remove(os.path.join(my_ftp_dir, 'new.txt'))
+
+
+def test_retrieve(my_pool, my_ftp_server, my_ftp_dir):
+    assert my_pool.retrieve('/pool/file1.txt') == b'data 1\n'
+
+    num_retrievals = my_ftp_server.num_retrievals
+    for _ in range(3):
+        assert my_pool.retrieve('/pool/file2.txt', cache=True) == \
+            b'data 2\n'
+    assert my_ftp_server.num_retrievals == num_retrievals + 1
+
+    # permanent errors are raised, but the connection is kept
+    with pytest.raises(ftplib.error_perm):
+        my_pool.retrieve('/pool/missing.txt')
+    assert my_pool.num_connections == 1
+
+
+def test_reconnect(my_pool, my_ftp_server, my_ftp_dir):
+    assert my_pool.retrieve('/pool/file0.txt') == b'data 0\n'
+    num_logins = my_ftp_server.num_logins
+    my_ftp_server.drop_connections()
+    assert my_pool.retrieve('/pool/file0.txt') == b'data 0\n'
+    assert my_ftp_server.num_logins == num_logins + 1
+    assert my_pool.num_connections == 1
+
+
+def test_concurrency(my_pool, my_ftp_dir):
+    results = []
+    lock = threading.Lock()
+    max_connections = [0]
+
+    def retrieve(ftp, path):
+        with lock:
+            max_connections[0] = max(max_connections[0],
+                                     my_pool.num_connections)
+        return ftp.size(path)
+
+    def worker(i):
+        size = my_pool.run(retrieve, '/pool/file%d.txt' % (i % 3))
+        with lock:
+            results.append(size)
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == [7] * 8
+    assert max_connections[0] <= 2
+    my_pool.close()
+    assert my_pool.num_connections == 0
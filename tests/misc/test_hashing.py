@@ -0,0 +1,104 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the `hashing` module."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import str as text
+
+import io
+import time
+import hashlib
+
+import numpy as np
+import pytest
+
+from genometools import misc
+from genometools.misc import hashing
+
+
+@pytest.fixture(scope='module')
+def my_data():
+    np.random.seed(0)
+    # random data with long runs of 0x00 and 0xff bytes
+    data = np.random.randint(0, 256, 300000).astype(np.uint8)
+    data[1000:5000] = 0
+    data[10000:20000] = 255
+    data[50000:50003] = 0
+    return data.tobytes()
+
+
+def test_bsd_sum(my_data):
+    assert misc.BSDSum(b'Hello world!').value == 2761
+    for n in [0, 1, 2000, 4001, 10017, 250000, len(my_data)]:
+        assert misc.BSDSum(my_data[:n]).value == \
+            hashing._bsd_sum_bytes(0, my_data[:n])
+
+    s = misc.BSDSum()
+    for i in range(0, len(my_data), 7777):
+        s.update(my_data[i:i+7777])
+    assert s.value == misc.BSDSum(my_data).value
+    assert s.size == len(my_data)
+    assert s.blocks == 293
+
+
+def test_bsd_sum_zeros(my_data):
+    # runs of zeros produce a carry (or zero checksum) at every position,
+    # which must not make the vectorized algorithm slow
+    data = bytes(bytearray(1000000)) + my_data[:100000]
+    t0 = time.time()
+    value = misc.BSDSum(data).value
+    t1 = time.time()
+    assert value == hashing._bsd_sum_bytes(0, data)
+    t2 = time.time()
+    assert t1 - t0 < 2 * (t2 - t1) + 0.5
+
+
+def test_crc32c(my_data):
+    assert misc.CRC32C(b'123456789').value == 0xe3069283
+    for n in [0, 1, 2000, 4001, 250000, len(my_data)]:
+        assert misc.CRC32C(my_data[:n]).value == \
+            hashing._crc32c_bytes(0xffffffff, my_data[:n]) ^ 0xffffffff
+
+    c = misc.CRC32C()
+    for i in range(0, len(my_data), 7777):
+        c.update(my_data[i:i+7777])
+    assert c.value == misc.CRC32C(my_data).value
+
+
+def test_hash_file(my_temp_dir, my_data):
+    paths = []
+    for i in range(3):
+        path = text(my_temp_dir.join('hash_%d.bin' % i))
+        with open(path, 'wb') as ofh:
+            ofh.write(my_data[i*1000:])
+        paths.append(path)
+
+    result = misc.hash_file(paths[0], chunk_size=10000)
+    assert list(result.keys()) == ['sum', 'md5', 'crc32c']
+    assert result['sum'] == misc.BSDSum(my_data).value
+    assert result['md5'] == hashlib.md5(my_data).hexdigest()
+    assert result['crc32c'] == misc.CRC32C(my_data).value
+    assert misc.hash_file(io.BytesIO(my_data), ['sha1']) == \
+        {'sha1': hashlib.sha1(my_data).hexdigest()}
+    assert misc.get_file_md5sum(paths[0]) == result['md5']
+    assert misc.get_file_checksum(paths[0]) == result['sum']
+
+    results = misc.hash_files(paths, ['md5', 'sum'], num_threads=2)
+    assert list(results.keys()) == paths
+    for path, r in results.items():
+        assert r == misc.hash_file(path, ['md5', 'sum'])
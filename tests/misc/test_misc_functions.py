@@ -21,6 +21,9 @@ from __future__ import (absolute_import, division,
 from builtins import str as text
 
 import os
+import sys
+import gzip
+import subprocess
 
 import pytest
 
@@ -35,6 +38,11 @@ def test_checksum(my_checksum_file):
     assert misc.get_file_checksum(my_checksum_file) == 2761
     assert misc.test_file_checksum(my_checksum_file, 2761)
 
+def test_checksum_without_sum(my_checksum_file, monkeypatch):
+    """Tests the checksum calculation if "sum" is not available."""
+    monkeypatch.setattr(misc.functions, '_which', lambda cmd: None)
+    assert misc.get_file_checksum(my_checksum_file) == 2761
+
 @pytest.mark.online
 def test_ftp_download(my_readme_file):
     """Tests `ftp_download` function."""
@@ -48,3 +56,22 @@ def test_http_download(my_temp_dir):
     download_file = text(my_temp_dir.join('google.htm'))
     misc.http_download('https://www.google.com', download_file)
     assert os.stat(download_file).st_size > 0
+
+
+@pytest.mark.linux
+@pytest.mark.darwin
+def test_smart_open_read_stdin():
+    """Tests reading gzip'ed and uncompressed data from ``stdin``."""
+    script = ('from genometools import misc\n'
+              'with misc.smart_open_read(mode="%s", try_gzip=True) as fh:\n'
+              '    print(repr(fh.read()))\n')
+    data = b'line 1\nline 2\n'
+    for mode in ['rb', 'r']:
+        for input_ in [data, gzip.compress(data)]:
+            proc = subprocess.Popen(
+                [sys.executable, '-c', script % mode],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+            output = proc.communicate(input_)[0].decode('ascii').strip()
+            assert proc.returncode == 0
+            expected = data if mode == 'rb' else data.decode('ascii')
+            assert output == repr(expected)
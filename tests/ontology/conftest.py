@@ -32,7 +32,7 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 from genometools import misc
-from genometools.ontology import GOTerm, GeneOntology
+from genometools.ontology import GOTerm, GeneOntology, GOAnnotation
 from genometools.expression import ExpGeneTable
 
 def download_file(url, path):
@@ -94,4 +94,46 @@ def my_goa_file(my_data_pypath):
 def my_go_term():
     go_term = GOTerm('GO:0000000', 'regulation of test process',
                   'biological_process', 'This is a test GO term.')
-    return go_term
\ No newline at end of file
+    return go_term
+
+@pytest.fixture
+def my_small_ontology():
+    """A small ontology with a diamond and a ``part_of`` relation."""
+    terms = [
+        GOTerm('GO:0000001', 'root process', 'biological_process',
+               'The root.'),
+        GOTerm('GO:0000002', 'first process', 'biological_process',
+               'A child of the root.', is_a=['GO:0000001']),
+        GOTerm('GO:0000003', 'second process', 'biological_process',
+               'Another child of the root.', is_a=['GO:0000001']),
+        GOTerm('GO:0000004', 'combined process', 'biological_process',
+               'A child of both children.',
+               is_a=['GO:0000002', 'GO:0000003']),
+        GOTerm('GO:0000005', 'partial process', 'biological_process',
+               'A part of the combined process.',
+               part_of=['GO:0000004']),
+        GOTerm('GO:0000006', 'specific partial process',
+               'biological_process', 'A subtype of the partial process.',
+               is_a=['GO:0000005']),
+    ]
+    return GeneOntology(terms)
+
+
+def _get_annotation(gene_ontology, gene, term_id, ev_code='IDA'):
+    return GOAnnotation(
+        db='UniProtKB', db_id='ID_' + gene, db_symbol=gene,
+        go_term=gene_ontology[term_id], db_ref='PMID:1',
+        ev_code=ev_code, db_type='protein', taxon='taxon:9606',
+        date='20170101', assigned_by='UniProt')
+
+
+@pytest.fixture
+def my_small_annotations(my_small_ontology):
+    """Annotations of three genes, using `my_small_ontology`."""
+    ontology = my_small_ontology
+    return [
+        _get_annotation(ontology, 'GENE1', 'GO:0000002'),
+        _get_annotation(ontology, 'GENE2', 'GO:0000004', 'IEA'),
+        _get_annotation(ontology, 'GENE2', 'GO:0000002'),
+        _get_annotation(ontology, 'GENE3', 'GO:0000006', 'TAS'),
+    ]
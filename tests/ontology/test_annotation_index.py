@@ -0,0 +1,97 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the `GOAnnotationIndex` class."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+import pytest
+
+from genometools.ontology import GOTerm, GeneOntology, GOAnnotationTable, \
+                                 GOAnnotationIndex
+
+
+@pytest.fixture
+def my_index(my_small_ontology, my_small_annotations):
+    return GOAnnotationIndex.from_annotations(
+        my_small_annotations, my_small_ontology)
+
+
+def test_lookup(my_index):
+    index = my_index
+    assert 'GENE1' in index
+    assert 'UNKNOWN' not in index
+
+    assert index.get_terms('GENE2', propagated=False) == \
+        ['GO:0000002', 'GO:0000004']
+    assert index.get_terms('GENE2') == \
+        ['GO:0000001', 'GO:0000002', 'GO:0000003', 'GO:0000004']
+    assert index.get_terms('GENE3', propagated=False) == ['GO:0000006']
+    assert len(index.get_terms('GENE3')) == 6
+
+    assert index.get_genes('GO:0000002', propagated=False) == \
+        ['GENE1', 'GENE2']
+    assert index.get_genes('GO:0000002') == ['GENE1', 'GENE2', 'GENE3']
+    assert index.get_genes('GO:0000005', propagated=False) == []
+    assert index.get_genes('GO:0000005') == ['GENE3']
+
+    assert index.get_term_counts().tolist() == [3, 3, 2, 2, 1, 1]
+    assert index.get_term_counts(False).tolist() == [0, 2, 0, 1, 0, 1]
+
+    with pytest.raises(KeyError):
+        index.get_terms('UNKNOWN')
+    with pytest.raises(KeyError):
+        index.get_genes('GO:9999999')
+
+
+def test_matrices(my_index, my_small_ontology, my_small_annotations):
+    index = my_index
+    for propagated in [False, True]:
+        matrix = index.get_matrix(propagated)
+        assert matrix.shape == (3, 6)
+        assert (index.get_matrix(propagated, by_term=True) != matrix.T).nnz \
+            == 0
+
+    # the index is identical for an annotation table
+    table = GOAnnotationTable.from_annotations(
+        my_small_annotations, my_small_ontology)
+    other = GOAnnotationIndex.from_annotations(table, my_small_ontology)
+    assert other.genes.tolist() == index.genes.tolist()
+    assert (other.get_matrix() != index.get_matrix()).nnz == 0
+
+    other = GOAnnotationIndex.from_annotations(
+        my_small_annotations, my_small_ontology, include_part_of=False)
+    assert other.get_genes('GO:0000002') == ['GENE1', 'GENE2']
+
+
+def test_npz(my_index, my_small_ontology, tmpdir):
+    path = str(tmpdir.join('index.npz'))
+    my_index.write_npz(path)
+    index = GOAnnotationIndex.read_npz(path, my_small_ontology)
+    assert index.include_part_of
+    assert index.genes.tolist() == my_index.genes.tolist()
+    for propagated in [False, True]:
+        for by_term in [False, True]:
+            assert (index.get_matrix(propagated, by_term) !=
+                    my_index.get_matrix(propagated, by_term)).nnz == 0
+    assert index.get_genes('GO:0000005') == ['GENE3']
+
+    # the index must be read using the same ontology
+    other_ontology = GeneOntology([GOTerm(
+        'GO:0000001', 'root process', 'biological_process', 'The root.')])
+    with pytest.raises(ValueError):
+        GOAnnotationIndex.read_npz(path, other_ontology)
@@ -22,10 +22,59 @@ from builtins import str as text
 
 
 import copy
+import gzip
+import os
 
 import pytest
 
-from genometools.ontology import GOTerm, GeneOntology
+from genometools.ontology import GOTerm, GeneOntology, GOAnnotationTable
+
+
+_obo_text = """format-version: 1.2
+data-version: releases/2017-01-01
+
+[Term]
+id: GO:0000001
+name: root process
+namespace: biological_process
+def: "The \\"root\\" process." [GOC:test]
+synonym: "the root" EXACT []
+synonym: "some root" RELATED []
+
+[Term]
+id: GO:0000002
+name: child process
+alt_id: GO:0000012
+namespace: biological_process
+is_a: GO:0000001 ! root process
+def: "A child." [GOC:test]
+
+[Typedef]
+id: part_of
+name: part of
+
+[Term]
+namespace: cellular_component
+id: GO:0000003
+name: partial process
+relationship: part_of GO:0000002 ! child process
+is_a: GO:0000001 ! root process
+def: "A part." [GOC:test]
+
+[Term]
+id: GO:0000004
+name: obsolete process
+namespace: biological_process
+def: "An obsolete process." [GOC:test]
+is_obsolete: true"""
+
+
+@pytest.fixture
+def my_obo_file(tmpdir):
+    path = text(tmpdir.join('test.obo'))
+    with open(path, 'w') as ofh:
+        ofh.write(_obo_text)
+    return path
 
 
 @pytest.fixture
@@ -71,4 +120,276 @@ def test_basic(my_go_term, my_other_term):
 
 @pytest.mark.online
 def test_real(my_gene_ontology):
-    assert isinstance(my_gene_ontology, GeneOntology)
\ No newline at end of file
+    assert isinstance(my_gene_ontology, GeneOntology)
+
+def test_closure(my_small_ontology):
+    ontology = my_small_ontology
+
+    ancestors = ontology.get_ancestor_closure()
+    assert ancestors['GO:0000001'] == set()
+    assert ancestors['GO:0000004'] == \
+        set(['GO:0000001', 'GO:0000002', 'GO:0000003'])
+    assert ancestors['GO:0000006'] == \
+        set(['GO:0000001', 'GO:0000002', 'GO:0000003',
+             'GO:0000004', 'GO:0000005'])
+    # the closure matrix is cached
+    assert ontology.get_ancestor_matrix() is ontology.get_ancestor_matrix()
+
+    # is_a-only closure
+    is_a_ancestors = ontology.get_ancestor_closure(include_part_of=False)
+    assert is_a_ancestors['GO:0000006'] == set(['GO:0000005'])
+
+    descendants = ontology.get_descendant_closure()
+    assert descendants['GO:0000001'] == \
+        set(['GO:0000002', 'GO:0000003', 'GO:0000004',
+             'GO:0000005', 'GO:0000006'])
+    assert descendants['GO:0000006'] == set()
+    is_a_descendants = ontology.get_descendant_closure(include_parts=False)
+    assert is_a_descendants['GO:0000001'] == \
+        set(['GO:0000002', 'GO:0000003', 'GO:0000004'])
+
+    ontology._flatten_ancestors()
+    ontology._flatten_descendants()
+    assert ontology['GO:0000005'].ancestors == ancestors['GO:0000005']
+    assert ontology['GO:0000002'].descendants == descendants['GO:0000002']
+
+
+def test_relations(my_small_ontology):
+    ontology = my_small_ontology
+    assert ontology['GO:0000001'].children == \
+        set(['GO:0000002', 'GO:0000003'])
+    assert ontology['GO:0000004'].children == set()
+    assert ontology['GO:0000004'].parts == set(['GO:0000005'])
+    assert isinstance(ontology['GO:0000004'].children, frozenset)
+    assert isinstance(ontology['GO:0000004'].parts, frozenset)
+
+    is_a = ontology.get_relation_matrix('is_a')
+    assert is_a.nnz == 5
+    children = ontology.get_relation_matrix('children')
+    assert (children != is_a.T).nnz == 0
+
+    # changing a relation updates the ontology
+    ontology['GO:0000005'].is_a = ['GO:0000001']
+    assert ontology['GO:0000001'].children == \
+        set(['GO:0000002', 'GO:0000003', 'GO:0000005'])
+    assert ontology.get_relation_matrix('is_a').nnz == 6
+
+    # removed terms no longer belong to the ontology
+    term = ontology['GO:0000006']
+    del ontology['GO:0000006']
+    assert term._ontology is None
+    assert ontology['GO:0000005'].children == set()
+
+
+def test_closure_matrix(my_small_ontology):
+    ontology = my_small_ontology
+    n = len(ontology)
+    assert ontology.term_ids == sorted(t.id for t in ontology)
+
+    ancestors = ontology.get_ancestor_matrix()
+    assert ancestors.shape == (n, n)
+    assert ancestors.nnz == 0 + 1 + 1 + 3 + 4 + 5
+    descendants = ontology.get_descendant_matrix()
+    assert (descendants != ancestors.T).nnz == 0
+
+    # vectorized queries
+    assert ontology.is_ancestor('GO:0000001', 'GO:0000006')
+    assert not ontology.is_ancestor('GO:0000006', 'GO:0000001')
+    assert not ontology.is_ancestor('GO:0000004', 'GO:0000005',
+                                    include_part_of=False)
+    result = ontology.is_ancestor(['GO:0000002', 'GO:0000003'],
+                                  ['GO:0000004', 'GO:0000002'])
+    assert result.tolist() == [True, False]
+
+    assert ontology.ancestors_of('GO:0000004') == \
+        ['GO:0000001', 'GO:0000002', 'GO:0000003']
+    assert ontology.ancestors_of(['GO:0000001', 'GO:0000002']) == \
+        [[], ['GO:0000001']]
+    assert ontology.descendants_of('GO:0000004', include_parts=False) == []
+    assert ontology.common_ancestors('GO:0000002', 'GO:0000006') == \
+        ['GO:0000001']
+    assert ontology.common_ancestors(
+        ['GO:0000004', 'GO:0000005'], ['GO:0000006', 'GO:0000001']) == \
+        [['GO:0000001', 'GO:0000002', 'GO:0000003'], []]
+
+    # lazy views
+    assert ontology['GO:0000005'].ancestors is None
+    ontology._flatten_ancestors(include_part_of=False)
+    assert ontology['GO:0000006'].ancestors == set(['GO:0000005'])
+
+    # changing the ontology invalidates the cached closures
+    del ontology['GO:0000006']
+    assert ontology.get_ancestor_matrix().shape == (n - 1, n - 1)
+
+
+def test_closure_deep():
+    """Closures of very deep hierarchies do not hit the recursion limit."""
+    n = 5000
+    terms = [GOTerm(GOTerm.acc2id(1), 'term 1', 'biological_process', '')]
+    for i in range(2, n + 1):
+        terms.append(GOTerm(GOTerm.acc2id(i), 'term %d' % i,
+                            'biological_process', '',
+                            is_a=[GOTerm.acc2id(i - 1)]))
+    ontology = GeneOntology(terms)
+    assert len(ontology.get_ancestor_closure()[GOTerm.acc2id(n)]) == n - 1
+    assert len(ontology.get_descendant_closure()[GOTerm.acc2id(1)]) == n - 1
+
+
+def test_closure_cycle(my_small_ontology):
+    term = my_small_ontology['GO:0000001']
+    # relations cannot be modified in place
+    with pytest.raises(AttributeError):
+        term.is_a.add('GO:0000006')
+    term.is_a = term.is_a | set(['GO:0000006'])
+    with pytest.raises(ValueError):
+        my_small_ontology.get_ancestor_closure()
+
+
+def _check_obo_ontology(ontology):
+    assert len(ontology) == 4
+    assert ontology.obsolete_ids == set(['GO:0000004'])
+    root = ontology['GO:0000001']
+    assert root.definition == 'The "root" process.'
+    assert root.children == set(['GO:0000002', 'GO:0000003'])
+    assert ontology['GO:0000002'].parts == set(['GO:0000003'])
+    assert ontology['GO:0000003'].domain == 'cellular_component'
+    assert ontology['GO:0000003'].ancestors == \
+        set(['GO:0000001', 'GO:0000002'])
+    assert root.descendants == set(['GO:0000002', 'GO:0000003'])
+    assert ontology.syn2id == {'the root': 'GO:0000001'}
+    assert ontology.alt_id == {'GO:0000012': 'GO:0000002'}
+    assert ontology.get_term_by_name('child process').id == 'GO:0000002'
+
+
+def test_read_obo(my_obo_file):
+    ontology = GeneOntology.read_obo(my_obo_file)
+    assert ontology.flattened
+    _check_obo_ontology(ontology)
+
+    # gzip'ed file
+    gzip_file = my_obo_file + '.gz'
+    with open(my_obo_file, 'rb') as fh, gzip.open(gzip_file, 'wb') as ofh:
+        ofh.write(fh.read())
+    assert GeneOntology.read_obo(gzip_file) == ontology
+
+    ontology = GeneOntology.read_obo(my_obo_file, part_of_cc_only=True)
+    assert ontology['GO:0000003'].part_of == set(['GO:0000002'])
+
+
+def test_npz(my_obo_file, tmpdir):
+    ontology = GeneOntology.read_obo(my_obo_file)
+    ontology.get_ancestor_matrix(include_part_of=False)
+    path = text(tmpdir.join('test.npz'))
+    ontology.write_npz(path)
+    other = GeneOntology.read_npz(path)
+    assert other == ontology
+    assert other.hash == ontology.hash
+    _check_obo_ontology(other)
+    assert (other.get_ancestor_matrix(include_part_of=False) !=
+            ontology.get_ancestor_matrix(include_part_of=False)).nnz == 0
+
+
+def test_obo_cache(my_obo_file, tmpdir):
+    cache_dir = text(tmpdir.join('cache'))
+    ontology = GeneOntology.read_obo(my_obo_file, cache_dir=cache_dir)
+    assert len(os.listdir(cache_dir)) == 1
+    other = GeneOntology.read_obo(my_obo_file, cache_dir=cache_dir)
+    assert other.hash == ontology.hash
+    _check_obo_ontology(other)
+
+    # modifying the file invalidates the cache
+    with open(my_obo_file, 'a') as ofh:
+        ofh.write('\n\n[Term]\nid: GO:0000004\nname: new process\n'
+                  'namespace: biological_process\n')
+    other = GeneOntology.read_obo(my_obo_file, cache_dir=cache_dir)
+    assert len(other) == 4
+    assert len(os.listdir(cache_dir)) == 2
+
+
+def test_obo_cache_unflattened(my_obo_file, tmpdir, monkeypatch):
+    cache_dir = text(tmpdir.join('cache_unflattened'))
+    # the result does not depend on whether the cache file exists
+    for _ in range(2):
+        ontology = GeneOntology.read_obo(my_obo_file, flatten=False,
+                                         cache_dir=cache_dir)
+        assert not ontology.flattened
+        assert ontology['GO:0000002'].ancestors is None
+    assert len(os.listdir(cache_dir)) == 1
+
+    ontology = GeneOntology.read_obo(my_obo_file, cache_dir=cache_dir)
+    assert ontology.flattened
+    assert ontology['GO:0000002'].ancestors == set(['GO:0000001'])
+
+    # no temporary files are left behind if the cache file cannot be written
+    def write_npz(self, file):
+        raise IOError('No space left on device')
+    monkeypatch.setattr(GeneOntology, 'write_npz', write_npz)
+    cache_dir = text(tmpdir.join('cache_failed'))
+    with pytest.raises(IOError):
+        GeneOntology.read_obo(my_obo_file, cache_dir=cache_dir)
+    assert os.listdir(cache_dir) == []
+
+
+def test_subgraph(my_small_ontology):
+    ontology = my_small_ontology
+    sub = ontology.subgraph(['GO:0000006', 'GO:0000004'])
+    assert sub.term_ids == ['GO:0000004', 'GO:0000006']
+    assert not sub['GO:0000006'].is_a
+    assert sub['GO:0000004'] is not ontology['GO:0000004']
+
+    sub = ontology.subgraph(['GO:0000006'], include_ancestors=True)
+    assert sub.term_ids == ontology.term_ids
+    for id_ in ontology.term_ids:
+        assert sub[id_].is_a == ontology[id_].is_a
+        assert sub[id_].part_of == ontology[id_].part_of
+        assert sub.ancestors_of(id_) == ontology.ancestors_of(id_)
+    assert (sub.get_ancestor_matrix() !=
+            ontology.get_ancestor_matrix()).nnz == 0
+
+    sub = ontology.subgraph(['GO:0000006'], include_ancestors=True,
+                            include_part_of=False)
+    assert sub.term_ids == ['GO:0000005', 'GO:0000006']
+    assert sub['GO:0000006'].is_a == set(['GO:0000005'])
+    assert not sub['GO:0000005'].part_of
+    assert sub.ancestors_of('GO:0000006', include_part_of=False) == \
+        ['GO:0000005']
+
+    with pytest.raises(KeyError):
+        ontology.subgraph(['GO:9999999'])
+
+
+def test_map_to_slim(my_small_ontology, my_small_annotations):
+    ontology = my_small_ontology
+    slim = ['GO:0000001', 'GO:0000002', 'GO:0000005']
+
+    annotations = my_small_annotations + [copy.deepcopy(
+        my_small_annotations[0])]
+    # maps to the same slim terms as the first annotation
+    annotations[-1].go_term = ontology['GO:0000004']
+
+    mapped = ontology.map_to_slim(slim, annotations)
+    assert isinstance(mapped, list)
+    assert sorted((ann.db_symbol, ann.go_term.id, ann.ev_code)
+                  for ann in mapped) == [
+        ('GENE1', 'GO:0000001', 'IDA'), ('GENE1', 'GO:0000002', 'IDA'),
+        ('GENE2', 'GO:0000001', 'IDA'), ('GENE2', 'GO:0000001', 'IEA'),
+        ('GENE2', 'GO:0000002', 'IDA'), ('GENE2', 'GO:0000002', 'IEA'),
+        ('GENE3', 'GO:0000001', 'TAS'), ('GENE3', 'GO:0000002', 'TAS'),
+        ('GENE3', 'GO:0000005', 'TAS'),
+    ]
+
+    mapped = ontology.map_to_slim(slim, annotations, most_specific=True)
+    assert sorted((ann.db_symbol, ann.go_term.id, ann.ev_code)
+                  for ann in mapped) == [
+        ('GENE1', 'GO:0000002', 'IDA'),
+        ('GENE2', 'GO:0000002', 'IDA'), ('GENE2', 'GO:0000002', 'IEA'),
+        ('GENE3', 'GO:0000005', 'TAS'),
+    ]
+
+    # without "part_of" relations, GENE3 is only mapped to GO:0000005
+    table = GOAnnotationTable.from_annotations(annotations, ontology)
+    mapped = ontology.map_to_slim(slim, table, include_part_of=False)
+    assert isinstance(mapped, GOAnnotationTable)
+    assert len(mapped) == 7
+    assert [ann.go_term.id for ann in mapped
+            if ann.db_symbol == 'GENE3'] == ['GO:0000005']
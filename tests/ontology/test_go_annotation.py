@@ -25,6 +25,7 @@ import copy
 import pytest
 
 from genometools.ontology import GeneOntology, GOAnnotation, \
+                                 GOAnnotationTable, \
                                  parse_gaf, get_goa_gene_sets
 from genometools.basic import GeneSetCollection
 
@@ -91,4 +92,115 @@ def test_parser(my_goa_file, my_valid_genes, my_gene_ontology):
         assert ann.ev_code in ev_codes
 
     gene_sets = get_goa_gene_sets(go_annotations)
-    assert isinstance(gene_sets, GeneSetCollection)
\ No newline at end of file
+    assert isinstance(gene_sets, GeneSetCollection)
+
+def test_gene_sets(my_small_annotations, my_small_ontology):
+    gene_sets = get_goa_gene_sets(my_small_annotations)
+    assert isinstance(gene_sets, GeneSetCollection)
+    assert [gs.id for gs in gene_sets] == \
+        ['GO:0000002', 'GO:0000004', 'GO:0000006']
+    assert gene_sets['GO:0000002'].genes == set(['GENE1', 'GENE2'])
+
+    # propagated annotations
+    gene_sets = get_goa_gene_sets(my_small_annotations, my_small_ontology,
+                                  propagate=True)
+    assert [gs.id for gs in gene_sets] == \
+        ['GO:0000001', 'GO:0000002', 'GO:0000003', 'GO:0000004',
+         'GO:0000005', 'GO:0000006']
+    assert gene_sets['GO:0000001'].genes == \
+        set(['GENE1', 'GENE2', 'GENE3'])
+    assert gene_sets['GO:0000002'].genes == \
+        set(['GENE1', 'GENE2', 'GENE3'])
+    assert gene_sets['GO:0000003'].genes == set(['GENE2', 'GENE3'])
+    assert gene_sets['GO:0000005'].genes == set(['GENE3'])
+
+    # propagation only along is_a relations
+    gene_sets = get_goa_gene_sets(my_small_annotations, my_small_ontology,
+                                  propagate=True, include_part_of=False)
+    assert gene_sets['GO:0000001'].genes == set(['GENE1', 'GENE2'])
+    assert gene_sets['GO:0000005'].genes == set(['GENE3'])
+
+    # gene set size filters
+    gene_sets = get_goa_gene_sets(my_small_annotations, my_small_ontology,
+                                  propagate=True, min_genes=2, max_genes=2)
+    assert [gs.id for gs in gene_sets] == ['GO:0000003', 'GO:0000004']
+
+    with pytest.raises(ValueError):
+        get_goa_gene_sets(my_small_annotations, propagate=True)
+
+
+@pytest.fixture
+def my_small_gaf_file(my_small_annotations, tmpdir):
+    path = text(tmpdir.join('test.gaf'))
+    with open(path, 'w') as ofh:
+        ofh.write('!gaf-version: 2.1\n')
+        for ann in my_small_annotations:
+            ofh.write('\t'.join(ann.to_list()) + '\n')
+    return path
+
+
+def test_table(my_small_annotations, my_small_ontology):
+    table = GOAnnotationTable.from_annotations(
+        my_small_annotations, my_small_ontology)
+    assert isinstance(repr(table), str)
+    assert isinstance(str(table), str)
+    assert len(table) == len(my_small_annotations)
+    assert table.genes.tolist() == ['GENE1', 'GENE2', 'GENE3']
+    assert table.gene_codes.tolist() == [0, 1, 1, 2]
+    assert table.term_indices.tolist() == [1, 3, 1, 5]
+    assert table.data['ev_code'].dtype.name == 'category'
+
+    # annotations are generated on demand
+    assert table[1] == my_small_annotations[1]
+    assert table[-1] == my_small_annotations[-1]
+    assert table.to_list() == my_small_annotations
+
+
+def test_small_parser(my_small_gaf_file, my_small_annotations,
+                      my_small_ontology):
+    go_annotations = parse_gaf(my_small_gaf_file, my_small_ontology)
+    assert go_annotations == my_small_annotations
+
+    table = parse_gaf(my_small_gaf_file, my_small_ontology,
+                      ev_codes=['IDA', 'TAS'], as_table=True)
+    assert isinstance(table, GOAnnotationTable)
+    assert len(table) == 3
+
+    # generating gene sets from the table
+    gene_sets = get_goa_gene_sets(table)
+    assert [gs.id for gs in gene_sets] == ['GO:0000002', 'GO:0000006']
+    other = get_goa_gene_sets(table.to_list())
+    assert gene_sets == other
+
+    gene_sets = get_goa_gene_sets(table, propagate=True)
+    other = get_goa_gene_sets(table.to_list(), my_small_ontology,
+                              propagate=True)
+    assert gene_sets == other
+    assert gene_sets['GO:0000001'].genes == set(['GENE1', 'GENE2', 'GENE3'])
+
+
+def test_chunked_parser(my_small_gaf_file, my_small_annotations,
+                        my_small_ontology):
+    table = parse_gaf(my_small_gaf_file, my_small_ontology, as_table=True)
+
+    for chunksize in [1, 3, 100]:
+        other = parse_gaf(my_small_gaf_file, my_small_ontology,
+                          chunksize=chunksize, as_table=True)
+        assert other.to_list() == table.to_list()
+        assert other.genes.tolist() == table.genes.tolist()
+
+    go_annotations = parse_gaf(my_small_gaf_file, my_small_ontology,
+                               ev_codes='IDA', chunksize=2)
+    assert go_annotations == \
+        [my_small_annotations[0], my_small_annotations[2]]
+
+    # only read the columns required for generating gene sets
+    other = parse_gaf(my_small_gaf_file, my_small_ontology, chunksize=2,
+                      usecols=['db_symbol', 'go_term'], as_table=True)
+    assert other.data['db_id'].tolist() == [''] * 4
+    assert other.data['ev_code'].tolist() == ['IDA', 'IEA', 'IDA', 'TAS']
+    assert get_goa_gene_sets(other, propagate=True) == \
+        get_goa_gene_sets(table, propagate=True)
+
+    with pytest.raises(ValueError):
+        parse_gaf(my_small_gaf_file, my_small_ontology, usecols=['foo'])
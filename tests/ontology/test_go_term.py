@@ -43,10 +43,29 @@ def test_basic(my_term):
     assert isinstance(my_term.domain, text)
     assert isinstance(my_term.definition, text)
 
-    assert isinstance(my_term.is_a, set)
-    assert isinstance(my_term.part_of, set)
+    assert isinstance(my_term.is_a, frozenset)
+    assert isinstance(my_term.part_of, frozenset)
     assert isinstance(hash(my_term), int)
 
+    # terms that do not belong to an ontology have no children or parts
+    assert isinstance(my_term.children, frozenset)
+    assert isinstance(my_term.parts, frozenset)
+    assert my_term.children == set()
+    assert my_term.parts == set()
+
+
+def test_compact(my_term):
+    """Test the memory-saving representation of GO terms."""
+    assert not hasattr(my_term, '__dict__')
+    with pytest.raises(AttributeError):
+        my_term.foo = 'bar'
+
+    term = GOTerm(''.join(['GO:', '0000001']), 'test process',
+                  is_a=['GO:0000000', 'GO:0000002', 'GO:0000000'])
+    assert term.id is GOTerm('GO:0000001', 'other process').id
+    assert term._is_a == ('GO:0000000', 'GO:0000002')
+    assert term.is_a == set(['GO:0000000', 'GO:0000002'])
+
 def test_compare(my_term):
     """Test comparison between two GOTerm objects."""
     other = copy.deepcopy(my_term)
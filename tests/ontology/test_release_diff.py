@@ -0,0 +1,165 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for comparing GO releases and updating GO gene sets."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+import pytest
+
+from genometools.ontology import GOTerm, GeneOntology, GOAnnotation, \
+                                 GOAnnotationTable, GeneOntologyDiff, \
+                                 GOAnnotationDiff, get_goa_gene_sets, \
+                                 update_goa_gene_sets
+
+
+def _get_annotation(gene_ontology, gene, term_id, ev_code='IDA'):
+    return GOAnnotation(
+        db='UniProtKB', db_id='ID_' + gene, db_symbol=gene,
+        go_term=gene_ontology[term_id], db_ref='PMID:1',
+        ev_code=ev_code, db_type='protein', taxon='taxon:9606',
+        date='20170101', assigned_by='UniProt')
+
+
+@pytest.fixture
+def my_new_ontology():
+    """A new release of `my_small_ontology`."""
+    terms = [
+        GOTerm('GO:0000001', 'root process', 'biological_process',
+               'The root.'),
+        # renamed
+        GOTerm('GO:0000002', 'first biological process',
+               'biological_process', 'A child of the root.',
+               is_a=['GO:0000001']),
+        GOTerm('GO:0000003', 'second process', 'biological_process',
+               'Another child of the root.', is_a=['GO:0000001']),
+        GOTerm('GO:0000004', 'combined process', 'biological_process',
+               'A child of both children.',
+               is_a=['GO:0000002', 'GO:0000003']),
+        # reparented
+        GOTerm('GO:0000005', 'partial process', 'biological_process',
+               'A part of the combined process.',
+               is_a=['GO:0000003']),
+        # added
+        GOTerm('GO:0000007', 'new process', 'biological_process',
+               'A new process.', is_a=['GO:0000001']),
+    ]
+    # GO:0000006 was merged into GO:0000005
+    return GeneOntology(terms, alt_id={'GO:0000006': 'GO:0000005'})
+
+
+@pytest.fixture
+def my_new_annotations(my_new_ontology):
+    ontology = my_new_ontology
+    return [
+        _get_annotation(ontology, 'GENE1', 'GO:0000002'),
+        _get_annotation(ontology, 'GENE2', 'GO:0000004', 'IEA'),
+        _get_annotation(ontology, 'GENE2', 'GO:0000002'),
+        _get_annotation(ontology, 'GENE3', 'GO:0000005', 'TAS'),
+        _get_annotation(ontology, 'GENE4', 'GO:0000007'),
+    ]
+
+
+def test_ontology_diff(my_small_ontology, my_new_ontology):
+    diff = GeneOntologyDiff.from_ontologies(
+        my_small_ontology, my_new_ontology)
+    assert diff.added == ['GO:0000007']
+    assert diff.removed == []
+    assert diff.merged == {'GO:0000006': 'GO:0000005'}
+    assert diff.obsoleted == []
+    assert diff.reparented == ['GO:0000005']
+    assert diff.changed == ['GO:0000002']
+    assert len(diff) == 4
+
+    assert len(GeneOntologyDiff.from_ontologies(
+        my_small_ontology, my_small_ontology)) == 0
+
+    # obsolete terms lose their relations
+    terms = [GOTerm(t.id, t.name, t.domain, t.definition, is_a=t.is_a,
+                    part_of=t.part_of) for t in my_new_ontology]
+    terms.append(GOTerm('GO:0000008', 'obsolete process',
+                        'biological_process', 'An obsolete process.'))
+    other = GeneOntology(terms, obsolete_ids=['GO:0000008'])
+    terms = [GOTerm(t.id, t.name, t.domain, t.definition, is_a=t.is_a,
+                    part_of=t.part_of) for t in my_new_ontology]
+    terms.append(GOTerm('GO:0000008', 'some process',
+                        'biological_process', 'An obsolete process.',
+                        is_a=['GO:0000001']))
+    diff = GeneOntologyDiff.from_ontologies(GeneOntology(terms), other)
+    assert diff.obsoleted == ['GO:0000008']
+    assert diff.reparented == ['GO:0000008']
+    assert diff.changed == ['GO:0000008']
+
+
+def test_annotation_diff(my_small_annotations, my_new_annotations,
+                         my_new_ontology):
+    diff = GOAnnotationDiff.from_annotations(
+        my_small_annotations, my_new_annotations)
+    assert diff.added == [('GENE3', 'GO:0000005'), ('GENE4', 'GO:0000007')]
+    assert diff.removed == [('GENE3', 'GO:0000006')]
+    assert diff.term_ids == ['GO:0000005', 'GO:0000006', 'GO:0000007']
+
+    # changes in evidence codes are ignored
+    table = GOAnnotationTable.from_annotations(
+        my_new_annotations, my_new_ontology)
+    changed = list(my_new_annotations)
+    changed[0] = _get_annotation(my_new_ontology, 'GENE1', 'GO:0000002',
+                                 'TAS')
+    assert len(GOAnnotationDiff.from_annotations(table, changed)) == 0
+
+
+def test_update_gene_sets(my_small_ontology, my_small_annotations,
+                          my_new_ontology, my_new_annotations):
+    old_gene_sets = get_goa_gene_sets(my_small_annotations,
+                                      my_small_ontology, propagate=True)
+    expected = get_goa_gene_sets(my_new_annotations, my_new_ontology,
+                                 propagate=True)
+
+    gene_sets = update_goa_gene_sets(
+        old_gene_sets, my_small_ontology, my_new_ontology,
+        my_small_annotations, my_new_annotations)
+    assert gene_sets == expected
+
+    for include_part_of in [False, True]:
+        for min_genes in [None, 2]:
+            kwargs = dict(include_part_of=include_part_of,
+                          min_genes=min_genes)
+            old_gene_sets = get_goa_gene_sets(
+                my_small_annotations, my_small_ontology, propagate=True,
+                **kwargs)
+            expected = get_goa_gene_sets(
+                my_new_annotations, my_new_ontology, propagate=True,
+                **kwargs)
+            gene_sets = update_goa_gene_sets(
+                old_gene_sets, my_small_ontology, my_new_ontology,
+                my_small_annotations, my_new_annotations, **kwargs)
+            assert gene_sets == expected
+
+
+def test_update_unaffected(my_small_ontology, my_small_annotations):
+    old_gene_sets = get_goa_gene_sets(my_small_annotations,
+                                      my_small_ontology, propagate=True)
+    new_annotations = my_small_annotations + [
+        _get_annotation(my_small_ontology, 'GENE1', 'GO:0000005')]
+    gene_sets = update_goa_gene_sets(
+        old_gene_sets, my_small_ontology, my_small_ontology,
+        my_small_annotations, new_annotations)
+    assert gene_sets == get_goa_gene_sets(new_annotations, my_small_ontology,
+                                          propagate=True)
+    # only ancestors of GO:0000005 are affected
+    assert gene_sets['GO:0000006'] is old_gene_sets['GO:0000006']
+    assert gene_sets['GO:0000005'] is not old_gene_sets['GO:0000005']
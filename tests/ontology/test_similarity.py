@@ -0,0 +1,115 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the `GOSimilarity` class."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+import numpy as np
+import pytest
+
+from genometools.ontology import GOSimilarity, GOAnnotationTable
+
+
+@pytest.fixture
+def my_similarity(my_small_ontology, my_small_annotations):
+    return GOSimilarity(my_small_ontology, my_small_annotations)
+
+
+def test_information_content(my_similarity):
+    # propagated counts: 3, 3, 2, 2, 1, 1 (out of 3 genes)
+    expected = -np.log(np.float64([3, 3, 2, 2, 1, 1]) / 3)
+    assert np.allclose(my_similarity.ic, expected)
+
+
+def test_information_content_is_a(my_small_ontology, my_small_annotations):
+    # without "part_of" relations, GO:0000005 and GO:0000006 form their own
+    # hierarchy
+    sim = GOSimilarity(my_small_ontology, my_small_annotations,
+                       include_part_of=False)
+    expected = -np.log(np.float64([2, 2, 1, 1, 1, 1]) / 3)
+    assert np.allclose(sim.ic, expected)
+    assert sim.get_mica('GO:0000006', 'GO:0000002') is None
+    assert sim.resnik('GO:0000006', 'GO:0000002') == 0
+
+
+def test_mica(my_similarity):
+    sim = my_similarity
+    assert sim.get_mica('GO:0000006', 'GO:0000005') == 'GO:0000005'
+    assert sim.get_mica(['GO:0000004', 'GO:0000002', 'GO:0000006'],
+                        ['GO:0000003', 'GO:0000003', 'GO:0000005']) == \
+        ['GO:0000003', 'GO:0000001', 'GO:0000005']
+
+    with pytest.raises(ValueError):
+        sim.get_mica(['GO:0000001'], ['GO:0000001', 'GO:0000002'])
+
+
+def test_term_similarity(my_similarity):
+    sim = my_similarity
+    assert np.isclose(sim.resnik('GO:0000006', 'GO:0000005'), np.log(3))
+    assert sim.resnik('GO:0000002', 'GO:0000003') == 0
+    assert np.isclose(sim.lin('GO:0000006', 'GO:0000005'), 1.0)
+    assert np.isclose(sim.lin('GO:0000003', 'GO:0000004'), 1.0)
+    assert np.isclose(sim.lin('GO:0000003', 'GO:0000006'),
+                      2 * np.log(1.5) / (np.log(1.5) + np.log(3)))
+    assert np.isclose(sim.jiang('GO:0000004', 'GO:0000006'),
+                      1 / (1 + np.log(2)))
+
+    ids1 = ['GO:0000001', 'GO:0000003', 'GO:0000006', 'GO:0000006']
+    ids2 = ['GO:0000002', 'GO:0000004', 'GO:0000005', 'GO:0000006']
+    for measure in GOSimilarity.measures:
+        values = sim.get_term_similarity(ids1, ids2, measure)
+        assert values.shape == (4,)
+        for i, (id1, id2) in enumerate(zip(ids1, ids2)):
+            assert np.isclose(
+                values[i], sim.get_term_similarity(id1, id2, measure))
+            # similarity is symmetric
+            assert np.isclose(
+                values[i], sim.get_term_similarity(id2, id1, measure))
+
+    with pytest.raises(ValueError):
+        sim.get_term_similarity(ids1, ids2, 'unknown')
+
+
+def test_gene_similarity(my_similarity, my_small_ontology,
+                         my_small_annotations):
+    sim = my_similarity
+    assert sim.get_gene_similarity('GENE1', 'GENE3') == 0
+    # GENE2 has two annotations (GO:0000002 and GO:0000004)
+    assert np.isclose(sim.get_gene_similarity('GENE2', 'GENE3'),
+                      2 * np.log(1.5) / 3)
+    assert np.isclose(sim.get_gene_similarity('GENE3', 'GENE3'), np.log(3))
+    assert np.isnan(sim.get_gene_similarity('GENE1', 'UNKNOWN'))
+
+    genes1 = ['GENE1', 'GENE2', 'GENE3', 'GENE2', 'UNKNOWN']
+    genes2 = ['GENE2', 'GENE3', 'GENE3', 'GENE2', 'GENE1']
+    expected = np.float64([sim.get_gene_similarity(g1, g2, 'lin')
+                           for g1, g2 in zip(genes1, genes2)])
+    values = sim.get_gene_similarity(genes1, genes2, 'lin')
+    assert np.allclose(values, expected, equal_nan=True)
+    values = sim.get_gene_similarity(genes1, genes2, 'lin',
+                                     num_jobs=2, chunksize=2)
+    assert np.allclose(values, expected, equal_nan=True)
+
+    # the results are identical for an annotation table
+    table = GOAnnotationTable.from_annotations(
+        my_small_annotations, my_small_ontology)
+    table_sim = GOSimilarity(my_small_ontology, table)
+    assert np.allclose(table_sim.ic, sim.ic)
+    assert np.allclose(
+        table_sim.get_gene_similarity(genes1, genes2, 'lin'),
+        expected, equal_nan=True)
@@ -0,0 +1,77 @@
+# Copyright (c) 2016 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import str as text
+
+import io
+import gzip
+
+import numpy as np
+import pytest
+
+from genometools import misc
+
+
+@pytest.fixture(scope='session')
+def my_seq_dir(tmpdir_factory):
+    return tmpdir_factory.mktemp('seq_data', numbered=False)
+
+
+@pytest.fixture(scope='session')
+def my_sequences():
+    """Random sequences of various lengths (including an empty one)."""
+    np.random.seed(0)
+    seqs = []
+    for i, n in enumerate([1000, 60, 0, 61, 1, 250000, 12345]):
+        s = np.frombuffer(b'ACGTN', dtype=np.uint8)[
+            np.random.randint(0, 5, n)].tobytes().decode('ascii')
+        seqs.append(('seq%d' % (i+1), s))
+    return seqs
+
+
+@pytest.fixture(scope='session')
+def my_fasta_data(my_sequences):
+    lines = []
+    for name, s in my_sequences:
+        lines.append('>%s description of %s\n' % (name, name))
+        lines.extend(s[i:(i+60)] + '\n' for i in range(0, len(s), 60))
+    return ''.join(lines).encode('ascii')
+
+
+@pytest.fixture(scope='session')
+def my_fasta_file(my_seq_dir, my_fasta_data):
+    path = text(my_seq_dir.join('test.fa'))
+    with io.open(path, 'wb') as ofh:
+        ofh.write(my_fasta_data)
+    return path
+
+
+@pytest.fixture(scope='session')
+def my_gzip_fasta_file(my_seq_dir, my_fasta_data):
+    path = text(my_seq_dir.join('test.fa.gz'))
+    with gzip.open(path, 'wb') as ofh:
+        ofh.write(my_fasta_data)
+    return path
+
+
+@pytest.fixture(scope='session')
+def my_bgzf_fasta_file(my_seq_dir, my_fasta_data):
+    path = text(my_seq_dir.join('test.fa.bgz'))
+    with io.open(path, 'wb') as ofh, misc.BgzfWriter(ofh) as writer:
+        writer.write(my_fasta_data)
+    return path
@@ -0,0 +1,103 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the `fasta` module."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import str as text
+
+import io
+import gzip
+
+import pytest
+
+from genometools import seq
+
+
+def _get_expected(my_sequences):
+    return [('%s description of %s' % (n, n), s) for n, s in my_sequences]
+
+
+@pytest.mark.parametrize('block_size', [1, 2, 7, 61, 4194304])
+def test_reader(my_sequences, my_fasta_data, block_size):
+    reader = seq.FastaReader(io.BytesIO(my_fasta_data),
+                             block_size=block_size)
+    records = list(reader)
+    assert all(isinstance(r.data, bytes) for r in records)
+    assert [(r.name, r.seq) for r in records] == _get_expected(my_sequences)
+
+
+def test_reader_files(my_sequences, my_fasta_file, my_gzip_fasta_file,
+                      my_bgzf_fasta_file):
+    expected = _get_expected(my_sequences)
+    for path in [my_fasta_file, my_gzip_fasta_file, my_bgzf_fasta_file]:
+        records = list(seq.FastaReader(path, block_size=1000))
+        assert [(r.name, r.seq) for r in records] == expected
+
+    with io.open(my_fasta_file, 'r', encoding='ascii') as fh:
+        records = list(seq.FastaReader(fh))
+        assert [(r.name, r.seq) for r in records] == expected
+
+
+def test_reader_line_breaks(my_sequences, my_fasta_data):
+    data = my_fasta_data.replace(b'\n', b'\r\n')
+    records = list(seq.FastaReader(io.BytesIO(data), block_size=100))
+    assert [(r.name, r.seq) for r in records] == _get_expected(my_sequences)
+
+    data = b'\n>a\nAC\n\nGT\n>b'
+    records = list(seq.FastaReader(io.BytesIO(data)))
+    assert [(r.name, r.seq) for r in records] == [('a', 'ACGT'), ('b', '')]
+
+
+def test_reader_invalid():
+    with pytest.raises(ValueError):
+        list(seq.FastaReader(io.BytesIO(b'ACGT\n>a\nACGT\n')))
+
+
+def test_sequence_bytes():
+    s = seq.Sequence('a', b'ACGT')
+    assert s.length == 4
+    assert s.seq == 'ACGT'
+    assert s == seq.Sequence('a', 'ACGT')
+    assert seq.Sequence('a', 'ACGT').data == b'ACGT'
+
+
+@pytest.mark.parametrize('num_threads', [1, 2])
+def test_writer(my_seq_dir, my_sequences, my_fasta_data, num_threads):
+    path = text(my_seq_dir.join('test_writer.fa'))
+    with seq.FastaWriter(path) as writer:
+        for name, s in my_sequences:
+            writer.write(seq.Sequence('%s description of %s' % (name, name),
+                                      s.encode('ascii')))
+    with io.open(path, 'rb') as fh:
+        assert fh.read() == my_fasta_data
+
+    path = text(my_seq_dir.join('test_writer.fa.gz'))
+    with seq.FastaWriter(path, compress=True,
+                         num_threads=num_threads) as writer:
+        for name, s in my_sequences:
+            writer.write(seq.Sequence(name, s))
+    with gzip.open(path, 'rb') as fh:
+        records = list(seq.FastaReader(fh))
+    assert [(r.name, r.seq) for r in records] == my_sequences
+
+
+def test_append_fasta():
+    ofh = io.StringIO()
+    seq.Sequence('a', 'ACGTA' * 3).append_fasta(ofh, linewidth=5)
+    seq.Sequence('b', 'ACG').append_fasta(ofh, linewidth=5)
+    assert ofh.getvalue() == '>a\nACGTA\nACGTA\nACGTA\n>b\nACG\n'
@@ -0,0 +1,101 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the `fasta_index` module."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+from builtins import str as text
+
+import io
+import struct
+
+import numpy as np
+import pytest
+
+from genometools import seq
+from genometools import ensembl
+
+
+def test_get_fasta_index(my_sequences, my_fasta_data, my_fasta_file,
+                         my_gzip_fasta_file, my_bgzf_fasta_file):
+    index = seq.get_fasta_index(my_fasta_file, block_size=1000)
+    assert index.index.tolist() == [name for name, _ in my_sequences]
+    assert index['length'].tolist() == [len(s) for _, s in my_sequences]
+    for name, s in my_sequences:
+        length, offset, linebases, linewidth = index.loc[name]
+        assert linebases == min(length, 60)
+        assert my_fasta_data[offset:(offset + linebases)] == \
+            s[:60].encode('ascii')
+
+    # compressed files
+    gzi_entries = []
+    assert seq.get_fasta_index(my_gzip_fasta_file).equals(index)
+    assert seq.get_fasta_index(
+        my_bgzf_fasta_file, gzi_entries=gzi_entries).equals(index)
+    assert len(gzi_entries) == len(my_fasta_data) // 65280
+
+
+def test_invalid_fasta(my_seq_dir):
+    path = text(my_seq_dir.join('invalid.fa'))
+    with io.open(path, 'wb') as ofh:
+        ofh.write(b'>a\r\nACGT\r\nAC\r\n\r\n>b x\nACGT\nACG')
+    index = seq.get_fasta_index(path)
+    assert index.values.tolist() == [[6, 4, 4, 6], [7, 21, 4, 5]]
+
+    with io.open(path, 'wb') as ofh:
+        ofh.write(b'>a\nACGT\nAC\nACGT\n>b\nAA\n')
+    with pytest.raises(ValueError):
+        seq.get_fasta_index(path)
+    assert seq.get_fasta_index(path, check_lines=False)['length'].tolist() \
+        == [10, 2]
+
+    with io.open(path, 'wb') as ofh:
+        ofh.write(b'ACGT\n>a\nACGT\n')
+    with pytest.raises(ValueError):
+        seq.get_fasta_index(path)
+
+
+def test_index_fasta(my_fasta_file, my_gzip_fasta_file, my_bgzf_fasta_file):
+    index = seq.index_fasta(my_fasta_file)
+    with io.open(my_fasta_file + '.fai') as fh:
+        first = fh.readline()
+    assert first == 'seq1\t1000\t26\t60\t61\n'
+    assert seq.read_fai(my_fasta_file + '.fai').equals(index)
+
+    seq.index_fasta(my_bgzf_fasta_file)
+    with io.open(my_bgzf_fasta_file + '.gzi', 'rb') as fh:
+        num_entries = struct.unpack('<Q', fh.read(8))[0]
+        entries = np.frombuffer(fh.read(), dtype='<u8').reshape(-1, 2)
+    assert entries.shape[0] == num_entries > 0
+    assert np.all(entries[:, 1] % 65280 == 0)
+
+    with pytest.raises(ValueError):
+        seq.index_fasta(my_gzip_fasta_file)
+
+
+def test_chromosome_lengths(my_seq_dir, my_gzip_fasta_file):
+    fai_file = text(my_seq_dir.join('chrom.fai'))
+    path = text(my_seq_dir.join('genome.fa'))
+    with io.open(path, 'wb') as ofh:
+        for name, length in [('X', 5), ('10', 3), ('MT', 2), ('2', 7)]:
+            ofh.write(b'>' + name.encode('ascii') + b' dna:chromosome\n' +
+                      b'A' * length + b'\n')
+    chromlen = ensembl.get_chromosome_lengths(path, fai_file=fai_file)
+    assert chromlen.index.tolist() == ['2', '10', 'X', 'MT']
+    assert chromlen.tolist() == [7, 3, 5, 2]
+    assert seq.read_fai(fai_file)['length'].tolist() == [5, 3, 2, 7]
+    assert ensembl.get_chromosome_lengths(my_gzip_fasta_file).size == 7
@@ -0,0 +1,77 @@
+# Copyright (c) 2017 Florian Wagner
+#
+# This file is part of GenomeTools.
+#
+# GenomeTools is free software: you can redistribute it and/or modify
+# it under the terms of the GNU Affero General Public License, Version 3,
+# as published by the Free Software Foundation.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU Affero General Public License for more details.
+#
+# You should have received a copy of the GNU Affero General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""Tests for the `indexed_fasta` module."""
+
+from __future__ import (absolute_import, division,
+                        print_function, unicode_literals)
+
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from genometools import seq
+
+
+def test_reverse_complement():
+    assert seq.reverse_complement(b'AACGTnR') == b'YnACGTT'
+
+
+def test_fetch(my_sequences, my_fasta_file):
+    sequences = dict((n, s.encode('ascii')) for n, s in my_sequences)
+    with seq.IndexedFasta(my_fasta_file) as fasta:
+        assert os.path.isfile(my_fasta_file + '.fai')
+        assert fasta.names == [n for n, _ in my_sequences]
+        assert fasta.lengths.tolist() == [len(s) for _, s in my_sequences]
+        assert 'seq1' in fasta and 'seq8' not in fasta
+
+        for name, s in sequences.items():
+            assert fasta.fetch(name) == s
+        s = sequences['seq6']
+        for start, end in [(1, 1), (60, 61), (61, 120), (59, 1000),
+                           (12345, 200000), (249990, 250010)]:
+            assert fasta.fetch('seq6', start, end) == s[(start-1):end]
+            assert fasta.fetch('seq6', start, end, reverse=True) == \
+                seq.reverse_complement(s[(start-1):end])
+        assert fasta.fetch('seq3', 1, 10) == b''
+        with pytest.raises(KeyError):
+            fasta.fetch('seq8')
+
+
+def test_fetch_regions(my_sequences, my_fasta_file):
+    sequences = dict((n, s.encode('ascii')) for n, s in my_sequences)
+    names = ['seq1', 'seq6', 'seq7', 'seq6', 'seq4']
+    starts = np.array([10, 1000, 2, 200000, 0])
+    ends = np.array([500, 5000, 12345, 200100, 61])
+    strands = ['+', '-', '+', '+', '-']
+    expected = [sequences[n][s:e] for n, s, e in zip(names, starts, ends)]
+    expected = [seq.reverse_complement(x) if strand == '-' else x
+                for x, strand in zip(expected, strands)]
+
+    fasta = seq.IndexedFasta(my_fasta_file)
+    bed = pd.DataFrame(OrderedDict([
+        ('chrom', names), ('chromStart', starts), ('chromEnd', ends),
+        ('name', 'region'), ('score', 0), ('strand', strands)]))
+    assert fasta.fetch_regions(bed) == expected
+
+    regions = pd.DataFrame(OrderedDict([
+        ('chromosome', names), ('start', starts + 1), ('end', ends),
+        ('strand', strands)]))
+    assert fasta.fetch_regions(regions) == expected
+    fasta.close()